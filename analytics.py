@@ -0,0 +1,725 @@
+"""
+Production Analytics - Sort-cycle timings with hourly and per-shift rollups
+
+Every tray and robot step is recorded as one row of a columnar table:
+
+    column    type      meaning
+    ts        float64   wall-clock start (time.time())
+    tray      int32     index into the tray ID table (-1 = no tray, conveyor mode)
+    piece     int16     visual piece ID (-1 = whole tray)
+    kind      uint8     index into KINDS
+    duration  float32   seconds
+    ok        bool      step succeeded
+    status    int8      0 GOOD, 1 BAD, -1 unknown (inspect rows carry the verdict)
+
+    kind      one row per
+    detect    capture (camera processing latency of the captured frame)
+    inspect   piece at capture (its GOOD/BAD verdict; duration 0)
+    pick      pick / pick_piece command
+    place     place_piece command
+    home      move_home command
+    tray      finished tray (wall time from capture to the end of sorting)
+    idle      gap between the end of one tray and the next capture
+
+Rows are folded into per-hour and per-shift Rollups as they arrive (O(1) per
+row), so the dashboard tab never rescans the table:
+- throughput: pieces placed per hour of elapsed time, left out ("-") until
+  the period has min_rate_elapsed of data, so a few minutes are not
+  extrapolated to a full hour
+- availability: robot busy time / planned time, where planned time is tray
+  wall time plus idle gaps; gaps longer than break_after are planned breaks
+  and are left out
+- quality: successful steps / attempted steps
+- performance and OEE (availability x performance x quality) when an ideal
+  cycle time is configured
+- defect rate per region and mean/max time per step kind (slowest first)
+
+Rows are kept in one compact NumPy file per day (analytics/YYYY-MM-DD.npz,
+one array per column). Only days with new rows are rewritten (atomically,
+on a saver thread): after every tray, when the conveyor stops, and every
+save_interval while it runs (conveyor mode has no trays). Memory holds the
+last keep_days days, which is all the report reads; older rows and rollups
+are dropped once saved, and the current and previous day are reloaded at
+startup so a restart keeps the shift totals.
+
+Run this file directly to print the stored rollups, or to simulate a shift:
+    python3 analytics.py [--dir analytics] [--day 2026-10-19]
+    python3 analytics.py --simulate
+"""
+
+import os
+import time
+import tempfile
+import threading
+import numpy as np
+
+
+KINDS = ("detect", "inspect", "pick", "place", "home", "tray", "idle")
+KIND_CODES = {name: code for code, name in enumerate(KINDS)}
+STEP_KINDS = ("detect", "pick", "place", "home")  # Robot/camera work (busy time)
+COMMAND_KINDS = {"pick_piece": "pick", "pick": "pick", "place_piece": "place", "move_home": "home"}
+STATUS_CODES = {"GOOD": 0, "BAD": 1}
+
+COLUMNS = (("ts", np.float64), ("tray", np.int32), ("piece", np.int16), ("kind", np.uint8),
+           ("duration", np.float32), ("ok", np.bool_), ("status", np.int8))
+
+DEFAULT_DIR = "analytics"
+
+
+def hour_start(ts):
+    """Local start of the hour containing ts (epoch seconds)."""
+    local = time.localtime(ts)
+    return time.mktime((local.tm_year, local.tm_mon, local.tm_mday, local.tm_hour, 0, 0, 0, 0, -1))
+
+
+def shift_start(ts, shift_hours=(6, 14, 22)):
+    """
+    Local start of the shift containing ts.
+    
+    Args:
+        ts (float): Epoch seconds.
+        shift_hours (tuple): Local hours at which shifts begin, ascending.
+    
+    Returns:
+        float: Epoch seconds of the shift start (a shift before the first
+        start hour belongs to the previous day's last shift).
+    """
+    local = time.localtime(ts)
+    day = (local.tm_year, local.tm_mon, local.tm_mday)
+    started = [hour for hour in shift_hours if hour <= local.tm_hour]
+    if started:
+        return time.mktime(day + (started[-1], 0, 0, 0, 0, -1))
+    return time.mktime(day + (shift_hours[-1] - 24, 0, 0, 0, 0, -1))  # mktime normalizes
+
+
+class Rollup:
+    """
+    Running totals for one period (an hour or a shift).
+    """
+    
+    def __init__(self, start, length):
+        """
+        Initialize empty totals.
+        
+        Args:
+            start (float): Period start (epoch seconds).
+            length (float): Period length in seconds.
+        """
+        self.start = start
+        self.length = length
+        self.first = None      # First row timestamp
+        self.last = None       # End of the latest row
+        self.trays = 0
+        self.pieces = 0        # Successful places
+        self.steps = 0         # Attempted pick/place/home commands
+        self.failed_steps = 0
+        self.busy = 0.0        # Detect + command time
+        self.tray_time = 0.0   # Wall time of finished trays
+        self.idle = 0.0        # Unplanned gaps between trays
+        self.breaks = 0.0      # Gaps longer than break_after
+        self.kind_sum = np.zeros(len(KINDS))
+        self.kind_count = np.zeros(len(KINDS), dtype=np.int64)
+        self.kind_max = np.zeros(len(KINDS))
+        self.region_good = {}  # {piece_id: count}
+        self.region_bad = {}
+    
+    def add(self, ts, piece, kind, duration, ok, status, break_after):
+        """Fold one row into the totals."""
+        if self.first is None:
+            self.first = ts
+        self.last = max(self.last or ts, ts + duration)
+        name = KINDS[kind]
+        
+        if name == "idle":
+            if duration > break_after:
+                self.breaks += duration
+                return
+            self.idle += duration
+        elif name == "tray":
+            self.trays += 1
+            self.tray_time += duration
+        elif name == "inspect":
+            counts = self.region_bad if status == STATUS_CODES["BAD"] else self.region_good
+            counts[piece] = counts.get(piece, 0) + 1
+            return
+        else:
+            self.busy += duration
+            if name != "detect":
+                self.steps += 1
+                self.failed_steps += not ok
+                if name == "place" and ok:
+                    self.pieces += 1
+        
+        self.kind_sum[kind] += duration
+        self.kind_count[kind] += 1
+        self.kind_max[kind] = max(self.kind_max[kind], duration)
+    
+    def summary(self, now=None, ideal_cycle=None, min_rate_elapsed=0.0):
+        """
+        Derived metrics.
+        
+        Args:
+            now (float): Current time, for periods still in progress.
+            ideal_cycle (float): Rated seconds per piece (pick + place + home)
+                for performance / OEE; None leaves them out.
+            min_rate_elapsed (float): Seconds of data needed before per_hour
+                is reported (None until then).
+        
+        Returns:
+            dict: {"start", "trays", "pieces", "per_hour", "availability",
+            "quality", "performance", "oee", "cycle", "defect_rate",
+            "regions": {piece_id: defect rate}, "slowest": [(kind, mean, max, count)]}
+        """
+        now = time.time() if now is None else now
+        elapsed = 0.0
+        if self.first is not None:
+            end = min(self.start + self.length, max(now, self.last))
+            elapsed = max(end - self.first - self.breaks, 1e-9)
+        planned = self.tray_time + self.idle
+        availability = min(self.busy / planned, 1.0) if planned > 0 else None
+        quality = (self.steps - self.failed_steps) / self.steps if self.steps else None
+        cycle = self.busy / self.pieces if self.pieces else None
+        performance = min(ideal_cycle / cycle, 1.0) if ideal_cycle and cycle else None
+        oee = (availability * performance * quality
+               if None not in (availability, performance, quality) else None)
+        
+        regions = {}
+        for piece_id in sorted(set(self.region_good) | set(self.region_bad)):
+            bad = self.region_bad.get(piece_id, 0)
+            regions[piece_id] = bad / (bad + self.region_good.get(piece_id, 0))
+        inspected = sum(self.region_good.values()) + sum(self.region_bad.values())
+        
+        slowest = []
+        for name in STEP_KINDS:
+            code = KIND_CODES[name]
+            if self.kind_count[code]:
+                slowest.append((name, self.kind_sum[code] / self.kind_count[code],
+                                float(self.kind_max[code]), int(self.kind_count[code])))
+        slowest.sort(key=lambda row: row[1], reverse=True)
+        
+        return {
+            "start": self.start,
+            "trays": self.trays,
+            "pieces": self.pieces,
+            "per_hour": self.pieces * 3600.0 / elapsed if elapsed and elapsed >= min_rate_elapsed else None,
+            "availability": availability,
+            "quality": quality,
+            "performance": performance,
+            "oee": oee,
+            "cycle": cycle,
+            "idle": self.idle,
+            "breaks": self.breaks,
+            "defect_rate": sum(self.region_bad.values()) / inspected if inspected else None,
+            "regions": regions,
+            "slowest": slowest,
+        }
+
+
+class Analytics:
+    """
+    Records tray / step timings and keeps hourly and per-shift rollups.
+    """
+    
+    def __init__(self, directory=DEFAULT_DIR, shift_hours=(6, 14, 22), break_after=1800.0,
+                 ideal_cycle=None, capacity=4096, min_rate_elapsed=600.0, save_interval=300.0,
+                 keep_days=2, on_event=None, on_thread_start=None):
+        """
+        Initialize the recorder.
+        
+        Args:
+            directory (str): Where the daily column files are written (None = memory only).
+            shift_hours (tuple): Local hours at which shifts begin.
+            break_after (float): Idle gaps longer than this (seconds) are
+                planned breaks and do not count against availability.
+            ideal_cycle (float): Rated seconds per piece for performance / OEE.
+            capacity (int): Initial row capacity (grows by doubling).
+            min_rate_elapsed (float): Seconds of data an hour or shift needs
+                before its pieces per hour is shown.
+            save_interval (float): Minimum seconds between save_if_due() writes.
+            keep_days (int): Local days of rows and rollups kept in memory
+                (the newest day and the ones before it); older days stay on disk.
+            on_event (callable): on_event(level, message) for the activity log.
+            on_thread_start (callable): Called first on the saver thread
+                (e.g. to pin it to the background cores).
+        """
+        self.directory = directory
+        self.shift_hours = tuple(sorted(shift_hours))
+        self.shift_length = 24 * 3600.0 / len(self.shift_hours)
+        self.break_after = break_after
+        self.ideal_cycle = ideal_cycle
+        self.min_rate_elapsed = min_rate_elapsed
+        self.save_interval = save_interval
+        self.keep_days = keep_days
+        self.on_event = on_event or (lambda level, message: print(f"[{level}] {message}"))
+        self.on_thread_start = on_thread_start
+        
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in COLUMNS}
+        self.count = 0
+        self.tray_ids = []       # tray column value → tray ID
+        self._tray_lookup = {}   # tray ID → tray column value
+        self.hours = {}          # {hour start: Rollup}
+        self.shifts = {}         # {shift start: Rollup}
+        self.days = {}           # {"YYYY-MM-DD": (start, end)} of the rows in memory
+        self.dirty_days = set()  # Days with rows not yet on disk
+        self.current_tray = None  # (tray index, start ts)
+        self.last_tray_end = None
+        self.last_save = time.monotonic()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # One writer of the day files at a time
+        self._save_request = threading.Event()
+        self._saver = None
+        
+        # Bounds of the latest hour / shift / day seen, so a row only calls
+        # localtime() when it crosses a boundary
+        self._hour = (0.0, 0.0)
+        self._shift = (0.0, 0.0)
+        self._day = (0.0, 0.0, None)
+    
+    def _locate(self, ts):
+        """Hour start, shift start and day name of ts (caller holds the lock)."""
+        if not self._hour[0] <= ts < self._hour[1]:
+            start = hour_start(ts)
+            self._hour = (start, start + 3600.0)
+        if not self._shift[0] <= ts < self._shift[1]:
+            start = shift_start(ts, self.shift_hours)
+            end = start + 3600.0
+            while shift_start(end, self.shift_hours) == start:
+                end += 3600.0
+            self._shift = (start, end)
+        if not self._day[0] <= ts < self._day[1]:
+            local = time.localtime(ts)
+            start = time.mktime((local.tm_year, local.tm_mon, local.tm_mday, 0, 0, 0, 0, 0, -1))
+            end = time.mktime((local.tm_year, local.tm_mon, local.tm_mday + 1, 0, 0, 0, 0, 0, -1))
+            self._day = (start, end, time.strftime("%Y-%m-%d", local))
+        return self._hour[0], self._shift[0], self._day[2]
+    
+    def _append(self, ts, tray, piece, kind, duration, ok=True, status=-1):
+        """Store one row and fold it into its hour and shift (caller holds the lock)."""
+        if self.count == len(self.columns["ts"]):
+            for name, column in self.columns.items():
+                self.columns[name] = np.concatenate((column, np.zeros_like(column)))
+        row = self.count
+        columns = self.columns
+        columns["ts"][row] = ts
+        columns["tray"][row] = tray
+        columns["piece"][row] = piece
+        columns["kind"][row] = kind
+        columns["duration"][row] = duration
+        columns["ok"][row] = ok
+        columns["status"][row] = status
+        self.count += 1
+        
+        hour, shift, day = self._locate(ts)
+        self.dirty_days.add(day)
+        if day not in self.days:
+            self.days[day] = self._day[:2]
+        for rollups, start, length in ((self.hours, hour, 3600.0),
+                                       (self.shifts, shift, self.shift_length)):
+            rollup = rollups.get(start)
+            if rollup is None:
+                rollup = rollups[start] = Rollup(start, length)
+            rollup.add(ts, piece, kind, duration, ok, status, self.break_after)
+    
+    def _trim(self):
+        """
+        Drop rows, rollups and tray IDs older than the last keep_days days
+        (caller holds the lock). Days not yet saved are kept until they are.
+        
+        Tray indices are renumbered, so this only runs where no caller holds
+        one (end_tray, save, load), never from inside _append.
+        """
+        days = sorted(self.days)
+        old = [day for day in days[:-self.keep_days]
+               if not (self.directory and day in self.dirty_days)]
+        if not old:
+            return
+        for day in old:
+            del self.days[day]
+        self.dirty_days.difference_update(old)
+        cutoff = min(start for start, _ in self.days.values())
+        
+        keep = self.columns["ts"][:self.count] >= cutoff
+        kept = int(keep.sum())
+        for name, column in self.columns.items():
+            column[:kept] = column[:self.count][keep]
+        self.count = kept
+        self.hours = {start: r for start, r in self.hours.items() if start + r.length > cutoff}
+        self.shifts = {start: r for start, r in self.shifts.items() if start + r.length > cutoff}
+        
+        # Renumber the trays still referenced
+        trays = self.columns["tray"][:kept]
+        used = set(np.unique(trays[trays >= 0]).tolist())
+        if self.current_tray is not None:
+            used.add(self.current_tray[0])
+        remap = np.full(len(self.tray_ids) + 1, -1, dtype=np.int32)  # Last entry: -1 stays -1
+        self.tray_ids = [self.tray_ids[index] for index in sorted(used)]
+        self._tray_lookup = {tray_id: index for index, tray_id in enumerate(self.tray_ids)}
+        for index, old_index in enumerate(sorted(used)):
+            remap[old_index] = index
+        trays[:] = remap[trays]
+        if self.current_tray is not None:
+            self.current_tray = (int(remap[self.current_tray[0]]), self.current_tray[1])
+    
+    def _tray_index(self, tray_id):
+        index = self._tray_lookup.get(tray_id)
+        if index is None:
+            index = self._tray_lookup[tray_id] = len(self.tray_ids)
+            self.tray_ids.append(tray_id)
+        return index
+    
+    def start_tray(self, tray_id, statuses, detect_seconds=None, ts=None):
+        """
+        Record a capture: the idle gap since the last tray, detection time
+        and each piece's verdict. An unfinished previous tray is closed first.
+        
+        Args:
+            tray_id (str): Tray identifier.
+            statuses (dict): {piece_id: "GOOD"/"BAD"}
+            detect_seconds (float): Camera processing time of the captured frame.
+            ts (float): Capture time (defaults to now).
+        """
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            if self.current_tray is not None:
+                self._end_tray(ts)
+            tray = self._tray_index(tray_id)
+            if self.last_tray_end is not None and ts > self.last_tray_end:
+                self._append(self.last_tray_end, tray, -1, KIND_CODES["idle"], ts - self.last_tray_end)
+            if detect_seconds is not None:
+                self._append(ts, tray, -1, KIND_CODES["detect"], detect_seconds)
+            for piece_id, status in statuses.items():
+                self._append(ts, tray, piece_id, KIND_CODES["inspect"], 0.0,
+                             status=STATUS_CODES.get(status, -1))
+            self.current_tray = (tray, ts)
+    
+    def record_step(self, command, piece_id, duration, ok, ts=None):
+        """
+        Record one robot command.
+        
+        Args:
+            command (str): Robot command name ("pick_piece", "place_piece", ...).
+            piece_id (int): Visual piece ID (None for home moves without a piece).
+            duration (float): Send → reply time (seconds).
+            ok (bool): Whether the command succeeded.
+            ts (float): Command start (defaults to now - duration).
+        """
+        kind = COMMAND_KINDS.get(command)
+        if kind is None:
+            return
+        ts = time.time() - duration if ts is None else ts
+        with self._lock:
+            tray = self.current_tray[0] if self.current_tray else -1
+            self._append(ts, tray, -1 if piece_id is None else piece_id, KIND_CODES[kind], duration, ok)
+    
+    def _end_tray(self, ts):
+        tray, started = self.current_tray
+        self._append(started, tray, -1, KIND_CODES["tray"], ts - started)
+        self.current_tray = None
+        self.last_tray_end = ts
+    
+    def end_tray(self, ts=None):
+        """
+        Close the current tray (sorting finished, paused or failed) and save.
+        
+        Also called when the conveyor stops: there is no tray then, but its
+        steps are saved.
+        """
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            if self.current_tray is not None:
+                self._end_tray(ts)
+            self._trim()
+            if not self.dirty_days:
+                return
+        self.save_async()
+    
+    def save_if_due(self):
+        """
+        Save in the background if there are new rows and save_interval has
+        passed (for long conveyor runs, which never end a tray).
+        
+        Returns:
+            bool: True if a save was requested.
+        """
+        with self._lock:
+            due = bool(self.dirty_days) and time.monotonic() - self.last_save >= self.save_interval
+        if due:
+            self.save_async()
+        return due
+    
+    def save_async(self):
+        """Request a save on the saver thread (requests made while it writes are coalesced)."""
+        if not self.directory:
+            return
+        with self._lock:
+            if self._saver is None or not self._saver.is_alive():
+                self._saver = threading.Thread(target=self._saver_loop, name="analytics-save", daemon=True)
+                self._saver.start()
+        self._save_request.set()
+    
+    def _saver_loop(self):
+        """Saver thread: write the changed days whenever a save is requested."""
+        if self.on_thread_start:
+            self.on_thread_start()
+        while True:
+            self._save_request.wait()
+            self._save_request.clear()
+            self.save()
+    
+    def rows(self, start=None, end=None):
+        """
+        Column views of the stored rows, optionally limited to [start, end).
+        
+        Returns:
+            dict: {column name: ndarray}
+        """
+        with self._lock:
+            columns = {name: column[:self.count].copy() for name, column in self.columns.items()}
+        if start is not None or end is not None:
+            ts = columns["ts"]
+            mask = np.ones(len(ts), dtype=bool)
+            if start is not None:
+                mask &= ts >= start
+            if end is not None:
+                mask &= ts < end
+            columns = {name: column[mask] for name, column in columns.items()}
+        return columns
+    
+    def step_percentiles(self, start=None, end=None, q=95):
+        """
+        Per-kind percentile of step durations (from the columns, not the rollups).
+        
+        Returns:
+            dict: {kind: seconds}
+        """
+        columns = self.rows(start, end)
+        result = {}
+        for name in STEP_KINDS:
+            durations = columns["duration"][columns["kind"] == KIND_CODES[name]]
+            if len(durations):
+                result[name] = float(np.percentile(durations, q))
+        return result
+    
+    def shift_summary(self, now=None):
+        """Summary of the shift in progress (None before its first row)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            rollup = self.shifts.get(shift_start(now, self.shift_hours))
+            return rollup.summary(now, self.ideal_cycle, self.min_rate_elapsed) if rollup else None
+    
+    def hourly(self, hours=8, now=None):
+        """
+        Summaries of the most recent hours with data, newest first.
+        
+        Args:
+            hours (int): Number of hours.
+        
+        Returns:
+            list: Rollup.summary() dicts.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            starts = sorted(self.hours, reverse=True)[:hours]
+            return [self.hours[start].summary(now, self.ideal_cycle, self.min_rate_elapsed)
+                    for start in starts]
+    
+    def _day_path(self, day):
+        return os.path.join(self.directory, f"{day}.npz")
+    
+    def save(self):
+        """
+        Rewrite the file of every day with new rows (one file per local day).
+        
+        Blocks while it writes; the dashboard uses save_async().
+        
+        Returns:
+            bool: True if written (or nothing was new).
+        """
+        if not self.directory:
+            return False
+        with self._save_lock:
+            with self._lock:
+                days = {day: self.days[day] for day in self.dirty_days if day in self.days}
+                self.dirty_days.clear()
+                self.last_save = time.monotonic()
+                ts = self.columns["ts"][:self.count]
+                snapshots = {}
+                for day, (start, end) in days.items():
+                    mask = (ts >= start) & (ts < end)
+                    snapshots[day] = {name: column[:self.count][mask] for name, column in self.columns.items()}
+                tray_ids = np.array(self.tray_ids + [""], dtype=str)
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                for day, arrays in sorted(snapshots.items()):
+                    handle, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".npz")
+                    with os.fdopen(handle, "wb") as f:
+                        np.savez_compressed(f, tray_ids=tray_ids, **arrays)
+                    os.replace(tmp_path, self._day_path(day))
+            except OSError as e:
+                with self._lock:
+                    self.dirty_days.update(days)
+                self.on_event("ERROR", f"Could not save analytics: {e}")
+                return False
+            with self._lock:
+                self._trim()  # Days held back until saved can go now
+            return True
+    
+    def load(self, days=2, now=None):
+        """
+        Reload the last few days' rows and rebuild the rollups.
+        
+        Args:
+            days (int): Number of days back, including today.
+        
+        Returns:
+            int: Rows loaded.
+        """
+        if not self.directory:
+            return 0
+        now = time.time() if now is None else now
+        loaded = 0
+        for back in range(days - 1, -1, -1):
+            day = time.strftime("%Y-%m-%d", time.localtime(now - back * 86400))
+            path = self._day_path(day)
+            if not os.path.exists(path):
+                continue
+            try:
+                with np.load(path) as data:
+                    tray_ids = data["tray_ids"].tolist()[:-1]
+                    columns = {name: data[name] for name, _ in COLUMNS}
+            except (OSError, KeyError, ValueError) as e:
+                self.on_event("WARNING", f"Could not read {path}: {e}")
+                continue
+            with self._lock:
+                remap = np.array([self._tray_index(tray_id) for tray_id in tray_ids] + [-1], dtype=np.int32)
+                for row in range(len(columns["ts"])):
+                    tray = int(columns["tray"][row])
+                    self._append(float(columns["ts"][row]), int(remap[tray]), int(columns["piece"][row]),
+                                 int(columns["kind"][row]), float(columns["duration"][row]),
+                                 bool(columns["ok"][row]), int(columns["status"][row]))
+                tray_rows = columns["kind"] == KIND_CODES["tray"]
+                if tray_rows.any():
+                    ends = columns["ts"][tray_rows] + columns["duration"][tray_rows]
+                    self.last_tray_end = max(self.last_tray_end or 0.0, float(ends.max()))
+            loaded += len(columns["ts"])
+        with self._lock:
+            self.dirty_days.clear()  # Everything loaded is already on disk
+            self._trim()
+        return loaded
+
+
+def _percent(value):
+    return "-" if value is None else f"{value * 100:.0f}%"
+
+
+def _rate(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def format_report(analytics, now=None):
+    """
+    Text report of the current shift and recent hours (dashboard tab / CLI).
+    
+    Returns:
+        str: Report lines.
+    """
+    now = time.time() if now is None else now
+    shift = analytics.shift_summary(now)
+    if shift is None:
+        return "No sort cycles recorded this shift"
+    
+    lines = [f"Shift from {time.strftime('%Y-%m-%d %H:%M', time.localtime(shift['start']))}: "
+             f"{shift['trays']} trays, {shift['pieces']} pieces, {_rate(shift['per_hour'])}/h",
+             f"Availability {_percent(shift['availability'])}  quality {_percent(shift['quality'])}  "
+             f"performance {_percent(shift['performance'])}  OEE {_percent(shift['oee'])}",
+             f"Cycle {shift['cycle'] or 0:.1f} s/piece, idle {shift['idle'] / 60:.1f} min, "
+             f"breaks {shift['breaks'] / 60:.0f} min, defects {_percent(shift['defect_rate'])}",
+             "",
+             f"{'hour':<7}{'trays':>6}{'pieces':>7}{'/h':>7}{'avail':>7}{'defect':>8}  slowest"]
+    for hour in analytics.hourly(8, now):
+        slowest = hour["slowest"][0] if hour["slowest"] else None
+        lines.append(f"{time.strftime('%H:%M', time.localtime(hour['start'])):<7}{hour['trays']:>6}"
+                     f"{hour['pieces']:>7}{_rate(hour['per_hour']):>7}{_percent(hour['availability']):>7}"
+                     f"{_percent(hour['defect_rate']):>8}  "
+                     + (f"{slowest[0]} {slowest[1]:.2f} s" if slowest else "-"))
+    
+    p95 = analytics.step_percentiles(shift["start"])
+    lines += ["", f"{'step':<8}{'mean':>8}{'p95':>8}{'max':>8}{'count':>7}"]
+    for kind, mean, longest, count in shift["slowest"]:
+        lines.append(f"{kind:<8}{mean:>7.2f}s{p95.get(kind, 0):>7.2f}s{longest:>7.2f}s{count:>7}")
+    
+    if shift["regions"]:
+        lines += ["", "Defect rate per region: " + "  ".join(
+            f"{pid}: {_percent(rate)}" for pid, rate in shift["regions"].items())]
+    return "\n".join(lines)
+
+
+def simulate(analytics, start, trays=60, pieces=6, seed=0):
+    """
+    Fill an Analytics with a synthetic shift (for the CLI demo and benchmark).
+    
+    Region 4 is made defect-prone and place moves to the bad bin are slower,
+    so both show up in the report.
+    """
+    rng = np.random.default_rng(seed)
+    ts = start
+    for tray in range(trays):
+        ts += rng.exponential(40.0) + (1800.0 if tray == trays // 2 else 0.0)  # Reload; lunch break
+        statuses = {pid: "BAD" if rng.random() < (0.35 if pid == 4 else 0.08) else "GOOD"
+                    for pid in range(1, pieces + 1)}
+        analytics.start_tray(f"tray-{tray}", statuses, detect_seconds=rng.normal(0.12, 0.02), ts=ts)
+        ts += 1.0
+        for pid, status in sorted(statuses.items(), key=lambda item: item[1] != "BAD"):
+            for command, mean in (("pick_piece", 2.2), ("place_piece", 3.4 if status == "BAD" else 2.6),
+                                  ("move_home", 1.8)):
+                duration = max(0.2, rng.normal(mean, 0.3))
+                ok = rng.random() > 0.01
+                analytics.record_step(command, pid, duration, ok, ts=ts)
+                ts += duration + 0.5
+        analytics.end_tray(ts=ts)
+    return ts
+
+
+def main():
+    """Print the stored rollups, or simulate a shift."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Sort-cycle analytics")
+    parser.add_argument("--dir", default=DEFAULT_DIR, help="Analytics directory")
+    parser.add_argument("--day", help="Report as of the end of this day (YYYY-MM-DD)")
+    parser.add_argument("--simulate", action="store_true", help="Synthetic shift in a temp directory")
+    args = parser.parse_args()
+    
+    if args.simulate:
+        with tempfile.TemporaryDirectory() as directory:
+            analytics = Analytics(directory, ideal_cycle=6.0)
+            start = shift_start(time.time() - 8 * 3600, analytics.shift_hours)
+            t0 = time.perf_counter()
+            end = simulate(analytics, start)
+            elapsed = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            analytics.save()  # Whatever the saver thread has not written yet
+            saved = time.perf_counter() - t0
+            print(format_report(analytics, end))
+            print(f"\n{analytics.count} rows recorded in {elapsed:.2f} s "
+                  f"({elapsed / analytics.count * 1e6:.0f} µs/row), last save {saved * 1000:.0f} ms")
+            reloaded = Analytics(directory, ideal_cycle=6.0)
+            t0 = time.perf_counter()
+            rows = reloaded.load(now=end)
+            size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+            print(f"Reloaded {rows} rows in {(time.perf_counter() - t0) * 1000:.0f} ms "
+                  f"from {size / 1024:.1f} KiB on disk")
+        return
+    
+    now = time.time()
+    if args.day:
+        now = time.mktime(time.strptime(args.day, "%Y-%m-%d")) + 86399
+    analytics = Analytics(args.dir)
+    if not analytics.load(now=now):
+        print(f"No analytics in {args.dir}/")
+        return
+    print(format_report(analytics, now))
+
+
+if __name__ == "__main__":
+    main()
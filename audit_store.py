@@ -0,0 +1,562 @@
+"""
+Audit Store - Append-only record of every tray capture and robot command
+
+Every "Capture & Detect" is stored with:
+- the raw snapshot frame (JPEG)
+- the per-region status and confidence
+- the model version that produced them
+- the robot commands sent for that tray and their responses
+
+Records go into a local SQLite database (WAL mode) written by a background
+thread, so the camera and Tk threads never wait on disk. Indexes on time,
+tray and piece keep a shift's history queryable in milliseconds. Any stored
+capture can be replayed through the current model for comparison.
+
+Command line:
+    python3 audit_store.py list --since 8h
+    python3 audit_store.py list --tray T20260119-0042
+    python3 audit_store.py list --piece 3 --status BAD
+    python3 audit_store.py show <capture_id> --out snapshot.jpg
+    python3 audit_store.py replay <capture_id> --model yolo.pt
+"""
+
+import os
+import json
+import time
+import uuid
+import queue
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+import cv2
+
+
+DEFAULT_DB_PATH = os.path.join("audit", "sort_audit.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    capture_id    TEXT PRIMARY KEY,
+    ts            REAL NOT NULL,
+    tray_id       TEXT NOT NULL,
+    model_version TEXT,
+    conf_thresh   REAL,
+    width         INTEGER,
+    height        INTEGER,
+    frame_jpeg    BLOB
+);
+CREATE TABLE IF NOT EXISTS regions (
+    capture_id     TEXT NOT NULL,
+    ts             REAL NOT NULL,
+    piece_id       INTEGER NOT NULL,
+    robot_piece_id INTEGER,
+    status         TEXT NOT NULL,
+    confidence     REAL,
+    x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER
+);
+CREATE TABLE IF NOT EXISTS commands (
+    capture_id TEXT,
+    ts         REAL NOT NULL,
+    piece_id   INTEGER,
+    command    TEXT NOT NULL,
+    payload    TEXT,
+    response   TEXT,
+    success    INTEGER,
+    duration   REAL
+);
+CREATE INDEX IF NOT EXISTS idx_captures_ts ON captures(ts);
+CREATE INDEX IF NOT EXISTS idx_captures_tray ON captures(tray_id);
+CREATE INDEX IF NOT EXISTS idx_regions_capture ON regions(capture_id);
+CREATE INDEX IF NOT EXISTS idx_regions_piece_ts ON regions(piece_id, ts);
+CREATE INDEX IF NOT EXISTS idx_commands_capture ON commands(capture_id);
+CREATE INDEX IF NOT EXISTS idx_commands_piece_ts ON commands(piece_id, ts);
+"""
+
+
+def model_version(model_path):
+    """
+    Identify a model file by name and content hash.
+    
+    Args:
+        model_path (str): Path to the model weights.
+    
+    Returns:
+        str: e.g. "yolo.pt@3f2a9c81d0e4", or "unknown" if unreadable.
+    """
+    try:
+        digest = hashlib.sha1()
+        with open(model_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return f"{os.path.basename(model_path)}@{digest.hexdigest()[:12]}"
+    except OSError:
+        return "unknown"
+
+
+def parse_since(value):
+    """
+    Parse a relative ("30m", "8h", "2d") or absolute (epoch seconds) time.
+    
+    Args:
+        value (str): Time specification.
+    
+    Returns:
+        float: Epoch seconds.
+    """
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if value and value[-1] in units:
+        return time.time() - float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+class AuditStore:
+    """
+    Append-only capture/command store with a background writer thread.
+    """
+    
+    def __init__(self, path=DEFAULT_DB_PATH, jpeg_quality=90, on_thread_start=None):
+        """
+        Initialize the store (the writer thread starts on first use).
+        
+        Args:
+            path (str): SQLite database file.
+            jpeg_quality (int): JPEG quality for snapshot frames.
+            on_thread_start (callable): Called first on the writer thread
+                (e.g. to pin it to the background cores).
+        """
+        self.path = path
+        self.jpeg_quality = jpeg_quality
+        self.on_thread_start = on_thread_start
+        self._queue = queue.Queue()
+        self._thread = None
+        self._tray_counter = 0
+        self._tray_day = None
+        self._lock = threading.Lock()
+    
+    def _connect(self):
+        """Open a connection (SQLite connections are per-thread)."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        return conn
+    
+    def start(self):
+        """Start the background writer thread if it is not running."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._writer_loop,
+                                                name="audit-writer", daemon=True)
+                self._thread.start()
+    
+    def close(self, timeout=5.0):
+        """Flush pending records and stop the writer thread."""
+        if self._thread and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+    
+    def flush(self, timeout=5.0):
+        """Block until every queued record has been written."""
+        done = threading.Event()
+        self.start()
+        self._queue.put(done)
+        return done.wait(timeout)
+    
+    def _writer_loop(self):
+        """Drain the queue and write records in batched transactions."""
+        if self.on_thread_start:
+            self.on_thread_start()
+        conn = self._connect()
+        try:
+            while True:
+                item = self._queue.get()
+                batch = [item]
+                # Group everything already queued into one transaction
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                
+                stop = False
+                events = []
+                with conn:
+                    for record in batch:
+                        if record is None:
+                            stop = True
+                        elif isinstance(record, threading.Event):
+                            events.append(record)
+                        else:
+                            try:
+                                self._write(conn, record)
+                            except Exception as e:
+                                print(f"Audit store write failed: {e}")
+                for event in events:
+                    event.set()
+                if stop:
+                    break
+        finally:
+            conn.close()
+    
+    def _write(self, conn, record):
+        """Write one queued record."""
+        kind = record["kind"]
+        if kind == "capture":
+            frame = record.pop("frame")
+            jpeg, width, height = None, None, None
+            if frame is not None:
+                ok, encoded = cv2.imencode(".jpg", frame,
+                                           [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+                if ok:
+                    jpeg = encoded.tobytes()
+                height, width = frame.shape[:2]
+            conn.execute(
+                "INSERT INTO captures VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (record["capture_id"], record["ts"], record["tray_id"],
+                 record["model_version"], record["conf_thresh"], width, height, jpeg))
+            conn.executemany(
+                "INSERT INTO regions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(record["capture_id"], record["ts"], piece_id, robot_id, status, confidence, *box)
+                 for piece_id, robot_id, status, confidence, box in record["regions"]])
+        elif kind == "command":
+            conn.execute(
+                "INSERT INTO commands VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (record["capture_id"], record["ts"], record["piece_id"], record["command"],
+                 record["payload"], record["response"], record["success"], record["duration"]))
+    
+    def next_tray_id(self):
+        """Return a new tray ID, sequential per day (e.g. T20260119-0042)."""
+        day = time.strftime("%Y%m%d")
+        with self._lock:
+            if day != self._tray_day:
+                self._tray_day = day
+                self._tray_counter = self._last_tray_number(day)
+            self._tray_counter += 1
+            return f"T{day}-{self._tray_counter:04d}"
+    
+    def _last_tray_number(self, day):
+        """Find the highest tray number already stored for a day."""
+        if not os.path.exists(self.path):
+            return 0
+        try:
+            conn = sqlite3.connect(self.path, timeout=10)
+            try:
+                row = conn.execute("SELECT MAX(tray_id) FROM captures WHERE tray_id LIKE ?",
+                                   (f"T{day}-%",)).fetchone()
+            finally:
+                conn.close()
+            return int(row[0].rsplit("-", 1)[1]) if row and row[0] else 0
+        except (sqlite3.Error, ValueError):
+            return 0
+    
+    def record_capture(self, frame, pieces, regions, model_version=None, conf_thresh=None,
+                       robot_id_map=None, tray_id=None):
+        """
+        Queue a capture for writing.
+        
+        Args:
+            frame (ndarray): Raw BGR snapshot (copied; may be None).
+            pieces (dict): {piece_id: {"status": ..., "confidence": ...}}
+            regions (dict): {piece_id: (x1, y1, x2, y2)} used for the decision.
+            model_version (str): Model identifier (see model_version()).
+            conf_thresh (float): Detection threshold in use.
+            robot_id_map (dict): Visual ID → robot ID mapping.
+            tray_id (str): Tray identifier (generated if None).
+        
+        Returns:
+            tuple: (capture_id, tray_id)
+        """
+        capture_id = uuid.uuid4().hex[:16]
+        tray_id = tray_id or self.next_tray_id()
+        robot_id_map = robot_id_map or {}
+        rows = [(int(pid), robot_id_map.get(pid, pid), data["status"],
+                 data.get("confidence"), tuple(regions[pid]) if pid in regions else (None,) * 4)
+                for pid, data in sorted(pieces.items())]
+        
+        self.start()
+        self._queue.put({
+            "kind": "capture",
+            "capture_id": capture_id,
+            "ts": time.time(),
+            "tray_id": tray_id,
+            "model_version": model_version,
+            "conf_thresh": conf_thresh,
+            "frame": None if frame is None else frame.copy(),
+            "regions": rows,
+        })
+        return capture_id, tray_id
+    
+    def record_command(self, capture_id, piece_id, command, payload, response,
+                       duration, ts=None):
+        """
+        Queue a robot command and its response for writing.
+        
+        Args:
+            capture_id (str): Capture the command belongs to (may be None).
+            piece_id (int): Visual piece ID (None for e.g. move_home).
+            command (str): Command name.
+            payload (dict): Command arguments.
+            response (dict): Server response (None on error).
+            duration (float): Round-trip time in seconds.
+            ts (float): Send time (defaults to now - duration).
+        """
+        self.start()
+        self._queue.put({
+            "kind": "command",
+            "capture_id": capture_id,
+            "ts": ts if ts is not None else time.time() - duration,
+            "piece_id": piece_id,
+            "command": command,
+            "payload": json.dumps(payload),
+            "response": json.dumps(response),
+            "success": int(bool(response) and response.get("status") == "success"),
+            "duration": duration,
+        })
+    
+    # ----- Queries -----
+    
+    def _read(self, sql, params=()):
+        """Run a read query on a fresh connection and return dict rows."""
+        if not os.path.exists(self.path):
+            return []
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+    
+    def query_captures(self, since=None, until=None, tray_id=None, limit=1000):
+        """
+        List captures (without frames), newest first.
+        
+        Args:
+            since (float): Epoch seconds lower bound.
+            until (float): Epoch seconds upper bound.
+            tray_id (str): Only this tray.
+            limit (int): Maximum rows.
+        
+        Returns:
+            list: Capture rows.
+        """
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ts <= ?")
+            params.append(until)
+        if tray_id:
+            clauses.append("tray_id = ?")
+            params.append(tray_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._read(
+            "SELECT capture_id, ts, tray_id, model_version, conf_thresh, width, height "
+            f"FROM captures {where} ORDER BY ts DESC LIMIT ?", (*params, limit))
+    
+    def query_regions(self, piece_id=None, since=None, until=None, status=None,
+                      capture_id=None, limit=1000):
+        """
+        List per-region decisions, newest first.
+        
+        Args:
+            piece_id (int): Only this visual piece ID.
+            since (float): Epoch seconds lower bound.
+            until (float): Epoch seconds upper bound.
+            status (str): Only "GOOD" or "BAD".
+            capture_id (str): Only this capture.
+            limit (int): Maximum rows.
+        
+        Returns:
+            list: Region rows joined with their tray ID.
+        """
+        clauses, params = [], []
+        for column, value in (("r.piece_id = ?", piece_id), ("r.status = ?", status),
+                              ("r.capture_id = ?", capture_id)):
+            if value is not None:
+                clauses.append(column)
+                params.append(value)
+        if since is not None:
+            clauses.append("r.ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("r.ts <= ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._read(
+            "SELECT r.*, c.tray_id FROM regions r JOIN captures c USING (capture_id) "
+            f"{where} ORDER BY r.ts DESC LIMIT ?", (*params, limit))
+    
+    def query_commands(self, capture_id=None, piece_id=None, limit=1000):
+        """
+        List robot commands in send order.
+        
+        Args:
+            capture_id (str): Only commands for this capture.
+            piece_id (int): Only commands for this visual piece ID.
+            limit (int): Maximum rows.
+        
+        Returns:
+            list: Command rows.
+        """
+        clauses, params = [], []
+        if capture_id is not None:
+            clauses.append("capture_id = ?")
+            params.append(capture_id)
+        if piece_id is not None:
+            clauses.append("piece_id = ?")
+            params.append(piece_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._read(f"SELECT * FROM commands {where} ORDER BY ts LIMIT ?",
+                          (*params, limit))
+    
+    def load_frame(self, capture_id):
+        """
+        Decode the stored snapshot of a capture.
+        
+        Args:
+            capture_id (str): Capture to load.
+        
+        Returns:
+            ndarray: BGR frame, or None if missing.
+        """
+        rows = self._read("SELECT frame_jpeg FROM captures WHERE capture_id = ?", (capture_id,))
+        if not rows or rows[0]["frame_jpeg"] is None:
+            return None
+        return cv2.imdecode(np.frombuffer(rows[0]["frame_jpeg"], dtype=np.uint8), cv2.IMREAD_COLOR)
+    
+    def replay(self, capture_id, detect):
+        """
+        Run a stored capture through a detector and compare decisions.
+        
+        Args:
+            capture_id (str): Capture to replay.
+            detect (callable): detect(frame, regions) → {piece_id: {"status",
+                "confidence"}}, called with the region geometry recorded
+                with the capture.
+        
+        Returns:
+            dict: {"capture_id", "recorded", "replayed", "changed"} or None
+            if the capture has no frame.
+        """
+        frame = self.load_frame(capture_id)
+        if frame is None:
+            return None
+        
+        rows = self.query_regions(capture_id=capture_id)
+        recorded = {row["piece_id"]: {"status": row["status"], "confidence": row["confidence"]}
+                    for row in rows}
+        regions = {row["piece_id"]: (row["x1"], row["y1"], row["x2"], row["y2"])
+                   for row in rows if row["x1"] is not None}
+        replayed = {pid: {"status": data["status"], "confidence": data.get("confidence")}
+                    for pid, data in detect(frame, regions).items()}
+        changed = sorted(pid for pid in set(recorded) | set(replayed)
+                         if recorded.get(pid, {}).get("status") != replayed.get(pid, {}).get("status"))
+        return {"capture_id": capture_id, "recorded": recorded,
+                "replayed": replayed, "changed": changed}
+
+
+def main():
+    """Command line interface for querying and replaying the audit store."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Query and replay sorting audit records")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Audit database path")
+    sub = parser.add_subparsers(dest="action", required=True)
+    
+    list_parser = sub.add_parser("list", help="List captures or piece decisions")
+    list_parser.add_argument("--since", help="e.g. 30m, 8h, 2d or epoch seconds")
+    list_parser.add_argument("--until", help="Epoch seconds")
+    list_parser.add_argument("--tray", help="Tray ID")
+    list_parser.add_argument("--piece", type=int, help="Visual piece ID")
+    list_parser.add_argument("--status", choices=["GOOD", "BAD"])
+    list_parser.add_argument("--limit", type=int, default=50)
+    
+    show_parser = sub.add_parser("show", help="Show one capture and its commands")
+    show_parser.add_argument("capture_id")
+    show_parser.add_argument("--out", help="Write the snapshot JPEG here")
+    
+    replay_parser = sub.add_parser("replay", help="Replay a capture through a model")
+    replay_parser.add_argument("capture_id")
+    replay_parser.add_argument("--model", default="yolo.pt")
+    replay_parser.add_argument("--conf", type=float, help="Confidence threshold "
+                               "(default: the one recorded with the capture)")
+    
+    args = parser.parse_args()
+    store = AuditStore(args.db)
+    
+    if args.action == "list":
+        since = parse_since(args.since) if args.since else None
+        until = float(args.until) if args.until else None
+        start = time.perf_counter()
+        if args.piece is not None or args.status:
+            rows = store.query_regions(args.piece, since, until, args.status, limit=args.limit)
+            elapsed = (time.perf_counter() - start) * 1000
+            for row in rows:
+                print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row['ts']))}  "
+                      f"{row['tray_id']}  {row['capture_id']}  piece {row['piece_id']} "
+                      f"(robot {row['robot_piece_id']})  {row['status']}  "
+                      f"conf={row['confidence'] or 0:.2f}")
+        else:
+            rows = store.query_captures(since, until, args.tray, args.limit)
+            elapsed = (time.perf_counter() - start) * 1000
+            for row in rows:
+                print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row['ts']))}  "
+                      f"{row['tray_id']}  {row['capture_id']}  {row['model_version']}")
+        print(f"{len(rows)} rows in {elapsed:.1f} ms")
+    
+    elif args.action == "show":
+        captures = store._read("SELECT capture_id, ts, tray_id, model_version, conf_thresh "
+                               "FROM captures WHERE capture_id = ?", (args.capture_id,))
+        if not captures:
+            print("Capture not found")
+            return
+        print(json.dumps(captures[0], indent=2))
+        for row in store.query_regions(capture_id=args.capture_id):
+            print(f"  piece {row['piece_id']} (robot {row['robot_piece_id']}): "
+                  f"{row['status']} conf={row['confidence'] or 0:.2f}")
+        for row in store.query_commands(capture_id=args.capture_id):
+            print(f"  {row['command']} piece={row['piece_id']} payload={row['payload']} "
+                  f"→ {row['response']} ({row['duration'] * 1000:.0f} ms)")
+        if args.out:
+            frame = store.load_frame(args.capture_id)
+            if frame is not None:
+                cv2.imwrite(args.out, frame)
+                print(f"Snapshot written to {args.out}")
+    
+    elif args.action == "replay":
+        from ultralytics import YOLO
+        from preprocess import FramePreprocessor
+        from detection import detect_regions
+        
+        captures = store._read("SELECT conf_thresh FROM captures WHERE capture_id = ?",
+                               (args.capture_id,))
+        if not captures:
+            print("Capture not found")
+            return
+        conf = args.conf if args.conf is not None else (captures[0]["conf_thresh"] or 0.3)
+        model = YOLO(args.model)
+        preprocessor = FramePreprocessor()
+        
+        def detect(frame, regions):
+            pieces, _ = detect_regions(model, preprocessor, frame, regions, conf)
+            return pieces
+        
+        result = store.replay(args.capture_id, detect)
+        if result is None:
+            print("Capture has no stored frame")
+            return
+        print(f"Replay of {args.capture_id} with {model_version(args.model)}:")
+        for pid in sorted(result["replayed"]):
+            old = result["recorded"].get(pid, {})
+            new = result["replayed"][pid]
+            marker = "  CHANGED" if pid in result["changed"] else ""
+            print(f"  piece {pid}: recorded {old.get('status')} ({old.get('confidence') or 0:.2f}) "
+                  f"→ now {new['status']} ({new['confidence'] or 0:.2f}){marker}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,494 @@
+"""
+Auto-Tune - Per-host self-benchmark of inference and capture settings
+
+The same code runs on Pi 3, Pi 4 and x86 bench PCs, and conf_thresh, the
+inference size, the thread count and the capture backend were tuned by hand
+on each. This tool measures them on the host itself:
+
+1. inference: every available backend (torch on yolo.pt, plus ONNX Runtime
+   and OpenVINO exports when those packages are installed) at every input
+   size, and for torch at every thread count the camera stage can use;
+   latency is measured on the sample clip with the camera thread pinned as
+   in the dashboard's resource profile
+2. accuracy: each backend/size runs once over the labelled samples at a
+   low confidence; the per-region GOOD/BAD accuracy is then computed for
+   every candidate conf_thresh from the same detections
+3. capture: the clip's JPEG frames are decoded the way each capture backend
+   would (OpenCV full decode + resize, or scaled-IDCT MJPEG decode); with
+   --camera, each backend and resolution is also opened live and its
+   delivered frame rate measured
+
+The fastest configuration (lowest p50 latency) whose accuracy meets the floor
+is written to host_profiles/<hostname>.json, which start_camera loads
+automatically. If nothing meets the floor the most accurate one is used.
+
+Samples (samples/ by default):
+    tray.mjpeg      recorded clip (python3 capture_backends.py --record samples/tray.mjpeg)
+    labels.json     {"regions": {"1": [x1, y1, x2, y2], ...},
+                     "frames": {"<clip frame index>": {"1": "GOOD", "2": "BAD", ...}}}
+Without labels.json, the snapshot frames and decisions of the audit store
+captures are used as samples (and as the clip if there is none). Those
+decisions came from a model, not an operator, so accuracy then only measures
+agreement with them: the profile is marked not accuracy-validated and never
+meets the floor.
+
+Command line:
+    python3 autotune.py                       # tune and write host_profiles/<hostname>.json
+    python3 autotune.py --floor 0.98 --camera 0
+    python3 autotune.py --show                # print this host's profile
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import platform
+import importlib.util
+import numpy as np
+import cv2
+
+
+DEFAULT_PROFILE_DIR = "host_profiles"
+DEFAULT_SAMPLE_DIR = "samples"
+SIZES = (320, 416, 512, 640)
+CONF_GRID = (0.15, 0.2, 0.25, 0.3, 0.35, 0.4, 0.5)
+RESOLUTIONS = ((640, 480), (1280, 720), (1920, 1080))
+
+# Inference backend → Python package it needs (besides ultralytics)
+INFERENCE_BACKENDS = {"torch": "torch", "onnx": "onnxruntime", "openvino": "openvino"}
+
+
+def board_model():
+    """Board name from the device tree (e.g. "Raspberry Pi 4 Model B Rev 1.4"), or None."""
+    try:
+        with open("/proc/device-tree/model") as f:
+            return f.read().strip("\x00\n ")
+    except OSError:
+        return None
+
+
+def host_info():
+    """
+    Describe this host.
+    
+    Returns:
+        dict: {"hostname", "system", "machine", "board", "cores", "opencv"}
+    """
+    from resources import available_cores
+    return {"hostname": socket.gethostname(), "system": platform.system(),
+            "machine": platform.machine(), "board": board_model(),
+            "cores": len(available_cores()), "opencv": cv2.__version__}
+
+
+def profile_path(directory=DEFAULT_PROFILE_DIR, hostname=None):
+    """Path of a host's profile (default: this host)."""
+    return os.path.join(directory, f"{hostname or socket.gethostname()}.json")
+
+
+def load_profile(path=None):
+    """
+    Load a host profile.
+    
+    Args:
+        path (str): Profile file (default: this host's).
+    
+    Returns:
+        dict: The profile, or None if missing or unreadable.
+    """
+    try:
+        with open(path or profile_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_profile(profile, path=None):
+    """Write a host profile (creates host_profiles/)."""
+    path = path or profile_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(profile, f, indent=2)
+    return path
+
+
+def available_backends():
+    """Inference backends whose packages are installed."""
+    if importlib.util.find_spec("ultralytics") is None:
+        return []
+    return [name for name, package in INFERENCE_BACKENDS.items()
+            if importlib.util.find_spec(package) is not None]
+
+
+def export_model(model_path, backend, log=print):
+    """
+    Model file for a backend, exporting it from the .pt weights if needed.
+    
+    Exports are dynamic-shape so the scheduler can still change the input
+    size, and are reused while they are newer than the weights.
+    
+    Returns:
+        str: Path ultralytics can load (file or OpenVINO directory).
+    """
+    if backend == "torch":
+        return model_path
+    stem = os.path.splitext(model_path)[0]
+    path = f"{stem}.onnx" if backend == "onnx" else f"{stem}_openvino_model"
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(model_path):
+        return path
+    from model_manager import load_yolo
+    log(f"Exporting {model_path} for {backend}...")
+    return str(load_yolo(model_path).export(format=backend, dynamic=True))
+
+
+def thread_options(cores):
+    """Torch thread counts to try for a camera stage with `cores` cores."""
+    return sorted({1, 2, max(1, cores // 2), cores} & set(range(1, cores + 1)))
+
+
+def load_samples(sample_dir=DEFAULT_SAMPLE_DIR, db_path=None, limit=200):
+    """
+    Load the clip and the labelled samples.
+    
+    Args:
+        sample_dir (str): Directory with tray.mjpeg and labels.json.
+        db_path (str): Audit database for the fallback labels (None = default).
+        limit (int): Maximum audit captures.
+    
+    Returns:
+        tuple: (clip JPEG byte strings, clip BGR frames,
+        labelled [(frame, regions, {piece_id: status})], description,
+        validated: True for operator labels, False for recorded decisions)
+    """
+    jpegs = []
+    clip_path = os.path.join(sample_dir, "tray.mjpeg")
+    if os.path.exists(clip_path):
+        from capture_backends import MJPEGFileSource
+        jpegs = MJPEGFileSource(clip_path).frames
+    clip = [cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR) for data in jpegs]
+    
+    labelled = []
+    labels_path = os.path.join(sample_dir, "labels.json")
+    if clip and os.path.exists(labels_path):
+        with open(labels_path) as f:
+            data = json.load(f)
+        regions = {int(pid): tuple(box) for pid, box in data["regions"].items()}
+        for index, labels in data["frames"].items():
+            if int(index) < len(clip):
+                labelled.append((clip[int(index)], regions,
+                                 {int(pid): status for pid, status in labels.items()}))
+        source = f"{clip_path} ({len(labelled)} labelled frames)"
+        validated = True
+    else:
+        from audit_store import AuditStore, DEFAULT_DB_PATH
+        from region_classifier import load_dataset
+        frames = load_dataset(AuditStore(db_path or DEFAULT_DB_PATH), limit=limit)[3]
+        labelled = [(frame, regions, recorded) for _, frame, regions, recorded in frames]
+        source = f"{len(labelled)} audit captures"
+        validated = False
+    
+    if not clip:
+        clip = [frame for frame, _, _ in labelled]
+        jpegs = [cv2.imencode(".jpg", frame)[1].tobytes() for frame in clip]
+    return jpegs, clip, labelled, source, validated
+
+
+def accuracy_by_conf(detections, labelled, conf_grid=CONF_GRID):
+    """
+    Region accuracy for every candidate confidence threshold.
+    
+    Args:
+        detections (list): (xyxy, classes, confidences) per labelled sample,
+            detected at the lowest threshold of the grid.
+        labelled (list): [(frame, regions, labels)] as from load_samples.
+        conf_grid (tuple): Thresholds to evaluate.
+    
+    Returns:
+        dict: {conf_thresh: fraction of regions matching the labels}
+    """
+    from detection import region_statuses
+    result = {}
+    for conf in conf_grid:
+        correct = total = 0
+        for (xyxy, classes, confidences), (_, regions, labels) in zip(detections, labelled):
+            keep = confidences >= conf
+            pieces = region_statuses(xyxy[keep], classes[keep], confidences[keep], regions)
+            correct += sum(pieces[pid]["status"] == status for pid, status in labels.items() if pid in pieces)
+            total += len(labels)
+        result[conf] = correct / total if total else 0.0
+    return result
+
+
+def benchmark_inference(model_path, clip, labelled, backends=None, sizes=SIZES, threads=None,
+                        frames=30, contrast=1.5, brightness=-30, conf_grid=CONF_GRID, log=print):
+    """
+    Latency and accuracy of every backend / input size / thread count.
+    
+    Args:
+        model_path (str): yolo.pt weights.
+        clip (list): BGR frames for the latency runs.
+        labelled (list): Labelled samples for accuracy.
+        backends (list): Backends to try (default: available_backends()).
+        sizes (tuple): Input sizes.
+        threads (list): Torch thread counts (default: one entry, the current setting).
+        frames (int): Timed frames per configuration.
+        contrast (float): Preprocessing contrast (as in the dashboard).
+        brightness (float): Preprocessing brightness.
+        conf_grid (tuple): conf_thresh candidates.
+        log (callable): log(message) for progress.
+    
+    Returns:
+        list: Rows {"backend", "model_path", "imgsz", "threads", "p50_ms", "p95_ms",
+        "conf_thresh", "accuracy"}.
+    """
+    from model_manager import load_yolo
+    from preprocess import FramePreprocessor
+    from detection import detect
+    
+    rows = []
+    low_conf = min(conf_grid)
+    for backend in backends or available_backends():
+        try:
+            path = export_model(model_path, backend, log)
+            model = load_yolo(path)
+        except Exception as e:
+            log(f"{backend}: skipped ({e})")
+            continue
+        torch = sys.modules.get("torch")
+        counts = (threads or [None]) if backend == "torch" and torch is not None else [None]
+        for imgsz in sizes:
+            preprocessor = FramePreprocessor(contrast, brightness, imgsz)
+            detections = [detect(model, preprocessor, frame, low_conf)[:3] for frame, _, _ in labelled]
+            accuracy = accuracy_by_conf(detections, labelled, conf_grid)
+            # Best accuracy; ties go to the threshold nearest the dashboard default 0.3
+            conf = max(accuracy, key=lambda c: (accuracy[c], -abs(c - 0.3)))
+            for count in counts:
+                if count:
+                    torch.set_num_threads(count)
+                for frame in clip[:3]:
+                    detect(model, preprocessor, frame, conf)  # Warm-up
+                times = []
+                for i in range(frames):
+                    start = time.perf_counter()
+                    detect(model, preprocessor, clip[i % len(clip)], conf)
+                    times.append(time.perf_counter() - start)
+                row = {"backend": backend, "model_path": path, "imgsz": imgsz, "threads": count,
+                       "p50_ms": float(np.percentile(times, 50) * 1000),
+                       "p95_ms": float(np.percentile(times, 95) * 1000),
+                       "conf_thresh": conf, "accuracy": accuracy[conf]}
+                rows.append(row)
+                log(f"{backend:<9}{imgsz:>5}px {count or 'auto':>4} threads  "
+                    f"p50 {row['p50_ms']:7.1f} ms  p95 {row['p95_ms']:7.1f} ms  "
+                    f"accuracy {row['accuracy'] * 100:5.1f}% @ conf {conf:.2f}")
+    return rows
+
+
+def benchmark_capture(jpegs, output_size, camera=None, resolutions=RESOLUTIONS, seconds=3.0, log=print):
+    """
+    Decode cost per capture backend on the clip, and live frame rates with a camera.
+    
+    Args:
+        jpegs (list): JPEG byte strings of the clip.
+        output_size (tuple): Frame size the piece regions are defined at.
+        camera (int): Camera index for live measurements (None = clip only).
+        resolutions (tuple): Camera resolutions to try live.
+        seconds (float): Duration of each live measurement.
+        log (callable): log(message) for progress.
+    
+    Returns:
+        list: Rows {"backend", "resolution", "decode_ms" or "fps"}.
+    """
+    from capture_backends import JPEGDecoder, open_capture, gstreamer_available
+    
+    rows = []
+    
+    def decode_ms(decode):
+        start = time.perf_counter()
+        for data in jpegs:
+            decode(data)
+        return (time.perf_counter() - start) / len(jpegs) * 1000
+    
+    def full_decode(data):
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        return cv2.resize(frame, output_size, interpolation=cv2.INTER_AREA)
+    
+    decoder = JPEGDecoder()
+    rows.append({"backend": "opencv", "resolution": None, "decode_ms": decode_ms(full_decode)})
+    rows.append({"backend": "mjpeg", "resolution": None,
+                 "decode_ms": decode_ms(lambda data: decoder.decode(data, output_size))})
+    for row in rows:
+        log(f"capture  {row['backend']:<10} clip decode {row['decode_ms']:6.2f} ms/frame")
+    
+    if camera is None or platform.system() != "Linux":
+        return rows
+    kinds = ["opencv", "mjpeg"] + (["gstreamer"] if gstreamer_available() else [])
+    for kind in kinds:
+        for resolution in resolutions:
+            capture, used = open_capture(camera, cv2.CAP_V4L2, kind, output_size, log=lambda message: None)
+            if used != kind or not capture.isOpened():
+                capture.release()
+                continue
+            capture.set(cv2.CAP_PROP_FRAME_WIDTH, resolution[0])
+            capture.set(cv2.CAP_PROP_FRAME_HEIGHT, resolution[1])
+            actual = (int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            count, stop = 0, time.perf_counter() + seconds
+            while time.perf_counter() < stop:
+                ok, _ = capture.read()
+                count += bool(ok)
+            capture.release()
+            if actual != tuple(resolution):
+                continue  # Camera does not offer this resolution
+            rows.append({"backend": kind, "resolution": list(resolution), "fps": count / seconds})
+            log(f"capture  {kind:<10} {resolution[0]}x{resolution[1]} live {count / seconds:5.1f} frames/s")
+    return rows
+
+
+def choose(rows, floor):
+    """
+    Pick the fastest configuration meeting the accuracy floor.
+    
+    Returns:
+        tuple: (row, met_floor); the most accurate row if none meets it.
+    """
+    passing = [row for row in rows if row["accuracy"] >= floor]
+    if passing:
+        return min(passing, key=lambda row: (row["p50_ms"], row["p95_ms"])), True
+    return max(rows, key=lambda row: (row["accuracy"], -row["p50_ms"])), False
+
+
+def choose_capture(rows, min_fps=15.0):
+    """
+    Pick the capture backend and the largest resolution it sustains.
+    
+    Returns:
+        tuple: (backend, hires_size or None)
+    """
+    live = [row for row in rows if "fps" in row]
+    if live:
+        best = max(live, key=lambda row: (row["fps"], row["backend"] == "mjpeg"))
+        sustained = [row["resolution"] for row in live
+                     if row["backend"] == best["backend"] and row["fps"] >= min_fps]
+        return best["backend"], max(sustained, key=lambda size: size[0] * size[1]) if sustained else None
+    return min(rows, key=lambda row: row["decode_ms"])["backend"], None
+
+
+def autotune(model_path="yolo.pt", sample_dir=DEFAULT_SAMPLE_DIR, floor=0.95, camera=None,
+             frames=30, resource_profile="latency", db_path=None, log=print):
+    """
+    Benchmark this host and build its profile.
+    
+    Args:
+        model_path (str): yolo.pt weights.
+        sample_dir (str): Clip and labels directory.
+        floor (float): Minimum region accuracy (0-1) on the labelled samples.
+        camera (int): Camera index for live capture measurements.
+        frames (int): Timed frames per inference configuration.
+        resource_profile (str): Resource profile the dashboard runs with
+            (the camera stage's cores bound the thread counts).
+        db_path (str): Audit database for fallback labels.
+        log (callable): log(message) for progress.
+    
+    Returns:
+        dict: The profile (not saved), or None without samples or backends.
+    """
+    from resources import ResourceManager
+    from audit_store import model_version
+    
+    jpegs, clip, labelled, source, validated = load_samples(sample_dir, db_path)
+    if not clip or not labelled:
+        log(f"No labelled samples: add {sample_dir}/tray.mjpeg + labels.json or audit captures")
+        return None
+    backends = available_backends()
+    if not backends:
+        log("No inference backend available (ultralytics and torch are required)")
+        return None
+    
+    manager = ResourceManager(resource_profile, on_event=lambda level, message: log(f"{level}: {message}"))
+    manager.apply_process()
+    manager.pin("camera")
+    cores = manager.stages["camera"] or manager.cores
+    height, width = clip[0].shape[:2]
+    log(f"Host {socket.gethostname()}: {len(cores)} camera core(s), backends {', '.join(backends)}; "
+        f"samples: {source}, clip {len(clip)} frames of {width}x{height}")
+    if not validated:
+        log(f"WARNING: no {sample_dir}/labels.json; the audit captures' own decisions are the "
+            f"reference, so accuracy is agreement with the current model and this profile is "
+            f"NOT accuracy-validated")
+    
+    rows = benchmark_inference(model_path, clip, labelled, backends, threads=thread_options(len(cores)),
+                               frames=frames, log=log)
+    if not rows:
+        return None
+    best, met = choose(rows, floor)
+    met = met and validated
+    capture_rows = benchmark_capture(jpegs, (width, height), camera, log=log)
+    capture_backend, hires_size = choose_capture(capture_rows)
+    return {
+        "host": host_info(),
+        "created": time.time(),
+        "model_version": model_version(model_path),
+        "resource_profile": resource_profile,
+        "accuracy_floor": floor,
+        "met_floor": met,
+        "validated": validated,
+        "samples": source,
+        "backend": best["backend"],
+        "model_path": best["model_path"],
+        "imgsz": best["imgsz"],
+        "threads": best["threads"],
+        "conf_thresh": best["conf_thresh"],
+        "capture_backend": capture_backend,
+        "hires_size": hires_size,
+        "accuracy": best["accuracy"],
+        "p50_ms": best["p50_ms"],
+        "p95_ms": best["p95_ms"],
+        "results": rows,
+        "capture_results": capture_rows,
+    }
+
+
+def describe(profile):
+    """Short summary of a profile for the activity log."""
+    threads = profile["threads"] or "auto"
+    accuracy = f"accuracy {profile['accuracy'] * 100:.1f}%"
+    if not profile.get("validated", True):
+        accuracy = f"agreement {profile['accuracy'] * 100:.1f}%, not accuracy-validated"
+    return (f"{profile['backend']} {profile['imgsz']}px, {threads} threads, conf {profile['conf_thresh']:.2f}, "
+            f"{profile['capture_backend']} capture (p50 {profile['p50_ms']:.0f} ms, {accuracy})")
+
+
+def main():
+    """Tune this host, or show its profile."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Per-host inference/capture auto-tuning")
+    parser.add_argument("--model", default="yolo.pt", help="YOLO weights")
+    parser.add_argument("--samples", default=DEFAULT_SAMPLE_DIR, help="Directory with tray.mjpeg + labels.json")
+    parser.add_argument("--floor", type=float, default=0.95, help="Minimum region accuracy (0-1)")
+    parser.add_argument("--camera", type=int, help="Also measure live capture on this camera")
+    parser.add_argument("--frames", type=int, default=30, help="Timed frames per configuration")
+    parser.add_argument("--resource-profile", default="latency", help="Resource profile of the dashboard")
+    parser.add_argument("--db", help="Audit database (fallback labels)")
+    parser.add_argument("--output", help="Profile path (default host_profiles/<hostname>.json)")
+    parser.add_argument("--show", action="store_true", help="Print this host's profile and exit")
+    args = parser.parse_args()
+    
+    if args.show:
+        profile = load_profile(args.output)
+        print(describe(profile) if profile else f"No profile at {args.output or profile_path()}")
+        return
+    
+    profile = autotune(args.model, args.samples, args.floor, args.camera, args.frames,
+                       args.resource_profile, args.db)
+    if profile is None:
+        return
+    if not profile["validated"]:
+        print(f"Not accuracy-validated: add {args.samples}/labels.json and rerun")
+    elif not profile["met_floor"]:
+        print(f"No configuration reached {args.floor * 100:.0f}% accuracy; using the most accurate one")
+    print(f"Chosen: {describe(profile)}")
+    print(f"Profile written to {save_profile(profile, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
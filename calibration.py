@@ -0,0 +1,183 @@
+"""
+Camera-to-Robot Calibration - Map image pixels to robot base coordinates
+
+The tray is a plane, so a 3x3 homography maps camera pixels to robot X/Y
+(mm). It is fitted from four or more pixel ↔ robot point pairs, e.g. by
+jogging the robot tip to marks visible in the camera image, and saved to
+calibration.json:
+
+    {
+      "pixel_points": [[u, v], ...],
+      "robot_points": [[x, y], ...],
+      "pick_z": 150.0,
+      "orientation": [0, 90, 0]
+    }
+
+Command line:
+    python3 calibration.py fit points.json      # fit and save calibration.json
+    python3 calibration.py map 320 240          # map a pixel to robot X/Y
+"""
+
+import json
+import numpy as np
+
+
+DEFAULT_CALIBRATION_PATH = "calibration.json"
+
+
+def fit_homography(pixel_points, robot_points):
+    """
+    Fit a homography with the direct linear transform (least squares).
+    
+    Args:
+        pixel_points (list): [[u, v], ...] at least 4 points.
+        robot_points (list): [[x, y], ...] matching robot coordinates.
+    
+    Returns:
+        ndarray: 3x3 homography (pixels → robot).
+    """
+    src = np.asarray(pixel_points, dtype=np.float64).reshape(-1, 2)
+    dst = np.asarray(robot_points, dtype=np.float64).reshape(-1, 2)
+    if len(src) < 4 or len(src) != len(dst):
+        raise ValueError("Need at least 4 matching point pairs")
+    
+    rows = []
+    for (u, v), (x, y) in zip(src, dst):
+        rows.append([-u, -v, -1, 0, 0, 0, u * x, v * x, x])
+        rows.append([0, 0, 0, -u, -v, -1, u * y, v * y, y])
+    _, _, vt = np.linalg.svd(np.asarray(rows))
+    h = vt[-1].reshape(3, 3)
+    return h / h[2, 2]
+
+
+class PixelToRobot:
+    """
+    Pixel → robot pose mapping for pose-based picks (pick_object).
+    """
+    
+    def __init__(self, homography=None, pick_z=150.0, orientation=(0, 90, 0)):
+        """
+        Initialize the mapping.
+        
+        Args:
+            homography (ndarray): 3x3 pixel → robot X/Y homography (identity
+                if None, i.e. uncalibrated).
+            pick_z (float): Robot Z for picks on the tray plane (mm).
+            orientation (tuple): [rx, ry, rz] tool orientation for picks.
+        """
+        self.homography = np.eye(3) if homography is None else np.asarray(homography, dtype=np.float64)
+        self.pick_z = pick_z
+        self.orientation = list(orientation)
+        self.calibrated = homography is not None
+    
+    @classmethod
+    def load(cls, path=DEFAULT_CALIBRATION_PATH):
+        """
+        Load a calibration file.
+        
+        Args:
+            path (str): JSON calibration file.
+        
+        Returns:
+            PixelToRobot: Calibrated mapping, or an uncalibrated one if the
+            file is missing or invalid.
+        """
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            homography = data.get("homography")
+            if homography is None:
+                homography = fit_homography(data["pixel_points"], data["robot_points"])
+            return cls(homography, data.get("pick_z", 150.0), data.get("orientation", (0, 90, 0)))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"No valid calibration ({e}); pixel coordinates will be used as-is")
+            return cls()
+    
+    def save(self, path=DEFAULT_CALIBRATION_PATH, pixel_points=None, robot_points=None):
+        """Write the calibration to a JSON file."""
+        data = {
+            "homography": self.homography.tolist(),
+            "pick_z": self.pick_z,
+            "orientation": self.orientation,
+        }
+        if pixel_points is not None:
+            data["pixel_points"] = [list(map(float, p)) for p in pixel_points]
+            data["robot_points"] = [list(map(float, p)) for p in robot_points]
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+    
+    def to_robot(self, points):
+        """
+        Map pixel points to robot X/Y.
+        
+        Args:
+            points (ndarray): (N, 2) or (2,) pixel coordinates.
+        
+        Returns:
+            ndarray: Robot X/Y with the same leading shape.
+        """
+        pts = np.asarray(points, dtype=np.float64)
+        flat = pts.reshape(-1, 2)
+        homogeneous = np.column_stack((flat, np.ones(len(flat)))) @ self.homography.T
+        mapped = homogeneous[:, :2] / homogeneous[:, 2:3]
+        return mapped.reshape(pts.shape)
+    
+    def velocity_to_robot(self, point, velocity):
+        """
+        Map a pixel velocity at a point to a robot X/Y velocity.
+        
+        Args:
+            point (tuple): Pixel position.
+            velocity (tuple): Pixel velocity (pixels/s).
+        
+        Returns:
+            ndarray: Robot velocity (mm/s).
+        """
+        p = np.asarray(point, dtype=np.float64)
+        v = np.asarray(velocity, dtype=np.float64)
+        return self.to_robot(p + v) - self.to_robot(p)
+    
+    def pick_pose(self, pixel):
+        """
+        Robot pick position and orientation for a pixel location.
+        
+        Args:
+            pixel (tuple): (u, v) pixel coordinates.
+        
+        Returns:
+            tuple: ([x, y, z], [rx, ry, rz])
+        """
+        x, y = self.to_robot(pixel)
+        return [round(float(x), 2), round(float(y), 2), self.pick_z], list(self.orientation)
+
+
+def main():
+    """Fit a calibration from point pairs or map a pixel."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Camera to robot calibration")
+    parser.add_argument("--file", default=DEFAULT_CALIBRATION_PATH)
+    sub = parser.add_subparsers(dest="action", required=True)
+    fit_parser = sub.add_parser("fit", help="Fit from a JSON file with pixel_points/robot_points")
+    fit_parser.add_argument("points")
+    map_parser = sub.add_parser("map", help="Map a pixel to robot coordinates")
+    map_parser.add_argument("u", type=float)
+    map_parser.add_argument("v", type=float)
+    args = parser.parse_args()
+    
+    if args.action == "fit":
+        with open(args.points) as f:
+            data = json.load(f)
+        homography = fit_homography(data["pixel_points"], data["robot_points"])
+        mapping = PixelToRobot(homography, data.get("pick_z", 150.0), data.get("orientation", (0, 90, 0)))
+        error = np.linalg.norm(mapping.to_robot(data["pixel_points"]) - np.asarray(data["robot_points"]), axis=1)
+        mapping.save(args.file, data["pixel_points"], data["robot_points"])
+        print(f"Saved {args.file} (mean error {error.mean():.2f} mm, max {error.max():.2f} mm)")
+    else:
+        mapping = PixelToRobot.load(args.file)
+        position, orientation = mapping.pick_pose((args.u, args.v))
+        print(f"pixel ({args.u}, {args.v}) → position {position}, orientation {orientation}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,608 @@
+"""
+Capture Backends - MJPEG capture with libjpeg-turbo decoding off the inference thread
+
+USB cameras deliver MJPEG above 640x480. With the default
+cv2.VideoCapture(i, CAP_V4L2) path OpenCV decodes every JPEG inside
+cap.read(), at full resolution, on the camera thread that then runs
+inference. Backends selectable in find_camera (self.capture_backend):
+
+    opencv      the previous path (OpenCV decodes inside read())
+    mjpeg       V4L2 delivers the raw JPEG buffers (CAP_PROP_CONVERT_RGB off);
+                a decode thread turns them into BGR frames with libjpeg-turbo
+                (PyTurboJPEG when installed, otherwise OpenCV's bundled
+                libjpeg-turbo via cv2.imdecode). When an output size is set,
+                the JPEG is decoded with scaled IDCT (1/2, 1/4, 1/8) straight
+                to the smallest size that still covers it, so most of the
+                decode and the later resize are skipped. read() returns the
+                newest decoded frame; older undelivered frames are dropped.
+    gstreamer   v4l2src ! jpegdec ! appsink pipeline; GStreamer decodes on
+                its own streaming thread (needs OpenCV built with GStreamer)
+
+Unavailable backends fall back to "opencv" with a log message.
+
+Run this file directly to benchmark the decode paths on a recorded MJPEG
+stream (concatenated JPEG frames), or on a synthetic 1920x1080 stream:
+    python3 capture_backends.py --record tray.mjpeg --camera 0 --size 1920x1080
+    python3 capture_backends.py --stream tray.mjpeg --output 640x360
+"""
+
+import time
+import threading
+import numpy as np
+import cv2
+
+try:
+    from turbojpeg import TurboJPEG  # PyTurboJPEG (optional)
+except ImportError:
+    TurboJPEG = None
+
+
+BACKENDS = ("opencv", "mjpeg", "gstreamer")
+
+# Scaled IDCT factor → cv2.imdecode flag
+REDUCED_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+# Start-of-frame markers that carry the image size
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def gstreamer_available():
+    """Whether this OpenCV build has the GStreamer video I/O backend."""
+    for line in cv2.getBuildInformation().splitlines():
+        if line.strip().startswith("GStreamer:"):
+            return "YES" in line
+    return False
+
+
+def jpeg_size(data):
+    """
+    Image size from a JPEG header (without decoding).
+    
+    Args:
+        data (bytes): JPEG file contents.
+    
+    Returns:
+        tuple: (width, height), or None if no frame header was found.
+    """
+    view = memoryview(data)
+    pos = 2
+    while pos + 9 < len(view):
+        if view[pos] != 0xFF:
+            return None
+        marker = view[pos + 1]
+        if marker == 0xFF:
+            pos += 1  # Fill byte
+            continue
+        length = (view[pos + 2] << 8) | view[pos + 3]
+        if marker in _SOF_MARKERS:
+            height = (view[pos + 5] << 8) | view[pos + 6]
+            width = (view[pos + 7] << 8) | view[pos + 8]
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def dct_scale(frame_size, output_size):
+    """
+    Largest scaled-IDCT factor whose output still covers output_size.
+    
+    Args:
+        frame_size (tuple): (width, height) of the JPEG.
+        output_size (tuple): (width, height) needed.
+    
+    Returns:
+        int: 1, 2, 4 or 8.
+    """
+    for factor in (8, 4, 2):
+        if frame_size[0] // factor >= output_size[0] and frame_size[1] // factor >= output_size[1]:
+            return factor
+    return 1
+
+
+class JPEGDecoder:
+    """
+    libjpeg-turbo JPEG → BGR decoding with optional scaled IDCT.
+    """
+    
+    def __init__(self, method="auto"):
+        """
+        Initialize the decoder.
+        
+        Args:
+            method (str): "turbojpeg" (PyTurboJPEG), "opencv" (cv2.imdecode,
+                which uses OpenCV's bundled libjpeg-turbo) or "auto".
+        """
+        if method == "auto":
+            method = "turbojpeg" if TurboJPEG is not None else "opencv"
+        if method == "turbojpeg" and TurboJPEG is None:
+            raise ValueError("PyTurboJPEG is not installed (pip install PyTurboJPEG)")
+        self.method = method
+        self._turbo = TurboJPEG() if method == "turbojpeg" else None
+    
+    def decode(self, data, output_size=None):
+        """
+        Decode one JPEG.
+        
+        Args:
+            data (bytes or ndarray): JPEG file contents.
+            output_size (tuple): (width, height) wanted; the JPEG is decoded at
+                the smallest IDCT scale covering it, then resized to it exactly.
+        
+        Returns:
+            ndarray: BGR frame, or None if the data could not be decoded.
+        """
+        scale = 1
+        if output_size:
+            size = jpeg_size(data)
+            if size is None:
+                return None
+            scale = dct_scale(size, output_size)
+        
+        if self._turbo is not None:
+            try:
+                frame = self._turbo.decode(bytes(data), scaling_factor=(1, scale) if scale > 1 else None)
+            except OSError:
+                return None
+        else:
+            frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), REDUCED_FLAGS[scale])
+        
+        if frame is not None and output_size and (frame.shape[1], frame.shape[0]) != tuple(output_size):
+            frame = cv2.resize(frame, tuple(output_size), interpolation=cv2.INTER_AREA)
+        return frame
+
+
+class V4L2MJPEGSource:
+    """
+    Raw MJPEG buffers from a V4L2 camera (OpenCV's own decode is switched off).
+    """
+    
+    def __init__(self, index, backend=cv2.CAP_V4L2):
+        """
+        Open the camera in MJPEG mode.
+        
+        Args:
+            index (int): Camera index.
+            backend (int): OpenCV capture API (raw buffers need CAP_V4L2).
+        """
+        self.cap = cv2.VideoCapture(index, backend)
+        if self.cap.isOpened():
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+            self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+    
+    def isOpened(self):
+        return self.cap.isOpened()
+    
+    def read_jpeg(self):
+        """
+        Next raw frame.
+        
+        Returns:
+            ndarray: JPEG bytes (uint8), or None if the read failed or the
+            camera is not delivering MJPEG.
+        """
+        ok, buffer = self.cap.read()
+        if not ok or buffer is None:
+            return None
+        data = buffer.reshape(-1)
+        if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+            return None
+        return data
+    
+    def get(self, prop):
+        return self.cap.get(prop)
+    
+    def set(self, prop, value):
+        result = self.cap.set(prop, value)
+        self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)  # Some drivers reset it on a format change
+        return result
+    
+    def release(self):
+        self.cap.release()
+
+
+class MJPEGFileSource:
+    """
+    A recorded MJPEG stream (concatenated JPEG frames) played back as a camera.
+    """
+    
+    def __init__(self, path=None, frames=None, fps=None, loop=True):
+        """
+        Load the stream into memory.
+        
+        Args:
+            path (str): Recorded .mjpeg file.
+            frames (list): JPEG byte strings (instead of a file).
+            fps (float): Playback rate (None = as fast as they are read).
+            loop (bool): Start over at the end of the stream.
+        """
+        if frames is None:
+            with open(path, "rb") as f:
+                frames = split_mjpeg(f.read())
+        self.frames = frames
+        self.fps = fps
+        self.loop = loop
+        self.index = 0
+        self._next_time = None
+        self.size = jpeg_size(frames[0]) if frames else (0, 0)
+    
+    def isOpened(self):
+        return bool(self.frames)
+    
+    def read_jpeg(self):
+        """Next JPEG frame (None at the end of a non-looping stream)."""
+        if self.index >= len(self.frames):
+            if not self.loop:
+                return None
+            self.index = 0
+        if self.fps:
+            now = time.monotonic()
+            self._next_time = max(self._next_time or now, now - 1.0 / self.fps)
+            if self._next_time > now:
+                time.sleep(self._next_time - now)
+            self._next_time += 1.0 / self.fps
+        data = self.frames[self.index]
+        self.index += 1
+        return data
+    
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.size[0])
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.size[1])
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps or 0)
+        return 0.0
+    
+    def set(self, prop, value):
+        return False
+    
+    def release(self):
+        pass
+
+
+def split_mjpeg(data):
+    """
+    Split a concatenated MJPEG stream into JPEG frames.
+    
+    Args:
+        data (bytes): Stream contents.
+    
+    Returns:
+        list: One bytes object per frame.
+    """
+    frames = []
+    start = data.find(b"\xff\xd8\xff")
+    while start != -1:
+        end = data.find(b"\xff\xd8\xff", start + 3)
+        frames.append(data[start:end if end != -1 else len(data)])
+        start = end
+    return frames
+
+
+class MJPEGCapture:
+    """
+    cv2.VideoCapture-compatible capture that decodes MJPEG on its own thread.
+    """
+    
+    def __init__(self, source, decoder=None, output_size=None, threaded=True):
+        """
+        Initialize the capture.
+        
+        Args:
+            source: V4L2MJPEGSource or MJPEGFileSource.
+            decoder (JPEGDecoder): Decoder (default: best available).
+            output_size (tuple): (width, height) to decode to (None = full size).
+                May be changed while running; applies from the next frame.
+            threaded (bool): Decode on a background thread (read() returns the
+                newest frame) instead of inside read().
+        """
+        self.source = source
+        self.decoder = decoder or JPEGDecoder()
+        self.output_size = output_size
+        self.threaded = threaded
+        self.decoded = 0
+        self.dropped = 0  # Decoded frames replaced before anyone read them
+        self.decode_time = 0.0
+        self._source_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._latest = None
+        self._sequence = 0
+        self._delivered = 0
+        self._running = False
+        self._failed = False
+        self._thread = None
+    
+    def isOpened(self):
+        return self.source.isOpened()
+    
+    def _grab_decode(self):
+        """Read and decode one frame (None on failure)."""
+        with self._source_lock:
+            data = self.source.read_jpeg()
+        if data is None:
+            return None
+        start = time.perf_counter()
+        frame = self.decoder.decode(data, self.output_size)
+        self.decode_time += time.perf_counter() - start
+        self.decoded += 1
+        return frame
+    
+    def _decode_loop(self):
+        failures = 0
+        while self._running:
+            frame = self._grab_decode()
+            if frame is None:
+                failures += 1
+                if failures >= 10:
+                    with self._cond:
+                        self._failed = True
+                        self._cond.notify_all()
+                    return
+                continue
+            failures = 0
+            with self._cond:
+                if self._sequence > self._delivered:
+                    self.dropped += 1
+                self._latest = frame
+                self._sequence += 1
+                self._cond.notify_all()
+    
+    def read(self, timeout=2.0):
+        """
+        Next frame, like cv2.VideoCapture.read().
+        
+        Returns:
+            tuple: (ok, BGR frame)
+        """
+        if not self.threaded:
+            frame = self._grab_decode()
+            return frame is not None, frame
+        
+        if not self._running:
+            self._running = True
+            self._thread = threading.Thread(target=self._decode_loop, name="mjpeg-decode", daemon=True)
+            self._thread.start()
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._sequence > self._delivered or self._failed, timeout):
+                return False, None
+            if self._sequence == self._delivered:
+                return False, None
+            self._delivered = self._sequence
+            return True, self._latest
+    
+    def get(self, prop):
+        """Camera property (frame size is the camera's, not the decoded size)."""
+        return self.source.get(prop)
+    
+    def set(self, prop, value):
+        """Camera property (e.g. resolution), applied between two reads."""
+        with self._source_lock:
+            return self.source.set(prop, value)
+    
+    def release(self):
+        """Stop decoding and close the camera."""
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        self.source.release()
+    
+    def describe(self):
+        """Short status string for the activity log."""
+        average = self.decode_time / self.decoded * 1000 if self.decoded else 0.0
+        return (f"{self.decoder.method} decode {average:.1f} ms/frame"
+                f"{' on its own thread' if self.threaded else ''}, {self.dropped} dropped")
+
+
+def gstreamer_pipeline(index, size=None, output_size=None):
+    """
+    v4l2src → jpegdec → appsink pipeline string for cv2.VideoCapture(..., CAP_GSTREAMER).
+    
+    Args:
+        index (int): Camera index (/dev/videoN).
+        size (tuple): Camera (width, height) to request.
+        output_size (tuple): (width, height) delivered to OpenCV.
+    """
+    caps = "image/jpeg" + (f",width={size[0]},height={size[1]}" if size else "")
+    scale = (f" ! videoscale ! video/x-raw,width={output_size[0]},height={output_size[1]}"
+             if output_size else "")
+    return (f"v4l2src device=/dev/video{index} ! {caps} ! jpegdec{scale} ! videoconvert ! "
+            f"video/x-raw,format=BGR ! appsink drop=true max-buffers=1 sync=false")
+
+
+def open_capture(index, backend, kind="opencv", output_size=None, log=print):
+    """
+    Open a camera with the requested capture backend.
+    
+    Args:
+        index (int): Camera index.
+        backend (int): OpenCV capture API for the "opencv" path (e.g. cv2.CAP_V4L2).
+        kind (str): "opencv", "mjpeg" or "gstreamer".
+        output_size (tuple): Decoded frame size for "mjpeg"/"gstreamer" (None = camera size).
+        log (callable): log(message) for fallbacks.
+    
+    Returns:
+        tuple: (capture object, backend actually used)
+    """
+    if kind == "mjpeg":
+        if backend == cv2.CAP_V4L2:
+            source = V4L2MJPEGSource(index, backend)
+            if source.isOpened():
+                capture = MJPEGCapture(source, output_size=output_size)
+                ok, frame = capture.read()
+                if ok and frame is not None:
+                    return capture, "mjpeg"
+                capture.release()
+                log(f"Camera {index} does not deliver raw MJPEG; using the OpenCV path")
+        else:
+            log("Raw MJPEG capture needs V4L2; using the OpenCV path")
+    elif kind == "gstreamer":
+        if gstreamer_available():
+            capture = cv2.VideoCapture(gstreamer_pipeline(index, output_size=output_size), cv2.CAP_GSTREAMER)
+            if capture.isOpened():
+                return capture, "gstreamer"
+            capture.release()
+            log(f"GStreamer pipeline for camera {index} did not open; using the OpenCV path")
+        else:
+            log("OpenCV was built without GStreamer; using the OpenCV path")
+    return cv2.VideoCapture(index, backend), "opencv"
+
+
+def synthetic_stream(count=60, size=(1920, 1080), quality=85):
+    """JPEG frames of the synthetic high-resolution tray (for the benchmark)."""
+    from tiling import synthetic_tray, SYNTHETIC_REFERENCE
+    from detection import PIECE_REGIONS
+    frames = []
+    for seed in range(count):
+        frame, _ = synthetic_tray(PIECE_REGIONS, SYNTHETIC_REFERENCE, size, seed=seed)
+        ok, data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        frames.append(data.tobytes())
+    return frames
+
+
+def benchmark(frames, output_size=(640, 360), inference_ms=30.0, seconds=3.0):
+    """
+    Compare decode paths on the same JPEG frames.
+    
+    Args:
+        frames (list): JPEG byte strings.
+        output_size (tuple): Size the model path needs.
+        inference_ms (float): Simulated per-frame inference (NumPy work that
+            releases the GIL) for the pipelined comparison.
+        seconds (float): Duration of each pipelined run.
+    
+    Returns:
+        list: Rows {"path", "decode_ms", "read_ms", "fps"}.
+    """
+    rows = []
+    
+    def decode_all(decode):
+        start = time.perf_counter()
+        for data in frames:
+            decode(data)
+        return (time.perf_counter() - start) / len(frames) * 1000
+    
+    def current_path(data):
+        # What cap.read() does internally on the V4L2 path, plus the downscale
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        return cv2.resize(frame, output_size, interpolation=cv2.INTER_AREA)
+    
+    rows.append({"path": "opencv full decode + resize", "decode_ms": decode_all(current_path)})
+    
+    opencv = JPEGDecoder("opencv")
+    scale = dct_scale(jpeg_size(frames[0]), output_size)
+    rows.append({"path": f"imdecode scaled IDCT 1/{scale}",
+                 "decode_ms": decode_all(lambda data: opencv.decode(data, output_size))})
+    if TurboJPEG is not None:
+        turbo = JPEGDecoder("turbojpeg")
+        rows.append({"path": "turbojpeg full decode",
+                     "decode_ms": decode_all(lambda data: turbo.decode(data))})
+        rows.append({"path": f"turbojpeg scaled IDCT 1/{scale}",
+                     "decode_ms": decode_all(lambda data: turbo.decode(data, output_size))})
+    
+    # Camera thread: read + inference, decode inline vs on the decode thread
+    work = np.random.default_rng(0).random((300, 300))
+    
+    def inference():
+        end = time.perf_counter() + inference_ms / 1000
+        while time.perf_counter() < end:
+            np.dot(work, work)  # Releases the GIL like torch does
+    
+    for label, decoder_output, threaded in (("inline full decode (current)", None, False),
+                                            ("decode thread, scaled IDCT", output_size, True)):
+        source = MJPEGFileSource(frames=frames, fps=30.0)
+        capture = MJPEGCapture(source, JPEGDecoder("opencv"), decoder_output, threaded)
+        count, read_time = 0, 0.0
+        stop = time.perf_counter() + seconds
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            ok, frame = capture.read()
+            if not threaded and ok:
+                frame = cv2.resize(frame, output_size, interpolation=cv2.INTER_AREA)
+            read_time += time.perf_counter() - start
+            inference()
+            count += ok
+        capture.release()
+        rows.append({"path": label, "read_ms": read_time / max(count, 1) * 1000, "fps": count / seconds,
+                     "dropped": capture.dropped})
+    return rows
+
+
+def record(path, index=0, size=None, count=300):
+    """
+    Record raw MJPEG frames from a V4L2 camera (no decode, no re-encode).
+    
+    Returns:
+        int: Frames written.
+    """
+    source = V4L2MJPEGSource(index)
+    if not source.isOpened():
+        print(f"Cannot open camera {index}")
+        return 0
+    if size:
+        source.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+        source.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+    written = 0
+    with open(path, "wb") as f:
+        while written < count:
+            data = source.read_jpeg()
+            if data is None:
+                print("Camera is not delivering MJPEG")
+                break
+            f.write(data.tobytes())
+            written += 1
+    source.release()
+    return written
+
+
+def _size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    """Record a stream, or benchmark decode paths on one."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="MJPEG capture/decode benchmark")
+    parser.add_argument("--stream", help="Recorded MJPEG stream (default: synthetic 1920x1080)")
+    parser.add_argument("--output", type=_size, default=(640, 360), help="Size the model path needs (WxH)")
+    parser.add_argument("--inference-ms", type=float, default=30.0, help="Simulated inference per frame")
+    parser.add_argument("--record", help="Record raw MJPEG from a camera to this file")
+    parser.add_argument("--camera", type=int, default=0, help="Camera index for --record")
+    parser.add_argument("--size", type=_size, help="Camera resolution for --record (WxH)")
+    parser.add_argument("--frames", type=int, default=300, help="Frames to record")
+    args = parser.parse_args()
+    
+    if args.record:
+        print(f"Recorded {record(args.record, args.camera, args.size, args.frames)} frames to {args.record}")
+        return
+    
+    if args.stream:
+        source = MJPEGFileSource(args.stream)
+        frames = source.frames
+    else:
+        frames = synthetic_stream()
+    if not frames:
+        print("No JPEG frames in the stream")
+        return
+    width, height = jpeg_size(frames[0])
+    print(f"{len(frames)} frames of {width}x{height}, model path needs {args.output[0]}x{args.output[1]}, "
+          f"PyTurboJPEG {'available' if TurboJPEG else 'not installed'}, "
+          f"GStreamer {'available' if gstreamer_available() else 'not built in'}")
+    print("=" * 78)
+    rows = benchmark(frames, args.output, args.inference_ms)
+    print(f"{'decode path':<34}{'ms/frame':>10}")
+    for row in rows:
+        if "decode_ms" in row:
+            print(f"{row['path']:<34}{row['decode_ms']:>10.2f}")
+    print(f"\nCamera thread at 30 fps input with {args.inference_ms:.0f} ms inference per frame:")
+    print(f"{'':<34}{'read() ms':>10}{'frames/s':>10}{'dropped':>9}")
+    for row in rows:
+        if "read_ms" in row:
+            print(f"{row['path']:<34}{row['read_ms']:>10.2f}{row['fps']:>10.1f}{row['dropped']:>9}")
+
+
+if __name__ == "__main__":
+    main()
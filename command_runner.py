@@ -0,0 +1,423 @@
+"""
+Command Runner - Scripted, timed command replay for the robot link
+
+Runs a JSONL or YAML command script against the robot server (real or
+simulated) and records a latency histogram per command, separately from the
+vision stack. Use it for repeatable throughput benchmarks and long soak runs.
+
+Script format (JSONL: one entry per line, "#" comments allowed; YAML: a list
+of the same entries, or {"commands": [...]}):
+
+    {"command": "pick_piece", "piece": "piece 1"}
+    {"command": "place_piece", "location": "bad bin"}
+    {"command": "move_home"}
+    {"sleep": 0.5}                # pause (waits for pipelined replies first)
+
+Options:
+- pipelining: up to --depth commands are in flight on one connection; the
+  server answers them in order, so the network round trip overlaps with
+  robot motion
+- concurrency: --workers connections run the script in parallel (the server
+  must accept several clients; use read-only commands such as get_pose when
+  driving the real arm)
+- soak: --duration or --loops repeats the script, reconnecting after
+  transport errors, with a report every --report seconds. A worker that
+  cannot connect at all gives up at once; without --duration it also gives
+  up after --max-reconnects failed reconnects in a row
+
+Command line:
+    python3 command_runner.py script.jsonl --host 192.168.137.1
+    python3 command_runner.py script.yaml --depth 4 --workers 2 --duration 3600 --out soak.json
+    python3 command_runner.py --sim --latency 0.03 --jitter 0.02   # built-in tray script, simulated server
+"""
+
+import os
+import json
+import time
+import threading
+from collections import deque
+import numpy as np
+from robot_client import RobotClient
+
+
+class LatencyHistogram:
+    """
+    Log-spaced latency histogram (0.1 ms to 100 s, about 2% bucket width).
+    """
+    
+    EDGES = np.geomspace(1e-4, 100.0, 701)
+    
+    def __init__(self):
+        self.counts = np.zeros(len(self.EDGES) + 1, dtype=np.int64)
+        self.total = 0.0
+        self.max = 0.0
+    
+    @property
+    def count(self):
+        """Number of samples."""
+        return int(self.counts.sum())
+    
+    def record(self, seconds):
+        """Add one latency sample."""
+        self.counts[np.searchsorted(self.EDGES, seconds)] += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+    
+    def merge(self, other):
+        """Add another histogram's samples to this one."""
+        self.counts += other.counts
+        self.total += other.total
+        self.max = max(self.max, other.max)
+    
+    def percentile(self, q):
+        """
+        Approximate percentile.
+        
+        Args:
+            q (float): Percentile (0-100).
+        
+        Returns:
+            float: Upper edge of the bucket holding the percentile, capped
+            at the largest sample (seconds).
+        """
+        count = self.count
+        if not count:
+            return 0.0
+        index = int(np.searchsorted(np.cumsum(self.counts), q / 100.0 * count))
+        return min(float(self.EDGES[min(index, len(self.EDGES) - 1)]), self.max)
+    
+    def summary(self):
+        """{"count", "mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms"}"""
+        count = self.count
+        return {
+            "count": count,
+            "mean_ms": self.total / count * 1000 if count else 0.0,
+            "p50_ms": self.percentile(50) * 1000,
+            "p90_ms": self.percentile(90) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+
+def load_script(path):
+    """
+    Load a command script.
+    
+    Args:
+        path (str): .jsonl or .yaml/.yml file.
+    
+    Returns:
+        list: Entries ({"command": ...} or {"sleep": seconds}).
+    """
+    if path.endswith((".yaml", ".yml")):
+        import yaml  # PyYAML, only needed for YAML scripts
+        with open(path) as f:
+            data = yaml.safe_load(f)
+        if isinstance(data, dict):
+            data = data.get("commands", [])
+    else:
+        data = []
+        with open(path) as f:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                try:
+                    data.append(json.loads(line))
+                except ValueError as e:
+                    raise ValueError(f"{path}:{number}: {e}")
+    
+    for entry in data:
+        if not isinstance(entry, dict) or not ("command" in entry or "sleep" in entry):
+            raise ValueError(f"Invalid script entry: {entry!r}")
+    return data
+
+
+class CommandRunner:
+    """
+    Runs a command script over one or more connections and collects statistics.
+    """
+    
+    def __init__(self, script, host, port=5000, depth=1, workers=1, loops=1, duration=None,
+                 reconnect_delay=1.0, timeout=None, max_reconnects=5):
+        """
+        Initialize the runner.
+        
+        Args:
+            script (list): Entries from load_script().
+            host (str): Robot server IP address.
+            port (int): Robot server port.
+            depth (int): Commands in flight per connection (1 = request/response).
+            workers (int): Parallel connections.
+            loops (int): Script repetitions per worker (ignored with duration).
+            duration (float): Soak duration in seconds (None = run `loops` times).
+            reconnect_delay (float): Pause before reconnecting after a transport error.
+            timeout (float): Reply timeout per connection (None = wait forever).
+            max_reconnects (int): Failed reconnects in a row before a worker
+                gives up when there is no duration (a soak keeps trying until
+                its deadline).
+        """
+        self.script = script
+        self.host = host
+        self.port = port
+        self.depth = max(1, depth)
+        self.workers = max(1, workers)
+        self.loops = loops
+        self.duration = duration
+        self.reconnect_delay = reconnect_delay
+        self.timeout = timeout
+        self.max_reconnects = max_reconnects
+        
+        self.histograms = {}
+        self.recovery = LatencyHistogram()  # Link lost → next successful reply
+        self.errors = {}
+        self.counters = {"sent": 0, "ok": 0, "failed": 0, "lost": 0, "reconnects": 0, "loops": 0,
+                         "gave_up": 0}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._lost_at = {}  # {worker thread: time its link was lost}
+        self.started = None
+        self.elapsed = 0.0
+    
+    def stop(self):
+        """Ask the workers to finish after their current command."""
+        self._stop.set()
+    
+    def _record(self, name, seconds, response):
+        """Store one reply."""
+        with self._lock:
+            if response.get("status") == "success" and self._lost_at.get(threading.get_ident()):
+                self.recovery.record(time.monotonic() - self._lost_at.pop(threading.get_ident()))
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.record(seconds)
+            if response.get("status") == "success":
+                self.counters["ok"] += 1
+            else:
+                self.counters["failed"] += 1
+                message = str(response.get("message", response))
+                key = (name, message)
+                self.errors[key] = self.errors.get(key, 0) + 1
+    
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.counters[key] += amount
+    
+    def _give_up(self, message):
+        """Stop one worker because its link cannot be (re-)established."""
+        print(f"Worker giving up: {message}")
+        with self._lock:
+            self.counters["gave_up"] += 1
+            key = ("connect", message)
+            self.errors[key] = self.errors.get(key, 0) + 1
+    
+    def _finished(self, loops_done, deadline):
+        if self._stop.is_set():
+            return True
+        if deadline is not None:
+            return time.monotonic() >= deadline
+        return loops_done >= self.loops
+    
+    def _worker(self, deadline):
+        """One connection: run the script until done, with pipelining."""
+        client = RobotClient(self.host, self.port, timeout=self.timeout)
+        if not client.connect():
+            self._give_up(f"cannot connect to {self.host}:{self.port}")
+            return
+        connected = True
+        failures = 0  # Failed reconnects in a row
+        inflight = deque()  # (command name, send time), in send order
+        loops_done = 0
+        
+        def drain(limit):
+            while len(inflight) > limit:
+                response = client.receive_response()
+                name, sent = inflight.popleft()
+                self._record(name, time.monotonic() - sent, response)
+        
+        while not self._finished(loops_done, deadline):
+            if not connected:
+                time.sleep(self.reconnect_delay)
+                connected = client.reconnect()
+                if connected:
+                    failures = 0
+                    self._count("reconnects")
+                else:
+                    failures += 1
+                    if deadline is None and failures >= self.max_reconnects:
+                        self._give_up(f"{self.host}:{self.port} unreachable after {failures} reconnects")
+                        break
+                continue
+            try:
+                for entry in self.script:
+                    if self._stop.is_set() or (deadline is not None and time.monotonic() >= deadline):
+                        break
+                    if "sleep" in entry:
+                        drain(0)
+                        time.sleep(float(entry["sleep"]))
+                        continue
+                    drain(self.depth - 1)
+                    inflight.append((entry["command"], time.monotonic()))
+                    client.send_nowait(entry)
+                    self._count("sent")
+                else:
+                    loops_done += 1
+                    self._count("loops")
+                drain(0)
+            except Exception as e:
+                print(f"Worker link error: {e}")
+                with self._lock:
+                    self._lost_at.setdefault(threading.get_ident(), time.monotonic())
+                self._count("lost", len(inflight))
+                inflight.clear()
+                client.disconnect()
+                connected = False
+        client.disconnect()
+    
+    def run(self, report_every=None, on_report=None):
+        """
+        Run all workers to completion.
+        
+        Args:
+            report_every (float): Seconds between interim reports (None = none).
+            on_report (callable): on_report(runner) for each interim report.
+        
+        Returns:
+            dict: Final results (see results()).
+        """
+        self.started = time.monotonic()
+        deadline = self.started + self.duration if self.duration else None
+        threads = [threading.Thread(target=self._worker, args=(deadline,), name=f"runner-{i}", daemon=True)
+                   for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        
+        last_report = self.started
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=0.2)
+                    self.elapsed = time.monotonic() - self.started
+                if report_every and on_report and time.monotonic() - last_report >= report_every:
+                    last_report = time.monotonic()
+                    on_report(self)
+        except KeyboardInterrupt:
+            print("\nStopping (waiting for in-flight commands)...")
+            self.stop()
+            for thread in threads:
+                thread.join()
+        self.elapsed = time.monotonic() - self.started
+        return self.results()
+    
+    def results(self):
+        """
+        Snapshot of the statistics.
+        
+        Returns:
+            dict: {"elapsed", "throughput", "counters", "commands": {name: summary},
+            "errors": [{"command", "message", "count"}]}
+        """
+        with self._lock:
+            commands = {name: h.summary() for name, h in self.histograms.items()}
+            total = LatencyHistogram()
+            for histogram in self.histograms.values():
+                total.merge(histogram)
+            recovery = self.recovery.summary()
+            errors = [{"command": name, "message": message, "count": count}
+                      for (name, message), count in sorted(self.errors.items())]
+            counters = dict(self.counters)
+        replies = counters["ok"] + counters["failed"]
+        return {
+            "elapsed": self.elapsed,
+            "throughput": replies / self.elapsed if self.elapsed else 0.0,
+            "depth": self.depth,
+            "workers": self.workers,
+            "counters": counters,
+            "commands": commands,
+            "all": total.summary(),
+            "recovery": recovery,
+            "errors": errors,
+        }
+
+
+def format_results(results):
+    """Render results as a text table."""
+    c = results["counters"]
+    lines = [f"{results['elapsed']:.1f}s, {results['workers']} worker(s), depth {results['depth']}: "
+             f"{c['ok'] + c['failed']} replies ({results['throughput']:.1f}/s), {c['failed']} failed, "
+             f"{c['lost']} lost, {c['reconnects']} reconnects, {c['loops']} loops"
+             + (f", {c['gave_up']} worker(s) gave up" if c["gave_up"] else ""),
+             f"{'command':<14}{'count':>8}{'mean':>10}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}  (ms)"]
+    rows = sorted(results["commands"].items()) + [("ALL", results["all"])]
+    for name, s in rows:
+        lines.append(f"{name:<14}{s['count']:>8}{s['mean_ms']:>10.1f}{s['p50_ms']:>10.1f}"
+                     f"{s['p90_ms']:>10.1f}{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}")
+    recovery = results["recovery"]
+    if recovery["count"]:
+        lines.append(f"recovery (link lost → next good reply): {recovery['count']}×, "
+                     f"p50 {recovery['p50_ms']:.0f} ms, p99 {recovery['p99_ms']:.0f} ms, "
+                     f"max {recovery['max_ms']:.0f} ms")
+    for error in results["errors"][:10]:
+        lines.append(f"  {error['count']}× {error['command']}: {error['message']}")
+    return "\n".join(lines)
+
+
+def main():
+    """Command-line entry point."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Scripted robot command replay and soak runner")
+    parser.add_argument("script", nargs="?", help="JSONL or YAML command script "
+                                                  "(default: a 6-piece tray cycle)")
+    parser.add_argument("--host", default="192.168.137.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--depth", type=int, default=1, help="Pipelined commands per connection")
+    parser.add_argument("--workers", type=int, default=1, help="Parallel connections")
+    parser.add_argument("--loops", type=int, default=1, help="Script repetitions per worker")
+    parser.add_argument("--duration", type=float, help="Soak duration in seconds (overrides --loops)")
+    parser.add_argument("--report", type=float, default=60.0, help="Interim report interval (s)")
+    parser.add_argument("--timeout", type=float, help="Reply timeout (s); default waits forever")
+    parser.add_argument("--max-reconnects", type=int, default=5,
+                        help="Failed reconnects in a row before a worker gives up (without --duration)")
+    parser.add_argument("--out", help="Write the final results as JSON")
+    parser.add_argument("--sim", action="store_true", help="Run against a local simulated server")
+    parser.add_argument("--speed", type=float, default=10.0, help="Simulated motion speed factor")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated one-way delay (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Simulated delay jitter (s)")
+    args = parser.parse_args()
+    
+    if args.script:
+        script = load_script(args.script)
+    else:
+        from sim_robot_server import tray_steps
+        script = tray_steps(6)
+    
+    host, port, server = args.host, args.port, None
+    if args.sim:
+        from sim_robot_server import SimRobotServer
+        server = SimRobotServer("127.0.0.1", 0, speed=args.speed, latency=args.latency, jitter=args.jitter)
+        host, port = "127.0.0.1", server.start()
+    
+    print(f"Running {len(script)} script entries against {host}:{port}")
+    runner = CommandRunner(script, host, port, args.depth, args.workers, args.loops, args.duration,
+                           timeout=args.timeout, max_reconnects=args.max_reconnects)
+    results = runner.run(report_every=args.report,
+                         on_report=lambda r: print(format_results(r.results()) + "\n"))
+    if server:
+        server.stop()
+    
+    print("=" * 70)
+    print(format_results(results))
+    if args.out:
+        directory = os.path.dirname(os.path.abspath(args.out))
+        os.makedirs(directory, exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.out}")
+    if results["counters"]["gave_up"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+"""
+Conveyor Mode - Latency-compensated pose picks from timestamped detections
+
+On a conveyor the piece keeps moving between the camera frame and the
+gripper closing on it. That lead time is the sum of:
+1. frame age: capture timestamp → now (inference, tracking, queueing)
+2. command latency: send_command → the server starts moving (half the RTT)
+3. approach: motion start → gripper at the piece
+
+Each piece's pick target is its tracked centroid advanced by the belt
+velocity over that lead time, mapped to robot coordinates with the
+calibration homography and sent as a pick_object command.
+
+The belt velocity is the median velocity of established tracks (robust
+against a piece being pushed or a bad match), smoothed with an EMA. The
+latencies are EMAs of measured round trips and pick durations.
+
+Run this file with --simulate to report the missed-pick rate against belt
+speed, with and without latency compensation:
+    python3 conveyor.py --simulate
+"""
+
+import time
+import numpy as np
+from tracker import CentroidTracker
+from calibration import PixelToRobot
+
+
+class BeltEstimator:
+    """
+    Belt velocity (pixels/s) from the velocities of tracked pieces.
+    """
+    
+    def __init__(self, smoothing=0.2, min_hits=4, max_speed=5000.0):
+        """
+        Initialize the estimator.
+        
+        Args:
+            smoothing (float): EMA weight of each new per-frame estimate.
+            min_hits (int): Detections a track needs before its velocity is used.
+            max_speed (float): Per-frame estimates above this (pixels/s) are
+                rejected as tracking glitches.
+        """
+        self.smoothing = smoothing
+        self.min_hits = min_hits
+        self.max_speed = max_speed
+        self.velocity = np.zeros(2)
+        self.samples = 0
+    
+    def reset(self):
+        """Forget the current estimate."""
+        self.velocity = np.zeros(2)
+        self.samples = 0
+    
+    @property
+    def speed(self):
+        """Belt speed in pixels/s."""
+        return float(np.hypot(*self.velocity))
+    
+    def update(self, tracks):
+        """
+        Fold one frame of tracks into the estimate.
+        
+        Args:
+            tracks (dict): CentroidTracker.tracks() output.
+        
+        Returns:
+            ndarray: Current belt velocity (pixels/s).
+        """
+        velocities = [t["velocity"] for t in tracks.values() if t["hits"] >= self.min_hits]
+        if not velocities:
+            return self.velocity
+        median = np.median(np.asarray(velocities, dtype=np.float64), axis=0)
+        if np.hypot(*median) > self.max_speed:
+            return self.velocity
+        if self.samples == 0:
+            self.velocity = median
+        else:
+            self.velocity += self.smoothing * (median - self.velocity)
+        self.samples += 1
+        return self.velocity
+
+
+class LatencyModel:
+    """
+    Measured delays between seeing a piece and the gripper reaching it.
+    """
+    
+    def __init__(self, rtt=0.02, approach=1.5, smoothing=0.2, grasp_fraction=0.6):
+        """
+        Initialize with prior estimates (replaced by measurements as they arrive).
+        
+        Args:
+            rtt (float): Command round-trip time (seconds).
+            approach (float): Motion start → gripper at the piece (seconds).
+            smoothing (float): EMA weight of each new measurement.
+            grasp_fraction (float): Fraction of a pick_object command spent
+                before the gripper closes (the rest is grasp and lift).
+        """
+        self.rtt = rtt
+        self.approach = approach
+        self.smoothing = smoothing
+        self.grasp_fraction = grasp_fraction
+    
+    def record_rtt(self, seconds):
+        """Add a round-trip measurement (e.g. RobotClient.last_rtt of get_pose)."""
+        self.rtt += self.smoothing * (seconds - self.rtt)
+    
+    def record_pick(self, seconds):
+        """Add the duration of a completed pick_object command."""
+        approach = max(0.0, seconds - self.rtt) * self.grasp_fraction
+        self.approach += self.smoothing * (approach - self.approach)
+    
+    def lead_time(self, observed_at, now=None):
+        """
+        Seconds between an observation and the gripper reaching the piece.
+        
+        Args:
+            observed_at (float): time.monotonic() capture time of the frame.
+            now (float): Current time (defaults to time.monotonic()).
+        
+        Returns:
+            float: Expected lead time.
+        """
+        now = time.monotonic() if now is None else now
+        return max(0.0, now - observed_at) + self.rtt / 2 + self.approach
+
+
+class ConveyorPlanner:
+    """
+    Chooses the next piece and its predicted pick pose.
+    """
+    
+    def __init__(self, calibration, belt, latency, reach=None):
+        """
+        Initialize the planner.
+        
+        Args:
+            calibration (PixelToRobot): Pixel → robot mapping.
+            belt (BeltEstimator): Belt velocity estimate.
+            latency (LatencyModel): Latency estimate.
+            reach (tuple): ((x_min, x_max), (y_min, y_max)) robot workspace
+                for picks in mm, or None for no limit.
+        """
+        self.calibration = calibration
+        self.belt = belt
+        self.latency = latency
+        self.reach = reach
+    
+    def in_reach(self, position):
+        """Check a robot position against the pick workspace."""
+        if self.reach is None:
+            return True
+        (x_min, x_max), (y_min, y_max) = self.reach
+        return x_min <= position[0] <= x_max and y_min <= position[1] <= y_max
+    
+    def plan(self, tracks, exclude=(), now=None, compensate=True):
+        """
+        Pick the most downstream reachable piece.
+        
+        Args:
+            tracks (dict): CentroidTracker.tracks() output (last_seen must be
+                the frame capture time).
+            exclude (set): Track IDs already picked.
+            now (float): Current time (defaults to time.monotonic()).
+            compensate (bool): Advance targets by the lead time (False aims at
+                the last seen position, for comparison).
+        
+        Returns:
+            dict: {"track_id", "status", "position", "orientation",
+            "predicted", "lead_time"} or None if no piece is reachable.
+        """
+        now = time.monotonic() if now is None else now
+        velocity = self.belt.velocity
+        direction = velocity / self.belt.speed if self.belt.speed > 1e-6 else np.zeros(2)
+        
+        best = None
+        best_score = None
+        for track_id, track in tracks.items():
+            if track_id in exclude:
+                continue
+            lead = self.latency.lead_time(track["last_seen"], now) if compensate else 0.0
+            predicted = np.asarray(track["centroid"]) + velocity * lead
+            position, orientation = self.calibration.pick_pose(predicted)
+            if not self.in_reach(position):
+                continue
+            # Furthest along the belt leaves the workspace first
+            score = (float(predicted @ direction), -track_id)
+            if best_score is None or score > best_score:
+                best_score = score
+                best = {
+                    "track_id": track_id,
+                    "status": track["status"],
+                    "position": position,
+                    "orientation": orientation,
+                    "predicted": (float(predicted[0]), float(predicted[1])),
+                    "lead_time": lead,
+                }
+        return best
+
+
+class ConveyorSorter:
+    """
+    Continuous pick/place loop for conveyor mode.
+    """
+    
+    def __init__(self, planner, execute, get_tracks, measure_rtt=None, on_event=None,
+                 on_progress=None, should_stop=None, sleep=time.sleep, poll_interval=0.05,
+                 rtt_interval=5.0):
+        """
+        Initialize the sorter.
+        
+        Args:
+            planner (ConveyorPlanner): Target planner.
+            execute (callable): execute(command, piece, payload) → response,
+                with command in ("pick", "place_piece", "move_home").
+            get_tracks (callable): Returns the current confirmed tracks.
+            measure_rtt (callable): Returns a fresh round-trip time or None.
+            on_event (callable): on_event(level, message) for the activity log.
+            on_progress (callable): on_progress(sorter) after each piece.
+            should_stop (callable): Returns True to stop the loop.
+            sleep (callable): Sleep function.
+            poll_interval (float): Wait when no piece is reachable (seconds).
+            rtt_interval (float): Seconds between RTT measurements.
+        """
+        self.planner = planner
+        self.execute = execute
+        self.get_tracks = get_tracks
+        self.measure_rtt = measure_rtt
+        self.on_event = on_event or (lambda level, message: print(f"[{level}] {message}"))
+        self.on_progress = on_progress
+        self.should_stop = should_stop or (lambda: False)
+        self.sleep = sleep
+        self.poll_interval = poll_interval
+        self.rtt_interval = rtt_interval
+        self.picked = set()
+        self.sorted = 0
+        self.failed = 0
+    
+    def _update_rtt(self):
+        """Refresh the round-trip estimate."""
+        if self.measure_rtt is None:
+            return
+        rtt = self.measure_rtt()
+        if rtt is not None:
+            self.planner.latency.record_rtt(rtt)
+    
+    def run(self):
+        """
+        Sort pieces until should_stop() returns True.
+        
+        Returns:
+            dict: {"sorted", "failed"}
+        """
+        last_rtt = 0.0
+        while not self.should_stop():
+            if time.monotonic() - last_rtt >= self.rtt_interval:
+                self._update_rtt()
+                last_rtt = time.monotonic()
+            
+            plan = self.planner.plan(self.get_tracks(), self.picked)
+            if plan is None:
+                self.sleep(self.poll_interval)
+                continue
+            
+            self.picked.add(plan["track_id"])
+            piece = {
+                "piece_id": plan["track_id"],
+                "status": plan["status"],
+                "bin": "bad bin" if plan["status"] == "BAD" else "good bin",
+            }
+            self.on_event("INFO", f"Picking {piece['status']} piece {piece['piece_id']} at "
+                                  f"{plan['position']} (lead {plan['lead_time']:.2f} s, "
+                                  f"belt {self.planner.belt.speed:.0f} px/s)")
+            
+            start = time.monotonic()
+            response = self.execute("pick", piece, {"position": plan["position"],
+                                                    "orientation": plan["orientation"]})
+            if response is None or response.get("status") != "success":
+                self.failed += 1
+                self.on_event("ERROR", f"Failed to pick piece {piece['piece_id']}")
+                continue
+            self.planner.latency.record_pick(time.monotonic() - start)
+            
+            response = self.execute("place_piece", piece, {"location": piece["bin"]})
+            if response is None or response.get("status") != "success":
+                self.failed += 1
+                self.on_event("ERROR", f"Failed to place piece {piece['piece_id']}")
+            else:
+                self.sorted += 1
+                self.on_event("SUCCESS", f"Piece {piece['piece_id']} sorted")
+            self.execute("move_home", piece, {})
+            if self.on_progress:
+                self.on_progress(self)
+        
+        return {"sorted": self.sorted, "failed": self.failed}
+
+
+def simulate(belt_speed, compensate=True, duration=300.0, spawn_interval=4.0,
+             camera_span=(0.0, 500.0), reach=(300.0, 800.0), inference=(0.06, 0.015),
+             rtt=(0.02, 0.01), approach=(1.2, 0.05), cycle=2.0, tolerance=10.0,
+             noise=1.0, seed=0):
+    """
+    Simulate a conveyor run on a virtual clock.
+    
+    Pieces spawn at x=0 and move along +x at belt_speed (1 pixel = 1 mm). The
+    camera loop is serial (capture → inference → tracking), and whenever the
+    robot is free it picks the planned piece; a pick lands if the piece is
+    within tolerance of the target when the gripper arrives.
+    
+    Args:
+        belt_speed (float): Belt speed (mm/s).
+        compensate (bool): Use latency-compensated targets.
+        duration (float): Simulated seconds.
+        spawn_interval (float): Mean seconds between pieces.
+        camera_span (tuple): Visible x range (mm).
+        reach (tuple): Robot x range for picks (mm).
+        inference (tuple): Mean/std of inference time (seconds).
+        rtt (tuple): Mean/std of the command round trip (seconds).
+        approach (tuple): Mean/std of motion start → gripper at piece (seconds).
+        cycle (float): Grasp + place + return time after arriving (seconds).
+        tolerance (float): Maximum gripper miss distance (mm).
+        noise (float): Detection centroid noise (pixels).
+        seed (int): Random seed.
+    
+    Returns:
+        dict: {"speed", "attempts", "missed", "miss_rate", "sorted", "escaped"}
+    """
+    rng = np.random.default_rng(seed)
+    count = int(duration / spawn_interval)
+    spawn_times = np.arange(count) * spawn_interval + rng.uniform(0, spawn_interval / 2, count)
+    lanes = rng.uniform(50.0, 350.0, count)
+    removed = np.zeros(count, dtype=bool)
+    
+    tracker = CentroidTracker(max_distance=50.0, max_age=0.5)
+    belt = BeltEstimator()
+    latency = LatencyModel(rtt=0.05, approach=1.0)
+    planner = ConveyorPlanner(PixelToRobot(), belt, latency, reach=(reach, (-1e9, 1e9)))
+    
+    def piece_x(t):
+        return (t - spawn_times) * belt_speed
+    
+    t = 0.0
+    robot_free = 0.0
+    picked = set()
+    attempts = missed = 0
+    while t < duration:
+        # Capture, then serial inference and tracking
+        x = piece_x(t)
+        visible = (t >= spawn_times) & ~removed & (x >= camera_span[0]) & (x <= camera_span[1])
+        centroids = np.column_stack((x[visible], lanes[visible])) + rng.normal(0, noise, (int(visible.sum()), 2))
+        tracker.update(centroids, timestamp=t)
+        ready = t + max(0.005, rng.normal(*inference))
+        tracks = tracker.tracks()
+        belt.update(tracks)
+        
+        if robot_free <= ready:
+            plan = planner.plan(tracks, picked, now=ready, compensate=compensate)
+            if plan is not None:
+                picked.add(plan["track_id"])
+                attempts += 1
+                trip = max(0.001, rng.normal(*rtt))
+                motion = max(0.1, rng.normal(*approach))
+                arrival = ready + trip / 2 + motion
+                latency.record_rtt(trip)
+                latency.record_pick(trip + motion / latency.grasp_fraction)
+                
+                distance = np.hypot(piece_x(arrival) - plan["position"][0], lanes - plan["position"][1])
+                distance[(arrival < spawn_times) | removed] = np.inf
+                nearest = int(np.argmin(distance))
+                if distance[nearest] <= tolerance:
+                    removed[nearest] = True
+                else:
+                    missed += 1
+                robot_free = arrival + cycle
+        t = ready
+    
+    passed = piece_x(duration) > reach[1]
+    return {
+        "speed": belt_speed,
+        "attempts": attempts,
+        "missed": missed,
+        "miss_rate": missed / attempts if attempts else 0.0,
+        "sorted": int(removed.sum()),
+        "escaped": int((passed & ~removed).sum()),
+    }
+
+
+def main():
+    """Run the missed-pick vs belt speed simulation."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Conveyor mode tools")
+    parser.add_argument("--simulate", action="store_true", help="Report missed picks vs belt speed")
+    parser.add_argument("--speeds", default="10,25,50,100,150,200", help="Belt speeds in mm/s")
+    parser.add_argument("--duration", type=float, default=300.0, help="Simulated seconds per run")
+    args = parser.parse_args()
+    
+    if not args.simulate:
+        parser.print_help()
+        return
+    
+    print("Conveyor simulation: missed-pick rate vs belt speed")
+    print("=" * 70)
+    print(f"{'speed mm/s':>10} | {'compensated':>26} | {'uncompensated':>26}")
+    for speed in [float(s) for s in args.speeds.split(",")]:
+        rows = []
+        for compensate in (True, False):
+            r = simulate(speed, compensate=compensate, duration=args.duration)
+            rows.append(f"{r['miss_rate'] * 100:5.1f}% of {r['attempts']:3d}, {r['escaped']:3d} escaped")
+        print(f"{speed:10.0f} | {rows[0]:>26} | {rows[1]:>26}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""
+Dataset Capture - Background writer for retraining data
+
+Saves raw (pre-overlay) camera frames with YOLO-format labels built from the
+current per-piece decisions, plus per-region crops sorted by class:
+
+    dataset/
+    ├── data.yaml                 # ultralytics training config
+    ├── layout.json               # piece regions and the capture size they are defined at
+    ├── images/<stem>.jpg         # raw frame
+    ├── labels/<stem>.txt         # "class cx cy w h" per piece (normalised)
+    └── crops/{GOOD,BAD}/<stem>_p<id>.jpg
+
+camera_loop only hands the frame to a bounded queue; hashing, JPEG
+encoding and disk writes happen on the writer thread. Near-identical frames
+are dropped with a 64-bit difference hash (dHash) compared against recent
+samples. Hard examples (a low-confidence detection, or a piece whose
+verdict changed since the last frame) skip the rate limit, use a tighter dedup
+threshold and are evicted last when the storage budget is exceeded.
+"""
+
+import os
+import json
+import time
+import queue
+import threading
+import cv2
+import numpy as np
+
+
+DEFAULT_DATASET_DIR = "dataset"
+LAYOUT_FILE = "layout.json"
+
+# Popcount of every byte value, for Hamming distances between hashes
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def dhash(frame, size=8):
+    """
+    64-bit difference hash of a frame.
+    
+    Args:
+        frame (ndarray): BGR frame.
+        size (int): Hash grid width (size * size bits).
+    
+    Returns:
+        int: Hash value.
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def load_layout(root=DEFAULT_DATASET_DIR):
+    """
+    Piece regions a dataset was recorded with.
+    
+    Args:
+        root (str): Dataset directory.
+    
+    Returns:
+        tuple: ({piece_id: (x1, y1, x2, y2)}, (width, height) the regions are
+        defined at), or None if the dataset has no layout.json.
+    """
+    path = os.path.join(root, LAYOUT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        data = json.load(f)
+    regions = {int(pid): tuple(box) for pid, box in data["regions"].items()}
+    return regions, tuple(data["reference_size"])
+
+
+def hamming(value, hashes):
+    """Bit distances between one hash and an array of uint64 hashes."""
+    xor = np.bitwise_xor(hashes, np.uint64(value))
+    return _POPCOUNT[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class DatasetWriter:
+    """
+    Asynchronous, deduplicating, size-bounded dataset recorder.
+    """
+    
+    def __init__(self, root=DEFAULT_DATASET_DIR, class_ids=None, budget_mb=2048,
+                 min_interval=1.0, hash_threshold=6, hard_hash_threshold=2,
+                 low_confidence=0.5, history=256, queue_size=8, jpeg_quality=95,
+                 on_event=None, on_thread_start=None):
+        """
+        Initialize the writer.
+        
+        Args:
+            root (str): Dataset directory.
+            class_ids (dict): {"BAD": id, "GOOD": id} matching the model classes.
+                GOOD may be None for a single-class (BAD-only) model: GOOD
+                pieces are then left unlabelled (background) but still cropped.
+            budget_mb (float): Maximum dataset size on disk.
+            min_interval (float): Minimum seconds between normal samples.
+            hash_threshold (int): dHash distance at or below which a frame
+                is a duplicate.
+            hard_hash_threshold (int): Same, for hard examples.
+            low_confidence (float): Detections below this confidence make a hard example.
+            history (int): Number of recent hashes compared against.
+            queue_size (int): Pending frames before normal samples are dropped.
+            jpeg_quality (int): JPEG quality of saved images.
+            on_event (callable): on_event(level, message) for the activity log.
+            on_thread_start (callable): Called first on the writer thread
+                (e.g. to pin it to the background cores).
+        """
+        self.root = root
+        self.class_ids = class_ids or {"BAD": 0, "GOOD": 1}
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.min_interval = min_interval
+        self.hash_threshold = hash_threshold
+        self.hard_hash_threshold = hard_hash_threshold
+        self.low_confidence = low_confidence
+        self.jpeg_quality = jpeg_quality
+        self.on_event = on_event or (lambda level, message: print(f"[{level}] {message}"))
+        self.on_thread_start = on_thread_start
+        self._last_error = None  # Repeated identical failures are reported once
+        self.layout = None  # {"regions", "reference_size"} for layout.json
+        
+        self.enabled = False
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._hard_queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._last_submit = 0.0
+        self._last_status = {}
+        self._sequence = 0
+        
+        self._hashes = np.zeros(history, dtype=np.uint64)
+        self._hash_count = 0
+        self._hash_head = 0
+        
+        self._samples = []  # [(paths, bytes, hard)] oldest first
+        self._total_bytes = 0
+        self.stats = {"saved": 0, "hard": 0, "duplicates": 0, "dropped": 0, "evicted": 0, "failed": 0}
+    
+    def start(self):
+        """Create the directory layout, index existing samples and start the writer."""
+        for sub in ("images", "labels", os.path.join("crops", "GOOD"), os.path.join("crops", "BAD")):
+            os.makedirs(os.path.join(self.root, sub), exist_ok=True)
+        self._write_config()
+        self._write_layout()
+        self._index_existing()
+        self.enabled = True  # Before the thread starts: it clears this if it exits
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._writer_loop, name="dataset-writer", daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        """Stop accepting frames (queued frames are still written)."""
+        self.enabled = False
+    
+    def _write_config(self):
+        """Write data.yaml for ultralytics training."""
+        classes = [(cid, name) for name, cid in self.class_ids.items() if cid is not None]
+        names = "\n".join(f"  {cid}: {name}" for cid, name in sorted(classes))
+        with open(os.path.join(self.root, "data.yaml"), "w") as f:
+            f.write(f"path: {os.path.abspath(self.root)}\ntrain: images\nval: images\nnames:\n{names}\n")
+    
+    def set_layout(self, regions, reference_size):
+        """
+        Record the piece regions and the capture size they are defined at
+        (written to layout.json now if recording, else on start()).
+        
+        Args:
+            regions (dict): {piece_id: (x1, y1, x2, y2)}
+            reference_size (tuple): (width, height)
+        """
+        self.layout = {"reference_size": list(reference_size),
+                       "regions": {str(pid): list(box) for pid, box in regions.items()}}
+        if os.path.isdir(self.root):
+            self._write_layout()
+    
+    def _write_layout(self):
+        if self.layout is None:
+            return
+        try:
+            with open(os.path.join(self.root, LAYOUT_FILE), "w") as f:
+                json.dump(self.layout, f, indent=2)
+        except OSError as e:
+            self.on_event("ERROR", f"Could not write {LAYOUT_FILE}: {e}")
+    
+    def _index_existing(self):
+        """Load the files and sizes of samples already on disk (for the storage budget)."""
+        crops = {}
+        for status in ("GOOD", "BAD"):
+            directory = os.path.join(self.root, "crops", status)
+            for name in os.listdir(directory):
+                crops.setdefault(name.rsplit("_p", 1)[0], []).append(os.path.join(directory, name))
+        
+        self._samples = []
+        self._total_bytes = 0
+        for name in sorted(os.listdir(os.path.join(self.root, "images"))):
+            stem, ext = os.path.splitext(name)
+            if ext != ".jpg":
+                continue
+            paths = [os.path.join(self.root, "images", name),
+                     os.path.join(self.root, "labels", stem + ".txt")] + crops.get(stem, [])
+            size = sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+            self._samples.append((paths, size, stem.endswith("_hard")))
+            self._total_bytes += size
+    
+    def submit(self, frame, pieces):
+        """
+        Offer a frame (called from camera_loop; never blocks).
+        
+        Args:
+            frame (ndarray): Raw BGR frame (not modified afterwards by the caller).
+            pieces (dict): {piece_id: {"box": (x1, y1, x2, y2), "status", "confidence"}};
+                fixed-region pieces also carry "detections" (0 when no
+                detection backs the verdict).
+        
+        Returns:
+            bool: True if the frame was queued.
+        """
+        if not self.enabled or not pieces:
+            return False
+        
+        hard = False
+        for pid, piece in pieces.items():
+            # A region with no detection reports confidence 0.0: nothing to judge
+            if piece.get("detections") != 0 and (piece.get("confidence") or 0.0) < self.low_confidence:
+                hard = True
+            if self._last_status.get(pid, piece["status"]) != piece["status"]:
+                hard = True
+            self._last_status[pid] = piece["status"]
+        
+        now = time.monotonic()
+        if not hard and now - self._last_submit < self.min_interval:
+            return False
+        
+        try:
+            (self._hard_queue if hard else self._queue).put_nowait((frame, pieces, hard, time.time()))
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+        self._last_submit = now
+        return True
+    
+    def _next_item(self):
+        """Hard examples first, then normal frames."""
+        try:
+            return self._hard_queue.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._queue.get(timeout=0.2)
+        except queue.Empty:
+            return None
+    
+    def _writer_loop(self):
+        """Writer thread: dedup, encode, write, enforce the budget."""
+        try:
+            if self.on_thread_start:
+                self.on_thread_start()
+            while True:
+                item = self._next_item()
+                if item is None:
+                    continue
+                try:
+                    self._write_sample(*item)
+                    self._last_error = None
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    message = f"Dataset write failed: {e}"
+                    if message != self._last_error:
+                        self._last_error = message
+                        self.on_event("ERROR", message)
+        except Exception as e:
+            self.on_event("ERROR", f"Dataset writer stopped: {e}")
+        finally:
+            # Nothing drains the queues any more: stop accepting frames
+            self.enabled = False
+    
+    def _is_duplicate(self, value, hard):
+        """Compare a hash against recent samples and remember it if new."""
+        if self._hash_count:
+            distances = hamming(value, self._hashes[:self._hash_count])
+            threshold = self.hard_hash_threshold if hard else self.hash_threshold
+            if distances.min() <= threshold:
+                return True
+        self._hashes[self._hash_head] = np.uint64(value)
+        self._hash_head = (self._hash_head + 1) % len(self._hashes)
+        self._hash_count = min(self._hash_count + 1, len(self._hashes))
+        return False
+    
+    def _write_sample(self, frame, pieces, hard, ts):
+        """Write one frame, its labels and crops."""
+        if self._is_duplicate(dhash(frame), hard):
+            self.stats["duplicates"] += 1
+            return
+        
+        height, width = frame.shape[:2]
+        self._sequence += 1
+        stem = time.strftime("%Y%m%d-%H%M%S", time.localtime(ts)) + f"-{self._sequence % 100000:05d}"
+        if hard:
+            stem += "_hard"
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+        
+        image_path = os.path.join(self.root, "images", stem + ".jpg")
+        cv2.imwrite(image_path, frame, params)
+        paths = [image_path]
+        
+        lines = []
+        for pid, piece in sorted(pieces.items()):
+            x1, y1, x2, y2 = (int(v) for v in piece["box"])
+            x1, x2 = max(0, x1), min(width, x2)
+            y1, y2 = max(0, y1), min(height, y2)
+            if x2 <= x1 or y2 <= y1:
+                continue
+            class_id = self.class_ids.get(piece["status"])
+            if class_id is not None:
+                lines.append(f"{class_id} {(x1 + x2) / 2 / width:.6f} {(y1 + y2) / 2 / height:.6f} "
+                             f"{(x2 - x1) / width:.6f} {(y2 - y1) / height:.6f}")
+            crop_path = os.path.join(self.root, "crops", piece["status"], f"{stem}_p{pid}.jpg")
+            cv2.imwrite(crop_path, frame[y1:y2, x1:x2], params)
+            paths.append(crop_path)
+        
+        label_path = os.path.join(self.root, "labels", stem + ".txt")
+        with open(label_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        paths.append(label_path)
+        
+        size = sum(os.path.getsize(p) for p in paths)
+        self._samples.append((paths, size, hard))
+        self._total_bytes += size
+        self.stats["saved"] += 1
+        if hard:
+            self.stats["hard"] += 1
+        self._enforce_budget()
+    
+    def _enforce_budget(self):
+        """Delete the oldest normal samples (then the oldest hard ones) over budget."""
+        while self._total_bytes > self.budget_bytes and len(self._samples) > 1:
+            index = next((i for i, sample in enumerate(self._samples) if not sample[2]), 0)
+            paths, size, _ = self._samples.pop(index)
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._total_bytes -= size
+            self.stats["evicted"] += 1
+    
+    def describe(self):
+        """Short status string for the activity log."""
+        s = self.stats
+        return (f"{s['saved']} saved ({s['hard']} hard), {s['duplicates']} duplicates, "
+                f"{s['dropped']} dropped, {s['evicted']} evicted, {s['failed']} failed, "
+                f"{self._total_bytes / 1024 / 1024:.1f} MB")
@@ -0,0 +1,147 @@
+"""
+Detection Helpers - Turn YOLO boxes into per-region GOOD/BAD decisions
+
+Shared by the live camera loop and any offline tool that needs to run the
+same decision logic on stored frames.
+"""
+
+import time
+import numpy as np
+
+
+BAD_CLASS_ID = 0  # YOLO class index of a BAD (defective) piece
+
+# Fixed piece positions (x1, y1, x2, y2) at the camera's default capture size,
+# calibrated to the actual camera view. Keys are the visual IDs shown on
+# screen (remapped for the robot by the dashboard's robot_id_map)
+PIECE_REGIONS = {
+    1: (300, 280, 500, 480),   # Bottom middle
+    2: (240, 80, 440, 280),    # Top middle
+    3: (40, 80, 240, 280),     # Top left
+    4: (440, 80, 640, 280),    # Top right
+    5: (500, 280, 700, 480),   # Bottom right
+    6: (100, 280, 300, 480),   # Bottom left
+}
+
+
+def boxes_to_arrays(results):
+    """
+    Extract detection arrays from an ultralytics result list.
+    
+    Args:
+        results (list): Output of model(frame).
+    
+    Returns:
+        tuple: (xyxy (N, 4) float32, classes (N,) int, confidences (N,) float32)
+    """
+    if results and len(results) > 0:
+        boxes = results[0].boxes
+        if boxes is not None and len(boxes) > 0:
+            return (boxes.xyxy.cpu().numpy().astype(np.float32),
+                    boxes.cls.cpu().numpy().astype(int),
+                    boxes.conf.cpu().numpy().astype(np.float32))
+    return (np.zeros((0, 4), dtype=np.float32),
+            np.zeros(0, dtype=int),
+            np.zeros(0, dtype=np.float32))
+
+
+def region_statuses(xyxy, classes, confidences, regions, bad_class=BAD_CLASS_ID):
+    """
+    Decide GOOD/BAD for every fixed piece region.
+    
+    A region is BAD when the center of any BAD-class detection falls inside
+    it. The reported confidence and box are those of the strongest detection
+    of the decided class inside the region (0.0 and None when a GOOD region
+    has none).
+    
+    Args:
+        xyxy (ndarray): (N, 4) boxes in frame coordinates.
+        classes (ndarray): (N,) class IDs.
+        confidences (ndarray): (N,) detection confidences.
+        regions (dict): {piece_id: (x1, y1, x2, y2)}
+        bad_class (int): Class ID that marks a piece as BAD.
+    
+    Returns:
+        dict: {piece_id: {"status": "GOOD"/"BAD", "confidence": float,
+        "centroid": (x, y), "detections": number of boxes inside,
+        "detection_box": (x1, y1, x2, y2) of the deciding detection or None}}
+    """
+    xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+    classes = np.asarray(classes).reshape(-1)
+    confidences = np.asarray(confidences, dtype=np.float32).reshape(-1)
+    
+    centers_x = (xyxy[:, 0] + xyxy[:, 2]) / 2
+    centers_y = (xyxy[:, 1] + xyxy[:, 3]) / 2
+    is_bad = classes == bad_class
+    
+    pieces = {}
+    for piece_id, (rx1, ry1, rx2, ry2) in regions.items():
+        inside = (rx1 <= centers_x) & (centers_x <= rx2) & (ry1 <= centers_y) & (centers_y <= ry2)
+        bad_inside = inside & is_bad
+        
+        if bad_inside.any():
+            status = "BAD"
+            decided = bad_inside
+        else:
+            status = "GOOD"
+            decided = inside & ~is_bad
+        
+        confidence, box = 0.0, None
+        if decided.any():
+            best = np.flatnonzero(decided)[np.argmax(confidences[decided])]
+            confidence = float(confidences[best])
+            box = tuple(float(v) for v in xyxy[best])
+        
+        pieces[piece_id] = {
+            "status": status,
+            "confidence": confidence,
+            "centroid": ((rx1 + rx2) / 2, (ry1 + ry2) / 2),
+            "detections": int(inside.sum()),
+            "detection_box": box,
+        }
+    return pieces
+
+
+def detect(model, preprocessor, frame, conf_thresh):
+    """
+    Run preprocessing and YOLO on one raw camera frame.
+    
+    Args:
+        model: Loaded ultralytics YOLO model.
+        preprocessor (FramePreprocessor): Preprocessor owning the buffers
+            (use a separate instance per thread).
+        frame (ndarray): Raw BGR frame.
+        conf_thresh (float): YOLO confidence threshold.
+    
+    Returns:
+        tuple: (xyxy in frame coordinates, classes, confidences, PreparedFrame)
+    """
+    prepared = preprocessor.process(frame)
+    
+    start = time.perf_counter()
+    results = model(prepared.model_input, imgsz=preprocessor.imgsz,
+                    conf=conf_thresh, verbose=False)
+    preprocessor.record("inference", time.perf_counter() - start)
+    
+    xyxy, classes, confidences = boxes_to_arrays(results)
+    xyxy = preprocessor.to_frame_coords(xyxy, prepared)
+    return xyxy, classes, confidences, prepared
+
+
+def detect_regions(model, preprocessor, frame, regions, conf_thresh):
+    """
+    Run the full detection pipeline on one raw camera frame.
+    
+    Args:
+        model: Loaded ultralytics YOLO model.
+        preprocessor (FramePreprocessor): Preprocessor owning the buffers
+            (use a separate instance per thread).
+        frame (ndarray): Raw BGR frame.
+        regions (dict): {piece_id: (x1, y1, x2, y2)}
+        conf_thresh (float): YOLO confidence threshold.
+    
+    Returns:
+        tuple: (pieces dict as returned by region_statuses, PreparedFrame)
+    """
+    xyxy, classes, confidences, prepared = detect(model, preprocessor, frame, conf_thresh)
+    return region_statuses(xyxy, classes, confidences, regions), prepared
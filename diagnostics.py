@@ -0,0 +1,406 @@
+"""
+Diagnostics - On-demand sampling profiler, memory diff and Tk object counts
+
+Nothing here runs until a capture is requested (from Insights → Diagnostics
+or the control socket), so the dashboard pays no overhead when it is off.
+A capture runs for a fixed time and then writes a directory:
+
+    diagnostics/<timestamp>/
+    ├── profile.folded    # collapsed stacks ("thread;module:func;... count"),
+    │                     #   for flamegraph.pl, speedscope or inferno
+    ├── profile.json      # top functions per thread (self / total samples)
+    ├── memory.json       # tracemalloc growth during the capture, by line
+    └── tk.json           # canvas items, PhotoImages, Tk images, log lines
+
+The profiler samples every thread's stack with sys._current_frames() from
+its own thread, so camera, sorting and Tk threads are all covered without
+instrumenting them.
+
+The control socket (127.0.0.1 only) takes one JSON command per connection:
+    {"command": "diagnostics", "duration": 10}   → {"status", "path"} when done
+    {"command": "tk_stats"}                      → current Tk object counts
+    {"command": "status"}                        → {"status", "running"}
+
+    python3 diagnostics.py --port 5055 --duration 10    # trigger from a shell
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import socket
+import threading
+import tracemalloc
+from collections import Counter
+
+
+DEFAULT_DIAGNOSTICS_DIR = "diagnostics"
+DEFAULT_CONTROL_PORT = 5055
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of all threads at a fixed rate.
+    """
+    
+    def __init__(self, rate_hz=200.0, max_depth=64):
+        """
+        Initialize the profiler.
+        
+        Args:
+            rate_hz (float): Samples per second.
+            max_depth (int): Stack frames kept per sample (innermost first).
+        """
+        self.interval = 1.0 / rate_hz
+        self.max_depth = max_depth
+        self.stacks = Counter()  # {(thread name, frame, ...) outermost first: samples}
+        self.samples = 0
+    
+    def sample(self, skip_ident):
+        """Take one sample of every thread except the profiler itself."""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == skip_ident:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            self.stacks[tuple(reversed(stack))] += 1
+        self.samples += 1
+    
+    def run(self, duration, should_stop=None):
+        """
+        Sample for `duration` seconds on the calling thread.
+        
+        Args:
+            duration (float): Seconds to sample.
+            should_stop (callable): Returns True to end early.
+        """
+        me = threading.get_ident()
+        deadline = time.perf_counter() + duration
+        next_sample = time.perf_counter()
+        while time.perf_counter() < deadline and not (should_stop and should_stop()):
+            self.sample(me)
+            next_sample += self.interval
+            delay = next_sample - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_sample = time.perf_counter()  # Fell behind; do not burst
+    
+    def folded(self):
+        """Collapsed-stack lines ("a;b;c count"), heaviest first."""
+        return [f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()]
+    
+    def summary(self, top=25):
+        """
+        Top functions per thread.
+        
+        Returns:
+            dict: {"samples", "interval_ms", "threads": {name: {"samples",
+            "self": [[function, samples]], "total": [[function, samples]]}}}
+        """
+        threads = {}
+        for stack, count in self.stacks.items():
+            entry = threads.setdefault(stack[0], {"samples": 0, "self": Counter(), "total": Counter()})
+            entry["samples"] += count
+            if len(stack) > 1:
+                entry["self"][stack[-1]] += count
+            for label in set(stack[1:]):
+                entry["total"][label] += count
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "threads": {name: {"samples": entry["samples"],
+                               "self": entry["self"].most_common(top),
+                               "total": entry["total"].most_common(top)}
+                        for name, entry in sorted(threads.items(), key=lambda item: -item[1]["samples"])},
+        }
+
+
+def memory_diff(before, after, top=30):
+    """
+    Allocation growth between two tracemalloc snapshots.
+    
+    Returns:
+        list: [{"location", "size_kb", "size_diff_kb", "count", "count_diff"}]
+    """
+    rows = []
+    for stat in after.compare_to(before, "lineno")[:top]:
+        frame = stat.traceback[0]
+        rows.append({
+            "location": f"{frame.filename}:{frame.lineno}",
+            "size_kb": round(stat.size / 1024, 1),
+            "size_diff_kb": round(stat.size_diff / 1024, 1),
+            "count": stat.count,
+            "count_diff": stat.count_diff,
+        })
+    return rows
+
+
+def tk_stats(root):
+    """
+    Count Tk objects that tend to leak in a long-running dashboard.
+    
+    Must be called on the Tk thread.
+    
+    Args:
+        root (tk.Tk): Application root.
+    
+    Returns:
+        dict: {"canvases": {path: items}, "canvas_items", "text_lines": {path: lines},
+        "tk_images", "photoimages", "widgets"}
+    """
+    import tkinter as tk
+    
+    canvases, texts = {}, {}
+    widgets = 0
+    pending = [root]
+    while pending:
+        widget = pending.pop()
+        widgets += 1
+        if isinstance(widget, tk.Canvas):
+            canvases[str(widget)] = len(widget.find_all())
+        elif isinstance(widget, tk.Text):
+            texts[str(widget)] = int(widget.index("end-1c").split(".")[0])
+        pending.extend(widget.winfo_children())
+    
+    photoimages = 0
+    for obj in gc.get_objects():
+        name = type(obj).__name__
+        if name == "PhotoImage" and type(obj).__module__ in ("PIL.ImageTk", "tkinter"):
+            photoimages += 1
+    return {
+        "canvases": canvases,
+        "canvas_items": sum(canvases.values()),
+        "text_lines": texts,
+        "tk_images": len(root.tk.call("image", "names")),
+        "photoimages": photoimages,
+        "widgets": widgets,
+    }
+
+
+class Diagnostics:
+    """
+    Runs one capture at a time: profile + memory diff + Tk counts.
+    """
+    
+    def __init__(self, output_dir=DEFAULT_DIAGNOSTICS_DIR, rate_hz=200.0, trace_frames=1,
+                 get_tk_stats=None, on_event=None):
+        """
+        Initialize the facility.
+        
+        Args:
+            output_dir (str): Parent directory of capture directories.
+            rate_hz (float): Profiler sampling rate.
+            trace_frames (int): tracemalloc frames stored per allocation.
+            get_tk_stats (callable): Returns tk_stats() (safe to call from any thread).
+            on_event (callable): on_event(level, message) for the activity log.
+        """
+        self.output_dir = output_dir
+        self.rate_hz = rate_hz
+        self.trace_frames = trace_frames
+        self.get_tk_stats = get_tk_stats
+        self.on_event = on_event or (lambda level, message: print(f"[{level}] {message}"))
+        self.running = False
+        self.last_path = None
+        self._lock = threading.Lock()
+    
+    def start(self, duration=10.0, on_done=None):
+        """
+        Start a capture in the background.
+        
+        Args:
+            duration (float): Seconds to profile.
+            on_done (callable): on_done(path or None) when the files are written.
+        
+        Returns:
+            bool: False if a capture is already running.
+        """
+        with self._lock:
+            if self.running:
+                return False
+            self.running = True
+        threading.Thread(target=self._capture, args=(duration, on_done),
+                         name="diagnostics", daemon=True).start()
+        return True
+    
+    def _capture(self, duration, on_done):
+        path = None
+        try:
+            path = self.capture(duration)
+            self.on_event("SUCCESS", f"Diagnostics written to {path}")
+        except Exception as e:
+            self.on_event("ERROR", f"Diagnostics failed: {e}")
+        finally:
+            with self._lock:
+                self.running = False
+        if on_done:
+            on_done(path)
+    
+    def capture(self, duration):
+        """
+        Run a capture on the calling thread.
+        
+        Returns:
+            str: Directory with the result files.
+        """
+        self.on_event("INFO", f"Diagnostics: profiling all threads for {duration:.0f}s...")
+        tk_before = self.get_tk_stats() if self.get_tk_stats else None
+        
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(self.trace_frames)
+        before = tracemalloc.take_snapshot()
+        
+        profiler = SamplingProfiler(self.rate_hz)
+        start = time.perf_counter()
+        profiler.run(duration)
+        elapsed = time.perf_counter() - start
+        
+        after = tracemalloc.take_snapshot()
+        traced, peak = tracemalloc.get_traced_memory()
+        if started_tracing:
+            tracemalloc.stop()
+        tk_after = self.get_tk_stats() if self.get_tk_stats else None
+        
+        path = os.path.join(self.output_dir, time.strftime("%Y%m%d-%H%M%S"))
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "profile.folded"), "w") as f:
+            f.write("\n".join(profiler.folded()) + "\n")
+        summary = profiler.summary()
+        summary["elapsed"] = elapsed
+        with open(os.path.join(path, "profile.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+        with open(os.path.join(path, "memory.json"), "w") as f:
+            json.dump({"traced_kb": round(traced / 1024, 1), "peak_kb": round(peak / 1024, 1),
+                       "note": None if started_tracing else "tracemalloc was already running",
+                       "growth": memory_diff(before, after)}, f, indent=2)
+        if tk_after is not None:
+            with open(os.path.join(path, "tk.json"), "w") as f:
+                json.dump({"before": tk_before, "after": tk_after}, f, indent=2)
+        self.last_path = path
+        return path
+
+
+class ControlServer:
+    """
+    Localhost JSON control socket for triggering diagnostics without the UI.
+    """
+    
+    def __init__(self, diagnostics, port=DEFAULT_CONTROL_PORT, host="127.0.0.1"):
+        """
+        Initialize the server.
+        
+        Args:
+            diagnostics (Diagnostics): Facility to trigger.
+            port (int): TCP port.
+            host (str): Interface (keep it on loopback).
+        """
+        self.diagnostics = diagnostics
+        self.host = host
+        self.port = port
+        self._server = None
+    
+    def start(self):
+        """
+        Listen on a background thread.
+        
+        Returns:
+            bool: False if the port could not be bound.
+        """
+        try:
+            self._server = socket.create_server((self.host, self.port))
+        except OSError as e:
+            print(f"Control socket unavailable on {self.host}:{self.port}: {e}")
+            return False
+        threading.Thread(target=self._accept_loop, name="control-socket", daemon=True).start()
+        return True
+    
+    def stop(self):
+        """Close the listening socket."""
+        if self._server:
+            self._server.close()
+    
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+    
+    def _handle(self, conn):
+        with conn:
+            try:
+                request = json.loads(conn.recv(4096).decode("utf-8"))
+                conn.sendall(json.dumps(self.handle(request)).encode("utf-8"))
+            except (OSError, ValueError) as e:
+                try:
+                    conn.sendall(json.dumps({"status": "error", "message": str(e)}).encode("utf-8"))
+                except OSError:
+                    pass
+    
+    def handle(self, request):
+        """
+        Execute one control command.
+        
+        Returns:
+            dict: Reply.
+        """
+        command = request.get("command")
+        diagnostics = self.diagnostics
+        if command == "status":
+            return {"status": "success", "running": diagnostics.running, "last_path": diagnostics.last_path}
+        if command == "tk_stats":
+            if not diagnostics.get_tk_stats:
+                return {"status": "error", "message": "No Tk application"}
+            return {"status": "success", "tk": diagnostics.get_tk_stats()}
+        if command == "diagnostics":
+            done = threading.Event()
+            result = {}
+            
+            def on_done(path):
+                result["path"] = path
+                done.set()
+            
+            if not diagnostics.start(float(request.get("duration", 10.0)), on_done):
+                return {"status": "error", "message": "A capture is already running"}
+            done.wait()
+            if result["path"] is None:
+                return {"status": "error", "message": "Capture failed (see the activity log)"}
+            return {"status": "success", "path": os.path.abspath(result["path"])}
+        return {"status": "error", "message": f"Unknown command {command}"}
+
+
+def main():
+    """Send a command to a running dashboard's control socket."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Trigger dashboard diagnostics")
+    parser.add_argument("--port", type=int, default=DEFAULT_CONTROL_PORT)
+    parser.add_argument("--duration", type=float, default=10.0, help="Profile length (s)")
+    parser.add_argument("--command", default="diagnostics", choices=("diagnostics", "tk_stats", "status"))
+    args = parser.parse_args()
+    
+    with socket.create_connection(("127.0.0.1", args.port)) as conn:
+        conn.sendall(json.dumps({"command": args.command, "duration": args.duration}).encode("utf-8"))
+        chunks = []
+        while True:
+            chunk = conn.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    print(json.dumps(json.loads(b"".join(chunks).decode("utf-8")), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+"""
+Dispatcher - One vision system feeding several robot arms in parallel
+
+A larger cell has two (or more) arms sharing one camera view. Each arm is a
+RobotArm: its own RobotClient connection, the subset of piece_regions it can
+reach, its own visual ID → robot ID map and its own bin names. The
+Dispatcher splits a tray's SortJob between the arms and runs one
+SortJobRunner per arm on its own thread, all sharing the same persisted job,
+so a crash still resumes from the per-piece states.
+
+Splitting keeps the job's sort order (BAD first, then GOOD, each by ID):
+- pieces only one arm reaches go to that arm
+- pieces several arms reach go to the arm with the fewest pieces so far
+- a piece already picked (picking/placing on resume) stays with its arm,
+  since it may be in that arm's gripper
+- pieces no arm reaches fail with a clear reason
+- pose-based picks (free placement / conveyor) are not dispatched: their
+  poses come from one calibration, i.e. one robot's base frame
+
+Collision avoidance: a zone is a named set of region IDs (or bin names) that
+only one arm may work in at a time, e.g. the middle column both arms can
+reach, or a bin both arms drop into. Each zone is a mutual-exclusion lock.
+An arm takes every zone of its piece (pick region and bin) before the pick,
+acquiring them in name order so two arms never deadlock. Region zones are
+released once the piece is placed (the arm has left the tray); bin zones
+are held until the arm is back home, since it is still at the bin after
+the place.
+
+Run this file directly to measure tray cycle time for one arm against two
+arms on simulated robot servers:
+    python3 dispatcher.py
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+
+from robot_client import RobotClient
+from sort_job import SortJob, SortJobRunner, JobPaused, PENDING, FAILED
+
+
+class RobotArm:
+    """
+    One arm of the cell: a connection plus what it can reach.
+    """
+    
+    def __init__(self, name, host, port=5000, regions=None, id_map=None, bins=None,
+                 timeout=None, secondary=None, dead_after=None):
+        """
+        Initialize an arm.
+        
+        Args:
+            name (str): Arm name used in logs and in the job ("left", "right").
+            host (str): Robot server address.
+            port (int): Robot server port.
+            regions (list): Visual piece IDs this arm can reach (None = all).
+            id_map (dict): Visual ID → this arm's robot piece ID.
+            bins (dict): {"bad bin": name, "good bin": name} overrides for this
+                arm's bin locations (default: the job's bin names).
+            timeout (float): Socket timeout for the RobotClient.
+            secondary (str): Standby server "host[:port]" for failover.
+            dead_after (float): Dead-link bound (see RobotClient).
+        """
+        self.name = name
+        self.client = RobotClient(host, port, timeout=timeout, secondary=secondary, dead_after=dead_after)
+        self.regions = None if regions is None else set(regions)
+        self.id_map = dict(id_map or {})
+        self.bins = dict(bins or {})
+    
+    @classmethod
+    def from_config(cls, config, timeout=None, dead_after=None):
+        """
+        Build an arm from a dashboard config entry.
+        
+        Args:
+            config (dict): {"name", "host", "port"?, "regions"?, "id_map"?, "bins"?, "secondary"?}
+            timeout (float): Socket timeout.
+            dead_after (float): Dead-link bound.
+        
+        Returns:
+            RobotArm: The arm (not connected yet).
+        """
+        return cls(config["name"], config["host"], config.get("port", 5000), config.get("regions"),
+                   config.get("id_map"), config.get("bins"), timeout, config.get("secondary"), dead_after)
+    
+    def reaches(self, piece):
+        """
+        True if this arm can pick the piece.
+        
+        Pose-based picks are never reachable: their poses are in the frame of
+        the single robot calibration.json was fitted for.
+        """
+        if "position" in piece:
+            return False
+        return self.regions is None or piece["piece_id"] in self.regions
+
+
+class ZoneLocks:
+    """
+    Mutual-exclusion zones shared by the arms.
+    """
+    
+    def __init__(self, zones=None):
+        """
+        Initialize the zones.
+        
+        Args:
+            zones (dict): {zone name: [region IDs or bin names]}.
+        """
+        self.zones = {name: set(members) for name, members in (zones or {}).items()}
+        self.locks = {name: threading.Lock() for name in self.zones}
+        self.waits = {name: 0.0 for name in self.zones}  # Seconds arms spent blocked per zone
+        self._stats_lock = threading.Lock()
+    
+    def zones_for(self, piece):
+        """Zone names a piece's pick or place enters, in acquisition (name) order."""
+        return sorted(name for name, members in self.zones.items()
+                      if piece["piece_id"] in members or piece["bin"] in members)
+    
+    def bin_zones(self, piece):
+        """Zone names of the piece's bin (the arm is still there after the place)."""
+        return sorted(name for name, members in self.zones.items() if piece["bin"] in members)
+    
+    def acquire(self, names):
+        """
+        Take zones in name order (blocks until all are free).
+        
+        Returns:
+            float: Seconds spent waiting.
+        """
+        start = time.monotonic()
+        for name in sorted(names):
+            before = time.monotonic()
+            self.locks[name].acquire()
+            with self._stats_lock:
+                self.waits[name] += time.monotonic() - before
+        return time.monotonic() - start
+    
+    def release(self, names):
+        """Release zones taken with acquire."""
+        for name in names:
+            self.locks[name].release()
+    
+    @contextmanager
+    def hold(self, piece):
+        """
+        Hold every zone of a piece for the duration of the block.
+        
+        Yields:
+            float: Seconds spent waiting for the zones.
+        """
+        names = self.zones_for(piece)
+        waited = self.acquire(names)
+        try:
+            yield waited
+        finally:
+            self.release(names)
+
+
+class Dispatcher:
+    """
+    Splits a SortJob between several arms and runs them concurrently.
+    """
+    
+    def __init__(self, arms, zones=None):
+        """
+        Initialize the dispatcher.
+        
+        Args:
+            arms (list): RobotArm instances (at least one).
+            zones (dict): {zone name: [region IDs or bin names]} that only one
+                arm may enter at a time.
+        """
+        if not arms:
+            raise ValueError("Dispatcher needs at least one arm")
+        self.arms = list(arms)
+        self.zones = ZoneLocks(zones)
+        self.stats = {}  # Per-arm statistics of the last run
+    
+    def arm(self, name):
+        """Return the arm with this name (None if unknown)."""
+        for arm in self.arms:
+            if arm.name == name:
+                return arm
+        return None
+    
+    def connect(self):
+        """
+        Connect every arm.
+        
+        Returns:
+            list: Names of the arms that could not be reached (empty on success).
+        """
+        return [arm.name for arm in self.arms if not arm.client.connect()]
+    
+    def disconnect(self):
+        """Close every arm's connection."""
+        for arm in self.arms:
+            arm.client.disconnect()
+    
+    def assign(self, job):
+        """
+        Split the job's remaining pieces between the arms (and persist it).
+        
+        Sets each piece's "arm", "robot_piece_id" (from the arm's ID map) and
+        "bin" (from the arm's bin names). Pieces no arm reaches are failed.
+        
+        Args:
+            job (SortJob): Job to split.
+        
+        Returns:
+            dict: {arm name: [pieces in sort order]}
+        """
+        plan = {arm.name: [] for arm in self.arms}
+        flexible = []
+        for piece in job.remaining():
+            current = self.arm(piece.get("arm"))
+            if current is not None and piece["state"] != PENDING:
+                plan[current.name].append(piece)  # May already be in this arm's gripper
+                continue
+            candidates = [arm for arm in self.arms if arm.reaches(piece)]
+            if not candidates:
+                reason = ("pose-based picks need a single arm (one calibration)" if "position" in piece
+                          else "no arm reaches this piece")
+                job.set_state(piece, FAILED, reason)
+            elif len(candidates) == 1:
+                plan[candidates[0].name].append(piece)
+            else:
+                flexible.append((piece, candidates))
+        
+        for piece, candidates in flexible:
+            arm = min(candidates, key=lambda a: len(plan[a.name]))
+            plan[arm.name].append(piece)
+        
+        order = {id(piece): index for index, piece in enumerate(job.pieces)}
+        for arm in self.arms:
+            pieces = sorted(plan[arm.name], key=lambda p: order[id(p)])
+            plan[arm.name] = pieces
+            for piece in pieces:
+                piece["arm"] = arm.name
+                piece.setdefault("job_bin", piece["bin"])
+                piece["bin"] = arm.bins.get(piece["job_bin"], piece["job_bin"])
+                if "position" not in piece:
+                    piece["robot_piece_id"] = arm.id_map.get(piece["piece_id"], piece["piece_id"])
+        job.save()
+        return plan
+    
+    def run(self, job, policy=None, execute=None, verify_slot=None, on_event=None,
+            should_stop=None, on_progress=None, settle_delay=0.5, sleep=time.sleep):
+        """
+        Sort every remaining piece of the job with all arms in parallel.
+        
+        Args:
+            job (SortJob): Job to run (shared by all arms).
+            policy (RetryPolicy): Retry policy per arm.
+            execute (callable): execute(arm, command, piece, payload) → response
+                (defaults to the arm's RobotClient methods).
+            verify_slot (callable): verify_slot(piece_id) → True/False/None.
+            on_event (callable): on_event(level, message); messages are
+                prefixed with the arm name.
+            should_stop (callable): Returns True to pause between pieces.
+            on_progress (callable): on_progress(job) after each piece.
+            settle_delay (float): Pause between steps (seconds).
+            sleep (callable): Sleep function.
+        
+        Returns:
+            bool: True if the job finished, False if it was stopped.
+        
+        Raises:
+            JobPaused: If an arm's link could not be recovered (after the
+                other arms have finished their pieces).
+        """
+        on_event = on_event or (lambda level, message: None)
+        should_stop = should_stop or (lambda: False)
+        plan = self.assign(job)
+        self.stats = {arm.name: {"pieces": 0, "sorted": 0, "busy": 0.0, "zone_wait": 0.0}
+                      for arm in self.arms}
+        outcome = {"stopped": False, "paused": None, "error": None}
+        
+        def arm_thread(arm):
+            stats = self.stats[arm.name]
+            runner = SortJobRunner(
+                job, arm.client, policy,
+                execute=(lambda command, piece, payload: execute(arm, command, piece, payload)) if execute else None,
+                verify_slot=verify_slot,
+                on_event=lambda level, message: on_event(level, f"[{arm.name}] {message}"),
+                sleep=sleep)
+            start = time.monotonic()
+            try:
+                for piece in plan[arm.name]:
+                    if should_stop():
+                        outcome["stopped"] = True
+                        return
+                    held = self.zones.zones_for(piece)
+                    stats["zone_wait"] += self.zones.acquire(held)
+                    try:
+                        sorted_ok = runner.process_piece(piece)
+                        if sorted_ok:
+                            # Out of the tray with the piece placed; still at the bin until home
+                            bins = self.zones.bin_zones(piece)
+                            self.zones.release([name for name in held if name not in bins])
+                            held = bins
+                            sleep(settle_delay)
+                        # Also after a failure, so the arm leaves the zones it is in
+                        runner.return_home()
+                    finally:
+                        self.zones.release(held)
+                    stats["pieces"] += 1
+                    if sorted_ok:
+                        stats["sorted"] += 1
+                    if on_progress:
+                        on_progress(job)
+                    sleep(settle_delay)
+            except JobPaused as e:
+                outcome["paused"] = f"{arm.name}: {e}"
+            except Exception as e:
+                outcome["error"] = f"{arm.name}: {e}"
+            finally:
+                stats["busy"] = time.monotonic() - start
+        
+        counts = ", ".join(f"{name} {len(pieces)}" for name, pieces in plan.items())
+        on_event("INFO", f"Dispatching {sum(len(p) for p in plan.values())} pieces: {counts}")
+        threads = [threading.Thread(target=arm_thread, args=(arm,), daemon=True)
+                   for arm in self.arms if plan[arm.name]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        if outcome["error"]:
+            raise RuntimeError(outcome["error"])
+        if outcome["paused"]:
+            raise JobPaused(outcome["paused"])
+        if outcome["stopped"]:
+            on_event("WARNING", "Sorting paused; the job can be resumed")
+            return False
+        return True
+    
+    def describe(self):
+        """Short status string (pieces, busy time and zone waits per arm)."""
+        return ", ".join(f"{name} {s['sorted']}/{s['pieces']} in {s['busy']:.1f} s "
+                         f"(zone wait {s['zone_wait']:.1f} s)" for name, s in self.stats.items())
+
+
+def benchmark(speed=5.0, latency=0.005, settle_delay=0.1, path="dispatch_benchmark.json"):
+    """
+    Tray cycle time on simulated servers: one arm vs two arms.
+    
+    The trays use the dashboard's six regions, three BAD and three GOOD. The
+    left arm reaches regions 3, 6, 2, 1 and the right arm 4, 5, 2, 1; regions
+    1 and 2 (the middle column) form one collision zone. In the "contended"
+    tray both middle pieces are BAD, so each arm's first pick is in the middle
+    zone and both drop into the shared bad bin (a second zone) at the same time.
+    
+    Returns:
+        list: Rows {"setup", "seconds", "per_piece", "zone_wait", "describe"}.
+    """
+    import os
+    from sim_robot_server import SimRobotServer
+    
+    spread = ([1, 3, 5], [2, 4, 6])
+    contended = ([1, 2, 4], [3, 5, 6])
+    single = [{"name": "single", "regions": [1, 2, 3, 4, 5, 6]}]
+    pair = [{"name": "left", "regions": [3, 6, 2, 1], "id_map": {3: 1, 6: 2, 2: 3, 1: 4}},
+            {"name": "right", "regions": [4, 5, 2, 1], "id_map": {4: 1, 5: 2, 2: 3, 1: 4}}]
+    cell_zones = {"middle": [1, 2], "bad bin": ["bad bin"]}
+    setups = [
+        ("1 arm", single, None, spread),
+        ("2 arms, zones", pair, cell_zones, spread),
+        ("2 arms, no zones (unsafe)", pair, None, spread),
+        ("1 arm, contended tray", single, None, contended),
+        ("2 arms, zones, contended tray", pair, cell_zones, contended),
+        ("2 arms, no zones, contended", pair, None, contended),
+    ]
+    
+    rows = []
+    for setup, configs, zones, (bad, good) in setups:
+        servers = [SimRobotServer("127.0.0.1", 0, speed=speed, latency=latency) for _ in configs]
+        for server in servers:
+            server.start()
+        arms = [RobotArm.from_config(dict(config, host="127.0.0.1", port=server.port), timeout=10.0)
+                for config, server in zip(configs, servers)]
+        dispatcher = Dispatcher(arms, zones)
+        try:
+            if dispatcher.connect():
+                raise RuntimeError("could not connect to the simulated servers")
+            job = SortJob.create(path, bad, good, {})
+            start = time.monotonic()
+            finished = dispatcher.run(job, settle_delay=settle_delay)
+            seconds = time.monotonic() - start
+            done = job.counts()["done"]
+            if not finished or done != len(job.pieces):
+                raise RuntimeError(f"{setup}: only {done}/{len(job.pieces)} pieces sorted")
+            rows.append({"setup": setup, "seconds": seconds, "per_piece": seconds / done,
+                         "zone_wait": sum(s["zone_wait"] for s in dispatcher.stats.values()),
+                         "describe": dispatcher.describe()})
+        finally:
+            dispatcher.disconnect()
+            for server in servers:
+                server.stop()
+    if os.path.exists(path):
+        os.remove(path)
+    return rows
+
+
+def main():
+    """Compare tray cycle time for one and two simulated arms."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Multi-arm dispatch benchmark")
+    parser.add_argument("--speed", type=float, default=5.0, help="Simulated motion speed factor")
+    parser.add_argument("--latency", type=float, default=0.005, help="Simulated network delay (s)")
+    args = parser.parse_args()
+    
+    rows = benchmark(args.speed, args.latency)
+    print(f"Tray cycle time, 6 pieces (motion speed x{args.speed:g}); speedup vs one arm on the same tray")
+    print("=" * 72)
+    print(f"{'setup':<30}{'cycle s':>10}{'s/piece':>10}{'speedup':>10}{'zone wait s':>12}")
+    for row in rows:
+        if row["setup"].startswith("1 arm"):
+            single = row["seconds"]
+        print(f"{row['setup']:<30}{row['seconds']:>10.2f}{row['per_piece']:>10.2f}"
+              f"{single / row['seconds']:>9.2f}x{row['zone_wait']:>12.2f}")
+        print(f"    {row['describe']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Link Health - Heartbeats, RTT histogram and dead-link detection for the robot connection
+
+A LinkMonitor watches one RobotClient from a background thread:
+- when the connection has been idle for `interval` seconds it sends a
+  lightweight get_pose heartbeat on the same socket (never while a command
+  is in flight: it only takes the client's exchange lock if it is free)
+- heartbeat round-trip times go into a LatencyHistogram (p50/p99 shown in
+  the dashboard's connection status)
+- a heartbeat without a reply within `dead_after` seconds marks the link
+  dead and reconnects, which fails over to the client's secondary server
+  when the primary cannot be reached
+
+While a motion is running the socket is busy, so there a dropped link is
+caught by the socket options set in RobotClient.connect (TCP keepalive and
+TCP_USER_TIMEOUT tuned to the same dead_after bound) and the pending command
+fails instead of hanging. Worst-case detection is therefore about
+interval + dead_after when idle and dead_after during a command.
+
+Link quality:
+    good        heartbeats answered, p99 RTT below degraded_rtt
+    degraded    p99 RTT above degraded_rtt, or a heartbeat was lost recently
+    down        the last heartbeat failed and reconnecting did not succeed
+
+Run this file directly to watch a simulated primary go silent and the
+monitor switch to a secondary server:
+    python3 link_health.py
+"""
+
+import time
+import threading
+from robot_client import RobotClient
+from command_runner import LatencyHistogram
+
+
+GOOD = "good"
+DEGRADED = "degraded"
+DOWN = "down"
+
+
+class LinkMonitor:
+    """
+    Idle-time heartbeats and link quality for a RobotClient.
+    """
+    
+    def __init__(self, client, interval=2.0, dead_after=6.0, degraded_rtt=0.2,
+                 recent=30.0, on_change=None):
+        """
+        Initialize the monitor.
+        
+        Args:
+            client (RobotClient): Connection to watch (shared with the sorting thread).
+            interval (float): Idle seconds before a heartbeat is sent.
+            dead_after (float): Seconds without a heartbeat reply before the
+                link is declared dead.
+            degraded_rtt (float): p99 RTT (seconds) above which the link is degraded.
+            recent (float): Seconds a lost heartbeat keeps the link degraded.
+            on_change (callable): on_change(quality, message) when the quality changes.
+        """
+        self.client = client
+        self.interval = interval
+        self.dead_after = dead_after
+        self.degraded_rtt = degraded_rtt
+        self.recent = recent
+        self.on_change = on_change or (lambda quality, message: None)
+        
+        self.rtt = LatencyHistogram()
+        self.heartbeats = 0
+        self.lost = 0
+        self.last_lost = None      # time.monotonic() of the last lost heartbeat
+        self.state = GOOD
+        self._retry_at = 0.0       # Earliest next reconnect attempt while down
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Start the heartbeat thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+    
+    def stop(self, wait=True):
+        """
+        Stop the heartbeat thread.
+        
+        Args:
+            wait (bool): Wait for a heartbeat in progress (up to dead_after).
+        """
+        self._stop.set()
+        if self._thread and wait:
+            self._thread.join(timeout=self.dead_after + 1.0)
+        self._thread = None
+    
+    def _loop(self):
+        while not self._stop.wait(min(0.25, self.interval / 4)):
+            now = time.monotonic()
+            if now - self.client.last_activity < self.interval or now < self._retry_at:
+                continue
+            if not self.client.lock.acquire(blocking=False):
+                continue  # A command is in flight; the socket options watch it
+            try:
+                if (self.client.socket is None or not self.heartbeat()) and not self._stop.is_set():
+                    self._reconnect()
+            finally:
+                self.client.lock.release()
+            self._update_state()
+    
+    def heartbeat(self):
+        """
+        Send one heartbeat (the caller holds the client lock).
+        
+        Returns:
+            bool: True if it was answered within dead_after.
+        """
+        client = self.client
+        self.heartbeats += 1
+        try:
+            client.socket.settimeout(self.dead_after)
+        except OSError:
+            pass
+        start = time.monotonic()
+        response = client.send_command({"command": "get_pose"})
+        if client.socket is not None:
+            try:
+                client.socket.settimeout(client.timeout)
+            except OSError:
+                pass
+        if response is None:
+            self.lost += 1
+            self.last_lost = time.monotonic()
+            return False
+        self.rtt.record(time.monotonic() - start)
+        return True
+    
+    def _reconnect(self):
+        previous = self.client.active
+        if self.state != DOWN:
+            self.on_change(DOWN, f"Robot link lost ({self.client.last_error or 'no connection'}), reconnecting...")
+        self.state = DOWN
+        if not self.client.reconnect():
+            self._retry_at = time.monotonic() + self.interval
+        else:
+            host, port = self.client.active
+            where = " (secondary server)" if self.client.active != (self.client.host, self.client.port) else ""
+            if previous and self.client.active != previous:
+                self.on_change(DEGRADED, f"Robot link switched to {host}:{port}{where}")
+            else:
+                self.on_change(DEGRADED, f"Robot link re-established to {host}:{port}{where}")
+            self.state = DEGRADED
+    
+    def quality(self, now=None):
+        """Current link quality: GOOD, DEGRADED or DOWN."""
+        if self.state == DOWN:
+            return DOWN
+        now = time.monotonic() if now is None else now
+        if self.last_lost is not None and now - self.last_lost < self.recent:
+            return DEGRADED
+        if self.rtt.count and self.rtt.percentile(99) > self.degraded_rtt:
+            return DEGRADED
+        return GOOD
+    
+    def _update_state(self):
+        quality = self.quality()
+        if quality != self.state:
+            self.state = quality
+            self.on_change(quality, f"Robot link {quality} ({self.describe()})")
+    
+    def describe(self):
+        """Short status string (RTT percentiles, lost heartbeats, server)."""
+        parts = []
+        if self.rtt.count:
+            parts.append(f"RTT {self.rtt.percentile(50) * 1000:.0f}/{self.rtt.percentile(99) * 1000:.0f} ms")
+        if self.lost:
+            parts.append(f"{self.lost} lost")
+        active = self.client.active
+        if active and active != (self.client.host, self.client.port):
+            parts.append("secondary")
+        return ", ".join(parts) or "no heartbeats yet"
+    
+    def summary(self):
+        """
+        Link statistics.
+        
+        Returns:
+            dict: {"quality", "heartbeats", "lost", "failovers", "active", "rtt": LatencyHistogram.summary()}
+        """
+        return {"quality": self.quality(), "heartbeats": self.heartbeats, "lost": self.lost,
+                "failovers": self.client.failovers, "active": self.client.active,
+                "rtt": self.rtt.summary()}
+
+
+def main():
+    """Silence a simulated primary server and measure detection and failover time."""
+    import argparse
+    from sim_robot_server import SimRobotServer, FaultProfile
+    
+    parser = argparse.ArgumentParser(description="Robot link health demo")
+    parser.add_argument("--interval", type=float, default=0.5, help="Idle seconds before a heartbeat")
+    parser.add_argument("--dead-after", type=float, default=2.0, help="Dead-link bound (seconds)")
+    args = parser.parse_args()
+    
+    primary = SimRobotServer(port=0, speed=0.0, latency=0.005, jitter=0.003)
+    secondary = SimRobotServer(port=0, speed=0.0, latency=0.005, jitter=0.003)
+    primary.start()
+    secondary.start()
+    
+    events = []
+    client = RobotClient("127.0.0.1", primary.port, timeout=30.0,
+                         secondary=f"127.0.0.1:{secondary.port}", dead_after=args.dead_after)
+    client.connect()
+    monitor = LinkMonitor(client, interval=args.interval, dead_after=args.dead_after,
+                          on_change=lambda quality, message: events.append((time.monotonic(), quality, message)))
+    monitor.start()
+    
+    time.sleep(args.interval * 6)
+    print(f"Before failure: {monitor.quality()} ({monitor.describe()})")
+    # The primary stops answering (like a dropped Wi-Fi link) and refuses new connections
+    killed = time.monotonic()
+    primary.faults = FaultProfile(hang_rate=1.0, hang_seconds=3600.0)
+    primary.stop()
+    deadline = killed + args.interval + args.dead_after + 5.0
+    while client.active != (client.host, secondary.port) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    switched = time.monotonic()
+    
+    for at, quality, message in events:
+        if at >= killed:
+            print(f"  +{at - killed:5.2f} s  {quality:<9} {message}")
+    response = client.get_pose()
+    print(f"Failover after {switched - killed:.2f} s (bound {args.interval + args.dead_after:.1f} s); "
+          f"get_pose on the new link: {response.get('status') if response else None}")
+    monitor.stop()
+    client.disconnect()
+    secondary.stop()
+    print(f"Link summary: {monitor.summary()}")
+
+
+if __name__ == "__main__":
+    main()
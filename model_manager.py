@@ -0,0 +1,320 @@
+"""
+Model Manager - Hot-swap and shadow evaluation of YOLO models
+
+Deploying a new yolo.pt used to mean stopping the camera, replacing the
+file and restarting. The manager instead:
+1. loads a candidate model on a background thread
+2. warms it up with dummy inferences (first-call allocations, kernel
+   selection) so the first real frame is not slow
+3. swaps it in atomically: the camera loop reads the live model once per
+   frame, so the swap always lands between frames
+4. optionally runs the candidate in shadow mode: every Nth frame is also
+   sent to a low-priority worker that runs the candidate on the same raw
+   frame and logs its per-region decisions and latency next to the live
+   model's (JSON lines in audit/shadow_<version>.jsonl)
+
+The shadow queue holds a single frame; if the worker is still busy the
+frame is skipped, so shadow evaluation never slows the live pipeline.
+"""
+
+import os
+import json
+import time
+import queue
+import threading
+import contextlib
+from collections import deque
+import numpy as np
+from audit_store import model_version
+
+
+DEFAULT_SHADOW_DIR = "audit"
+
+
+def load_yolo(path):
+    """Load an ultralytics YOLO model (imported lazily)."""
+    from ultralytics import YOLO
+    return YOLO(path)
+
+
+class ModelSlot:
+    """
+    A loaded model with its identity and warm-up cost.
+    """
+    
+    __slots__ = ("model", "path", "version", "warmup_ms")
+    
+    def __init__(self, model, path, version, warmup_ms=None):
+        self.model = model
+        self.path = path
+        self.version = version
+        self.warmup_ms = warmup_ms
+
+
+class ModelManager:
+    """
+    Owns the live model, a background-loaded candidate and shadow evaluation.
+    """
+    
+    def __init__(self, loader=load_yolo, imgsz=640, warmup_runs=2, shadow_every=10,
+                 shadow_dir=DEFAULT_SHADOW_DIR, on_event=None, on_thread_start=None, load_context=None):
+        """
+        Initialize the manager.
+        
+        Args:
+            loader (callable): loader(path) → model.
+            imgsz (int): Inference size used for warm-up.
+            warmup_runs (int): Dummy inferences after loading.
+            shadow_every (int): Shadow-evaluate one frame in this many.
+            shadow_dir (str): Directory for shadow logs.
+            on_event (callable): on_event(level, message) for the activity log.
+            on_thread_start (callable): Called first on the shadow thread
+                (e.g. to pin it to the background cores).
+            load_context (callable): load_context() → context manager wrapped
+                around each load and warm-up (e.g. to build the inference
+                library's thread pool on the camera cores).
+        """
+        self.loader = loader
+        self.imgsz = imgsz
+        self.warmup_runs = warmup_runs
+        self.shadow_every = shadow_every
+        self.shadow_dir = shadow_dir
+        self.on_event = on_event or (lambda level, message: print(f"[{level}] {message}"))
+        self.on_thread_start = on_thread_start
+        self.load_context = load_context or contextlib.nullcontext
+        
+        self.live = None
+        self.candidate = None
+        self.loading = False
+        self._lock = threading.Lock()
+        
+        self.shadow_enabled = False
+        self._shadow_queue = queue.Queue(maxsize=1)
+        self._shadow_thread = None
+        self._shadow_frames = 0
+        self.shadow_stats = None
+    
+    def warmup(self, model):
+        """
+        Run dummy inferences so the first real frame is not penalised.
+        
+        Returns:
+            float: Duration of the last warm-up inference (ms).
+        """
+        dummy = np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        elapsed = None
+        for _ in range(self.warmup_runs):
+            start = time.perf_counter()
+            model(dummy, imgsz=self.imgsz, verbose=False)
+            elapsed = (time.perf_counter() - start) * 1000
+        return elapsed
+    
+    def _load(self, path):
+        """Load and warm a model."""
+        with self.load_context():
+            model = self.loader(path)
+            return ModelSlot(model, path, model_version(path), self.warmup(model))
+    
+    def load_live(self, path):
+        """
+        Load the live model synchronously (startup).
+        
+        Returns:
+            ModelSlot: The new live model.
+        """
+        slot = self._load(path)
+        with self._lock:
+            self.live = slot
+        return slot
+    
+    def load_candidate(self, path, on_ready=None):
+        """
+        Load and warm a candidate model in the background.
+        
+        Args:
+            path (str): Model file.
+            on_ready (callable): on_ready(slot or None) when done.
+        
+        Returns:
+            bool: False if a load is already in progress.
+        """
+        if self.loading:
+            return False
+        self.loading = True
+        
+        def worker():
+            slot = None
+            try:
+                slot = self._load(path)
+                with self._lock:
+                    self.candidate = slot
+                    self.shadow_stats = self._new_stats()
+                self.on_event("SUCCESS", f"Candidate {slot.version} ready "
+                                         f"(warm-up inference {slot.warmup_ms:.0f} ms)")
+            except Exception as e:
+                self.on_event("ERROR", f"Failed to load candidate {path}: {e}")
+            finally:
+                self.loading = False
+            if on_ready:
+                on_ready(slot)
+        
+        threading.Thread(target=worker, name="model-load", daemon=True).start()
+        return True
+    
+    def promote(self):
+        """
+        Make the candidate the live model.
+        
+        Returns:
+            ModelSlot: The new live model, or None if there is no candidate.
+        """
+        with self._lock:
+            if self.candidate is None:
+                return None
+            previous = self.live
+            self.live, self.candidate = self.candidate, None
+            self.shadow_enabled = False
+        self.on_event("SUCCESS", f"Promoted {self.live.version}"
+                                 + (f" (was {previous.version})" if previous else ""))
+        return self.live
+    
+    def reject(self):
+        """Drop the candidate."""
+        with self._lock:
+            candidate, self.candidate = self.candidate, None
+            self.shadow_enabled = False
+        if candidate:
+            self.on_event("INFO", f"Rejected candidate {candidate.version}")
+    
+    def _new_stats(self):
+        """Empty shadow statistics (latency histories are bounded)."""
+        return {"frames": 0, "regions": 0, "agree": 0, "disagreements": {},
+                "live_ms": deque(maxlen=5000), "candidate_ms": deque(maxlen=5000)}
+    
+    def set_shadow(self, enabled, detect=None):
+        """
+        Enable or disable shadow evaluation of the candidate.
+        
+        Args:
+            enabled (bool): Shadow mode on/off.
+            detect (callable): detect(model, frame, regions, imgsz) → pieces,
+                called on the shadow worker (use a dedicated preprocessor);
+                imgsz is the live model's input size for that frame.
+        
+        Returns:
+            bool: False if shadow mode was requested without a candidate.
+        """
+        if enabled and self.candidate is None:
+            return False
+        if enabled and (self._shadow_thread is None or not self._shadow_thread.is_alive()):
+            self._shadow_thread = threading.Thread(target=self._shadow_loop, args=(detect,),
+                                                   name="model-shadow", daemon=True)
+            self._shadow_thread.start()
+        self.shadow_enabled = enabled
+        return True
+    
+    def submit(self, frame, regions, live_pieces, live_seconds, imgsz=None):
+        """
+        Offer a processed frame for shadow evaluation (called by the camera loop).
+        
+        Args:
+            frame (ndarray): Raw BGR frame (copied only if accepted).
+            regions (dict): {piece_id: (x1, y1, x2, y2)}
+            live_pieces (dict): Live model decisions for the frame.
+            live_seconds (float): Live model processing time.
+            imgsz (int): Input size the live model ran at (the candidate runs
+                at the same size, so agreement and latency are comparable;
+                None = self.imgsz).
+        """
+        if not self.shadow_enabled or self.candidate is None:
+            return
+        self._shadow_frames += 1
+        if self._shadow_frames % self.shadow_every:
+            return
+        try:
+            self._shadow_queue.put_nowait((frame.copy(), dict(regions), live_pieces, live_seconds,
+                                           imgsz or self.imgsz))
+        except queue.Full:
+            pass  # Worker busy; skip this frame rather than queue up
+    
+    def _shadow_loop(self, detect):
+        """Shadow worker (low OS priority where supported)."""
+        if self.on_thread_start:
+            self.on_thread_start()
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+        except (AttributeError, OSError):
+            pass
+        
+        while True:
+            frame, regions, live_pieces, live_seconds, imgsz = self._shadow_queue.get()
+            candidate = self.candidate
+            if candidate is None or not self.shadow_enabled:
+                continue
+            start = time.perf_counter()
+            try:
+                pieces = detect(candidate.model, frame, regions, imgsz)
+            except Exception as e:
+                self.on_event("ERROR", f"Shadow inference failed: {e}")
+                continue
+            candidate_seconds = time.perf_counter() - start
+            self._log_shadow(candidate, live_pieces, live_seconds, pieces, candidate_seconds, imgsz)
+    
+    def _log_shadow(self, candidate, live_pieces, live_seconds, pieces, candidate_seconds, imgsz):
+        """Compare one shadow frame with the live decisions and append it to the log."""
+        live = self.live
+        stats = self.shadow_stats
+        changed = []
+        for pid, piece in pieces.items():
+            live_status = live_pieces.get(pid, {}).get("status")
+            stats["regions"] += 1
+            if piece["status"] == live_status:
+                stats["agree"] += 1
+            else:
+                changed.append(pid)
+                stats["disagreements"][pid] = stats["disagreements"].get(pid, 0) + 1
+        stats["frames"] += 1
+        stats["live_ms"].append(live_seconds * 1000)
+        stats["candidate_ms"].append(candidate_seconds * 1000)
+        
+        record = {
+            "ts": time.time(),
+            "live": live.version if live else None,
+            "candidate": candidate.version,
+            "live_ms": round(live_seconds * 1000, 2),
+            "candidate_ms": round(candidate_seconds * 1000, 2),
+            "imgsz": imgsz,
+            "changed": changed,
+            "regions": {str(pid): {"live": live_pieces.get(pid, {}).get("status"),
+                                   "live_conf": live_pieces.get(pid, {}).get("confidence"),
+                                   "candidate": piece["status"],
+                                   "candidate_conf": piece["confidence"]}
+                        for pid, piece in pieces.items()},
+        }
+        os.makedirs(self.shadow_dir, exist_ok=True)
+        path = os.path.join(self.shadow_dir, f"shadow_{candidate.version}.jsonl")
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    
+    def shadow_summary(self):
+        """
+        Summarise the shadow run so far.
+        
+        Returns:
+            dict: {"frames", "agreement", "disagreements", "live_ms",
+            "candidate_ms", "live_p95_ms", "candidate_p95_ms"} or None.
+        """
+        stats = self.shadow_stats
+        if not stats or not stats["frames"]:
+            return None
+        live_ms = np.asarray(stats["live_ms"])
+        candidate_ms = np.asarray(stats["candidate_ms"])
+        return {
+            "frames": stats["frames"],
+            "agreement": stats["agree"] / max(stats["regions"], 1),
+            "disagreements": dict(stats["disagreements"]),
+            "live_ms": float(live_ms.mean()),
+            "candidate_ms": float(candidate_ms.mean()),
+            "live_p95_ms": float(np.percentile(live_ms, 95)),
+            "candidate_p95_ms": float(np.percentile(candidate_ms, 95)),
+        }
@@ -0,0 +1,325 @@
+"""
+Region Overlay - Cached drawing of the fixed piece region boxes and labels
+
+The region geometry never changes while the camera runs, only the GOOD/BAD
+status of each region does. Instead of calling cv2.rectangle / cv2.putText
+for every region on every frame, this module pre-renders each region's box
+and label once per status into small sprites with masks, keeps a composed
+overlay layer for the whole frame, and only re-composes the cells whose
+status changed. Applying the overlay to a frame is a single masked copy.
+
+Run this file directly to benchmark drawing cost per frame:
+    python3 overlay.py
+"""
+
+import time
+import numpy as np
+import cv2
+
+
+# Status → BGR color used for region boxes and label backgrounds
+STATUS_COLORS = {
+    "GOOD": (0, 255, 0),
+    "BAD": (0, 0, 255),
+}
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+FONT_SCALE = 0.7
+FONT_THICKNESS = 2
+BOX_THICKNESS = 3
+
+
+def draw_region(frame, piece_id, region, status, origin=(0, 0), color=None):
+    """
+    Draw one region box and its label onto an image.
+    
+    Args:
+        frame (ndarray): Image to draw on (modified in place).
+        piece_id (int): Visual piece ID shown in the label.
+        region (tuple): (x1, y1, x2, y2) in frame coordinates.
+        status (str): "GOOD" or "BAD".
+        origin (tuple): (x, y) frame coordinate of frame[0, 0], used when
+            drawing into a sprite cut out of a larger frame.
+        color (tuple): Override color (used to draw masks).
+    """
+    ox, oy = origin
+    rx1, ry1, rx2, ry2 = region
+    rx1, ry1, rx2, ry2 = rx1 - ox, ry1 - oy, rx2 - ox, ry2 - oy
+    
+    if color is None:
+        color = STATUS_COLORS.get(status, (255, 255, 0))
+        text_color = (255, 255, 255)
+    else:
+        text_color = color
+    
+    # Draw region box
+    cv2.rectangle(frame, (rx1, ry1), (rx2, ry2), color, BOX_THICKNESS)
+    
+    # Draw label
+    label = f"Piece {piece_id}: {status}"
+    label_size, _ = cv2.getTextSize(label, FONT, FONT_SCALE, FONT_THICKNESS)
+    cv2.rectangle(frame, (rx1, ry1 - label_size[1] - 10),
+                  (rx1 + label_size[0], ry1), color, -1)
+    cv2.putText(frame, label, (rx1, ry1 - 5),
+                FONT, FONT_SCALE, text_color, FONT_THICKNESS)
+
+
+def draw_regions_naive(frame, regions, statuses):
+    """
+    Reference implementation: draw every region directly, every frame.
+    
+    Args:
+        frame (ndarray): BGR frame (modified in place).
+        regions (dict): {piece_id: (x1, y1, x2, y2)}
+        statuses (dict): {piece_id: "GOOD"/"BAD"}
+    """
+    for piece_id, region in regions.items():
+        draw_region(frame, piece_id, region, statuses.get(piece_id, "GOOD"))
+
+
+def draw_tracks(frame, tracks):
+    """
+    Draw free-placement tracks (geometry changes every frame, so no caching).
+    
+    Args:
+        frame (ndarray): BGR frame (modified in place).
+        tracks (dict): {track_id: {"box": (x1, y1, x2, y2), "status": ...}}
+    """
+    for track_id, track in tracks.items():
+        draw_region(frame, track_id, track["box"], track["status"])
+
+
+class RegionOverlay:
+    """
+    Pre-rendered overlay of the fixed piece regions.
+    
+    Usage:
+        overlay = RegionOverlay(piece_regions)
+        overlay.render(frame, {1: "GOOD", 2: "BAD", ...})
+    """
+    
+    def __init__(self, regions, statuses=("GOOD", "BAD")):
+        """
+        Initialize the overlay.
+        
+        Args:
+            regions (dict): {piece_id: (x1, y1, x2, y2)} in frame coordinates.
+            statuses (tuple): All statuses a region can take.
+        """
+        self.regions = dict(regions)
+        self.statuses = tuple(statuses)
+        
+        self.frame_shape = None
+        self.cells = {}  # {piece_id: {"rect": (x1, y1, x2, y2), "sprites": {status: (img, mask)}}}
+        self.layer = None  # Composed BGR overlay for the whole frame
+        self.mask = None   # uint8 mask (0/255) of overlay pixels
+        self.roi = None    # (y1, y2, x1, x2) bounding all cells
+        self.current = {}  # {piece_id: status} currently composed into the layer
+    
+    def set_regions(self, regions):
+        """Replace the region geometry (e.g. after recalibration)."""
+        self.regions = dict(regions)
+        self.frame_shape = None
+    
+    def _cell_rect(self, piece_id, region, height, width):
+        """Bounding rectangle of a region's box + label, clipped to the frame."""
+        rx1, ry1, rx2, ry2 = region
+        label_w, label_h = 0, 0
+        for status in self.statuses:
+            label = f"Piece {piece_id}: {status}"
+            (w, h), _ = cv2.getTextSize(label, FONT, FONT_SCALE, FONT_THICKNESS)
+            label_w = max(label_w, w)
+            label_h = max(label_h, h + 10)
+        pad = BOX_THICKNESS
+        x1 = max(0, min(rx1, rx2) - pad)
+        y1 = max(0, min(ry1 - label_h, ry2) - pad)
+        x2 = min(width, max(rx2, rx1 + label_w) + pad + 1)
+        y2 = min(height, max(ry1, ry2) + pad + 1)
+        return x1, y1, x2, y2
+    
+    def prepare(self, frame_shape):
+        """
+        Pre-render sprites and masks for every region and status.
+        
+        Args:
+            frame_shape (tuple): Shape of the frames that will be rendered.
+        """
+        height, width = frame_shape[:2]
+        self.frame_shape = tuple(frame_shape)
+        self.cells = {}
+        
+        for piece_id, region in self.regions.items():
+            x1, y1, x2, y2 = self._cell_rect(piece_id, region, height, width)
+            if x2 <= x1 or y2 <= y1:
+                continue  # Region entirely outside the frame
+            
+            sprites = {}
+            for status in self.statuses:
+                img = np.zeros((y2 - y1, x2 - x1, 3), dtype=np.uint8)
+                mask = np.zeros((y2 - y1, x2 - x1), dtype=np.uint8)
+                draw_region(img, piece_id, region, status, origin=(x1, y1))
+                draw_region(mask, piece_id, region, status, origin=(x1, y1), color=255)
+                sprites[status] = (img, mask)
+            self.cells[piece_id] = {"rect": (x1, y1, x2, y2), "sprites": sprites}
+        
+        self.layer = np.zeros((height, width, 3), dtype=np.uint8)
+        self.mask = np.zeros((height, width), dtype=np.uint8)
+        self.current = {}
+        
+        if self.cells:
+            rects = [cell["rect"] for cell in self.cells.values()]
+            self.roi = (min(r[1] for r in rects), max(r[3] for r in rects),
+                        min(r[0] for r in rects), max(r[2] for r in rects))
+        else:
+            self.roi = (0, 0, 0, 0)
+    
+    def _compose(self, rect, statuses):
+        """Rebuild the overlay layer inside rect from all cells overlapping it."""
+        x1, y1, x2, y2 = rect
+        self.layer[y1:y2, x1:x2] = 0
+        self.mask[y1:y2, x1:x2] = 0
+        
+        # Re-apply cells in region order so overlaps stack like direct drawing
+        for piece_id, cell in self.cells.items():
+            cx1, cy1, cx2, cy2 = cell["rect"]
+            ix1, iy1 = max(x1, cx1), max(y1, cy1)
+            ix2, iy2 = min(x2, cx2), min(y2, cy2)
+            if ix2 <= ix1 or iy2 <= iy1:
+                continue
+            
+            status = statuses.get(piece_id, self.statuses[0])
+            img, mask = cell["sprites"].get(status, cell["sprites"][self.statuses[0]])
+            sy, sx = slice(iy1 - cy1, iy2 - cy1), slice(ix1 - cx1, ix2 - cx1)
+            cell_mask = mask[sy, sx]
+            cv2.copyTo(img[sy, sx], cell_mask, self.layer[iy1:iy2, ix1:ix2])
+            layer_mask = self.mask[iy1:iy2, ix1:ix2]
+            cv2.bitwise_or(layer_mask, cell_mask, dst=layer_mask)
+    
+    def update(self, statuses):
+        """
+        Re-compose only the cells whose status changed.
+        
+        Args:
+            statuses (dict): {piece_id: status}
+        
+        Returns:
+            int: Number of cells re-composed.
+        """
+        changed = [pid for pid in self.cells
+                   if statuses.get(pid, self.statuses[0]) != self.current.get(pid)]
+        for piece_id in changed:
+            self._compose(self.cells[piece_id]["rect"], statuses)
+        for piece_id in changed:
+            self.current[piece_id] = statuses.get(piece_id, self.statuses[0])
+        return len(changed)
+    
+    def render(self, frame, statuses):
+        """
+        Draw the overlay onto a frame.
+        
+        Args:
+            frame (ndarray): BGR frame (modified in place).
+            statuses (dict): {piece_id: status}
+        
+        Returns:
+            ndarray: The same frame, for chaining.
+        """
+        if self.frame_shape != frame.shape:
+            self.prepare(frame.shape)
+        
+        self.update(statuses)
+        
+        # Masked copy writes straight into the frame view
+        y1, y2, x1, x2 = self.roi
+        cv2.copyTo(self.layer[y1:y2, x1:x2], self.mask[y1:y2, x1:x2], frame[y1:y2, x1:x2])
+        return frame
+
+
+def grid_regions(count, frame_size=(1280, 720)):
+    """
+    Build a synthetic grid of regions for benchmarking.
+    
+    Args:
+        count (int): Number of regions.
+        frame_size (tuple): (width, height) of the frame.
+    
+    Returns:
+        dict: {piece_id: (x1, y1, x2, y2)}
+    """
+    width, height = frame_size
+    cols = int(np.ceil(np.sqrt(count * width / height)))
+    rows = int(np.ceil(count / cols))
+    cell_w, cell_h = width // cols, (height - 30) // rows
+    regions = {}
+    for i in range(count):
+        r, c = divmod(i, cols)
+        x1, y1 = c * cell_w, 30 + r * cell_h
+        regions[i + 1] = (x1, y1, x1 + cell_w, y1 + cell_h)
+    return regions
+
+
+def benchmark(count, frame_size=(1280, 720), frames=200):
+    """
+    Measure per-frame overlay cost: direct drawing vs cached compositor.
+    
+    Args:
+        count (int): Number of regions.
+        frame_size (tuple): (width, height) of the frame.
+        frames (int): Frames per measurement.
+    
+    Returns:
+        dict: Milliseconds per frame for each method.
+    """
+    width, height = frame_size
+    regions = grid_regions(count, frame_size)
+    source = np.random.randint(0, 255, (height, width, 3), dtype=np.uint8)
+    frame = source.copy()
+    rng = np.random.default_rng(0)
+    statuses = {pid: "GOOD" for pid in regions}
+    results = {}
+    
+    start = time.perf_counter()
+    for _ in range(frames):
+        frame[:] = source
+        draw_regions_naive(frame, regions, statuses)
+    results["direct"] = (time.perf_counter() - start) * 1000 / frames
+    
+    overlay = RegionOverlay(regions)
+    start = time.perf_counter()
+    overlay.prepare(frame.shape)
+    results["prepare"] = (time.perf_counter() - start) * 1000
+    overlay.render(frame, statuses)
+    
+    start = time.perf_counter()
+    for _ in range(frames):
+        frame[:] = source
+        overlay.render(frame, statuses)
+    results["cached_static"] = (time.perf_counter() - start) * 1000 / frames
+    
+    start = time.perf_counter()
+    for _ in range(frames):
+        frame[:] = source
+        pid = int(rng.integers(1, count + 1))
+        statuses[pid] = "BAD" if statuses[pid] == "GOOD" else "GOOD"
+        overlay.render(frame, statuses)
+    results["cached_one_change"] = (time.perf_counter() - start) * 1000 / frames
+    
+    # Sanity check: cached output must match direct drawing
+    expected = source.copy()
+    draw_regions_naive(expected, regions, statuses)
+    frame[:] = source
+    overlay.render(frame, statuses)
+    results["identical"] = bool(np.array_equal(frame, expected))
+    
+    return results
+
+
+if __name__ == "__main__":
+    print("Region overlay benchmark (ms per frame)")
+    print("=" * 70)
+    for count, size in ((6, (800, 600)), (96, (1280, 720))):
+        r = benchmark(count, size)
+        print(f"{count:3d} regions @ {size[0]}x{size[1]}: "
+              f"direct {r['direct']:.3f} | cached {r['cached_static']:.3f} | "
+              f"cached+1 change {r['cached_one_change']:.3f} | "
+              f"prepare {r['prepare']:.1f} | identical={r['identical']}")
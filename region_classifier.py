@@ -0,0 +1,407 @@
+"""
+Region Classifier - Fast GOOD/BAD decision per fixed piece region
+
+The six piece_regions never move, so a full object detector plus
+point-in-rectangle tests is more than the decision needs. This module
+classifies the region crops directly:
+1. all region crops of a frame are resized into one preallocated batch
+2. a small vector of classical features is computed for the whole batch
+   with NumPy (colour statistics, hue/saturation histograms, gradient
+   energy on a 3x3 grid, Laplacian sharpness, dark/bright fractions)
+3. a logistic regression gives P(BAD) per region
+
+In cascade mode only regions whose P(BAD) falls between the low and high
+thresholds are sent to YOLO; if every region is confident the detector
+is skipped for that frame.
+
+Training data comes from the audit store (snapshot frames + per-region
+decisions of each capture). The trained model is exported as a small .npz.
+
+Command line:
+    python3 region_classifier.py train                  # fit on audit captures, save region_classifier.npz
+    python3 region_classifier.py evaluate --model yolo.pt   # accuracy/throughput vs detector-only
+"""
+
+import os
+import time
+import cv2
+import numpy as np
+
+
+DEFAULT_CLASSIFIER_PATH = "region_classifier.npz"
+CROP_SIZE = 48
+GRID = 3
+
+
+def extract_features(batch):
+    """
+    Compute classical features for a batch of crops.
+    
+    Args:
+        batch (ndarray): (N, S, S, 3) uint8 BGR crops.
+    
+    Returns:
+        ndarray: (N, F) float32 features.
+    """
+    n, size = batch.shape[0], batch.shape[1]
+    if n == 0:
+        return np.zeros((0, feature_count()), dtype=np.float32)
+    x = batch.astype(np.float32) * (1.0 / 255.0)
+    flat = x.reshape(n, -1, 3)
+    
+    # Colour statistics
+    means = flat.mean(axis=1)
+    stds = flat.std(axis=1)
+    
+    # Hue/saturation histograms (one cvtColor call for the whole batch)
+    hsv = cv2.cvtColor(batch.reshape(n * size, size, 3), cv2.COLOR_BGR2HSV).reshape(n, -1, 3)
+    hue_bins = (hsv[:, :, 0].astype(np.int32) * 8) // 180
+    sat_bins = hsv[:, :, 1].astype(np.int32) // 64
+    offsets = (np.arange(n) * 8)[:, None]
+    hue_hist = np.bincount((hue_bins + offsets).ravel(), minlength=n * 8).reshape(n, 8)
+    offsets = (np.arange(n) * 4)[:, None]
+    sat_hist = np.bincount((sat_bins + offsets).ravel(), minlength=n * 4).reshape(n, 4)
+    pixels = float(size * size)
+    
+    # Gradients and sharpness on grey
+    gray = x @ np.array([0.114, 0.587, 0.299], dtype=np.float32)
+    gx = np.abs(np.diff(gray, axis=2))[:, :-1, :]
+    gy = np.abs(np.diff(gray, axis=1))[:, :, :-1]
+    magnitude = gx + gy
+    laplacian = (4 * gray[:, 1:-1, 1:-1] - gray[:, :-2, 1:-1] - gray[:, 2:, 1:-1]
+                 - gray[:, 1:-1, :-2] - gray[:, 1:-1, 2:])
+    
+    # Gradient energy per grid cell (localised defects)
+    cell = magnitude.shape[1] // GRID
+    cells = magnitude[:, :cell * GRID, :cell * GRID].reshape(n, GRID, cell, GRID, cell).mean(axis=(2, 4))
+    
+    gray_flat = gray.reshape(n, -1)
+    features = np.column_stack((
+        means, stds,
+        hue_hist / pixels, sat_hist / pixels,
+        magnitude.reshape(n, -1).mean(axis=1),
+        magnitude.reshape(n, -1).std(axis=1),
+        (magnitude > 0.1).reshape(n, -1).mean(axis=1),
+        laplacian.reshape(n, -1).var(axis=1),
+        (gray_flat < 0.2).mean(axis=1),
+        (gray_flat > 0.8).mean(axis=1),
+        cells.reshape(n, -1),
+    ))
+    return features.astype(np.float32)
+
+
+def feature_count():
+    """Length of the feature vector produced by extract_features."""
+    return 6 + 8 + 4 + 6 + GRID * GRID
+
+
+class CropBatcher:
+    """
+    Cuts region crops into a reused (N, S, S, 3) buffer.
+    """
+    
+    def __init__(self, crop_size=CROP_SIZE):
+        """
+        Initialize the batcher.
+        
+        Args:
+            crop_size (int): Side length of each resized crop.
+        """
+        self.crop_size = crop_size
+        self._batch = np.zeros((0, crop_size, crop_size, 3), dtype=np.uint8)
+    
+    def crop(self, frame, regions):
+        """
+        Resize every region of a frame into the batch buffer.
+        
+        Args:
+            frame (ndarray): BGR frame.
+            regions (list): [(x1, y1, x2, y2), ...]
+        
+        Returns:
+            ndarray: (len(regions), S, S, 3) view of the buffer.
+        """
+        n = len(regions)
+        if len(self._batch) < n:
+            self._batch = np.zeros((n, self.crop_size, self.crop_size, 3), dtype=np.uint8)
+        height, width = frame.shape[:2]
+        for i, (x1, y1, x2, y2) in enumerate(regions):
+            x1, x2 = max(0, int(x1)), min(width, int(x2))
+            y1, y2 = max(0, int(y1)), min(height, int(y2))
+            if x2 <= x1 or y2 <= y1:
+                self._batch[i] = 0
+                continue
+            cv2.resize(frame[y1:y2, x1:x2], (self.crop_size, self.crop_size),
+                       dst=self._batch[i], interpolation=cv2.INTER_AREA)
+        return self._batch[:n]
+
+
+class RegionClassifier:
+    """
+    Logistic regression on crop features, P(BAD) per region.
+    """
+    
+    def __init__(self, weights=None, bias=0.0, mean=None, std=None, crop_size=CROP_SIZE,
+                 low=0.2, high=0.8):
+        """
+        Initialize the classifier.
+        
+        Args:
+            weights (ndarray): (F,) weights (None = untrained).
+            bias (float): Bias term.
+            mean (ndarray): Feature means used for standardisation.
+            std (ndarray): Feature standard deviations.
+            crop_size (int): Crop side length the model was trained with.
+            low (float): P(BAD) at or below this is a confident GOOD.
+            high (float): P(BAD) at or above this is a confident BAD.
+        """
+        count = feature_count()
+        self.weights = np.zeros(count, dtype=np.float32) if weights is None else np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.mean = np.zeros(count, dtype=np.float32) if mean is None else np.asarray(mean, dtype=np.float32)
+        self.std = np.ones(count, dtype=np.float32) if std is None else np.asarray(std, dtype=np.float32)
+        self.low = low
+        self.high = high
+        self.batcher = CropBatcher(crop_size)
+    
+    @classmethod
+    def load(cls, path=DEFAULT_CLASSIFIER_PATH):
+        """
+        Load an exported classifier.
+        
+        Args:
+            path (str): .npz file written by save().
+        
+        Returns:
+            RegionClassifier: The classifier, or None if the file is missing.
+        """
+        if not os.path.exists(path):
+            return None
+        data = np.load(path)
+        return cls(data["weights"], float(data["bias"]), data["mean"], data["std"],
+                   int(data["crop_size"]), float(data["low"]), float(data["high"]))
+    
+    def save(self, path=DEFAULT_CLASSIFIER_PATH):
+        """Export the classifier to a .npz file."""
+        np.savez(path, weights=self.weights, bias=self.bias, mean=self.mean, std=self.std,
+                 crop_size=self.batcher.crop_size, low=self.low, high=self.high)
+    
+    def fit(self, features, labels, epochs=800, learning_rate=0.5, l2=1e-3):
+        """
+        Train with full-batch gradient descent (class-balanced).
+        
+        Args:
+            features (ndarray): (N, F) features.
+            labels (ndarray): (N,) 1 for BAD, 0 for GOOD.
+            epochs (int): Gradient steps.
+            learning_rate (float): Step size.
+            l2 (float): Weight decay.
+        
+        Returns:
+            RegionClassifier: self
+        """
+        x = np.asarray(features, dtype=np.float64)
+        y = np.asarray(labels, dtype=np.float64)
+        self.mean = x.mean(axis=0).astype(np.float32)
+        self.std = (x.std(axis=0) + 1e-6).astype(np.float32)
+        x = (x - self.mean) / self.std
+        
+        # Weight each class equally (BAD pieces are usually the minority)
+        positives = max(y.sum(), 1.0)
+        negatives = max(len(y) - y.sum(), 1.0)
+        sample_weight = np.where(y > 0.5, 0.5 / positives, 0.5 / negatives)
+        
+        w = np.zeros(x.shape[1])
+        b = 0.0
+        for _ in range(epochs):
+            p = 1.0 / (1.0 + np.exp(-(x @ w + b)))
+            error = (p - y) * sample_weight
+            w -= learning_rate * (x.T @ error + l2 * w)
+            b -= learning_rate * error.sum()
+        self.weights = w.astype(np.float32)
+        self.bias = float(b)
+        return self
+    
+    def predict_features(self, features):
+        """P(BAD) for precomputed features."""
+        z = ((features - self.mean) / self.std) @ self.weights + self.bias
+        return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+    
+    def predict(self, frame, regions):
+        """
+        Classify every region of a frame in one batch.
+        
+        Args:
+            frame (ndarray): Raw BGR frame.
+            regions (dict): {piece_id: (x1, y1, x2, y2)}
+        
+        Returns:
+            dict: {piece_id: P(BAD)}
+        """
+        ids = list(regions)
+        batch = self.batcher.crop(frame, [regions[pid] for pid in ids])
+        return dict(zip(ids, self.predict_features(extract_features(batch)).tolist()))
+    
+    def classify(self, frame, regions):
+        """
+        Per-region decisions in the same format as detection.region_statuses.
+        
+        Returns:
+            tuple: (pieces dict, list of uncertain piece IDs)
+        """
+        pieces = {}
+        uncertain = []
+        for pid, p_bad in self.predict(frame, regions).items():
+            x1, y1, x2, y2 = regions[pid]
+            pieces[pid] = {
+                "status": "BAD" if p_bad >= 0.5 else "GOOD",
+                "confidence": p_bad if p_bad >= 0.5 else 1.0 - p_bad,
+                "centroid": ((x1 + x2) / 2, (y1 + y2) / 2),
+                "detections": None,  # Classifier cannot tell an empty slot
+            }
+            if self.low < p_bad < self.high:
+                uncertain.append(pid)
+        return pieces, uncertain
+
+
+def cascade_regions(classifier, model, preprocessor, frame, regions, conf_thresh):
+    """
+    Classifier first; YOLO only when some region is uncertain.
+    
+    Args:
+        classifier (RegionClassifier): Trained classifier.
+        model: Loaded YOLO model.
+        preprocessor (FramePreprocessor): Preprocessor for the YOLO path.
+        frame (ndarray): Raw BGR frame.
+        regions (dict): {piece_id: (x1, y1, x2, y2)}
+        conf_thresh (float): YOLO confidence threshold.
+    
+    Returns:
+        tuple: (pieces dict, adjusted frame for display, uncertain piece IDs)
+    """
+    from detection import detect_regions
+    
+    start = time.perf_counter()
+    pieces, uncertain = classifier.classify(frame, regions)
+    preprocessor.record("classifier", time.perf_counter() - start)
+    if not uncertain:
+        return pieces, preprocessor.adjust(frame), uncertain
+    
+    detected, prepared = detect_regions(model, preprocessor, frame, regions, conf_thresh)
+    for pid in uncertain:
+        pieces[pid] = detected[pid]
+    return pieces, prepared.adjusted, uncertain
+
+
+def load_dataset(store, since=None, limit=1000, crop_size=CROP_SIZE):
+    """
+    Build features and labels from audit store captures.
+    
+    Args:
+        store (AuditStore): Audit store with snapshot frames.
+        since (float): Only captures after this epoch time.
+        limit (int): Maximum number of captures.
+        crop_size (int): Crop side length.
+    
+    Returns:
+        tuple: (features (N, F), labels (N,), [(capture_id, piece_id)], frames)
+        where frames is [(capture_id, frame, regions, recorded)] for replay.
+    """
+    batcher = CropBatcher(crop_size)
+    features, labels, keys, frames = [], [], [], []
+    for capture in reversed(store.query_captures(since=since, limit=limit)):
+        frame = store.load_frame(capture["capture_id"])
+        if frame is None:
+            continue
+        regions, recorded = {}, {}
+        for row in store.query_regions(capture_id=capture["capture_id"]):
+            if row["x1"] is None:
+                continue
+            regions[row["piece_id"]] = (row["x1"], row["y1"], row["x2"], row["y2"])
+            recorded[row["piece_id"]] = row["status"]
+        if not regions:
+            continue
+        ids = sorted(regions)
+        features.append(extract_features(batcher.crop(frame, [regions[pid] for pid in ids])))
+        labels.extend(1 if recorded[pid] == "BAD" else 0 for pid in ids)
+        keys.extend((capture["capture_id"], pid) for pid in ids)
+        frames.append((capture["capture_id"], frame, regions, recorded))
+    if not features:
+        return np.zeros((0, feature_count()), dtype=np.float32), np.zeros(0), [], []
+    return np.concatenate(features), np.asarray(labels), keys, frames
+
+
+def main():
+    """Train and evaluate the region classifier from the audit store."""
+    import argparse
+    from audit_store import AuditStore, DEFAULT_DB_PATH, parse_since
+    
+    parser = argparse.ArgumentParser(description="Per-region GOOD/BAD crop classifier")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Audit database path")
+    parser.add_argument("--classifier", default=DEFAULT_CLASSIFIER_PATH)
+    parser.add_argument("--since", help="e.g. 7d or epoch seconds")
+    parser.add_argument("--limit", type=int, default=1000, help="Maximum captures")
+    sub = parser.add_subparsers(dest="action", required=True)
+    train_parser = sub.add_parser("train", help="Fit on audit captures and export")
+    train_parser.add_argument("--holdout", type=float, default=0.2, help="Newest fraction kept for validation")
+    eval_parser = sub.add_parser("evaluate", help="Compare with detector-only mode on replay data")
+    eval_parser.add_argument("--model", default="yolo.pt")
+    eval_parser.add_argument("--conf", type=float, default=0.3)
+    args = parser.parse_args()
+    
+    store = AuditStore(args.db)
+    since = parse_since(args.since) if args.since else None
+    features, labels, keys, frames = load_dataset(store, since, args.limit)
+    if not len(labels):
+        print("No captures with snapshots and region geometry in the audit store")
+        return
+    
+    if args.action == "train":
+        split = int(len(labels) * (1 - args.holdout))
+        classifier = RegionClassifier().fit(features[:split], labels[:split])
+        if split < len(labels):
+            p = classifier.predict_features(features[split:])
+            accuracy = ((p >= 0.5) == (labels[split:] > 0)).mean()
+            confident = ((p <= classifier.low) | (p >= classifier.high)).mean()
+            print(f"Holdout: {len(labels) - split} regions, accuracy {accuracy * 100:.1f}%, "
+                  f"{confident * 100:.0f}% confident")
+        classifier = RegionClassifier().fit(features, labels)
+        classifier.save(args.classifier)
+        print(f"Trained on {len(labels)} regions ({int(labels.sum())} BAD) → {args.classifier}")
+        return
+    
+    classifier = RegionClassifier.load(args.classifier)
+    if classifier is None:
+        print(f"{args.classifier} not found; run 'train' first")
+        return
+    
+    from ultralytics import YOLO
+    from preprocess import FramePreprocessor
+    from detection import detect_regions
+    
+    model = YOLO(args.model)
+    preprocessor = FramePreprocessor()
+    modes = {
+        "detector": lambda f, r: detect_regions(model, preprocessor, f, r, args.conf)[0],
+        "classifier": lambda f, r: classifier.classify(f, r)[0],
+        "cascade": lambda f, r: cascade_regions(classifier, model, preprocessor, f, r, args.conf)[0],
+    }
+    # Warm up the detector once so the first replay frame is not penalised
+    modes["detector"](frames[0][1], frames[0][2])
+    
+    print(f"Replay of {len(frames)} captures ({len(labels)} regions), labels = recorded decisions")
+    print("=" * 70)
+    for name, run in modes.items():
+        correct = total = 0
+        start = time.perf_counter()
+        for _, frame, regions, recorded in frames:
+            pieces = run(frame, regions)
+            correct += sum(pieces[pid]["status"] == recorded[pid] for pid in regions)
+            total += len(regions)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>10}: accuracy {correct / total * 100:5.1f}%  "
+              f"{elapsed / len(frames) * 1000:7.1f} ms/frame  {len(frames) / elapsed:6.1f} frames/s")
+
+
+if __name__ == "__main__":
+    main()
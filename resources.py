@@ -0,0 +1,286 @@
+"""
+Resource Manager - Thread budgets and CPU affinity per pipeline stage
+
+On a 4-core Pi the torch intra-op pool, OpenCV's thread pool, the Tk
+mainloop, the camera thread and the sorting thread all compete for the same
+cores, which shows up as p99 inference spikes and UI stutter. A profile
+assigns each stage a set of cores and each library a thread budget:
+
+    stage        runs                                      "latency" profile (4 cores)
+    ui           Tk mainloop (and threads it starts)       core 0
+    robot        sorting / conveyor threads                core 0
+    background   writers, telemetry, shadow worker         core 0, nice +10
+    camera       capture + preprocessing + inference       cores 1-3, torch 3 threads,
+                                                           OpenCV 1 thread
+
+"throughput" gives the camera stage every core and larger pools (best
+frames/s, worse tails); "default" changes nothing.
+
+Threads inherit the affinity of the thread that creates them, so pinning the
+camera thread before its first inference also confines torch's worker pool.
+ONNX Runtime and OpenVINO exports (chosen by autotune.py) build their pools
+when the model is loaded and warmed up, and ultralytics offers no way to size
+them, so models are loaded inside pinned("camera"): the pools then stay on
+the inference cores. Affinity uses os.sched_setaffinity (Linux); elsewhere
+only the thread budgets are applied.
+
+Run this file directly to compare p50/p99 latency across profiles with a
+synthetic inference / UI / background load:
+    python3 resources.py
+"""
+
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+import numpy as np
+import cv2
+
+
+PROFILES = ("default", "latency", "throughput")
+
+
+def available_cores():
+    """Cores this process may run on."""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+class ResourceManager:
+    """
+    Applies a resource profile: library thread budgets and per-stage affinity.
+    """
+    
+    def __init__(self, profile="latency", cores=None, on_event=None):
+        """
+        Initialize the manager.
+        
+        Args:
+            profile (str): "default", "latency" or "throughput".
+            cores (list): Cores to distribute (defaults to the process affinity).
+            on_event (callable): on_event(level, message) for the activity log.
+        """
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown resource profile {profile!r} (expected one of {PROFILES})")
+        self.profile = profile
+        self.cores = list(cores) if cores else available_cores()
+        self.on_event = on_event or (lambda level, message: print(f"[{level}] {message}"))
+        self.stages, self.budgets, self.nice = self.plan()
+    
+    def plan(self):
+        """
+        Compute the stage → cores map and the thread budgets.
+        
+        Returns:
+            tuple: ({stage: [cores] or None}, {"torch", "cv2": threads or None},
+            {stage: nice increment})
+        """
+        cores = self.cores
+        if self.profile == "default":
+            return ({stage: None for stage in ("ui", "robot", "background", "camera")},
+                    {"torch": None, "cv2": None}, {})
+        
+        if self.profile == "latency":
+            control = cores[:1]
+            inference = cores[1:] or cores  # Single core: nothing to separate
+            stages = {"ui": control, "robot": control, "background": control, "camera": inference}
+            budgets = {"torch": len(inference), "cv2": 1}
+            return stages, budgets, {"background": 10}
+        
+        stages = {"ui": None, "robot": None, "background": None, "camera": cores}
+        budgets = {"torch": len(cores), "cv2": len(cores)}
+        return stages, budgets, {"background": 10}
+    
+    def apply_process(self):
+        """
+        Set library thread budgets (call before the model is loaded).
+        
+        OMP/MKL variables only take effect if torch has not been imported
+        yet, so they are set here and torch is also configured directly
+        once loaded (apply_inference_threads).
+        """
+        threads = self.budgets["torch"]
+        if threads:
+            for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+                os.environ.setdefault(name, str(threads))  # An explicit setting wins
+        if self.budgets["cv2"]:
+            cv2.setNumThreads(self.budgets["cv2"])
+        self.apply_inference_threads()
+    
+    def apply_inference_threads(self):
+        """Set the torch intra-op pool size if torch is loaded (after the model loads)."""
+        threads = self.budgets["torch"]
+        torch = sys.modules.get("torch")
+        if threads and torch is not None:
+            try:
+                torch.set_num_threads(threads)
+            except RuntimeError as e:
+                self.on_event("WARNING", f"Could not set torch threads: {e}")
+    
+    def pin(self, stage):
+        """
+        Pin the calling thread to its stage's cores (and nice level).
+        
+        Args:
+            stage (str): "ui", "robot", "background" or "camera".
+        
+        Returns:
+            bool: True if an affinity was applied.
+        """
+        nice = self.nice.get(stage)
+        if nice:
+            try:
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), nice)
+            except (AttributeError, OSError):
+                pass
+        cores = self.stages.get(stage)
+        if not cores:
+            return False
+        try:
+            os.sched_setaffinity(0, cores)  # 0 = the calling thread on Linux
+            return True
+        except (AttributeError, OSError) as e:
+            self.on_event("WARNING", f"Could not pin {stage} to cores {cores}: {e}")
+            return False
+    
+    @contextmanager
+    def pinned(self, stage):
+        """
+        Run a block on a stage's cores, then restore the calling thread's affinity.
+        
+        Thread pools created inside the block keep the stage's cores (used to
+        load and warm up models, see the module docstring).
+        
+        Args:
+            stage (str): "ui", "robot", "background" or "camera".
+        """
+        cores = self.stages.get(stage)
+        try:
+            previous = os.sched_getaffinity(0) if cores else None
+        except AttributeError:
+            previous = None  # No affinity control on this platform
+        if previous is None:
+            yield
+            return
+        try:
+            os.sched_setaffinity(0, cores)
+        except OSError as e:
+            self.on_event("WARNING", f"Could not pin {stage} to cores {cores}: {e}")
+            yield
+            return
+        try:
+            yield
+        finally:
+            os.sched_setaffinity(0, previous)
+    
+    def describe(self):
+        """Short status string for the activity log."""
+        stages = ", ".join(f"{stage} {','.join(map(str, cores)) if cores else 'any'}"
+                           for stage, cores in self.stages.items())
+        budgets = ", ".join(f"{name} {threads or 'default'}" for name, threads in self.budgets.items())
+        return f"{self.profile}: cores [{stages}], threads [{budgets}]"
+
+
+def _percentiles(values):
+    values = np.asarray(values) * 1000
+    if not len(values):
+        return 0.0, 0.0
+    return float(np.percentile(values, 50)), float(np.percentile(values, 99))
+
+
+def benchmark(profile, seconds=5.0, frame_size=(1280, 720)):
+    """
+    Run a synthetic camera / UI / background load under one profile.
+    
+    The camera stage repeatedly blurs, resizes and colour-converts a frame
+    (OpenCV-parallel work standing in for preprocessing + inference); the UI
+    stage wakes every 10 ms like the Tk mainloop and measures how late it is;
+    the background stage does NumPy work like the writers.
+    
+    Returns:
+        dict: {"profile", "frames_per_s", "camera_p50_ms", "camera_p99_ms",
+        "ui_late_p50_ms", "ui_late_p99_ms"}
+    """
+    default_cv2_threads = cv2.getNumThreads()
+    manager = ResourceManager(profile)
+    manager.apply_process()
+    stop = threading.Event()
+    camera_times, ui_late = [], []
+    frame = np.random.default_rng(0).integers(0, 255, (frame_size[1], frame_size[0], 3), dtype=np.uint8)
+    kernel = np.ones((9, 9), np.float32) / 81
+    
+    def camera():
+        manager.pin("camera")
+        out = np.empty_like(frame)
+        small = np.empty((640, 640, 3), dtype=np.uint8)
+        while not stop.is_set():
+            start = time.perf_counter()
+            cv2.filter2D(frame, -1, kernel, dst=out)
+            cv2.resize(out, (640, 640), dst=small)
+            cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=small)
+            camera_times.append(time.perf_counter() - start)
+    
+    def ui():
+        manager.pin("ui")
+        period = 0.01
+        next_tick = time.perf_counter() + period
+        while not stop.is_set():
+            time.sleep(max(0.0, next_tick - time.perf_counter()))
+            ui_late.append(max(0.0, time.perf_counter() - next_tick))
+            next_tick += period
+    
+    def background():
+        manager.pin("background")
+        data = np.random.default_rng(1).random((300, 300))
+        while not stop.is_set():
+            np.linalg.svd(data)
+            time.sleep(0.005)
+    
+    threads = [threading.Thread(target=target, daemon=True) for target in (camera, ui, background)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    
+    # Undo the process-wide settings so the next profile starts clean
+    cv2.setNumThreads(default_cv2_threads)
+    try:
+        os.sched_setaffinity(0, manager.cores)
+    except (AttributeError, OSError):
+        pass
+    
+    camera_p50, camera_p99 = _percentiles(camera_times)
+    ui_p50, ui_p99 = _percentiles(ui_late)
+    return {"profile": profile, "describe": manager.describe(),
+            "frames_per_s": len(camera_times) / seconds,
+            "camera_p50_ms": camera_p50, "camera_p99_ms": camera_p99,
+            "ui_late_p50_ms": ui_p50, "ui_late_p99_ms": ui_p99}
+
+
+def main():
+    """Compare the profiles on this machine."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Resource profile benchmark")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duration per profile")
+    args = parser.parse_args()
+    
+    print(f"{len(available_cores())} core(s) available, OpenCV threads {cv2.getNumThreads()}")
+    print("=" * 78)
+    benchmark("default", 1.0)  # Warm-up (first-call allocations, CPU frequency ramp)
+    print(f"{'profile':<12}{'frames/s':>10}{'camera p50':>12}{'camera p99':>12}"
+          f"{'UI late p50':>13}{'UI late p99':>13}")
+    for profile in PROFILES:
+        row = benchmark(profile, args.seconds)
+        print(f"{profile:<12}{row['frames_per_s']:>10.1f}{row['camera_p50_ms']:>10.1f}ms"
+              f"{row['camera_p99_ms']:>10.1f}ms{row['ui_late_p50_ms']:>11.2f}ms{row['ui_late_p99_ms']:>11.2f}ms")
+        print(f"    {row['describe']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,56 @@ the robot by sending commands over the network.
 import socket
 import json
 import time
+import codecs
+import threading
+
+
+def parse_address(address, default_port=5000):
+    """
+    Split "host" or "host:port" into (host, port).
+    
+    Args:
+        address (str): Server address.
+        default_port (int): Port used when none is given.
+    
+    Returns:
+        tuple: (host, port)
+    """
+    host, _, port = address.strip().rpartition(":")
+    if not host or not port.isdigit():
+        return address.strip(), default_port
+    return host, int(port)
+
+
+def configure_socket(sock, dead_after=None):
+    """
+    Low-latency and dead-link options for a robot connection.
+    
+    TCP_NODELAY sends each small JSON command immediately. Keepalive probes
+    notice a silently dropped link while the socket is idle (e.g. waiting for
+    a long motion to finish), and TCP_USER_TIMEOUT bounds how long sent data
+    may stay unacknowledged; both are tuned so a dead link is detected within
+    about dead_after seconds (Linux; elsewhere only the OS defaults apply).
+    
+    Args:
+        sock (socket.socket): Connected or unconnected TCP socket.
+        dead_after (float): Detection bound in seconds (None = OS keepalive timing).
+    """
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    if not dead_after:
+        return
+    idle = max(1, int(dead_after / 3))
+    interval = 1
+    count = max(1, int(dead_after) - idle)
+    for name, value in (("TCP_KEEPIDLE", idle), ("TCP_KEEPINTVL", interval), ("TCP_KEEPCNT", count),
+                        ("TCP_USER_TIMEOUT", int(dead_after * 1000))):
+        option = getattr(socket, name, None)
+        if option is not None:
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, option, value)
+            except OSError:
+                pass
 
 
 class RobotClient:
@@ -15,35 +65,116 @@ class RobotClient:
     Client class for sending commands to the RobotController server.
     """
     
-    def __init__(self, host, port=5000):
+    def __init__(self, host, port=5000, timeout=None, secondary=None, dead_after=None):
         """
         Initialize the robot client.
         
         Args:
             host (str): IP address of the server running the robot controller.
             port (int): Port number (default: 5000).
+            timeout (float): Seconds to wait for a reply before treating the
+                link as lost (None = wait forever). Must exceed the longest motion.
+            secondary (str): "host" or "host:port" of a standby robot server,
+                connected to when the primary cannot be reached.
+            dead_after (float): Seconds within which a silently dropped link is
+                detected by TCP keepalive (None = OS defaults).
         """
         self.host = host
         self.port = port
+        self.timeout = timeout
+        self.secondary = parse_address(secondary, port) if secondary else None
+        self.dead_after = dead_after
+        self.active = None      # (host, port) currently connected to
+        self.failovers = 0      # Connections that went to the secondary server
+        self.lock = threading.RLock()  # One request/response exchange at a time
+        self.last_activity = time.monotonic()  # Last reply received
         self.socket = None
+        self.last_error = None  # Last transport error (None if the last command got a reply)
+        self.last_rtt = None    # Send → reply time of the last command (seconds)
+        self.plan_supported = None  # Whether the server knows execute_plan (None = not tried yet)
+        self._reset_buffer()
+    
+    def _reset_buffer(self):
+        """Clear the receive buffer (new connection)."""
+        self._buffer = ""
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
     
     def connect(self):
-        """Connect to the robot server."""
-        try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((self.host, self.port))
-            print(f"Connected to robot server at {self.host}:{self.port}")
+        """Connect to the robot server (the secondary server if the primary fails)."""
+        addresses = [(self.host, self.port)]
+        if self.secondary and self.secondary not in addresses:
+            addresses.append(self.secondary)
+        for address in addresses:
+            try:
+                self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                configure_socket(self.socket, self.dead_after)
+                self.socket.settimeout(self.dead_after or self.timeout)  # Fail over quickly
+                self.socket.connect(address)
+                self.socket.settimeout(self.timeout)
+            except Exception as e:
+                print(f"Failed to connect to {address[0]}:{address[1]}: {e}")
+                self.socket.close()
+                self.socket = None
+                continue
+            self._reset_buffer()
+            self.active = address
+            self.last_activity = time.monotonic()
+            if address != addresses[0]:
+                self.failovers += 1
+                print(f"Connected to secondary robot server at {address[0]}:{address[1]}")
+            else:
+                print(f"Connected to robot server at {address[0]}:{address[1]}")
             return True
-        except Exception as e:
-            print(f"Failed to connect: {e}")
-            return False
+        return False
     
     def disconnect(self):
         """Disconnect from the robot server."""
         if self.socket:
-            self.socket.close()
+            try:
+                self.socket.close()
+            except OSError:
+                pass
+            self.socket = None
+            self.active = None
             print("Disconnected from robot server")
     
+    def reconnect(self):
+        """
+        Drop the current socket and connect again.
+        
+        Returns:
+            bool: True if the new connection succeeded.
+        """
+        with self.lock:
+            self.disconnect()
+            return self.connect()
+    
+    def _receive(self):
+        """
+        Read the next JSON message from the server.
+        
+        Messages may arrive split over several reads or several per read
+        (execute_plan streams progress events), so complete JSON values are
+        decoded from a buffer.
+        
+        Returns:
+            dict: The decoded message.
+        """
+        while True:
+            text = self._buffer.lstrip()
+            if text:
+                try:
+                    message, end = self._json.raw_decode(text)
+                    self._buffer = text[end:]
+                    return message
+                except json.JSONDecodeError:
+                    pass  # Incomplete; read more
+            chunk = self.socket.recv(4096)
+            if not chunk:
+                raise ConnectionError("Connection closed by server")
+            self._buffer = text + self._utf8.decode(chunk)
+    
     def send_command(self, command_dict):
         """
         Send a command to the robot and receive the response.
@@ -55,19 +186,112 @@ class RobotClient:
             dict: Response from the server, or None if error.
         """
         try:
-            # Send command as JSON
-            command_json = json.dumps(command_dict)
-            self.socket.send(command_json.encode('utf-8'))
-            
-            # Receive response
-            response = self.socket.recv(4096)
-            response_dict = json.loads(response.decode('utf-8'))
+            with self.lock:
+                # Send command as JSON
+                command_json = json.dumps(command_dict)
+                start = time.monotonic()
+                self.socket.sendall(command_json.encode('utf-8'))
+                
+                # Receive response
+                response_dict = self._receive()
+                self.last_activity = time.monotonic()
+                self.last_rtt = self.last_activity - start
             
+            self.last_error = None
             return response_dict
         except Exception as e:
             print(f"Error sending command: {e}")
+            self.last_error = e
             return None
     
+    def send_nowait(self, command_dict):
+        """
+        Send a command without waiting for its response (pipelining).
+        
+        Responses arrive in send order; read them with receive_response().
+        Transport errors are raised to the caller.
+        
+        Args:
+            command_dict (dict): Command dictionary to send.
+        """
+        self.socket.sendall(json.dumps(command_dict).encode('utf-8'))
+    
+    def receive_response(self):
+        """
+        Read the next response (for commands sent with send_nowait).
+        
+        Returns:
+            dict: Response from the server (transport errors are raised).
+        """
+        response = self._receive()
+        self.last_activity = time.monotonic()
+        return response
+    
+    def execute_plan(self, steps, on_event=None):
+        """
+        Run an ordered list of steps on the server with a single command.
+        
+        The server streams one {"event": "step", "index", "command", "status",
+        "duration"} message per finished step and ends with
+        {"event": "done", "status", "completed", "failed_step"}; it stops at
+        the first failed step. If the server does not know execute_plan, the
+        steps are sent one by one instead (with the same events).
+        
+        Args:
+            steps (list): Command dicts, e.g. [{"command": "pick_piece", "piece": "piece 1"},
+                {"command": "place_piece", "location": "bad bin"}, {"command": "move_home"}]
+            on_event (callable): on_event(event) after each step.
+        
+        Returns:
+            dict: The final "done" message, or None on a transport error.
+        """
+        with self.lock:
+            return self._execute_plan(steps, on_event)
+    
+    def _execute_plan(self, steps, on_event):
+        """execute_plan with the exchange lock held."""
+        if self.plan_supported is not False:
+            try:
+                self.socket.sendall(json.dumps({"command": "execute_plan", "steps": steps}).encode('utf-8'))
+                while True:
+                    message = self._receive()
+                    self.last_activity = time.monotonic()
+                    event = message.get("event")
+                    if event == "step":
+                        if on_event:
+                            on_event(message)
+                    elif event == "done":
+                        self.plan_supported = True
+                        self.last_error = None
+                        return message
+                    elif self.plan_supported is None and message.get("status") == "error":
+                        print(f"Server does not support execute_plan ({message.get('message')}); "
+                              f"sending steps individually")
+                        self.plan_supported = False
+                        break
+                    else:
+                        self.last_error = None
+                        return message
+            except Exception as e:
+                print(f"Error sending plan: {e}")
+                self.last_error = e
+                return None
+        
+        for index, step in enumerate(steps):
+            start = time.monotonic()
+            response = self.send_command(step)
+            if response is None:
+                return None
+            event = {"event": "step", "index": index, "command": step.get("command"),
+                     "status": response.get("status"), "duration": time.monotonic() - start,
+                     "message": response.get("message")}
+            if on_event:
+                on_event(event)
+            if response.get("status") != "success":
+                return {"event": "done", "status": "error", "completed": index,
+                        "failed_step": index, "message": response.get("message")}
+        return {"event": "done", "status": "success", "completed": len(steps), "failed_step": None}
+    
     def move_home(self):
         """Move robot to home position."""
         command = {"command": "move_home"}
@@ -0,0 +1,201 @@
+"""
+Inference Scheduler - Scale YOLO input size and frame rate with load and thermals
+
+camera_loop used to run YOLO at a fixed input size as fast as possible plus
+a fixed 30 ms sleep. In an enclosed Raspberry Pi that keeps the CPU pinned,
+the SoC throttles, and every frame gets slower. The scheduler instead:
+- runs at full rate only while the operator is waiting to capture, and at a
+  low duty cycle while idle or while the robot is sorting (short boosts
+  serve slot re-checks)
+- steps the inference size down when the measured per-frame latency is
+  above target and back up when there is headroom
+- reads the CPU temperature from /sys/class/thermal and scales the frame
+  rate down (and the size to its minimum) before the throttle point
+
+Run this file directly to watch the controller converge on a synthetic
+latency model:
+    python3 scheduler.py
+"""
+
+import time
+
+
+THERMAL_PATH = "/sys/class/thermal/thermal_zone0/temp"
+
+# Pipeline states
+IDLE = "idle"                          # Capture taken, waiting for START SORTING
+AWAITING_CAPTURE = "awaiting_capture"  # Live view before capture (and conveyor mode)
+SORTING = "sorting"                    # Robot moving; frames only for slot re-checks
+
+
+def read_cpu_temp(path=THERMAL_PATH):
+    """
+    Read the CPU temperature.
+    
+    Args:
+        path (str): sysfs thermal zone file (millidegrees Celsius).
+    
+    Returns:
+        float: Temperature in °C, or None if unavailable (e.g. not a Pi).
+    """
+    try:
+        with open(path) as f:
+            return int(f.read().strip()) / 1000.0
+    except (OSError, ValueError):
+        return None
+
+
+class InferenceScheduler:
+    """
+    Chooses the inference size and the delay before the next frame.
+    """
+    
+    def __init__(self, sizes=(320, 416, 512, 640), target_latency=0.15, rates=None,
+                 temp_soft=70.0, temp_hard=80.0, thermal_interval=2.0, smoothing=0.2,
+                 cooldown=3.0, read_temp=read_cpu_temp):
+        """
+        Initialize the scheduler.
+        
+        Args:
+            sizes (tuple): Allowed inference sizes, ascending (multiples of 32).
+            target_latency (float): Per-frame processing time to hold (seconds).
+            rates (dict): Frame rate (Hz) per pipeline state.
+            temp_soft (float): °C where the frame rate starts to scale down.
+            temp_hard (float): °C where the rate is at its floor and the
+                smallest size is used (the Pi throttles at 80-85 °C).
+            thermal_interval (float): Seconds between temperature reads.
+            smoothing (float): EMA weight of each latency sample.
+            cooldown (float): Minimum seconds between size changes.
+            read_temp (callable): Temperature source (°C or None).
+        """
+        self.sizes = sorted(sizes)
+        self.target_latency = target_latency
+        self.rates = rates or {IDLE: 2.0, AWAITING_CAPTURE: 15.0, SORTING: 2.0}
+        self.temp_soft = temp_soft
+        self.temp_hard = temp_hard
+        self.thermal_interval = thermal_interval
+        self.smoothing = smoothing
+        self.cooldown = cooldown
+        self.read_temp = read_temp
+        
+        self.state = AWAITING_CAPTURE
+        self.index = len(self.sizes) - 1
+        self.latency = None
+        self.temperature = None
+        self.boost_until = 0.0
+        self._last_change = 0.0
+        self._last_thermal = 0.0
+    
+    @property
+    def imgsz(self):
+        """Current inference size."""
+        if self.thermal_factor() <= 0.25:
+            return self.sizes[0]
+        return self.sizes[self.index]
+    
+    def set_state(self, state):
+        """Set the pipeline state (IDLE, AWAITING_CAPTURE or SORTING)."""
+        self.state = state
+    
+    def boost(self, seconds):
+        """Run at the AWAITING_CAPTURE rate for a while (e.g. a slot re-check)."""
+        self.boost_until = max(self.boost_until, time.monotonic() + seconds)
+    
+    def record(self, seconds):
+        """Add the processing time of one frame (inference + tracking + overlay)."""
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += self.smoothing * (seconds - self.latency)
+    
+    def thermal_factor(self):
+        """Rate multiplier from the last temperature reading (1.0 = no limit, 0.25 floor)."""
+        if self.temperature is None or self.temperature <= self.temp_soft:
+            return 1.0
+        span = max(self.temp_hard - self.temp_soft, 1e-6)
+        return max(0.25, 1.0 - 0.75 * (self.temperature - self.temp_soft) / span)
+    
+    def update(self, now=None):
+        """
+        Re-evaluate the temperature and inference size.
+        
+        Args:
+            now (float): Current time (defaults to time.monotonic()).
+        
+        Returns:
+            int: Inference size for the next frame.
+        """
+        now = time.monotonic() if now is None else now
+        if now - self._last_thermal >= self.thermal_interval:
+            self.temperature = self.read_temp()
+            self._last_thermal = now
+        
+        if self.latency is None or now - self._last_change < self.cooldown:
+            return self.imgsz
+        
+        size = self.sizes[self.index]
+        if self.latency > self.target_latency * 1.1 and self.index > 0:
+            self.index -= 1
+            self._last_change = now
+            self.latency *= (self.sizes[self.index] / size) ** 2  # Expected new cost
+        elif self.index < len(self.sizes) - 1 and self.thermal_factor() == 1.0:
+            # Inference cost grows roughly with the input area
+            expected = self.latency * (self.sizes[self.index + 1] / size) ** 2
+            if expected < self.target_latency * 0.9:
+                self.index += 1
+                self._last_change = now
+                self.latency = expected
+        return self.imgsz
+    
+    def rate(self, now=None):
+        """Target frame rate (Hz) for the current state and temperature."""
+        now = time.monotonic() if now is None else now
+        state = AWAITING_CAPTURE if now < self.boost_until else self.state
+        return self.rates[state] * self.thermal_factor()
+    
+    def next_delay(self, frame_start, now=None):
+        """
+        Seconds to wait before the next frame.
+        
+        Args:
+            frame_start (float): time.monotonic() when the current frame began.
+            now (float): Current time (defaults to time.monotonic()).
+        
+        Returns:
+            float: Delay (at least 5 ms so the GUI thread always gets time).
+        """
+        now = time.monotonic() if now is None else now
+        return max(0.005, frame_start + 1.0 / self.rate(now) - now)
+    
+    def describe(self):
+        """Short status string for the activity log."""
+        latency = "-" if self.latency is None else f"{self.latency * 1000:.0f}ms"
+        temp = "n/a" if self.temperature is None else f"{self.temperature:.0f}°C"
+        return (f"imgsz {self.imgsz}, latency {latency}, {self.rate():.1f} Hz "
+                f"({self.state}), CPU {temp}")
+
+
+def main():
+    """Run the controller against a synthetic latency/temperature model."""
+    temperature = [60.0]
+    scheduler = InferenceScheduler(read_temp=lambda: temperature[0], cooldown=1.0, thermal_interval=0.5)
+    print("Scheduler simulation (640px costs 400 ms, target 150 ms)")
+    print("=" * 70)
+    now = 0.0
+    for step in range(120):
+        if step == 60:
+            scheduler.set_state(SORTING)
+        if step >= 80:
+            temperature[0] = min(85.0, temperature[0] + 1.0)
+        scheduler.update(now)
+        latency = 0.4 * (scheduler.imgsz / 640) ** 2
+        scheduler.record(latency)
+        delay = scheduler.next_delay(now, now + latency)
+        if step % 10 == 0:
+            print(f"t={now:6.1f}s  temp {temperature[0]:4.0f}°C  imgsz {scheduler.imgsz}  "
+                  f"latency {latency * 1000:5.0f}ms  rate {scheduler.rate(now):5.2f} Hz  ({scheduler.state})")
+        now += latency + delay
+
+
+if __name__ == "__main__":
+    main()
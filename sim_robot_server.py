@@ -0,0 +1,557 @@
+"""
+Simulated Robot Server - Local stand-in for the robot controller
+
+Speaks the same newline-free JSON protocol as the real server (one JSON
+reply per command) so the dashboard, RobotClient and the tools can run
+without the arm. Motion commands sleep for a simulated duration and move
+a simulated tool pose; an optional network delay with jitter is added to
+every reply to mimic a congested Wi-Fi link.
+
+execute_plan runs an ordered list of steps on the server and streams one
+progress event per step, so a whole tray needs a single round trip.
+
+A FaultProfile injects the failures the client has to survive: latency
+drawn from a distribution (fixed, uniform, normal, lognormal, exponential,
+or occasional spikes), replies split into small fragments, replies padded
+beyond the client's 4096-byte recv size, error replies, dropped connections
+(before or in the middle of a reply) and hung commands that never answer.
+Each connection has its own thread, so hundreds of clients can connect.
+
+Command line:
+    python3 sim_robot_server.py                    # serve on 0.0.0.0:5000
+    python3 sim_robot_server.py --benchmark        # per-step vs execute_plan tray time
+    python3 sim_robot_server.py --latency-dist lognormal:0.03,0.8 --fragment-rate 0.5 \
+        --disconnect-rate 0.01 --error-rate 0.02  # serve with faults
+    python3 sim_robot_server.py --stress           # client throughput/recovery under faults
+"""
+
+import json
+import math
+import time
+import socket
+import random
+import threading
+
+
+# Simulated motion times (seconds) at speed 1.0
+DEFAULT_DURATIONS = {
+    "move_home": 0.8,
+    "move_pose": 1.0,
+    "pick": 1.5,
+    "place": 1.2,
+    "pick_piece": 1.5,
+    "place_piece": 1.2,
+}
+
+HOME_POSE = [300.0, 0.0, 400.0, 0.0, 90.0, 0.0]
+PIECES = {f"piece {i}": [250.0 + 60 * ((i - 1) % 3), -60.0 + 120 * ((i - 1) // 3), 150.0] for i in range(1, 7)}
+LOCATIONS = {"good bin": [450.0, 250.0, 200.0], "bad bin": [450.0, -250.0, 200.0]}
+
+
+class DelayDistribution:
+    """
+    Random network delay parsed from "kind:a,b,..." (seconds).
+    
+    Kinds:
+        fixed:d            always d
+        uniform:lo,hi      uniform in [lo, hi]
+        normal:mean,sd     normal, clipped at 0
+        lognormal:med,s    median `med`, log-space sigma `s` (long tail)
+        exponential:mean   exponential with the given mean
+        spike:base,p,d     `base`, plus `d` with probability p (Wi-Fi stalls)
+    """
+    
+    KINDS = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1, "spike": 3}
+    
+    def __init__(self, spec="fixed:0", rng=None):
+        """
+        Initialize the distribution.
+        
+        Args:
+            spec (str): Distribution spec, e.g. "lognormal:0.03,0.8".
+            rng (random.Random): Random source.
+        """
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",") if p]
+        if self.KINDS.get(kind) != len(self.params):
+            raise ValueError(f"Invalid delay spec {spec!r} (see DelayDistribution)")
+        self.spec = spec
+        self.rng = rng or random.Random()
+    
+    def sample(self):
+        """Draw one delay (seconds, >= 0)."""
+        p, rng = self.params, self.rng
+        if self.kind == "fixed":
+            value = p[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            value = rng.gauss(p[0], p[1])
+        elif self.kind == "lognormal":
+            value = p[0] * math.exp(rng.gauss(0.0, p[1])) if p[0] > 0 else 0.0
+        elif self.kind == "exponential":
+            value = rng.expovariate(1.0 / p[0]) if p[0] > 0 else 0.0
+        else:
+            value = p[0] + (p[2] if rng.random() < p[1] else 0.0)
+        return max(0.0, value)
+
+
+class FaultProfile:
+    """
+    Which faults the server injects, and how often.
+    """
+    
+    def __init__(self, latency="fixed:0", error_rate=0.0, disconnect_rate=0.0, hang_rate=0.0,
+                 hang_seconds=30.0, fragment_rate=0.0, fragment_size=64, large_response=0,
+                 seed=None):
+        """
+        Initialize the profile.
+        
+        Args:
+            latency (str): One-way delay distribution (DelayDistribution spec),
+                applied to each request and each reply.
+            error_rate (float): Probability a command gets an error reply
+                without executing.
+            disconnect_rate (float): Probability the connection is dropped
+                instead of replying (half of these after a partial reply).
+            hang_rate (float): Probability a command never gets a reply; the
+                connection is closed after `hang_seconds`.
+            hang_seconds (float): How long a hung command blocks the connection.
+            fragment_rate (float): Probability a reply is sent in small pieces.
+            fragment_size (int): Largest fragment (bytes).
+            large_response (int): Padding bytes added to every reply (set it
+                above 4096 to exceed a single recv).
+            seed (int): Random seed for reproducible runs.
+        """
+        self.rng = random.Random(seed)
+        self.latency = DelayDistribution(latency, self.rng)
+        self.error_rate = error_rate
+        self.disconnect_rate = disconnect_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.fragment_rate = fragment_rate
+        self.fragment_size = max(1, fragment_size)
+        self.large_response = large_response
+        self._lock = threading.Lock()
+    
+    def chance(self, probability):
+        """True with the given probability."""
+        if probability <= 0:
+            return False
+        with self._lock:
+            return self.rng.random() < probability
+    
+    def delay(self):
+        """One sampled one-way delay."""
+        with self._lock:
+            return self.latency.sample()
+    
+    def fragment_sizes(self, length):
+        """Random chunk sizes covering `length` bytes."""
+        sizes = []
+        with self._lock:
+            while length > 0:
+                size = min(length, self.rng.randint(1, self.fragment_size))
+                sizes.append(size)
+                length -= size
+        return sizes
+
+
+class DropConnection(Exception):
+    """Raised inside a connection handler to simulate a dropped link."""
+
+
+class SimRobotServer:
+    """
+    Threaded TCP server simulating the robot controller.
+    """
+    
+    def __init__(self, host="0.0.0.0", port=5000, speed=1.0, latency=0.0, jitter=0.0, faults=None):
+        """
+        Initialize the server.
+        
+        Args:
+            host (str): Interface to bind.
+            port (int): TCP port (0 = any free port).
+            speed (float): Motion speed factor (2.0 = twice as fast).
+            latency (float): Mean one-way network delay added per message (seconds).
+            jitter (float): Uniform jitter (± seconds) on that delay.
+            faults (FaultProfile): Fault injection (replaces latency/jitter).
+        """
+        self.host = host
+        self.port = port
+        self.speed = speed
+        if faults is None:
+            spec = f"uniform:{max(0.0, latency - jitter)},{latency + jitter}" if jitter else f"fixed:{latency}"
+            faults = FaultProfile(latency=spec)
+        self.faults = faults
+        self.stats = {"connections": 0, "errors": 0, "disconnects": 0, "hangs": 0, "fragmented": 0}
+        self.durations = dict(DEFAULT_DURATIONS)
+        self.pose = list(HOME_POSE)
+        self.holding = None
+        self.commands = 0
+        self.running = False
+        self._server = None
+        self._lock = threading.Lock()
+    
+    def start(self):
+        """Bind and accept connections on a background thread."""
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((self.host, self.port))
+        self._server.listen(512)
+        self.port = self._server.getsockname()[1]
+        self.running = True
+        threading.Thread(target=self._accept_loop, name="sim-server", daemon=True).start()
+        return self.port
+    
+    def stop(self):
+        """Stop accepting connections."""
+        self.running = False
+        if self._server:
+            try:
+                self._server.shutdown(socket.SHUT_RDWR)  # Wakes the blocked accept()
+            except OSError:
+                pass
+            self._server.close()
+    
+    def _accept_loop(self):
+        while self.running:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                break
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Fragments leave separately
+            with self._lock:
+                self.stats["connections"] += 1
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+    
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+    
+    def _delay(self):
+        """Simulated one-way network delay."""
+        delay = self.faults.delay()
+        if delay:
+            time.sleep(delay)
+    
+    def _write(self, conn, message, allow_drop=True):
+        """Encode and send a message, with padding, fragmentation and mid-reply drops."""
+        faults = self.faults
+        if faults.large_response:
+            message = dict(message, padding="x" * faults.large_response)
+        data = json.dumps(message).encode("utf-8")
+        if allow_drop and faults.chance(faults.disconnect_rate / 2):
+            self._count("disconnects")
+            conn.sendall(data[:len(data) // 2])
+            raise DropConnection()
+        if faults.chance(faults.fragment_rate):
+            self._count("fragmented")
+            offset = 0
+            for index, size in enumerate(faults.fragment_sizes(len(data))):
+                conn.sendall(data[offset:offset + size])
+                offset += size
+                if index % 8 == 7:
+                    time.sleep(0.0005)  # Let the client read a partial message
+        else:
+            conn.sendall(data)
+    
+    def _send(self, conn, message):
+        self._delay()
+        self._write(conn, message)
+    
+    def _inject(self):
+        """
+        Decide the fault for the next reply.
+        
+        Returns:
+            dict: An injected error reply, or None to execute normally.
+        
+        Raises:
+            DropConnection: For a dropped or hung connection.
+        """
+        faults = self.faults
+        if faults.chance(faults.hang_rate):
+            self._count("hangs")
+            time.sleep(faults.hang_seconds)
+            raise DropConnection()
+        if faults.chance(faults.disconnect_rate / 2):
+            self._count("disconnects")
+            raise DropConnection()
+        if faults.chance(faults.error_rate):
+            self._count("errors")
+            return {"status": "error", "message": "Injected fault"}
+        return None
+    
+    def _serve(self, conn):
+        """Handle one client connection."""
+        decoder = json.JSONDecoder()
+        buffer = ""
+        with conn:
+            while self.running:
+                try:
+                    chunk = conn.recv(4096)
+                except OSError:
+                    break
+                if not chunk:
+                    break
+                buffer += chunk.decode("utf-8", errors="replace")
+                while True:
+                    text = buffer.lstrip()
+                    try:
+                        command, end = decoder.raw_decode(text)
+                    except json.JSONDecodeError:
+                        buffer = text
+                        break
+                    buffer = text[end:]
+                    self._delay()  # Request travelling to the server
+                    try:
+                        reply = self._inject()
+                        if reply is not None:
+                            self._send(conn, reply)
+                        elif command.get("command") == "execute_plan":
+                            self._execute_plan(conn, command.get("steps", []))
+                        else:
+                            self._send(conn, self.handle(command))
+                    except (OSError, DropConnection):
+                        return
+    
+    def _move(self, command, target=None):
+        """Simulate a motion command."""
+        time.sleep(self.durations[command] / self.speed)
+        if target is not None:
+            with self._lock:
+                self.pose[:3] = list(target[:3])
+    
+    def handle(self, command):
+        """
+        Execute one command.
+        
+        Args:
+            command (dict): Command message.
+        
+        Returns:
+            dict: Reply message.
+        """
+        self.commands += 1
+        name = command.get("command")
+        if name == "move_home":
+            self._move(name, HOME_POSE)
+            return {"status": "success", "message": "Moved home"}
+        if name == "move_pose":
+            self._move(name, command["pose"])
+            return {"status": "success", "message": "Moved to pose"}
+        if name in ("pick", "place"):
+            self._move(name, command["position"])
+            self.holding = "object" if name == "pick" else None
+            return {"status": "success", "message": f"{name} done"}
+        if name == "pick_piece":
+            target = PIECES.get(command.get("piece"))
+            if target is None:
+                return {"status": "error", "message": f"Unknown piece {command.get('piece')}"}
+            self._move(name, target)
+            self.holding = command["piece"]
+            return {"status": "success", "message": f"Picked {command['piece']}"}
+        if name == "place_piece":
+            target = LOCATIONS.get(command.get("location"))
+            if target is None:
+                return {"status": "error", "message": f"Unknown location {command.get('location')}"}
+            self._move(name, target)
+            self.holding = None
+            return {"status": "success", "message": f"Placed in {command['location']}"}
+        if name == "wait":
+            time.sleep(float(command.get("duration", 0)) / self.speed)
+            return {"status": "success", "message": "Waited"}
+        if name == "get_pose":
+            with self._lock:
+                return {"status": "success", "pose": list(self.pose)}
+        if name == "get_joints":
+            with self._lock:
+                x, y, z = self.pose[:3]
+            return {"status": "success", "joints": [round(x / 10, 2), round(y / 10, 2), round(z / 10, 2), 0.0, 90.0, 0.0]}
+        return {"status": "error", "message": f"Unknown command {name}"}
+    
+    def _execute_plan(self, conn, steps):
+        """Run a plan, streaming one event per step; stop at the first failure."""
+        for index, step in enumerate(steps):
+            start = time.monotonic()
+            reply = self.handle(step)
+            event = {"event": "step", "index": index, "command": step.get("command"),
+                     "status": reply.get("status"), "duration": time.monotonic() - start,
+                     "message": reply.get("message")}
+            self._write(conn, event, allow_drop=False)  # Progress is not delayed per step
+            if reply.get("status") != "success":
+                self._send(conn, {"event": "done", "status": "error", "completed": index,
+                                  "failed_step": index, "message": reply.get("message")})
+                return
+        self._send(conn, {"event": "done", "status": "success", "completed": len(steps),
+                          "failed_step": None})
+
+
+def tray_steps(count=6):
+    """Pick/place/home steps for a tray of `count` pieces (alternating bins)."""
+    steps = []
+    for i in range(1, count + 1):
+        steps.append({"command": "pick_piece", "piece": f"piece {i}"})
+        steps.append({"command": "place_piece", "location": "bad bin" if i % 2 else "good bin"})
+        steps.append({"command": "move_home"})
+    return steps
+
+
+def benchmark(speed=20.0, latency=0.04, jitter=0.03, settle_delay=0.5, pieces=6):
+    """
+    Compare a tray sorted step by step with one sent as a plan.
+    
+    Args:
+        speed (float): Motion speed factor (high so the network dominates).
+        latency (float): Mean one-way delay (seconds).
+        jitter (float): Delay jitter (seconds).
+        settle_delay (float): Client-side sleep between steps in the
+            step-by-step path (as in SortJobRunner.run).
+        pieces (int): Pieces per tray.
+    
+    Returns:
+        dict: {"step_by_step": seconds, "plan": seconds}
+    """
+    from robot_client import RobotClient
+    
+    server = SimRobotServer("127.0.0.1", 0, speed=speed, latency=latency, jitter=jitter)
+    port = server.start()
+    client = RobotClient("127.0.0.1", port)
+    client.connect()
+    steps = tray_steps(pieces)
+    try:
+        start = time.perf_counter()
+        for step in steps:
+            client.send_command(step)
+            time.sleep(settle_delay)
+        step_by_step = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        result = client.execute_plan(steps)
+        plan = time.perf_counter() - start
+        assert result and result["status"] == "success", result
+    finally:
+        client.disconnect()
+        server.stop()
+    return {"step_by_step": step_by_step, "plan": plan,
+            "motion": sum(DEFAULT_DURATIONS[s["command"]] for s in steps) / speed}
+
+
+STRESS_SCENARIOS = {
+    "clean": {},
+    "slow": {"latency": "lognormal:0.02,0.8"},
+    "fragmented": {"fragment_rate": 1.0, "fragment_size": 256, "large_response": 8192},
+    "lossy": {"latency": "spike:0.005,0.02,0.3", "error_rate": 0.02, "disconnect_rate": 0.01,
+              "hang_rate": 0.002, "hang_seconds": 5.0},
+}
+
+
+def stress_benchmark(clients=(1, 10, 50, 200), duration=3.0, timeout=1.0, scenarios=None):
+    """
+    Measure client throughput and recovery time under injected faults.
+    
+    Each client runs a get_pose/get_joints/pick_piece loop through
+    CommandRunner with a reply timeout, so hung commands and dropped links
+    are detected and reconnected.
+    
+    Args:
+        clients (tuple): Concurrent client counts to try.
+        duration (float): Seconds per run.
+        timeout (float): Client reply timeout (seconds).
+        scenarios (dict): {name: FaultProfile kwargs} (default STRESS_SCENARIOS).
+    
+    Returns:
+        list: Result rows (dicts).
+    """
+    import io
+    import contextlib
+    from command_runner import CommandRunner
+    
+    script = [{"command": "get_pose"}, {"command": "get_joints"},
+              {"command": "pick_piece", "piece": "piece 1"}]
+    rows = []
+    for name, options in (scenarios or STRESS_SCENARIOS).items():
+        for count in clients:
+            server = SimRobotServer("127.0.0.1", 0, speed=1000.0, faults=FaultProfile(seed=1, **options))
+            port = server.start()
+            runner = CommandRunner(script, "127.0.0.1", port, workers=count, duration=duration,
+                                   reconnect_delay=0.05, timeout=timeout)
+            with contextlib.redirect_stdout(io.StringIO()):  # Per-connection chatter
+                results = runner.run()
+            server.stop()
+            c = results["counters"]
+            rows.append({"scenario": name, "clients": count, "throughput": results["throughput"],
+                         "p50_ms": results["all"]["p50_ms"], "p99_ms": results["all"]["p99_ms"],
+                         "failed": c["failed"], "lost": c["lost"], "reconnects": c["reconnects"],
+                         "recovery_p50_ms": results["recovery"]["p50_ms"],
+                         "recovery_max_ms": results["recovery"]["max_ms"]})
+    return rows
+
+
+def main():
+    """Run the simulated server or the plan benchmark."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Simulated robot server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--speed", type=float, default=1.0, help="Motion speed factor")
+    parser.add_argument("--latency", type=float, default=0.0, help="One-way network delay (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Network delay jitter (s)")
+    parser.add_argument("--benchmark", action="store_true", help="Per-step vs execute_plan tray time")
+    parser.add_argument("--latency-dist", help="Delay distribution, e.g. lognormal:0.03,0.8 "
+                                               "(overrides --latency/--jitter)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Injected error replies (0-1)")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0, help="Dropped connections (0-1)")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Commands never answered (0-1)")
+    parser.add_argument("--fragment-rate", type=float, default=0.0, help="Fragmented replies (0-1)")
+    parser.add_argument("--fragment-size", type=int, default=64, help="Largest fragment (bytes)")
+    parser.add_argument("--large-response", type=int, default=0, help="Padding bytes per reply")
+    parser.add_argument("--seed", type=int, help="Random seed")
+    parser.add_argument("--stress", action="store_true", help="Client throughput/recovery under faults")
+    args = parser.parse_args()
+    
+    if args.stress:
+        print(f"{'scenario':<12}{'clients':>8}{'cmd/s':>10}{'p50':>9}{'p99':>9}{'failed':>8}"
+              f"{'lost':>6}{'reconn':>8}{'recov p50':>11}{'recov max':>11}")
+        print("=" * 92)
+        for row in stress_benchmark():
+            print(f"{row['scenario']:<12}{row['clients']:>8}{row['throughput']:>10.0f}"
+                  f"{row['p50_ms']:>7.1f}ms{row['p99_ms']:>7.1f}ms{row['failed']:>8}{row['lost']:>6}"
+                  f"{row['reconnects']:>8}{row['recovery_p50_ms']:>9.0f}ms{row['recovery_max_ms']:>9.0f}ms")
+        return
+    
+    if args.benchmark:
+        print("Tray of 6 pieces: 18 steps (pick, place, home)")
+        print("=" * 70)
+        for latency, jitter in ((0.0, 0.0), (0.02, 0.01), (0.05, 0.04), (0.1, 0.08)):
+            r = benchmark(latency=latency, jitter=jitter, settle_delay=0.0)
+            full = benchmark(latency=latency, jitter=jitter, settle_delay=0.5)
+            print(f"one-way {latency * 1000:4.0f}±{jitter * 1000:<3.0f}ms | motion {r['motion']:.2f}s | "
+                  f"step-by-step {r['step_by_step']:.2f}s (+0.5s settles {full['step_by_step']:.2f}s) | "
+                  f"plan {r['plan']:.2f}s")
+        return
+    
+    faults = None
+    if args.latency_dist or args.error_rate or args.disconnect_rate or args.hang_rate \
+            or args.fragment_rate or args.large_response:
+        latency = args.latency_dist or (f"uniform:{max(0.0, args.latency - args.jitter)},"
+                                        f"{args.latency + args.jitter}")
+        faults = FaultProfile(latency, args.error_rate, args.disconnect_rate, args.hang_rate,
+                              fragment_rate=args.fragment_rate, fragment_size=args.fragment_size,
+                              large_response=args.large_response, seed=args.seed)
+    server = SimRobotServer(args.host, args.port, args.speed, args.latency, args.jitter, faults)
+    server.start()
+    print(f"Simulated robot server on {args.host}:{server.port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Detection Snapshots - Immutable per-frame detection results
+
+The camera thread used to rewrite a shared {piece_id: {...}} dict in place
+every frame while the Tk thread iterated it, so a capture could mix regions
+from two different frames. Instead, each processed frame now becomes one
+DetectionSnapshot that is never modified after it is built; the camera
+thread publishes it by replacing a single attribute (an atomic reference
+swap), and readers (capture, occupancy checks, conveyor planning, logging)
+take a local reference and see one consistent frame without locks or copies.
+
+A snapshot stores its pieces twice:
+- records: a read-only structured NumPy array, one row per piece
+  (id, status code, confidence, box, centroid, detections), sorted by ID,
+  for counts and ID lists without touching Python dicts
+- pieces: a read-only mapping of the per-piece dicts the detection stage
+  already produced, for the consumers that take dicts (audit store,
+  conveyor planner)
+
+Run this file directly to compare the in-place dict against snapshot
+publishing under a concurrent reader (torn reads and cost per frame):
+    python3 snapshot.py
+"""
+
+import time
+import threading
+from types import MappingProxyType
+import numpy as np
+
+from tracker import STATUS_NAMES
+
+
+SNAPSHOT_DTYPE = np.dtype([
+    ("id", np.int32),
+    ("status", np.uint8),        # Index into STATUS_NAMES
+    ("confidence", np.float32),
+    ("box", np.float32, (4,)),   # (x1, y1, x2, y2); zeros when unknown
+    ("centroid", np.float32, (2,)),
+    ("detections", np.int32),    # Boxes inside a fixed region (-1 = not applicable)
+])
+
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+
+
+class DetectionSnapshot:
+    """
+    One processed frame's decisions (immutable once built).
+    """
+    
+    __slots__ = ("frame_id", "timestamp", "mode", "records", "pieces", "frame")
+    
+    def __init__(self, frame_id, timestamp, mode, records, pieces, frame=None):
+        """
+        Build a snapshot (see from_pieces for the usual constructor).
+        
+        Args:
+            frame_id (int): Increasing frame counter of the camera loop.
+            timestamp (float): time.monotonic() capture time of the frame.
+            mode (str): Tracking mode that produced it ("regions", "free", "conveyor").
+            records (ndarray): SNAPSHOT_DTYPE rows sorted by ID (made read-only).
+            pieces (dict): {piece_id: piece dict}; must not be modified afterwards.
+            frame (ndarray): Raw BGR frame the decisions were made on (not copied).
+        """
+        records.flags.writeable = False
+        set_slot = object.__setattr__
+        set_slot(self, "frame_id", frame_id)
+        set_slot(self, "timestamp", timestamp)
+        set_slot(self, "mode", mode)
+        set_slot(self, "records", records)
+        set_slot(self, "pieces", MappingProxyType(pieces))
+        set_slot(self, "frame", frame)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("DetectionSnapshot is immutable; publish a new one instead")
+    
+    @classmethod
+    def from_pieces(cls, frame_id, timestamp, mode, pieces, regions=None, frame=None):
+        """
+        Build a snapshot from the dicts returned by the detection stage.
+        
+        Args:
+            frame_id (int): Increasing frame counter.
+            timestamp (float): time.monotonic() capture time.
+            mode (str): Tracking mode.
+            pieces (dict): {piece_id: {"status", "confidence", "centroid", ...}}
+                as returned by region_statuses / cascade_regions / Tracker.tracks.
+            regions (dict): {piece_id: (x1, y1, x2, y2)} for pieces without a "box".
+            frame (ndarray): Raw BGR frame.
+        
+        Returns:
+            DetectionSnapshot: The snapshot.
+        """
+        regions = regions or {}
+        rows = []
+        for piece_id in sorted(pieces):
+            piece = pieces[piece_id]
+            box = piece.get("box") or regions.get(piece_id) or (0, 0, 0, 0)
+            detections = piece.get("detections")
+            rows.append((piece_id, STATUS_CODES[piece["status"]], piece.get("confidence") or 0.0,
+                         box, piece["centroid"], -1 if detections is None else detections))
+        return cls(frame_id, timestamp, mode, np.array(rows, dtype=SNAPSHOT_DTYPE), pieces, frame)
+    
+    def __len__(self):
+        return len(self.records)
+    
+    def ids(self, status=None):
+        """
+        Piece IDs in ascending order.
+        
+        Args:
+            status (str): Only pieces with this status ("GOOD"/"BAD"); None = all.
+        
+        Returns:
+            list: Piece IDs (ints).
+        """
+        ids = self.records["id"]
+        if status is not None:
+            ids = ids[self.records["status"] == STATUS_CODES[status]]
+        return ids.tolist()
+    
+    def counts(self):
+        """
+        Pieces per status.
+        
+        Returns:
+            dict: {"GOOD": n, "BAD": m}
+        """
+        per_code = np.bincount(self.records["status"], minlength=len(STATUS_NAMES))
+        return {name: int(per_code[code]) for code, name in enumerate(STATUS_NAMES)}
+    
+    def statuses(self):
+        """
+        Status per piece (for the region overlay).
+        
+        Returns:
+            dict: {piece_id: "GOOD"/"BAD"}
+        """
+        return {int(pid): STATUS_NAMES[code]
+                for pid, code in zip(self.records["id"], self.records["status"])}
+    
+    def age(self, now=None):
+        """Seconds since the frame was captured (None for the empty snapshot)."""
+        if self.timestamp is None:
+            return None
+        return (time.monotonic() if now is None else now) - self.timestamp
+    
+    def describe(self):
+        """Short status string for the activity log."""
+        counts = self.counts()
+        return f"frame {self.frame_id}: {counts['GOOD']} good, {counts['BAD']} bad"
+
+
+EMPTY_SNAPSHOT = DetectionSnapshot(0, None, None, np.zeros(0, dtype=SNAPSHOT_DTYPE), {})
+
+
+def _frame_pieces(frame_id, count):
+    """Synthetic region decisions for one frame (confidence encodes the frame)."""
+    return {pid: {"status": "BAD" if (pid + frame_id) % 3 == 0 else "GOOD",
+                  "confidence": float(frame_id), "centroid": (pid * 100.0, 50.0),
+                  "detections": 1}
+            for pid in range(1, count + 1)}
+
+
+def benchmark(seconds=2.0, count=6):
+    """
+    Writer thread publishing ~1000 frames/s, reader thread polling like the Tk thread.
+    
+    Returns:
+        dict: {"mode": {"frames", "reads", "torn", "write_us"}} for "in-place dict"
+        and "snapshot"; a torn read saw pieces from more than one frame.
+    """
+    results = {}
+    for mode in ("in-place dict", "snapshot"):
+        shared = {"pieces": {}, "snapshot": EMPTY_SNAPSHOT}
+        stop = threading.Event()
+        stats = {"frames": 0, "reads": 0, "torn": 0, "write_s": 0.0}
+        
+        def writer():
+            frame_id = 0
+            while not stop.is_set():
+                frame_id += 1
+                pieces = _frame_pieces(frame_id, count)
+                start = time.perf_counter()
+                if mode == "snapshot":
+                    shared["snapshot"] = DetectionSnapshot.from_pieces(frame_id, time.monotonic(),
+                                                                       "regions", pieces)
+                else:
+                    for piece_id, piece in pieces.items():
+                        shared["pieces"][piece_id] = piece
+                stats["write_s"] += time.perf_counter() - start
+                stats["frames"] += 1
+                time.sleep(0.0005)
+        
+        def reader():
+            while not stop.is_set():
+                if mode == "snapshot":
+                    frames = set(shared["snapshot"].records["confidence"].tolist())
+                else:
+                    frames = set()
+                    for piece in shared["pieces"].values():
+                        frames.add(piece["confidence"])
+                        time.sleep(0)  # Yield mid-iteration, as Tk callbacks do
+                stats["reads"] += 1
+                if len(frames) > 1:
+                    stats["torn"] += 1
+                time.sleep(0.001)
+        
+        threads = [threading.Thread(target=writer, daemon=True), threading.Thread(target=reader, daemon=True)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        results[mode] = {"frames": stats["frames"], "reads": stats["reads"], "torn": stats["torn"],
+                         "write_us": stats["write_s"] / max(stats["frames"], 1) * 1e6}
+    return results
+
+
+if __name__ == "__main__":
+    print("Detection snapshot benchmark (6 regions, concurrent reader)")
+    print("=" * 60)
+    print(f"{'publishing':<16}{'frames':>10}{'reads':>8}{'torn reads':>12}{'write µs':>12}")
+    for mode, row in benchmark().items():
+        print(f"{mode:<16}{row['frames']:>10}{row['reads']:>8}{row['torn']:>12}{row['write_us']:>12.1f}")
@@ -0,0 +1,597 @@
+"""
+Sort Job - Resumable, persisted pick-and-place job with retry and recovery
+
+A SortJob holds one tray's sort plan with a state per piece:
+
+    pending → picking → placing → done
+                  ↘         ↘
+                   failed    failed
+
+The job is written to disk (atomically) on every state change. After a
+crash, disconnect or operator stop, the dashboard can resume it from where
+it stopped instead of recapturing the tray.
+
+A place is not idempotent: if its reply is lost, the piece may already be in
+the bin and a second place would run with an empty gripper. Before each
+place the piece is flagged "check" on disk; the flag is cleared by a
+definite reply. A lost reply (or a crash) leaves it set, the job pauses,
+and the operator has to confirm where the piece is (resolve_check) before
+the job resumes. A plan interrupted by a lost link is handled the same way
+for every piece it had not confirmed, since the server may have run more
+steps than the client saw (or still be running them).
+
+SortJobRunner executes a job with a RetryPolicy:
+- non-success responses are retried with exponential backoff
+- transport errors (no response) reconnect the socket before retrying,
+  except for a place, which pauses the job for an operator check
+- before re-picking, the slot can be re-verified with the camera; an empty
+  slot after an unanswered pick means the piece is already in the gripper
+
+With an execute_plan callback, a fresh job is sent to the robot server as
+one plan (pick, place and home for every piece) and the piece states follow
+the streamed step events; a failed step falls back to the per-piece path
+above for the rest of the tray, and a lost link pauses the job for an
+operator check.
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+
+
+PENDING = "pending"
+PICKING = "picking"
+PLACING = "placing"
+DONE = "done"
+FAILED = "failed"
+
+DEFAULT_JOB_PATH = "sort_job.json"
+
+PICK_FAILED = "pick failed"
+PLACE_FAILED = "place failed"
+
+# Operator checks (piece["check"]) and where the operator found the piece
+CHECK_PLACE = "place"   # Picked; the place may or may not have run (gripper or bin)
+CHECK_PLAN = "plan"     # Unconfirmed step of an interrupted plan (slot, gripper or bin)
+IN_SLOT = "slot"
+IN_GRIPPER = "gripper"
+IN_BIN = "bin"
+
+
+class RetryPolicy:
+    """
+    Retry limits and exponential backoff for robot commands.
+    """
+    
+    def __init__(self, max_attempts=3, base_delay=1.0, factor=2.0, max_delay=10.0,
+                 reconnect_attempts=5):
+        """
+        Initialize the policy.
+        
+        Args:
+            max_attempts (int): Attempts per command before the piece fails.
+            base_delay (float): Delay before the first retry (seconds).
+            factor (float): Backoff multiplier per retry.
+            max_delay (float): Upper bound for a single delay.
+            reconnect_attempts (int): Reconnect attempts after a transport
+                error before the job is paused.
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.factor = factor
+        self.max_delay = max_delay
+        self.reconnect_attempts = reconnect_attempts
+    
+    def delay(self, attempt):
+        """
+        Backoff delay after a failed attempt.
+        
+        Args:
+            attempt (int): 1-based attempt number that just failed.
+        
+        Returns:
+            float: Seconds to wait.
+        """
+        return min(self.max_delay, self.base_delay * self.factor ** (attempt - 1))
+
+
+class JobPaused(Exception):
+    """Raised when the robot link cannot be recovered; the job stays resumable."""
+
+
+class SlotEmpty(Exception):
+    """Raised when the camera shows the slot empty before a pick retry."""
+
+
+class SortJob:
+    """
+    Persisted per-piece state machine for one tray.
+    """
+    
+    def __init__(self, path, pieces, tray_id=None, capture_id=None, created=None):
+        """
+        Initialize a job (use SortJob.create or SortJob.load).
+        
+        Args:
+            path (str): JSON file the job is persisted to.
+            pieces (list): Piece dicts in sort order.
+            tray_id (str): Tray identifier from the audit store.
+            capture_id (str): Capture the plan was derived from.
+            created (float): Creation time (epoch seconds).
+        """
+        self.path = path
+        self.pieces = pieces
+        self.tray_id = tray_id
+        self.capture_id = capture_id
+        self.created = created or time.time()
+        self._lock = threading.RLock()  # Several runners (one per arm) may share a job
+    
+    @classmethod
+    def create(cls, path, bad_pieces, good_pieces, robot_id_map, tray_id=None, capture_id=None,
+               targets=None):
+        """
+        Build a new job: BAD pieces first, then GOOD, each in ID order.
+        
+        Args:
+            path (str): JSON file the job is persisted to.
+            bad_pieces (list): Visual IDs of BAD pieces.
+            good_pieces (list): Visual IDs of GOOD pieces.
+            robot_id_map (dict): Visual ID → robot ID.
+            tray_id (str): Tray identifier.
+            capture_id (str): Capture identifier.
+            targets (dict): Optional {piece_id: (position, orientation)} for
+                pose-based picks (free-placement mode) instead of named slots.
+        
+        Returns:
+            SortJob: The saved job.
+        """
+        pieces = []
+        for status, bin_name, ids in (("BAD", "bad bin", bad_pieces), ("GOOD", "good bin", good_pieces)):
+            for piece_id in sorted(ids):
+                piece = {
+                    "piece_id": piece_id,
+                    "robot_piece_id": robot_id_map.get(piece_id, piece_id),
+                    "status": status,
+                    "bin": bin_name,
+                    "state": PENDING,
+                    "attempts": 0,
+                    "error": None,
+                    "updated": time.time(),
+                }
+                if targets and piece_id in targets:
+                    position, orientation = targets[piece_id]
+                    piece["robot_piece_id"] = None
+                    piece["position"] = list(position)
+                    piece["orientation"] = list(orientation)
+                pieces.append(piece)
+        job = cls(path, pieces, tray_id, capture_id)
+        job.save()
+        return job
+    
+    @classmethod
+    def load(cls, path=DEFAULT_JOB_PATH):
+        """
+        Load a persisted job.
+        
+        Args:
+            path (str): JSON file.
+        
+        Returns:
+            SortJob: The job, or None if missing or unreadable.
+        """
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            return cls(path, data["pieces"], data.get("tray_id"),
+                       data.get("capture_id"), data.get("created"))
+        except (OSError, ValueError, KeyError):
+            return None
+    
+    def save(self):
+        """Write the job atomically (temp file + rename)."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            data = {
+                "tray_id": self.tray_id,
+                "capture_id": self.capture_id,
+                "created": self.created,
+                "pieces": self.pieces,
+            }
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(data, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+    
+    def set_state(self, piece, state, error=None):
+        """
+        Move a piece to a new state and persist the job.
+        
+        Args:
+            piece (dict): Piece entry of this job.
+            state (str): New state.
+            error (str): Failure reason, if any.
+        """
+        with self._lock:
+            piece["state"] = state
+            piece["error"] = error
+            piece["updated"] = time.time()
+            self.save()
+    
+    def set_check(self, piece, check):
+        """
+        Flag (or clear) a piece whose outcome is unknown, and persist the job.
+        
+        Args:
+            piece (dict): Piece entry of this job.
+            check (str): CHECK_PLACE or CHECK_PLAN; None once the outcome is known.
+        """
+        with self._lock:
+            piece["check"] = check
+            self.save()
+    
+    def flag_unconfirmed(self, pieces):
+        """
+        Flag every piece of an interrupted plan that was not confirmed done.
+        
+        Args:
+            pieces (list): Piece entries the plan covered.
+        """
+        with self._lock:
+            for piece in pieces:
+                if piece["state"] != DONE:
+                    piece["check"] = CHECK_PLACE if piece["state"] == PLACING else CHECK_PLAN
+            self.save()
+    
+    def needs_check(self):
+        """Pieces whose outcome is unknown (the operator must confirm before resuming)."""
+        return [p for p in self.pieces if p.get("check") and p["state"] not in (DONE, FAILED)]
+    
+    def resolve_check(self, piece, location):
+        """
+        Record where the operator found a piece with an unknown outcome.
+        
+        Args:
+            piece (dict): Piece from needs_check().
+            location (str): IN_SLOT (picked again on resume), IN_GRIPPER
+                (placed again) or IN_BIN (done).
+        """
+        states = {IN_SLOT: PENDING, IN_GRIPPER: PLACING, IN_BIN: DONE}
+        with self._lock:
+            piece["check"] = None
+            piece["state"] = states[location]
+            piece["error"] = None
+            piece["updated"] = time.time()
+            self.save()
+    
+    def remaining(self):
+        """Pieces that are not done or failed, in sort order."""
+        return [p for p in self.pieces if p["state"] not in (DONE, FAILED)]
+    
+    def counts(self):
+        """Return {state: number of pieces}."""
+        counts = {state: 0 for state in (PENDING, PICKING, PLACING, DONE, FAILED)}
+        for piece in self.pieces:
+            counts[piece["state"]] += 1
+        return counts
+    
+    def processed(self):
+        """Number of pieces that reached a final state."""
+        counts = self.counts()
+        return counts[DONE] + counts[FAILED]
+    
+    def is_finished(self):
+        """True when every piece is done or failed."""
+        return not self.remaining()
+    
+    def reset_failed(self):
+        """
+        Retry failed pieces on resume.
+        
+        Pieces that failed at the pick go back to pending. A piece that failed
+        at the place was picked and may still be in the gripper, so it is not
+        re-picked: it waits for an operator check (needs_check) instead.
+        """
+        with self._lock:
+            for piece in self.pieces:
+                if piece["state"] == FAILED:
+                    piece["attempts"] = 0
+                    if piece["error"] == PLACE_FAILED:
+                        piece["state"] = PLACING
+                        piece["check"] = CHECK_PLACE
+                    else:
+                        piece["state"] = PENDING
+                        piece["error"] = None
+            self.save()
+
+
+class SortJobRunner:
+    """
+    Executes a SortJob against a RobotClient with retries and recovery.
+    """
+    
+    def __init__(self, job, client, policy=None, execute=None, verify_slot=None,
+                 on_event=None, should_stop=None, sleep=time.sleep, execute_plan=None):
+        """
+        Initialize the runner.
+        
+        Args:
+            job (SortJob): Job to run.
+            client (RobotClient): Connected robot client (reconnect() is used
+                on transport errors).
+            policy (RetryPolicy): Retry policy (default RetryPolicy()).
+            execute (callable): execute(command, piece, payload) → response.
+                Defaults to calling the matching RobotClient method.
+            verify_slot (callable): verify_slot(piece_id) → True (occupied),
+                False (empty) or None (unknown).
+            on_event (callable): on_event(level, message) for logging.
+            should_stop (callable): Returns True to pause the job between steps.
+            sleep (callable): Sleep function (replaceable in simulations).
+            execute_plan (callable): execute_plan(steps, piece_ids, on_step) →
+                final "done" message or None (see RobotClient.execute_plan).
+                When set, fresh jobs are sent as a single plan.
+        """
+        self.job = job
+        self.client = client
+        self.policy = policy or RetryPolicy()
+        self.execute = execute or self._default_execute
+        self.verify_slot = verify_slot
+        self.on_event = on_event or (lambda level, message: None)
+        self.should_stop = should_stop or (lambda: False)
+        self.sleep = sleep
+        self.execute_plan = execute_plan
+    
+    def _default_execute(self, command, piece, payload):
+        """Call the RobotClient method for a command."""
+        if command == "pick_piece":
+            return self.client.pick_piece(payload["piece"])
+        if command == "pick":
+            return self.client.pick_object(payload["position"], payload["orientation"])
+        if command == "place_piece":
+            return self.client.place_piece(payload["location"])
+        if command == "move_home":
+            return self.client.move_home()
+        raise ValueError(f"Unknown command {command}")
+    
+    def _recover_link(self):
+        """Reconnect with backoff; raise JobPaused if the link stays down."""
+        for attempt in range(1, self.policy.reconnect_attempts + 1):
+            self.on_event("WARNING", f"Robot link lost, reconnecting (attempt {attempt})...")
+            if self.client.reconnect():
+                self.on_event("SUCCESS", "Reconnected to robot")
+                return
+            self.sleep(self.policy.delay(attempt))
+        raise JobPaused("Robot link could not be re-established")
+    
+    def _command(self, command, piece, payload):
+        """
+        Send a command with retries.
+        
+        Returns:
+            tuple: (response or None, transport_error_seen)
+        """
+        transport_error = False
+        for attempt in range(1, self.policy.max_attempts + 1):
+            piece["attempts"] += 1
+            response = self.execute(command, piece, payload)
+            if response is not None and response.get("status") == "success":
+                return response, transport_error
+            
+            if response is None:
+                transport_error = True
+                self.on_event("WARNING", f"{command} for piece {piece['piece_id']}: no response "
+                                         f"({self.client.last_error})")
+                self._recover_link()
+                if command in ("place_piece", "place"):
+                    return None, True  # May have been executed; never re-send blindly
+            else:
+                self.on_event("WARNING", f"{command} for piece {piece['piece_id']} failed: "
+                                         f"{response.get('message', response)}")
+            
+            if attempt < self.policy.max_attempts:
+                if command in ("pick_piece", "pick") and not self._slot_still_occupied(piece, transport_error):
+                    return {"status": "success", "inferred": True}, transport_error
+                self.sleep(self.policy.delay(attempt))
+        return response, transport_error
+    
+    def _slot_still_occupied(self, piece, outcome_unknown):
+        """
+        Re-check the slot with the camera before re-picking.
+        
+        Returns True if the pick should be retried. If the slot is empty and
+        the last pick's outcome is unknown, the piece is assumed to be in the
+        gripper. If the slot is empty after a rejected pick, the piece fails.
+        """
+        if not self.verify_slot:
+            return True
+        occupied = self.verify_slot(piece["piece_id"])
+        if occupied is None or occupied:
+            return True
+        if outcome_unknown:
+            self.on_event("INFO", f"Slot {piece['piece_id']} is empty; assuming the piece is in the gripper")
+            return False
+        raise SlotEmpty(f"Slot {piece['piece_id']} is empty")
+    
+    def process_piece(self, piece):
+        """
+        Drive one piece through its state machine.
+        
+        Returns:
+            bool: True if the piece was sorted.
+        """
+        job = self.job
+        name = f"piece {piece['robot_piece_id']}"
+        if piece.get("check") == CHECK_PLAN:
+            raise JobPaused(f"Piece {piece['piece_id']} was in an interrupted sort plan; "
+                            f"check where it is before resuming")
+        
+        try:
+            if piece["state"] == PICKING:
+                # Resumed mid-pick: the outcome is unknown, check the slot first
+                if not self._slot_still_occupied(piece, outcome_unknown=True):
+                    job.set_state(piece, PLACING)
+            
+            if piece["state"] in (PENDING, PICKING):
+                job.set_state(piece, PICKING)
+                if "position" in piece:
+                    self.on_event("INFO", f"Picking {piece['status']} piece {piece['piece_id']} "
+                                          f"at {piece['position']}...")
+                    response, _ = self._command("pick", piece, {"position": piece["position"],
+                                                                "orientation": piece["orientation"]})
+                else:
+                    self.on_event("INFO", f"Picking {piece['status']} piece {piece['piece_id']} "
+                                          f"(robot ID: {piece['robot_piece_id']})...")
+                    response, _ = self._command("pick_piece", piece, {"piece": name})
+                if response is None or response.get("status") != "success":
+                    job.set_state(piece, FAILED, PICK_FAILED)
+                    self.on_event("ERROR", f"Failed to pick piece {piece['piece_id']}")
+                    return False
+                job.set_state(piece, PLACING)
+        except SlotEmpty as e:
+            job.set_state(piece, FAILED, str(e))
+            self.on_event("ERROR", f"{e}; skipping piece")
+            return False
+        
+        if piece["state"] == PLACING:
+            if piece.get("check"):
+                raise JobPaused(f"Piece {piece['piece_id']} may already be in the {piece['bin']}; "
+                                f"check the gripper before resuming")
+            self.on_event("INFO", f"Placing piece {piece['piece_id']} in {piece['bin']}...")
+            job.set_check(piece, CHECK_PLACE)
+            response, transport_error = self._command("place_piece", piece, {"location": piece["bin"]})
+            if response is None and transport_error:
+                raise JobPaused(f"Link lost while placing piece {piece['piece_id']}; "
+                                f"check the gripper before resuming")
+            piece["check"] = None  # Definite reply; saved with the new state
+            if response is None or response.get("status") != "success":
+                job.set_state(piece, FAILED, PLACE_FAILED)
+                self.on_event("ERROR", f"Failed to place piece {piece['piece_id']} "
+                                       f"(check the gripper before resuming)")
+                return False
+            job.set_state(piece, DONE)
+            self.on_event("SUCCESS", f"Piece {piece['piece_id']} sorted successfully!")
+            return True
+        
+        return piece["state"] == DONE
+    
+    def return_home(self):
+        """Send the robot home (one retry round; failure is only a warning)."""
+        response, _ = self._command("move_home", {"piece_id": None, "attempts": 0}, {})
+        if response and response.get("status") == "success":
+            self.on_event("SUCCESS", "Returned to home")
+        else:
+            self.on_event("WARNING", "Failed to return home")
+    
+    def plan_steps(self, pieces):
+        """
+        Build the robot plan for a list of pieces.
+        
+        Returns:
+            tuple: (steps, owners) where owners[i] is the piece of steps[i].
+        """
+        steps, owners = [], []
+        for piece in pieces:
+            if "position" in piece:
+                steps.append({"command": "pick", "position": piece["position"],
+                              "orientation": piece["orientation"]})
+            else:
+                steps.append({"command": "pick_piece", "piece": f"piece {piece['robot_piece_id']}"})
+            steps.append({"command": "place_piece", "location": piece["bin"]})
+            steps.append({"command": "move_home"})
+            owners.extend([piece, piece, piece])
+        return steps, owners
+    
+    def _run_plan(self, on_progress):
+        """
+        Send every pending piece as one plan and follow its step events.
+        
+        Returns:
+            bool: True if the whole plan succeeded, False if the server
+            stopped at a failed step (the pieces are left in the state of
+            their last finished step and the per-piece path retries from there).
+        
+        Raises:
+            JobPaused: If the link was lost mid-plan; every unconfirmed piece
+                is flagged for an operator check.
+        """
+        pieces = self.job.remaining()
+        steps, owners = self.plan_steps(pieces)
+        self.on_event("INFO", f"Sending sort plan: {len(pieces)} pieces, {len(steps)} steps")
+        self.job.set_state(pieces[0], PICKING)
+        
+        def on_step(event):
+            index = event["index"]
+            piece = owners[index]
+            command = steps[index]["command"]
+            if command != "move_home":
+                piece["attempts"] += 1
+            if event.get("status") != "success":
+                return
+            if command in ("pick", "pick_piece"):
+                self.job.set_state(piece, PLACING)
+            elif command == "place_piece":
+                self.job.set_state(piece, DONE)
+                self.on_event("SUCCESS", f"Piece {piece['piece_id']} sorted successfully!")
+                if on_progress:
+                    on_progress(self.job)
+            elif index + 1 < len(steps):
+                self.job.set_state(owners[index + 1], PICKING)
+        
+        result = self.execute_plan(steps, [piece["piece_id"] for piece in owners], on_step)
+        if result is None:
+            # The server may have run more steps than we saw events for, or may
+            # still be running the plan: nothing unconfirmed is re-sent blindly
+            self.job.flag_unconfirmed(pieces)
+            raise JobPaused(f"Sort plan interrupted: no response ({self.client.last_error}). "
+                            f"The robot may still be running it; wait for it to stop and "
+                            f"check the tray before resuming")
+        if result.get("status") != "success":
+            failed = result.get("failed_step")
+            where = (f" at {steps[failed]['command']} of piece {owners[failed]['piece_id']}"
+                     if failed is not None and failed < len(steps) else "")
+            self.on_event("WARNING", f"Sort plan stopped{where}: {result.get('message', result)}; "
+                                     f"continuing piece by piece")
+            return False
+        self.on_event("SUCCESS", "Returned to home")
+        return True
+    
+    def run(self, on_progress=None, settle_delay=0.5):
+        """
+        Run every remaining piece of the job.
+        
+        Args:
+            on_progress (callable): on_progress(job) after each piece.
+            settle_delay (float): Pause between steps (seconds).
+        
+        Returns:
+            bool: True if the job finished, False if it was stopped.
+        
+        Raises:
+            JobPaused: If the robot link could not be recovered.
+        """
+        remaining = self.job.remaining()
+        if self.execute_plan and remaining and all(p["state"] == PENDING for p in remaining):
+            # A stop request takes effect once the plan has finished
+            if self._run_plan(on_progress):
+                return True
+        
+        for piece in self.job.remaining():
+            if self.should_stop():
+                self.on_event("WARNING", "Sorting paused; the job can be resumed")
+                return False
+            if self.process_piece(piece):
+                self.sleep(settle_delay)
+                self.return_home()
+            if on_progress:
+                on_progress(self.job)
+            self.sleep(settle_delay)
+        return True
@@ -8,6 +8,7 @@ Features:
 4. Real-time progress tracking
 """
 
+import os
 import tkinter as tk
 from tkinter import messagebox, ttk
 from PIL import Image, ImageTk
@@ -15,8 +16,31 @@ import cv2
 import threading
 import time
 import platform
-from ultralytics import YOLO
+import numpy as np
 from robot_client import RobotClient
+from dispatcher import Dispatcher, RobotArm
+from link_health import LinkMonitor, GOOD, DOWN
+from overlay import RegionOverlay, draw_tracks
+from preprocess import FramePreprocessor
+from detection import detect, detect_regions, region_statuses, BAD_CLASS_ID, PIECE_REGIONS
+from tiling import TiledDetector
+from tracker import CentroidTracker, STATUS_GOOD, STATUS_BAD
+from calibration import PixelToRobot
+from conveyor import BeltEstimator, LatencyModel, ConveyorPlanner, ConveyorSorter
+from scheduler import InferenceScheduler, IDLE, AWAITING_CAPTURE, SORTING
+from region_classifier import RegionClassifier, cascade_regions
+from model_manager import ModelManager
+from dataset_capture import DatasetWriter
+from diagnostics import Diagnostics, ControlServer, tk_stats
+from resources import ResourceManager
+from capture_backends import open_capture
+from autotune import profile_path, load_profile, describe as describe_profile
+from snapshot import DetectionSnapshot, EMPTY_SNAPSHOT
+from audit_store import AuditStore, model_version
+from analytics import Analytics, format_report
+from telemetry import TelemetryPoller, NUM_COLS, COL_TIME, summarize
+from sort_job import (SortJob, SortJobRunner, RetryPolicy, JobPaused, DEFAULT_JOB_PATH, FAILED,
+                      CHECK_PLAN, IN_SLOT, IN_GRIPPER, IN_BIN)
 
 
 class SortingDashboard:
@@ -43,24 +67,46 @@ class SortingDashboard:
         
         self.root.configure(bg=self.dark_bg)
         
+        # Thread budgets (torch/OpenCV) and per-stage core pinning: "latency" keeps
+        # Tk/robot/background on one core and inference on the others
+        self.resource_profile = "latency"
+        self.resources = ResourceManager(
+            self.resource_profile,
+            on_event=lambda level, message: self.root.after(0, lambda: self.log_message(message, level)))
+        self.resources.apply_process()
+        
         # YOLO model configuration
         self.model_path = "yolo.pt"
         self.conf_thresh = 0.3  # Lower threshold to detect BAD pieces better
         self.camera_id = 0  # Default camera (0=first camera, 1=second camera)
         self.contrast = 1.5
         self.brightness = -30
+        self.imgsz = 640  # YOLO input size (square, letterboxed)
+        
+        # Per-host settings measured by autotune.py (backend/model file, input size,
+        # threads, conf_thresh, capture backend); applied by start_camera when present
+        self.host_profile_path = profile_path()
+        self.host_profile = None
+        self.host_profile_warned = False  # "No host profile" is logged once
+        
+        # Fused brightness/contrast LUT + letterbox + display conversion
+        self.preprocessor = FramePreprocessor(self.contrast, self.brightness, self.imgsz)
+        
+        # Tiled high-resolution mode (fixed regions): capture at hires_size and run
+        # tile x tile crops over the regions; applied when the camera starts
+        self.hires_mode = False
+        self.hires_size = (1920, 1080)
+        self.tile_size = 640
+        self.region_frame_size = None  # Default capture size the piece regions are defined at
+        self.tiled_detector = None
+        
+        # Adaptive inference size / frame rate (latency target, CPU temperature, pipeline state)
+        self.scheduler = InferenceScheduler(sizes=(320, 416, 512, self.imgsz), target_latency=0.15)
         
         # Fixed piece positions (x1, y1, x2, y2) - calibrated to actual camera view
         # These represent the 6 fixed positions where pieces are located
         # Visual IDs on screen (will be remapped for robot)
-        self.piece_regions = {
-            1: (300, 280, 500, 480),   # Bottom middle
-            2: (240, 80, 440, 280),    # Top middle
-            3: (40, 80, 240, 280),     # Top left
-            4: (440, 80, 640, 280),    # Top right
-            5: (500, 280, 700, 480),   # Bottom right
-            6: (100, 280, 300, 480),   # Bottom left
-        }
+        self.piece_regions = dict(PIECE_REGIONS)
         
         # ID remapping: Visual ID → Robot ID
         # This maps what we show on screen to what the robot expects
@@ -73,20 +119,103 @@ class SortingDashboard:
             1: 6,  # Visual piece 1 → Robot piece 6
         }
         
+        # Optional crop classifier (region_classifier.npz): confident regions skip YOLO
+        self.classifier = RegionClassifier.load()
+        self.use_classifier = False
+        
+        # Send each tray to the robot server as one plan (falls back per step)
+        self.use_robot_plan = True
+        
+        # Retraining data recorder (raw frames + YOLO labels, written in the background)
+        self.dataset_writer = DatasetWriter(
+            budget_mb=2048, on_thread_start=self.pin_background,
+            on_event=lambda level, message: self.root.after(0, lambda: self.on_dataset_event(message, level)))
+        
+        # Pre-rendered region boxes/labels (sprites are built on the first frame)
+        self.overlay = RegionOverlay(self.piece_regions)
+        
         # Camera and model
         self.cap = None
-        self.model = None
+        # "mjpeg": raw MJPEG from V4L2, libjpeg-turbo decode on its own thread;
+        # "gstreamer": jpegdec appsink pipeline; "opencv": OpenCV decodes in read()
+        self.capture_backend = "mjpeg"
+        self.model = None  # Live model (replaced between frames on promotion)
+        self.model_version = None
+        self.model_manager = ModelManager(
+            imgsz=self.imgsz,
+            on_event=lambda level, message: self.root.after(0, lambda: self.log_message(message, level)),
+            on_thread_start=self.pin_background,
+            load_context=lambda: self.resources.pinned("camera"))
+        self.replay_model = None  # (path, model) used by Insights → Audit replays
+        self.replay_running = False
+        self.candidate_path = "candidate.pt"
         self.camera_running = False
+        # Latest processed frame and its decisions; replaced (never modified) by the
+        # camera thread, so readers take one reference and see a consistent frame
+        self.snapshot = EMPTY_SNAPSHOT
+        self.frame_count = 0
+        
+        # Audit store: every capture + robot command, written in the background
+        self.audit_store = AuditStore(on_thread_start=self.pin_background)
+        self.capture_id = None
+        self.tray_id = None
+        
+        # Per-step sort-cycle timings with hourly / per-shift rollups (analytics/);
+        # set ideal_cycle (rated s per piece) to also get performance and OEE
+        self.analytics = Analytics(
+            ideal_cycle=None,
+            on_event=lambda level, message: self.root.after(0, lambda: self.log_message(message, level)),
+            on_thread_start=self.pin_background)
+        self.analytics.load()
         
         # Robot client
         self.robot_client = None
         self.robot_ip = "192.168.137.1"
+        self.robot_timeout = 60.0  # No reply within this long = link lost (longer than any motion)
+        self.robot_secondary = None  # "host" or "host:port" of a standby robot server (failover)
+        self.heartbeat_interval = 2.0  # Idle seconds before a link heartbeat
+        self.link_dead_after = 6.0  # A silently dropped link is detected within this many seconds
+        self.link_monitors = {}  # {arm name (None for a single robot): LinkMonitor}
+        self.link_status_after = None  # Pending refresh_link_status callback (one loop at a time)
         self.is_connected = False
         
+        # Multi-arm cell: None = the single robot above; otherwise one entry per arm
+        # sharing the camera view, each with the regions it reaches and its own ID map:
+        # [{"name": "left", "host": "192.168.137.1", "regions": [3, 6, 2, 1], "id_map": {3: 1, 6: 2, 2: 3, 1: 4}},
+        #  {"name": "right", "host": "192.168.137.2", "regions": [4, 5, 2, 1], "id_map": {4: 1, 5: 2, 2: 3, 1: 4}}]
+        self.robot_arms = None
+        self.arm_zones = {"middle": [1, 2]}  # Regions both arms reach: one arm inside at a time
+        self.dispatcher = None
+        
+        # Robot telemetry (separate connection, sampled in the background)
+        self.telemetry = None
+        self.telemetry_rate_hz = 10.0
+        self.insights_window = None
+        
+        # On-demand profiler / memory diff / Tk counts (Insights → Diagnostics or
+        # the localhost control socket); nothing runs until a capture is requested
+        self.diagnostics = Diagnostics(
+            get_tk_stats=self.get_tk_stats,
+            on_event=lambda level, message: self.root.after(0, lambda: self.log_message(message, level)))
+        self.control_port = 5055  # None disables the control socket
+        self.control_server = None
+        self.max_log_lines = 2000  # Older activity log lines are dropped
+        
         # Detection tracking
-        self.piece_tracker = {}  # {centroid: piece_id}
-        self.next_piece_id = 1
-        self.detected_pieces = {}  # {piece_id: {"status": "GOOD"/"BAD", "centroid": (x,y)}}
+        # "regions": the six fixed piece_regions; "free": pieces anywhere on the
+        # tray, tracked with stable IDs and picked by pose (needs calibration.json);
+        # "conveyor": like "free", but pieces move and are picked continuously
+        self.tracking_mode = "regions"
+        self.tracker = CentroidTracker(max_distance=50.0, max_age=1.0)
+        self.calibration = PixelToRobot.load()
+        self.pick_targets = {}  # {track_id: (position, orientation)} of the last capture
+        
+        # Conveyor mode: belt velocity, measured latencies and the pick loop
+        self.belt = BeltEstimator()
+        self.latency = LatencyModel()
+        self.conveyor_reach = None  # ((x_min, x_max), (y_min, y_max)) robot mm, None = anywhere
+        self.conveyor_sorter = None
+        self.last_frame_time = None  # time.monotonic() capture time of the latest frame
         
         # Sorting state
         self.is_sorting = False
@@ -95,6 +224,11 @@ class SortingDashboard:
         self.processed_pieces = 0
         self.total_pieces = 0
         
+        # Resumable sort job (persisted per-piece state) and retry policy
+        self.job_path = DEFAULT_JOB_PATH
+        self.sort_job = None
+        self.retry_policy = RetryPolicy(max_attempts=3, base_delay=1.0, factor=2.0, max_delay=10.0)
+        
         # Build UI
         self.create_widgets()
         
@@ -132,6 +266,20 @@ class SortingDashboard:
         )
         subtitle_label.pack(side="left", padx=(15, 0))
         
+        insights_btn = tk.Button(
+            header_frame,
+            text="📈 Insights",
+            command=self.open_insights,
+            bg=self.dark_secondary,
+            fg=self.dark_fg,
+            font=("Arial", 10, "bold"),
+            padx=12,
+            pady=4,
+            relief=tk.FLAT,
+            cursor="hand2"
+        )
+        insights_btn.pack(side="right")
+        
         # ===== LEFT SIDE: CAMERA VIEW =====
         camera_container = tk.Frame(main_container, bg=self.dark_secondary, relief=tk.RIDGE, borderwidth=2)
         camera_container.grid(row=1, column=0, sticky="nsew", padx=(0, 10))
@@ -155,6 +303,7 @@ class SortingDashboard:
             highlightthickness=0
         )
         self.camera_canvas.pack(padx=5, pady=(0, 5))
+        self.camera_image_item = None  # Single image item, updated in place every frame
         
         # Camera controls
         camera_controls = tk.Frame(camera_container, bg=self.dark_secondary)
@@ -204,6 +353,72 @@ class SortingDashboard:
         )
         self.detect_btn.pack(side="left", padx=5)
         
+        self.free_mode_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            camera_controls,
+            text="Free placement",
+            variable=self.free_mode_var,
+            command=self.on_tracking_mode_change,
+            bg=self.dark_secondary,
+            fg=self.dark_fg,
+            selectcolor=self.dark_bg,
+            activebackground=self.dark_secondary,
+            font=("Arial", 10)
+        ).pack(side="left", padx=5)
+        
+        self.conveyor_mode_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            camera_controls,
+            text="Conveyor",
+            variable=self.conveyor_mode_var,
+            command=self.on_tracking_mode_change,
+            bg=self.dark_secondary,
+            fg=self.dark_fg,
+            selectcolor=self.dark_bg,
+            activebackground=self.dark_secondary,
+            font=("Arial", 10)
+        ).pack(side="left", padx=5)
+        
+        self.classifier_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            camera_controls,
+            text="Fast classifier",
+            variable=self.classifier_var,
+            command=self.on_classifier_toggle,
+            bg=self.dark_secondary,
+            fg=self.dark_fg,
+            selectcolor=self.dark_bg,
+            activebackground=self.dark_secondary,
+            font=("Arial", 10),
+            state=tk.NORMAL if self.classifier else tk.DISABLED
+        ).pack(side="left", padx=5)
+        
+        self.dataset_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            camera_controls,
+            text="Record dataset",
+            variable=self.dataset_var,
+            command=self.on_dataset_toggle,
+            bg=self.dark_secondary,
+            fg=self.dark_fg,
+            selectcolor=self.dark_bg,
+            activebackground=self.dark_secondary,
+            font=("Arial", 10)
+        ).pack(side="left", padx=5)
+        
+        self.hires_var = tk.BooleanVar(value=self.hires_mode)
+        tk.Checkbutton(
+            camera_controls,
+            text="Hi-res tiles",
+            variable=self.hires_var,
+            command=self.on_hires_toggle,
+            bg=self.dark_secondary,
+            fg=self.dark_fg,
+            selectcolor=self.dark_bg,
+            activebackground=self.dark_secondary,
+            font=("Arial", 10)
+        ).pack(side="left", padx=5)
+        
         # ===== RIGHT SIDE: CONTROL PANEL =====
         control_panel = tk.Frame(main_container, bg=self.dark_bg)
         control_panel.grid(row=1, column=1, sticky="nsew")
@@ -439,13 +654,16 @@ class SortingDashboard:
         
         log_entry = f"[{timestamp}] {prefix} {message}\n"
         self.log_text.insert(tk.END, log_entry)
+        lines = int(self.log_text.index("end-1c").split(".")[0])
+        if lines > self.max_log_lines:
+            self.log_text.delete("1.0", f"{lines - self.max_log_lines + 1}.0")
         self.log_text.see(tk.END)
         self.log_text.config(state=tk.DISABLED)
         self.root.update()
     
     def adjust_brightness_contrast(self, frame):
         """Adjust brightness and contrast of frame."""
-        return cv2.convertScaleAbs(frame, alpha=self.contrast, beta=self.brightness)
+        return self.preprocessor.adjust(frame)
     
     def find_camera(self):
         """Find available camera - handles both Windows and Linux."""
@@ -463,16 +681,19 @@ class SortingDashboard:
             camera_order = [0, 1, 2, 3]  # Try index 0 first on Linux
             self.log_message(f"Using {'V4L2' if os_name == 'Linux' else 'default'} backend (Linux/Unix)")
         
+        # Raw MJPEG / GStreamer capture is Linux-only; elsewhere OpenCV decodes
+        kind = self.capture_backend if os_name == "Linux" else "opencv"
+        
         # Try to open camera with detected backend
         for i in camera_order:
             try:
                 self.log_message(f"Trying camera index {i}...")
-                cap = cv2.VideoCapture(i, backend)
+                cap, used = open_capture(i, backend, kind, log=lambda message: self.log_message(message, "WARNING"))
                 if cap.isOpened():
                     # Test if we can actually read a frame
                     ret, frame = cap.read()
                     if ret and frame is not None:
-                        self.log_message(f"Camera found at index {i}", "SUCCESS")
+                        self.log_message(f"Camera found at index {i} ({used} capture)", "SUCCESS")
                         return cap, i
                 cap.release()
             except Exception as e:
@@ -488,11 +709,17 @@ class SortingDashboard:
             return
         
         self.log_message("Starting camera...")
+        self.apply_host_profile()
         
-        # Load YOLO model
+        # Load YOLO model (kept across camera restarts; replaced via the Model tab)
         try:
-            self.model = YOLO(self.model_path)
-            self.log_message("YOLO model loaded", "SUCCESS")
+            live = self.model_manager.live
+            if live is None or live.path != self.model_path:
+                live = self.model_manager.load_live(self.model_path)
+            self.model = live.model
+            self.model_version = live.version
+            self.resources.apply_inference_threads()
+            self.log_message(f"YOLO model loaded ({self.model_version})", "SUCCESS")
         except Exception as e:
             self.log_message(f"Failed to load YOLO model: {e}", "ERROR")
             messagebox.showerror("Error", f"Failed to load YOLO model:\n{e}")
@@ -506,7 +733,10 @@ class SortingDashboard:
             messagebox.showerror("Error", "No camera detected")
             return
         
+        self.setup_capture_resolution()
+        
         self.camera_running = True
+        self.scheduler.set_state(AWAITING_CAPTURE)
         self.start_camera_btn.config(state=tk.DISABLED)
         self.stop_camera_btn.config(state=tk.NORMAL)
         self.detect_btn.config(state=tk.NORMAL)
@@ -515,124 +745,319 @@ class SortingDashboard:
         self.camera_thread = threading.Thread(target=self.camera_loop, daemon=True)
         self.camera_thread.start()
     
+    def apply_host_profile(self):
+        """Apply this host's autotune profile (host_profiles/<hostname>.json), if any."""
+        profile = load_profile(self.host_profile_path)
+        if profile is None:
+            if not self.host_profile_warned:
+                self.log_message("No host profile; run autotune.py to tune this host", "WARNING")
+                self.host_profile_warned = True
+            return
+        
+        # An export only matches the weights it was made from (unchanged on camera restarts)
+        if self.model_path != profile["model_path"]:
+            if model_version(self.model_path) == profile["model_version"] and os.path.exists(profile["model_path"]):
+                self.model_path = profile["model_path"]
+            elif profile["backend"] != "torch":
+                self.log_message(f"Host profile was tuned for {profile['model_version']}; "
+                                 f"keeping {self.model_path} (rerun autotune.py)", "WARNING")
+        
+        imgsz = profile["imgsz"]
+        if imgsz != self.imgsz:
+            self.imgsz = imgsz
+            self.preprocessor.set_imgsz(imgsz)
+            self.model_manager.imgsz = imgsz
+            # The tuned size is the largest the scheduler may use
+            sizes = [size for size in self.scheduler.sizes if size < imgsz] + [imgsz]
+            self.scheduler = InferenceScheduler(sizes=sizes, target_latency=self.scheduler.target_latency)
+        if profile["threads"] and profile["resource_profile"] == self.resource_profile:
+            self.resources.budgets["torch"] = profile["threads"]
+        self.conf_thresh = profile["conf_thresh"]
+        self.capture_backend = profile["capture_backend"]
+        if profile.get("hires_size"):
+            self.hires_size = tuple(profile["hires_size"])
+        
+        if self.host_profile is None or self.host_profile["created"] != profile["created"]:
+            self.log_message(f"Host profile: {describe_profile(profile)}",
+                             "SUCCESS" if profile["met_floor"] else "WARNING")
+        self.host_profile = profile
+    
+    def setup_capture_resolution(self):
+        """Record the default capture size and switch to high resolution in tiled mode."""
+        width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if self.region_frame_size is None:
+            self.region_frame_size = (width, height)
+        # Recorded boxes are normalised; tiling.py --dataset needs the regions to score them
+        self.dataset_writer.set_layout(self.piece_regions, self.region_frame_size)
+        self.tiled_detector = None
+        if not self.hires_mode:
+            return
+        
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.hires_size[0])
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.hires_size[1])
+        actual = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        if actual[0] <= self.region_frame_size[0]:
+            self.log_message(f"Camera does not support {self.hires_size[0]}x{self.hires_size[1]}; "
+                             f"tiled mode off", "WARNING")
+            return
+        self.tiled_detector = TiledDetector(self.piece_regions, self.region_frame_size, tile=self.tile_size,
+                                            contrast=self.contrast, brightness=self.brightness,
+                                            record=self.preprocessor.record)
+        tiles = self.tiled_detector.layout((actual[1], actual[0], 3))
+        self.log_message(f"Hi-res tiles: {actual[0]}x{actual[1]}, {len(tiles)} tiles of "
+                         f"{self.tile_size}px over the piece regions")
+    
+    def on_hires_toggle(self):
+        """Enable or disable tiled high-resolution inference (applied on camera start)."""
+        self.hires_mode = self.hires_var.get()
+        if self.camera_running:
+            self.log_message("Hi-res tiles: restart the camera to apply")
+        else:
+            self.log_message(f"Hi-res tiles {'enabled' if self.hires_mode else 'disabled'}")
+    
     def stop_camera(self):
         """Stop camera feed."""
         self.camera_running = False
         if self.cap:
             self.cap.release()
+            if hasattr(self.cap, "describe"):
+                self.log_message(f"Capture: {self.cap.describe()}")
         self.start_camera_btn.config(state=tk.NORMAL)
         self.stop_camera_btn.config(state=tk.DISABLED)
         self.detect_btn.config(state=tk.DISABLED)
         self.log_message("Camera stopped")
+        if self.preprocessor.timings:
+            self.log_message(f"Avg frame timings: {self.preprocessor.format_timings()}")
+            self.log_message(f"Scheduler: {self.scheduler.describe()}")
     
-    def get_centroid(self, box):
-        """Calculate centroid of detection box."""
-        x1, y1, x2, y2 = box.xyxy[0]
-        return (float((x1 + x2) / 2), float((y1 + y2) / 2))
+    def on_tracking_mode_change(self):
+        """Switch between fixed-region, free-placement and conveyor tracking."""
+        if self.conveyor_mode_var.get():
+            self.tracking_mode = "conveyor"
+        elif self.free_mode_var.get():
+            self.tracking_mode = "free"
+        else:
+            self.tracking_mode = "regions"
+        if self.tracking_mode != "regions" and self.robot_arms:
+            # Pick poses come from one calibration, i.e. one robot's base frame
+            self.log_message(f"{self.tracking_mode.capitalize()} mode needs a single robot "
+                             f"(robot_arms is set)", "ERROR")
+            messagebox.showerror("Multiple Arms", f"{self.tracking_mode.capitalize()} mode picks by pose "
+                                                  f"and is only supported with a single robot.")
+            allowed = False
+        else:
+            allowed = self.tracking_mode == "regions" or self.check_calibration(f"{self.tracking_mode} mode")
+        if not allowed:
+            self.free_mode_var.set(False)
+            self.conveyor_mode_var.set(False)
+            self.tracking_mode = "regions"
+        self.tracker.reset()
+        self.belt.reset()
+        self.snapshot = EMPTY_SNAPSHOT
+        self.pick_targets = {}
+        self.log_message(f"Tracking mode: {self.tracking_mode}")
     
-    def match_detection(self, centroid, threshold=50):
-        """Match detection to existing piece or create new one."""
-        best_match = None
-        best_distance = threshold
+    def check_calibration(self, action):
+        """
+        Refuse pose-based picking without calibration.json.
         
-        for tracked_centroid, piece_id in self.piece_tracker.items():
-            dist = ((centroid[0] - tracked_centroid[0])**2 + 
-                   (centroid[1] - tracked_centroid[1])**2) ** 0.5
-            
-            if dist < best_distance:
-                best_distance = dist
-                best_match = (tracked_centroid, piece_id)
+        Without it PixelToRobot is the identity, so pick poses would be raw
+        pixel coordinates sent to the robot as millimetres.
         
-        if best_match:
-            old_centroid, piece_id = best_match
-            del self.piece_tracker[old_centroid]
-            self.piece_tracker[centroid] = piece_id
-            return piece_id
+        Args:
+            action (str): What needs the calibration (for the message).
         
-        new_piece_id = self.next_piece_id
-        self.next_piece_id += 1
-        self.piece_tracker[centroid] = new_piece_id
-        return new_piece_id
+        Returns:
+            bool: True if calibrated.
+        """
+        if self.calibration.calibrated:
+            return True
+        self.log_message(f"{action} needs calibration.json (pixel → robot mapping); run calibration.py first",
+                         "ERROR")
+        messagebox.showerror("Not Calibrated", f"{action.capitalize()} needs calibration.json.\n\n"
+                                               f"Run calibration.py to map pixels to robot coordinates.")
+        return False
+    
+    def on_classifier_toggle(self):
+        """Enable or disable the classifier → YOLO cascade for fixed regions."""
+        self.use_classifier = self.classifier_var.get() and self.classifier is not None
+        self.log_message("Fast classifier " + ("enabled (uncertain regions go to YOLO)"
+                                               if self.use_classifier else "disabled"))
+    
+    def on_dataset_toggle(self):
+        """Start or stop recording retraining samples."""
+        writer = self.dataset_writer
+        if not self.dataset_var.get():
+            writer.stop()
+            self.log_message(f"Dataset recording stopped: {writer.describe()}")
+            return
+        
+        if self.model is not None:
+            # Label with the class IDs of the model being retrained
+            names = {str(name).upper(): class_id for class_id, name in self.model.names.items()}
+            if len(names) == 1:
+                # BAD-only model: GOOD pieces are background, not a class
+                writer.class_ids = {"BAD": next(iter(names.values())), "GOOD": None}
+                self.log_message("Single-class model: GOOD pieces are recorded as crops only, "
+                                 "without label lines")
+            else:
+                writer.class_ids = {"BAD": names.get("BAD", BAD_CLASS_ID),
+                                    "GOOD": names.get("GOOD", 1 - BAD_CLASS_ID)}
+        try:
+            writer.start()
+        except OSError as e:
+            self.dataset_var.set(False)
+            self.log_message(f"Cannot record dataset: {e}", "ERROR")
+            return
+        self.log_message(f"Recording dataset to {writer.root}/ ({writer.describe()})")
+    
+    def on_dataset_event(self, message, level):
+        """Log a dataset writer error; untick recording if the writer has stopped."""
+        self.log_message(message, level)
+        if self.dataset_var.get() and not self.dataset_writer.enabled:
+            self.dataset_var.set(False)
+    
+    def update_tracks(self, xyxy, classes, confidences, timestamp=None):
+        """
+        Feed one frame of detections to the free-placement tracker.
+        
+        Args:
+            xyxy (ndarray): (N, 4) boxes in frame coordinates.
+            classes (ndarray): (N,) class IDs.
+            confidences (ndarray): (N,) confidences.
+            timestamp (float): time.monotonic() capture time of the frame.
+        
+        Returns:
+            dict: Confirmed tracks {track_id: {"status", "confidence", "centroid", ...}}
+        """
+        centroids = np.column_stack(((xyxy[:, 0] + xyxy[:, 2]) / 2, (xyxy[:, 1] + xyxy[:, 3]) / 2))
+        statuses = np.where(classes == BAD_CLASS_ID, STATUS_BAD, STATUS_GOOD)
+        self.tracker.update(centroids, xyxy, statuses, confidences, timestamp)
+        return self.tracker.tracks()
     
     def camera_loop(self):
         """Main camera loop with YOLO detection using fixed regions."""
+        self.resources.pin("camera")
         while self.camera_running:
+            frame_start = time.monotonic()
+            if hasattr(self.cap, "output_size"):
+                # MJPEG decode thread: when a hi-res frame is downsized anyway (non-tiled
+                # paths), decode straight to the reference size with scaled IDCT
+                downsize = self.tiled_detector is not None and (self.tracking_mode != "regions"
+                                                                or self.use_classifier)
+                self.cap.output_size = self.region_frame_size if downsize else None
             ret, frame = self.cap.read()
+            capture_time = time.monotonic()
             if not ret:
                 self.log_message("Failed to read frame", "ERROR")
                 break
             
-            # Adjust image
-            frame = self.adjust_brightness_contrast(frame)
+            raw = frame  # Capture-size frame for the dataset recorder (hi-res in tiled mode)
+            tiled = self.tiled_detector
+            if tiled is not None and (self.tracking_mode != "regions" or self.use_classifier):
+                # Tiles only cover the fixed regions; other paths run at the reference size
+                frame = tiled.reference_frame(frame)
+                tiled = None
             
-            # Run YOLO detection on full frame
-            results = self.model(frame, conf=self.conf_thresh, verbose=False)
+            if self.tracking_mode != "regions":
+                # Free placement / conveyor: match every detection to a stable track ID
+                xyxy, classes, confidences, prepared = detect(self.model, self.preprocessor,
+                                                              frame, self.conf_thresh)
+                t0 = time.perf_counter()
+                pieces = self.update_tracks(xyxy, classes, confidences, capture_time)
+                if self.tracking_mode == "conveyor":
+                    self.belt.update(pieces)
+                self.preprocessor.record("tracking", time.perf_counter() - t0)
+                adjusted = prepared.adjusted
+            elif tiled is not None:
+                # Full-resolution tiles over the regions, merged across seams; boxes,
+                # overlay and everything downstream are at the reference size
+                xyxy, classes, confidences, adjusted = tiled.detect(self.model, frame, self.conf_thresh)
+                pieces = region_statuses(xyxy, classes, confidences, self.piece_regions)
+                frame = tiled.reference_frame(frame)
+            elif self.use_classifier:
+                # Classify the region crops; only uncertain regions trigger YOLO
+                pieces, adjusted, _ = cascade_regions(self.classifier, self.model, self.preprocessor,
+                                                      frame, self.piece_regions, self.conf_thresh)
+            else:
+                # Adjust image (LUT), letterbox it into shared buffers and run YOLO;
+                # for each fixed piece region, check if there's a BAD detection inside
+                pieces, prepared = detect_regions(self.model, self.preprocessor, frame,
+                                                  self.piece_regions, self.conf_thresh)
+                adjusted = prepared.adjusted
             
-            # For each fixed piece region, check if there's a BAD detection inside
-            for piece_id, (rx1, ry1, rx2, ry2) in self.piece_regions.items():
-                # Default status is GOOD
-                status = "GOOD"
-                piece_centroid = ((rx1 + rx2) / 2, (ry1 + ry2) / 2)
-                
-                # Check if any YOLO detection (BAD class) falls within this region
-                if results and len(results) > 0:
-                    boxes = results[0].boxes
-                    if boxes is not None and len(boxes) > 0:
-                        for box in boxes:
-                            bx1, by1, bx2, by2 = box.xyxy[0]
-                            box_center_x = (float(bx1) + float(bx2)) / 2
-                            box_center_y = (float(by1) + float(by2)) / 2
-                            
-                            # Check if detection center is inside this piece region
-                            if rx1 <= box_center_x <= rx2 and ry1 <= box_center_y <= ry2:
-                                cls_id = int(box.cls[0])
-                                if cls_id == 0:  # BAD class
-                                    status = "BAD"
-                                    break
-                
-                # Store piece status
-                self.detected_pieces[piece_id] = {
-                    "status": status,
-                    "centroid": piece_centroid
-                }
-                
-                # Draw region box
-                color = (0, 0, 255) if status == "BAD" else (0, 255, 0)
-                cv2.rectangle(frame, (rx1, ry1), (rx2, ry2), color, 3)
-                
-                # Draw label
-                label = f"Piece {piece_id}: {status}"
-                label_size, _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)
-                cv2.rectangle(frame, (rx1, ry1 - label_size[1] - 10), 
-                            (rx1 + label_size[0], ry1), color, -1)
-                cv2.putText(frame, label, (rx1, ry1 - 5), 
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+            if self.tracking_mode == "regions":
+                # Every Nth frame also goes to the candidate model (shadow mode)
+                self.model_manager.submit(frame, self.piece_regions, pieces,
+                                          time.monotonic() - capture_time, self.preprocessor.imgsz)
             
-            # Convert frame for tkinter
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame_resized = cv2.resize(frame_rgb, (640, 480))
-            img = Image.fromarray(frame_resized)
+            # Raw (pre-overlay) frame + labels for retraining; written off this thread
+            if self.dataset_writer.enabled:
+                if self.tracking_mode == "regions":
+                    # Label the detection box; a region cell is not an object box,
+                    # so regions without a detection are left out
+                    labels = {pid: dict(piece, box=piece["detection_box"]) for pid, piece in pieces.items()
+                              if piece.get("detection_box") is not None}
+                else:
+                    labels = pieces
+                if raw is not frame:
+                    # Tiled mode: record the hi-res capture, boxes scaled up from the reference size
+                    sx, sy = raw.shape[1] / frame.shape[1], raw.shape[0] / frame.shape[0]
+                    labels = {pid: dict(piece, box=(piece["box"][0] * sx, piece["box"][1] * sy,
+                                                    piece["box"][2] * sx, piece["box"][3] * sy))
+                              for pid, piece in labels.items()}
+                self.dataset_writer.submit(raw, labels)
+            
+            # Publish the raw frame and its decisions as one immutable snapshot
+            snapshot = DetectionSnapshot.from_pieces(self.frame_count + 1, capture_time, self.tracking_mode,
+                                                     pieces, self.piece_regions, frame)
+            self.snapshot = snapshot
+            self.last_frame_time = capture_time
+            self.frame_count += 1
+            
+            # Draw region boxes and labels (only changed cells are re-rendered)
+            t0 = time.perf_counter()
+            if self.tracking_mode != "regions":
+                draw_tracks(adjusted, pieces)
+            else:
+                self.overlay.render(adjusted, snapshot.statuses())
+            self.preprocessor.record("overlay", time.perf_counter() - t0)
+            
+            # Convert frame for tkinter (resize + RGB into a reused display buffer)
+            img = Image.fromarray(self.preprocessor.display(adjusted))
             imgtk = ImageTk.PhotoImage(image=img)
             
-            # Update canvas
-            self.camera_canvas.create_image(0, 0, anchor=tk.NW, image=imgtk)
+            # Update canvas (reuse one image item; a new item per frame piles up
+            # thousands of canvas items over a shift)
+            if self.camera_image_item is None:
+                self.camera_image_item = self.camera_canvas.create_image(0, 0, anchor=tk.NW, image=imgtk)
+            else:
+                self.camera_canvas.itemconfigure(self.camera_image_item, image=imgtk)
             self.camera_canvas.image = imgtk
             
-            time.sleep(0.03)  # ~30 FPS
+            # Adapt inference size and frame rate to latency, temperature and pipeline state
+            self.scheduler.record(time.monotonic() - capture_time)
+            imgsz = self.scheduler.update()
+            if imgsz != self.preprocessor.imgsz:
+                self.preprocessor.set_imgsz(imgsz)
+                self.log_message(f"Scheduler: {self.scheduler.describe()}")
+            time.sleep(self.scheduler.next_delay(frame_start))
     
     def capture_and_detect(self):
         """Capture current frame and finalize detection."""
-        if not self.detected_pieces:
+        # One frame's decisions for everything below, even if the camera publishes a newer one
+        snapshot = self.snapshot
+        if not len(snapshot):
             messagebox.showwarning("No Detection", "No pieces detected yet. Wait for detections to appear.")
             return
+        if self.tracking_mode != "regions" and not self.check_calibration(f"{self.tracking_mode} capture"):
+            return
         
-        # Separate good and bad pieces
-        self.good_pieces = [pid for pid, data in self.detected_pieces.items() if data["status"] == "GOOD"]
-        self.bad_pieces = [pid for pid, data in self.detected_pieces.items() if data["status"] == "BAD"]
-        
-        # Sort IDs numerically to maintain spatial order (critical for server positioning)
-        self.good_pieces.sort()
-        self.bad_pieces.sort()
+        # Separate good and bad pieces; IDs come sorted numerically to maintain
+        # spatial order (critical for server positioning)
+        self.good_pieces = snapshot.ids("GOOD")
+        self.bad_pieces = snapshot.ids("BAD")
         
         # Update UI
         self.good_count_label.config(text=str(len(self.good_pieces)))
@@ -650,12 +1075,56 @@ class SortingDashboard:
         else:
             self.bad_list_label.config(text="None detected")
         
-        self.log_message(f"Detected: {len(self.good_pieces)} good, {len(self.bad_pieces)} bad", "SUCCESS")
+        self.log_message(f"Detected: {len(self.good_pieces)} good, {len(self.bad_pieces)} bad "
+                         f"(frame {snapshot.frame_id})", "SUCCESS")
+        
+        # Free placement: freeze each piece's pick pose at capture time
+        regions, robot_id_map = self.piece_regions, self.robot_id_map
+        if self.tracking_mode != "regions":
+            robot_id_map = {}
+            self.pick_targets = {pid: self.calibration.pick_pose(data["centroid"])
+                                 for pid, data in snapshot.pieces.items()}
+            regions = {pid: data["box"] for pid, data in snapshot.pieces.items()}
+        
+        # Persist what the camera saw for this tray
+        if snapshot.frame is not None:
+            self.capture_id, self.tray_id = self.audit_store.record_capture(
+                snapshot.frame, snapshot.pieces, regions, self.model_version,
+                self.conf_thresh, robot_id_map)
+            self.log_message(f"Capture saved: tray {self.tray_id} ({self.capture_id})")
+            self.analytics.start_tray(self.tray_id, snapshot.statuses(), self.scheduler.latency)
+        
+        # Detection is final until sorting starts; keep the camera at a low duty cycle
+        self.scheduler.set_state(IDLE)
         
         # Enable sorting if robot is connected
         if self.is_connected:
             self.sort_btn.config(state=tk.NORMAL)
     
+    def replay_capture(self, capture_id):
+        """
+        Run a stored capture through the current model (runs on a worker thread).
+        
+        Args:
+            capture_id (str): Capture to replay (see audit_store.py list).
+        
+        Returns:
+            dict: Recorded vs replayed decisions (see AuditStore.replay).
+        """
+        live = self.model_manager.live
+        path = live.path if live else self.model_path
+        if self.replay_model is None or self.replay_model[0] != path:
+            # Own instance: the camera thread may be predicting on the live one
+            self.replay_model = (path, self.model_manager.loader(path))
+        model = self.replay_model[1]
+        preprocessor = FramePreprocessor(self.contrast, self.brightness, self.imgsz)
+        
+        def detect(frame, regions):
+            pieces, _ = detect_regions(model, preprocessor, frame, regions, self.conf_thresh)
+            return pieces
+        
+        return self.audit_store.replay(capture_id, detect)
+    
     def connect_robot(self):
         """Connect to robot server."""
         self.robot_ip = self.ip_entry.get().strip()
@@ -669,7 +1138,12 @@ class SortingDashboard:
         
         def connect_thread():
             try:
-                self.robot_client = RobotClient(self.robot_ip)
+                if self.robot_arms:
+                    self.connect_arms()
+                    return
+                self.robot_client = RobotClient(self.robot_ip, timeout=self.robot_timeout,
+                                                secondary=self.robot_secondary,
+                                                dead_after=self.link_dead_after)
                 
                 if self.robot_client.connect():
                     self.is_connected = True
@@ -677,16 +1151,48 @@ class SortingDashboard:
                 else:
                     self.root.after(0, self.on_connection_failed)
             except Exception as e:
-                self.root.after(0, lambda: self.on_connection_error(str(e)))
+                self.root.after(0, lambda error=str(e): self.on_connection_error(error))
         
         threading.Thread(target=connect_thread, daemon=True).start()
     
+    def connect_arms(self):
+        """Connect every arm of a multi-arm cell (runs on the connect thread)."""
+        arms = [RobotArm.from_config(config, self.robot_timeout, self.link_dead_after)
+                for config in self.robot_arms]
+        dispatcher = Dispatcher(arms, self.arm_zones)
+        failed = dispatcher.connect()
+        if failed:
+            dispatcher.disconnect()
+            self.root.after(0, lambda: self.log_message(f"Could not reach arm(s): {', '.join(failed)}", "ERROR"))
+            self.root.after(0, self.on_connection_failed)
+            return
+        self.dispatcher = dispatcher
+        # The first arm is the dashboard's robot: homing and telemetry use it; every arm
+        # gets its own link monitor (on_connection_success)
+        self.robot_client = arms[0].client
+        self.is_connected = True
+        self.root.after(0, lambda: self.log_message(
+            f"Connected to {len(arms)} arms: {', '.join(arm.name for arm in arms)}", "SUCCESS"))
+        self.root.after(0, self.on_connection_success)
+    
     def on_connection_success(self):
         """Handle successful connection."""
         self.log_message("Connected to robot!", "SUCCESS")
         self.connection_status.config(text="● Connected", fg=self.success_color)
         self.connect_btn.config(text="Disconnect", state=tk.NORMAL, command=self.disconnect_robot)
         
+        # Idle-time heartbeats, RTT histogram and failover to robot_secondary, per arm
+        clients = ({arm.name: arm.client for arm in self.dispatcher.arms} if self.dispatcher
+                   else {None: self.robot_client})
+        for name, client in clients.items():
+            monitor = LinkMonitor(client, self.heartbeat_interval, self.link_dead_after,
+                                  on_change=lambda quality, message, name=name:
+                                  self.on_link_change(quality, message if name is None else f"{name}: {message}"))
+            monitor.start()
+            self.link_monitors[name] = monitor
+        self.cancel_link_status()
+        self.refresh_link_status()
+        
         # Move to home
         try:
             response = self.robot_client.move_home()
@@ -695,9 +1201,43 @@ class SortingDashboard:
         except Exception as e:
             self.log_message(f"Error moving home: {e}", "ERROR")
         
-        # Enable sorting if pieces detected
-        if self.good_pieces or self.bad_pieces:
+        # Enable sorting if pieces detected or an interrupted job can be resumed
+        job = SortJob.load(self.job_path)
+        if self.good_pieces or self.bad_pieces or (job and not job.is_finished()):
             self.sort_btn.config(state=tk.NORMAL)
+        
+        # Start pose/joint sampling on its own connection
+        threading.Thread(target=self.start_telemetry, daemon=True).start()
+    
+    def on_link_change(self, quality, message):
+        """Log a link quality change (called from the heartbeat thread)."""
+        level = "SUCCESS" if quality == GOOD else "ERROR" if quality == DOWN else "WARNING"
+        self.root.after(0, lambda: self.log_message(message, level))
+    
+    def refresh_link_status(self):
+        """Show link quality in the connection status (runs on the Tk thread every second)."""
+        self.link_status_after = None
+        monitors = self.link_monitors
+        if not monitors:
+            return
+        qualities = {name: monitor.quality() for name, monitor in monitors.items()}
+        down = [name for name, quality in qualities.items() if quality == DOWN]
+        if down:
+            where = "" if down == [None] else f" ({', '.join(down)})"
+            self.connection_status.config(text=f"● Link lost{where}, reconnecting...", fg=self.error_color)
+        else:
+            described = "; ".join(monitor.describe() if name is None else f"{name}: {monitor.describe()}"
+                                  for name, monitor in monitors.items())
+            good = all(quality == GOOD for quality in qualities.values())
+            self.connection_status.config(text=f"● Connected ({described})",
+                                          fg=self.success_color if good else self.warning_color)
+        self.link_status_after = self.root.after(1000, self.refresh_link_status)
+    
+    def cancel_link_status(self):
+        """Stop the link status refresh loop."""
+        if self.link_status_after is not None:
+            self.root.after_cancel(self.link_status_after)
+            self.link_status_after = None
     
     def on_connection_failed(self):
         """Handle connection failure."""
@@ -713,7 +1253,15 @@ class SortingDashboard:
     
     def disconnect_robot(self):
         """Disconnect from robot."""
-        if self.robot_client:
+        self.stop_telemetry()
+        self.cancel_link_status()
+        for monitor in self.link_monitors.values():
+            monitor.stop(wait=False)  # Never block the UI on a heartbeat in flight
+        self.link_monitors = {}
+        if self.dispatcher:
+            self.dispatcher.disconnect()
+            self.dispatcher = None
+        elif self.robot_client:
             self.robot_client.disconnect()
         self.is_connected = False
         self.log_message("Disconnected from robot")
@@ -722,103 +1270,835 @@ class SortingDashboard:
         self.sort_btn.config(state=tk.DISABLED)
     
     def start_sorting(self):
-        """Start automated sorting process."""
+        """Start automated sorting process (or resume an interrupted job)."""
         if not self.is_connected:
             messagebox.showerror("Error", "Robot not connected")
             return
         
-        if not self.good_pieces and not self.bad_pieces:
-            messagebox.showwarning("No Pieces", "No pieces to sort")
+        if self.tracking_mode != "regions" and not self.check_calibration(f"{self.tracking_mode} sorting"):
+            return
+        
+        if self.tracking_mode == "conveyor":
+            self.start_conveyor()
             return
         
+        job = SortJob.load(self.job_path)
+        if job and not job.is_finished():
+            remaining = len(job.remaining())
+            if not messagebox.askyesno(
+                    "Resume Sorting",
+                    f"An interrupted sort job for tray {job.tray_id} has {remaining} piece(s) left.\n\n"
+                    f"Resume it? (No starts a new job from the current detection)"):
+                job = None
+        elif job and job.counts()[FAILED] and not (self.good_pieces or self.bad_pieces):
+            if messagebox.askyesno("Retry Failed",
+                                   f"Retry {job.counts()[FAILED]} failed piece(s) of tray {job.tray_id}?"):
+                job.reset_failed()
+            else:
+                job = None
+        else:
+            job = None
+        
+        if job is None:
+            if not self.good_pieces and not self.bad_pieces:
+                messagebox.showwarning("No Pieces", "No pieces to sort")
+                return
+            targets = self.pick_targets if self.tracking_mode == "free" else None
+            job = SortJob.create(self.job_path, self.bad_pieces, self.good_pieces,
+                                 self.robot_id_map, self.tray_id, self.capture_id, targets)
+            self.log_message(f"Starting sorting of {len(job.pieces)} pieces...")
+            self.log_message(f"BAD pieces (in order): {self.bad_pieces}")
+            self.log_message(f"GOOD pieces (in order): {self.good_pieces}")
+        else:
+            if not self.confirm_unknown_places(job):
+                return
+            self.capture_id = job.capture_id
+            self.log_message(f"Resuming tray {job.tray_id}: "
+                             f"{[p['piece_id'] for p in job.remaining()]} remaining")
+        
+        if any("position" in piece for piece in job.remaining()):
+            if self.dispatcher:
+                messagebox.showerror("Multiple Arms", "This job picks by pose, which needs a single robot.")
+                return
+            if not self.check_calibration("pose-based sorting"):
+                return
+        
+        self.sort_job = job
         self.is_sorting = True
+        self.scheduler.set_state(SORTING)
         self.sort_btn.config(state=tk.DISABLED)
-        self.total_pieces = len(self.good_pieces) + len(self.bad_pieces)
-        self.processed_pieces = 0
+        self.total_pieces = len(job.pieces)
+        self.processed_pieces = job.processed()
         self.progress_bar['maximum'] = self.total_pieces
-        self.progress_bar['value'] = 0
-        
-        self.log_message(f"Starting sorting of {self.total_pieces} pieces...")
-        self.log_message(f"BAD pieces (in order): {self.bad_pieces}")
-        self.log_message(f"GOOD pieces (in order): {self.good_pieces}")
+        self.update_progress()
+        
+        runner = SortJobRunner(
+            job,
+            self.robot_client,
+            self.retry_policy,
+            execute=self.robot_command,
+            verify_slot=self.verify_slot,
+            on_event=lambda level, message: self.root.after(0, lambda: self.log_message(message, level)),
+            should_stop=lambda: not self.is_connected,
+            execute_plan=self.robot_plan if self.use_robot_plan else None
+        )
         
         def sorting_thread():
+            self.resources.pin("robot")
             try:
-                # Sort BAD pieces one by one (in numerical ID order)
-                for piece_id in self.bad_pieces:
-                    success = self.pick_and_place(piece_id, "bad bin", "BAD")
-                    if success:
-                        # Return to home after each piece
-                        self.return_to_home()
-                    time.sleep(0.5)
-                
-                # Sort GOOD pieces one by one
-                for piece_id in self.good_pieces:
-                    success = self.pick_and_place(piece_id, "good bin", "GOOD")
-                    if success:
-                        # Return to home after each piece
-                        self.return_to_home()
-                    time.sleep(0.5)
-                
-                self.root.after(0, self.on_sorting_complete)
+                if self.dispatcher:
+                    finished = self.dispatcher.run(
+                        job, self.retry_policy,
+                        execute=lambda arm, command, piece, payload: self.robot_command(command, piece, payload,
+                                                                                        arm.client),
+                        verify_slot=self.verify_slot,
+                        on_event=lambda level, message: self.root.after(0, lambda: self.log_message(message, level)),
+                        should_stop=lambda: not self.is_connected,
+                        on_progress=self.on_job_progress)
+                    self.root.after(0, lambda: self.log_message(f"Arms: {self.dispatcher.describe()}"))
+                else:
+                    finished = runner.run(on_progress=self.on_job_progress)
+                if finished:
+                    self.root.after(0, self.on_sorting_complete)
+                else:
+                    self.root.after(0, lambda: self.on_sorting_paused("Robot disconnected"))
+            except JobPaused as e:
+                self.root.after(0, lambda reason=str(e): self.on_sorting_paused(reason))
             except Exception as e:
-                self.root.after(0, lambda: self.on_sorting_error(str(e)))
+                self.root.after(0, lambda error=str(e): self.on_sorting_error(error))
         
         threading.Thread(target=sorting_thread, daemon=True).start()
     
-    def pick_and_place(self, piece_id, bin_name, status_type):
-        """Pick and place a single piece using exact functions from client_example."""
-        # Map visual ID to robot ID
-        robot_piece_id = self.robot_id_map.get(piece_id, piece_id)
-        piece_name = f"piece {robot_piece_id}"
+    def confirm_unknown_places(self, job):
+        """
+        Ask the operator where pieces with an unknown outcome are.
+        
+        A place whose reply was lost may already have put the piece in the
+        bin, and a sort plan cut off mid-run may have moved pieces we never
+        heard about; sending those steps again would pick empty slots or
+        place with an empty gripper.
+        
+        Returns:
+            bool: False if the operator cancelled (the job is not started).
+        """
+        for piece in job.needs_check():
+            location = None
+            if piece["check"] == CHECK_PLAN:
+                answer = messagebox.askyesnocancel(
+                    "Check Tray",
+                    f"Piece {piece['piece_id']} ({piece['status']}) was in an interrupted sort plan.\n\n"
+                    f"Is it still in its slot?\n"
+                    f"Yes: pick it again   No: check the gripper   Cancel: do not start")
+                if answer is None:
+                    return False
+                if answer:
+                    location = IN_SLOT
+            if location is None:
+                answer = messagebox.askyesnocancel(
+                    "Check Gripper",
+                    f"Piece {piece['piece_id']} ({piece['status']}) may already be in the {piece['bin']}.\n\n"
+                    f"Is it still in the gripper?\n"
+                    f"Yes: place it again   No: it is in the bin   Cancel: do not start")
+                if answer is None:
+                    return False
+                location = IN_GRIPPER if answer else IN_BIN
+            job.resolve_check(piece, location)
+            self.log_message(f"Piece {piece['piece_id']}: operator found it in the {location}")
+        return True
+    
+    def start_conveyor(self):
+        """Start continuous latency-compensated picking from the moving belt."""
+        if not self.camera_running:
+            messagebox.showwarning("Camera Off", "Start the camera before conveyor sorting")
+            return
+        
+        planner = ConveyorPlanner(self.calibration, self.belt, self.latency, self.conveyor_reach)
+        
+        def measure_rtt():
+            self.robot_client.get_pose()
+            return self.robot_client.last_rtt
+        
+        self.conveyor_sorter = ConveyorSorter(
+            planner,
+            execute=self.robot_command,
+            get_tracks=lambda: self.snapshot.pieces,
+            measure_rtt=measure_rtt,
+            on_event=lambda level, message: self.root.after(0, lambda: self.log_message(message, level)),
+            on_progress=self.on_conveyor_progress,
+            should_stop=lambda: not (self.is_sorting and self.is_connected and self.camera_running)
+        )
+        
+        self.is_sorting = True
+        self.scheduler.set_state(AWAITING_CAPTURE)  # Conveyor tracking needs every frame
+        self.processed_pieces = 0
+        self.sort_btn.config(text="⏹ STOP CONVEYOR", command=self.stop_conveyor, bg=self.error_color)
+        self.log_message("Conveyor sorting started")
+        
+        def conveyor_thread():
+            self.resources.pin("robot")
+            try:
+                stats = self.conveyor_sorter.run()
+                self.root.after(0, lambda: self.on_conveyor_stopped(stats))
+            except Exception as e:
+                self.root.after(0, lambda error=str(e): self.on_sorting_error(error))
+        
+        threading.Thread(target=conveyor_thread, daemon=True).start()
+    
+    def stop_conveyor(self):
+        """Stop conveyor sorting after the current piece."""
+        self.is_sorting = False
+        self.sort_btn.config(state=tk.DISABLED)
+        self.log_message("Stopping conveyor sorting after the current piece...")
+    
+    def on_conveyor_progress(self, sorter):
+        """Update counters after each conveyor pick (called from the sorting thread)."""
+        self.processed_pieces = sorter.sorted
+        self.analytics.save_if_due()  # Conveyor runs never end a tray
+        self.root.after(0, lambda: self.progress_label.config(
+            text=f"{sorter.sorted} sorted, {sorter.failed} failed "
+                 f"(lead {self.latency.lead_time(time.monotonic()):.2f} s)"))
+    
+    def on_conveyor_stopped(self, stats):
+        """Restore the sort button once the conveyor loop has exited."""
+        self.is_sorting = False
+        self.scheduler.set_state(AWAITING_CAPTURE)
+        self.analytics.end_tray()
+        self.sort_btn.config(text="▶️ START SORTING", command=self.start_sorting,
+                             bg=self.success_color,
+                             state=tk.NORMAL if self.is_connected else tk.DISABLED)
+        self.log_message(f"Conveyor sorting stopped: {stats['sorted']} sorted, "
+                         f"{stats['failed']} failed", "SUCCESS")
+    
+    def robot_command(self, command, piece, payload, client=None):
+        """
+        Send one sort command with telemetry marks and audit logging.
+        
+        Args:
+            command (str): "pick_piece", "pick", "place_piece" or "move_home".
+            piece (dict): Sort job piece entry.
+            payload (dict): Command arguments.
+            client (RobotClient): Arm to send it to (default: robot_client).
+        
+        Returns:
+            dict: Server response, or None on a transport error.
+        """
+        client = client or self.robot_client
+        marked = client is self.robot_client  # Telemetry samples the first arm only
+        t0 = time.time()
+        if marked:
+            self.mark_telemetry(command, begin=True)
+        if command == "pick_piece":
+            response = client.pick_piece(payload["piece"])
+        elif command == "pick":
+            response = client.pick_object(payload["position"], payload["orientation"])
+        elif command == "place_piece":
+            response = client.place_piece(payload["location"])
+        else:
+            response = client.move_home()
+        if marked:
+            self.mark_telemetry(command, begin=False)
+        duration = time.time() - t0
+        self.audit_store.record_command(self.capture_id, piece.get("piece_id"), command,
+                                        payload, response, duration, t0)
+        self.analytics.record_step(command, piece.get("piece_id"), duration,
+                                   bool(response) and response.get("status") == "success", t0)
+        return response
+    
+    def robot_plan(self, steps, piece_ids, on_step):
+        """
+        Send a whole sort plan with telemetry marks and audit logging per step.
+        
+        Args:
+            steps (list): Command dicts.
+            piece_ids (list): Visual piece ID of each step.
+            on_step (callable): on_step(event) for each finished step.
+        
+        Returns:
+            dict: Final "done" message, or None on a transport error.
+        """
+        started = [time.time()]
+        self.mark_telemetry(steps[0]["command"], begin=True)
+        
+        def on_event(event):
+            index = event["index"]
+            step = steps[index]
+            now = time.time()
+            self.mark_telemetry(step["command"], begin=False)
+            if index + 1 < len(steps):
+                self.mark_telemetry(steps[index + 1]["command"], begin=True)
+            payload = {k: v for k, v in step.items() if k != "command"}
+            response = {"status": event.get("status"), "message": event.get("message")}
+            self.audit_store.record_command(self.capture_id, piece_ids[index], step["command"],
+                                            payload, response, now - started[0], started[0])
+            self.analytics.record_step(step["command"], piece_ids[index], now - started[0],
+                                       event.get("status") == "success", started[0])
+            started[0] = now
+            on_step(event)
+        
+        result = self.robot_client.execute_plan(steps, on_event)
+        if result is None or result.get("status") != "success":
+            failed = result.get("failed_step") if result else None
+            self.mark_telemetry(steps[failed]["command"] if failed is not None and failed < len(steps)
+                                else steps[-1]["command"], begin=False)
+        return result
+    
+    def verify_slot(self, piece_id, timeout=2.0):
+        """
+        Check with the camera whether a slot still holds a piece.
+        
+        Args:
+            piece_id (int): Visual piece ID.
+            timeout (float): Maximum wait for fresh frames (seconds).
+        
+        Returns:
+            bool: True if occupied, False if empty, None if unknown (camera
+            off, or a single-class model that cannot see GOOD pieces).
+        """
+        if not self.camera_running or self.model is None or len(self.model.names) < 2:
+            return None
+        
+        # Wait for frames captured after the robot stopped moving
+        self.scheduler.boost(timeout)
+        target = self.frame_count + 2
+        deadline = time.time() + timeout
+        while self.frame_count < target and time.time() < deadline:
+            time.sleep(0.05)
+        if self.frame_count < target or not len(self.snapshot):
+            return None
+        
+        if self.tracking_mode == "free":
+            # A picked piece's track expires once it is no longer seen
+            time.sleep(self.tracker.max_age)
+            return piece_id in self.tracker.tracks(confirmed=False)
+        
+        piece = self.snapshot.pieces.get(piece_id)
+        if piece is None or piece["detections"] is None:
+            return None
+        return piece["detections"] > 0
+    
+    def on_job_progress(self, job):
+        """Update progress after each piece (called from the sorting thread)."""
+        self.processed_pieces = job.processed()
+        self.root.after(0, self.update_progress)
+    
+    def pin_background(self):
+        """Pin the calling writer/poller thread to the background cores."""
+        self.resources.pin("background")
+    
+    def start_telemetry(self):
+        """Connect the telemetry poller to the dashboard's robot (runs on a worker thread)."""
+        # The first arm's server in a multi-arm cell, not the IP entry
+        client = self.robot_client
+        poller = TelemetryPoller(client.host, client.port, rate_hz=self.telemetry_rate_hz,
+                                 on_thread_start=self.pin_background)
+        if poller.start():
+            self.telemetry = poller
+            self.root.after(0, lambda: self.log_message(
+                f"Telemetry sampling at {self.telemetry_rate_hz:g} Hz"))
+        else:
+            self.root.after(0, lambda: self.log_message("Telemetry connection failed", "WARNING"))
+    
+    def stop_telemetry(self):
+        """Stop the telemetry poller."""
+        if self.telemetry:
+            self.telemetry.stop()
+            self.telemetry = None
+    
+    def mark_telemetry(self, name, begin):
+        """Mark the start/end of a robot command in the telemetry timeline."""
+        if self.telemetry:
+            if begin:
+                self.telemetry.begin(name)
+            else:
+                self.telemetry.end(name)
+    
+    def open_insights(self):
+        """Open (or raise) the Insights window."""
+        if self.insights_window and self.insights_window.winfo_exists():
+            self.insights_window.lift()
+            return
+        
+        self.insights_window = tk.Toplevel(self.root)
+        self.insights_window.title("📈 Insights")
+        self.insights_window.configure(bg=self.dark_bg)
+        self.insights_window.geometry("680x420")
+        
+        self.insights_notebook = ttk.Notebook(self.insights_window)
+        self.insights_notebook.pack(fill="both", expand=True, padx=5, pady=5)
+        
+        self.create_telemetry_tab(self.insights_notebook)
+        self.create_model_tab(self.insights_notebook)
+        self.create_diagnostics_tab(self.insights_notebook)
+        self.create_production_tab(self.insights_notebook)
+        self.create_audit_tab(self.insights_notebook)
+    
+    def create_telemetry_tab(self, notebook):
+        """Create the live robot telemetry plot."""
+        tab = tk.Frame(notebook, bg=self.dark_bg)
+        notebook.add(tab, text="Telemetry")
+        
+        controls = tk.Frame(tab, bg=self.dark_bg)
+        controls.pack(fill="x", padx=10, pady=5)
         
-        # PICK PIECE - Using exact function from client_example
-        self.root.after(0, lambda: self.log_message(f"Picking {status_type} piece {piece_id} (robot ID: {robot_piece_id})..."))
+        tk.Label(
+            controls,
+            text="Sample rate (Hz):",
+            font=("Arial", 9),
+            bg=self.dark_bg,
+            fg=self.dark_fg
+        ).pack(side="left")
+        
+        self.telemetry_rate_var = tk.DoubleVar(value=self.telemetry_rate_hz)
+        tk.Spinbox(
+            controls,
+            from_=1,
+            to=50,
+            increment=1,
+            width=5,
+            textvariable=self.telemetry_rate_var,
+            command=self.on_telemetry_rate_change
+        ).pack(side="left", padx=5)
+        
+        # Legend
+        self.telemetry_series = {"x": (1, "#4fc3f7"), "y": (2, "#ffb74d"), "z": (3, self.success_color)}
+        for name, (_, color) in self.telemetry_series.items():
+            tk.Label(controls, text=f"━ {name}", font=("Arial", 9, "bold"),
+                     bg=self.dark_bg, fg=color).pack(side="left", padx=5)
+        
+        self.telemetry_canvas = tk.Canvas(tab, width=640, height=240, bg="black", highlightthickness=0)
+        self.telemetry_canvas.pack(padx=10)
+        
+        # Line items are created once; refreshes only move their points
+        self.telemetry_lines = {
+            name: self.telemetry_canvas.create_line(0, 0, 0, 0, fill=color, width=2)
+            for name, (_, color) in self.telemetry_series.items()
+        }
+        self.telemetry_plot_buf = np.empty((640, NUM_COLS))  # One sample per pixel column
+        
+        self.telemetry_summary = tk.Label(
+            tab,
+            text="Waiting for telemetry...",
+            font=("Courier New", 8),
+            bg=self.dark_bg,
+            fg="#888888",
+            justify="left",
+            anchor="w"
+        )
+        self.telemetry_summary.pack(fill="x", padx=10, pady=5)
+        
+        self.refresh_telemetry()
+    
+    def on_telemetry_rate_change(self):
+        """Apply a new telemetry sample rate."""
         try:
-            response = self.robot_client.pick_piece(piece_name)
-            
-            if response is None or response.get("status") != "success":
-                self.root.after(0, lambda: self.log_message(f"Failed to pick piece {piece_id}", "ERROR"))
-                self.processed_pieces += 1
-                self.root.after(0, self.update_progress)
-                return False
+            self.telemetry_rate_hz = float(self.telemetry_rate_var.get())
+        except (tk.TclError, ValueError):
+            return
+        if self.telemetry:
+            self.telemetry.set_rate(self.telemetry_rate_hz)
+    
+    def refresh_telemetry(self):
+        """Redraw the telemetry plot (runs on the Tk thread every 500 ms)."""
+        if not (self.insights_window and self.insights_window.winfo_exists()):
+            return
+        
+        if self.telemetry and self.telemetry.count > 1:
+            buf = self.telemetry_plot_buf
+            n = self.telemetry.window(buf)
+            rows = buf[len(buf) - n:]
+            width = int(self.telemetry_canvas.winfo_width()) or 640
+            height = int(self.telemetry_canvas.winfo_height()) or 240
             
-            time.sleep(0.5)
+            t = rows[:, COL_TIME]
+            span = max(t[-1] - t[0], 1e-6)
+            xs = (t - t[0]) / span * (width - 10) + 5
             
-            # PLACE PIECE - Using exact function from client_example
-            self.root.after(0, lambda: self.log_message(f"Placing piece {piece_id} in {bin_name}..."))
-            response = self.robot_client.place_piece(bin_name)
+            for name, (col, _) in self.telemetry_series.items():
+                values = rows[:, col]
+                valid = ~np.isnan(values)
+                if valid.sum() < 2:
+                    continue
+                lo, hi = values[valid].min(), values[valid].max()
+                ys = height - 10 - (values[valid] - lo) / max(hi - lo, 1e-6) * (height - 20)
+                points = np.empty(2 * int(valid.sum()))
+                points[0::2] = xs[valid]
+                points[1::2] = ys
+                self.telemetry_canvas.coords(self.telemetry_lines[name], *points.tolist())
             
-            if response is None or response.get("status") != "success":
-                self.root.after(0, lambda: self.log_message(f"Failed to place piece {piece_id}", "ERROR"))
-                self.processed_pieces += 1
-                self.root.after(0, self.update_progress)
-                return False
+            # Segment only the plotted rows, not a fresh copy of the whole ring buffer
+            summary = summarize(self.telemetry, samples=rows)
+            lines = [f"{n} samples over {span:.1f}s, {self.telemetry.errors} errors"]
+            for name, avg in summary["averages"].items():
+                lines.append(f"avg {name:<12} {avg:6.2f}s")
+            if summary["commands"] and summary["commands"][-1]["covered"]:
+                last = summary["commands"][-1]
+                lines.append(f"last {last['name']}: {last['duration']:.2f}s = approach "
+                             f"{last['approach']:.2f} + transfer {last['transfer']:.2f} + "
+                             f"retreat {last['retreat']:.2f} + idle {last['idle']:.2f}")
+            if summary["idle_gaps"]:
+                lines.append(f"idle between commands: avg {np.mean(summary['idle_gaps']):.2f}s")
+            self.telemetry_summary.config(text="\n".join(lines))
+        
+        self.root.after(500, self.refresh_telemetry)
+    
+    def create_model_tab(self, notebook):
+        """Create the model hot-swap / shadow evaluation tab."""
+        tab = tk.Frame(notebook, bg=self.dark_bg)
+        notebook.add(tab, text="Model")
+        
+        controls = tk.Frame(tab, bg=self.dark_bg)
+        controls.pack(fill="x", padx=10, pady=5)
+        
+        tk.Label(
+            controls,
+            text="Candidate:",
+            font=("Arial", 9),
+            bg=self.dark_bg,
+            fg=self.dark_fg
+        ).pack(side="left")
+        
+        self.candidate_entry = tk.Entry(controls, width=24, font=("Arial", 9))
+        self.candidate_entry.insert(0, self.candidate_path)
+        self.candidate_entry.pack(side="left", padx=5)
+        
+        for text, command in (("Load", self.load_candidate_model),
+                              ("Promote", self.promote_candidate_model),
+                              ("Reject", self.reject_candidate_model)):
+            tk.Button(
+                controls,
+                text=text,
+                command=command,
+                bg=self.dark_accent,
+                fg=self.dark_fg,
+                font=("Arial", 9, "bold"),
+                relief=tk.FLAT,
+                cursor="hand2"
+            ).pack(side="left", padx=2)
+        
+        self.shadow_var = tk.BooleanVar(value=self.model_manager.shadow_enabled)
+        tk.Checkbutton(
+            controls,
+            text="Shadow",
+            variable=self.shadow_var,
+            command=self.on_shadow_toggle,
+            bg=self.dark_bg,
+            fg=self.dark_fg,
+            selectcolor=self.dark_secondary,
+            activebackground=self.dark_bg,
+            font=("Arial", 9)
+        ).pack(side="left", padx=5)
+        
+        self.model_summary = tk.Label(
+            tab,
+            text="",
+            font=("Courier New", 9),
+            bg=self.dark_bg,
+            fg="#888888",
+            justify="left",
+            anchor="nw"
+        )
+        self.model_summary.pack(fill="both", expand=True, padx=10, pady=5)
+        
+        self.refresh_model_tab()
+    
+    def create_diagnostics_tab(self, notebook):
+        """Create the profiler / memory / Tk object count tab."""
+        tab = tk.Frame(notebook, bg=self.dark_bg)
+        notebook.add(tab, text="Diagnostics")
+        
+        controls = tk.Frame(tab, bg=self.dark_bg)
+        controls.pack(fill="x", padx=10, pady=5)
+        
+        tk.Label(
+            controls,
+            text="Duration (s):",
+            font=("Arial", 9),
+            bg=self.dark_bg,
+            fg=self.dark_fg
+        ).pack(side="left")
+        
+        self.diagnostics_duration = tk.Spinbox(controls, from_=1, to=120, width=5, font=("Arial", 9))
+        self.diagnostics_duration.delete(0, tk.END)
+        self.diagnostics_duration.insert(0, "10")
+        self.diagnostics_duration.pack(side="left", padx=5)
+        
+        tk.Button(
+            controls,
+            text="Capture",
+            command=self.start_diagnostics,
+            bg=self.dark_accent,
+            fg=self.dark_fg,
+            font=("Arial", 9, "bold"),
+            relief=tk.FLAT,
+            cursor="hand2"
+        ).pack(side="left", padx=2)
+        
+        self.diagnostics_summary = tk.Label(
+            tab,
+            text="",
+            font=("Courier New", 9),
+            bg=self.dark_bg,
+            fg="#888888",
+            justify="left",
+            anchor="nw"
+        )
+        self.diagnostics_summary.pack(fill="both", expand=True, padx=10, pady=5)
+        
+        self.refresh_diagnostics_tab()
+    
+    def create_production_tab(self, notebook):
+        """Create the shift throughput / availability / bottleneck tab."""
+        tab = tk.Frame(notebook, bg=self.dark_bg)
+        notebook.add(tab, text="Production")
+        
+        self.production_summary = tk.Label(
+            tab,
+            text="",
+            font=("Courier New", 9),
+            bg=self.dark_bg,
+            fg="#888888",
+            justify="left",
+            anchor="nw"
+        )
+        self.production_summary.pack(fill="both", expand=True, padx=10, pady=5)
+        
+        self.refresh_production_tab()
+    
+    def create_audit_tab(self, notebook):
+        """Create the capture history / replay tab."""
+        tab = tk.Frame(notebook, bg=self.dark_bg)
+        notebook.add(tab, text="Audit")
+        
+        controls = tk.Frame(tab, bg=self.dark_bg)
+        controls.pack(fill="x", padx=10, pady=5)
+        
+        tk.Label(
+            controls,
+            text="Capture:",
+            font=("Arial", 9),
+            bg=self.dark_bg,
+            fg=self.dark_fg
+        ).pack(side="left")
+        
+        self.audit_entry = tk.Entry(controls, width=30, font=("Arial", 9))
+        self.audit_entry.insert(0, self.capture_id or "")
+        self.audit_entry.pack(side="left", padx=5)
+        
+        for text, command in (("Replay", self.start_replay),
+                              ("Recent", self.refresh_audit_tab)):
+            tk.Button(
+                controls,
+                text=text,
+                command=command,
+                bg=self.dark_accent,
+                fg=self.dark_fg,
+                font=("Arial", 9, "bold"),
+                relief=tk.FLAT,
+                cursor="hand2"
+            ).pack(side="left", padx=2)
+        
+        self.audit_summary = tk.Label(
+            tab,
+            text="",
+            font=("Courier New", 9),
+            bg=self.dark_bg,
+            fg="#888888",
+            justify="left",
+            anchor="nw"
+        )
+        self.audit_summary.pack(fill="both", expand=True, padx=10, pady=5)
+        
+        self.refresh_audit_tab()
+    
+    def refresh_audit_tab(self):
+        """List the most recent captures (runs on the Tk thread when asked)."""
+        if not (self.insights_window and self.insights_window.winfo_exists()):
+            return
+        
+        rows = self.audit_store.query_captures(limit=12)
+        lines = ["Recent captures (enter an ID and press Replay to compare with the current model):", ""]
+        for row in rows:
+            when = time.strftime("%m-%d %H:%M:%S", time.localtime(row["ts"]))
+            lines.append(f"{row['capture_id']}  {when}  {row['tray_id'] or '-':<16} {row['model_version'] or '-'}")
+        if not rows:
+            lines.append("No captures yet")
+        self.audit_summary.config(text="\n".join(lines))
+    
+    def start_replay(self):
+        """Replay the entered capture on a worker thread."""
+        capture_id = self.audit_entry.get().strip()
+        if not capture_id or self.replay_running:
+            return
+        self.replay_running = True
+        self.audit_summary.config(text=f"Replaying {capture_id}...")
+        
+        def worker():
+            self.pin_background()
+            try:
+                result = self.replay_capture(capture_id)
+            except Exception as e:
+                result = None
+                self.root.after(0, lambda error=str(e): self.log_message(
+                    f"Replay {capture_id} failed: {error}", "ERROR"))
+            self.root.after(0, lambda: self.show_replay(capture_id, result))
+        
+        threading.Thread(target=worker, name="audit-replay", daemon=True).start()
+    
+    def show_replay(self, capture_id, result):
+        """Show a replay's recorded vs replayed decisions and the tray's commands."""
+        self.replay_running = False
+        if result is None:
+            self.log_message(f"Capture {capture_id} not found", "WARNING")
+            text = f"Capture {capture_id}: no stored frame"
+        else:
+            if result["changed"]:
+                self.log_message(f"Replay {capture_id}: pieces {result['changed']} changed verdict", "WARNING")
             else:
-                self.root.after(0, lambda: self.log_message(f"Piece {piece_id} sorted successfully!", "SUCCESS"))
-            
-            self.processed_pieces += 1
-            self.root.after(0, self.update_progress)
-            return True
-            
-        except Exception as e:
-            self.root.after(0, lambda: self.log_message(f"Error processing piece {piece_id}: {e}", "ERROR"))
-            self.processed_pieces += 1
-            self.root.after(0, self.update_progress)
-            return False
-    
-    def return_to_home(self):
-        """Return robot to home position."""
-        self.root.after(0, lambda: self.log_message("Returning to home..."))
+                self.log_message(f"Replay {capture_id}: all verdicts match", "SUCCESS")
+            recorded, replayed = result["recorded"], result["replayed"]
+            lines = [f"Replay {capture_id} with {self.replay_model[0]}:", "",
+                     f"{'piece':<7}{'recorded':<20}{'replayed':<20}"]
+            for pid in sorted(set(recorded) | set(replayed)):
+                cells = []
+                for decisions in (recorded, replayed):
+                    decision = decisions.get(pid)
+                    confidence = decision.get("confidence") if decision else None
+                    cells.append(f"{decision['status']} {confidence:.2f}" if confidence is not None
+                                 else decision["status"] if decision else "-")
+                mark = "  changed" if pid in result["changed"] else ""
+                lines.append(f"{pid:<7}{cells[0]:<20}{cells[1]:<20}{mark}")
+            commands = self.audit_store.query_commands(capture_id=capture_id)
+            if commands:
+                lines.append("")
+                lines.append(f"Robot commands ({len(commands)}):")
+                for row in commands[:8]:
+                    lines.append(f"  piece {row['piece_id']}  {row['command']:<12} "
+                                 f"{'ok' if row['success'] else 'failed':<7}{row['duration'] or 0:.2f}s")
+            text = "\n".join(lines)
+        if self.insights_window and self.insights_window.winfo_exists():
+            self.audit_summary.config(text=text)
+    
+    def refresh_production_tab(self):
+        """Update the shift and hourly rollups (runs on the Tk thread every 5 seconds while open)."""
+        if not (self.insights_window and self.insights_window.winfo_exists()):
+            return
+        
+        self.production_summary.config(text=format_report(self.analytics))
+        self.root.after(5000, self.refresh_production_tab)
+    
+    def start_diagnostics(self):
+        """Start a profile + memory capture in the background."""
         try:
-            response = self.robot_client.move_home()
-            if response and response.get("status") == "success":
-                self.root.after(0, lambda: self.log_message("Returned to home", "SUCCESS"))
-            else:
-                self.root.after(0, lambda: self.log_message("Failed to return home", "WARNING"))
-            time.sleep(0.5)
-        except Exception as e:
-            self.root.after(0, lambda: self.log_message(f"Error returning home: {e}", "ERROR"))
+            duration = float(self.diagnostics_duration.get())
+        except ValueError:
+            duration = 10.0
+        if not self.diagnostics.start(duration):
+            self.log_message("A diagnostics capture is already running", "WARNING")
+    
+    def get_tk_stats(self):
+        """Tk object counts, gathered on the Tk thread (callable from any thread)."""
+        if threading.current_thread() is threading.main_thread():
+            return tk_stats(self.root)
+        done = threading.Event()
+        result = {}
+        
+        def collect():
+            result["stats"] = tk_stats(self.root)
+            done.set()
+        
+        self.root.after(0, collect)
+        done.wait(timeout=5.0)
+        return result.get("stats")
+    
+    def refresh_diagnostics_tab(self):
+        """Update the Tk object counts (runs on the Tk thread every 5 seconds while open)."""
+        if not (self.insights_window and self.insights_window.winfo_exists()):
+            return
+        
+        stats = tk_stats(self.root)
+        lines = [f"Canvas items:  {stats['canvas_items']}",
+                 f"PhotoImages:   {stats['photoimages']} (Tk images: {stats['tk_images']})",
+                 f"Log lines:     {stats['text_lines'].get(str(self.log_text), 0)}",
+                 f"Widgets:       {stats['widgets']}",
+                 "",
+                 "Capturing..." if self.diagnostics.running
+                 else f"Last capture:  {self.diagnostics.last_path or '-'}"]
+        if self.control_server:
+            lines.append(f"Control socket: 127.0.0.1:{self.control_port}")
+        self.diagnostics_summary.config(text="\n".join(lines))
+        self.root.after(5000, self.refresh_diagnostics_tab)
+    
+    def load_candidate_model(self):
+        """Load the candidate model in the background (the camera keeps running)."""
+        self.candidate_path = self.candidate_entry.get().strip()
+        if not self.candidate_path:
+            return
+        self.log_message(f"Loading candidate model {self.candidate_path}...")
+        if not self.model_manager.load_candidate(self.candidate_path):
+            self.log_message("A candidate is already loading", "WARNING")
+    
+    def promote_candidate_model(self):
+        """Swap the candidate in as the live model (takes effect on the next frame)."""
+        live = self.model_manager.promote()
+        if live is None:
+            messagebox.showwarning("No Candidate", "Load a candidate model first")
+            return
+        self.model = live.model
+        self.model_version = live.version
+        self.model_path = live.path
+        self.shadow_var.set(False)
+    
+    def reject_candidate_model(self):
+        """Discard the candidate model."""
+        self.model_manager.reject()
+        self.shadow_var.set(False)
+    
+    def on_shadow_toggle(self):
+        """Start or stop shadow evaluation of the candidate."""
+        enabled = self.shadow_var.get()
+        preprocessor = FramePreprocessor(self.contrast, self.brightness, self.imgsz)
+        
+        def detect(model, frame, regions, imgsz):
+            # Same input size as the live model used for this frame
+            preprocessor.set_imgsz(imgsz)
+            pieces, _ = detect_regions(model, preprocessor, frame, regions, self.conf_thresh)
+            return pieces
+        
+        if not self.model_manager.set_shadow(enabled, detect):
+            self.shadow_var.set(False)
+            messagebox.showwarning("No Candidate", "Load a candidate model first")
+            return
+        self.log_message(f"Shadow evaluation {'started' if enabled else 'stopped'} "
+                         f"(1 in {self.model_manager.shadow_every} frames)")
+    
+    def refresh_model_tab(self):
+        """Update the live/candidate/shadow summary (runs on the Tk thread every second)."""
+        if not (self.insights_window and self.insights_window.winfo_exists()):
+            return
+        
+        manager = self.model_manager
+        lines = [f"Live:      {manager.live.version if manager.live else '-'}"]
+        if manager.loading:
+            lines.append("Candidate: loading...")
+        elif manager.candidate:
+            lines.append(f"Candidate: {manager.candidate.version} "
+                         f"(warm-up {manager.candidate.warmup_ms:.0f} ms)")
+        else:
+            lines.append("Candidate: -")
+        
+        summary = manager.shadow_summary()
+        if summary:
+            lines.append("")
+            lines.append(f"Shadow frames: {summary['frames']}, region agreement "
+                         f"{summary['agreement'] * 100:.1f}%")
+            lines.append(f"Latency live      {summary['live_ms']:6.1f} ms (p95 {summary['live_p95_ms']:.1f})")
+            lines.append(f"Latency candidate {summary['candidate_ms']:6.1f} ms "
+                         f"(p95 {summary['candidate_p95_ms']:.1f})")
+            for pid, count in sorted(summary["disagreements"].items()):
+                lines.append(f"  piece {pid}: {count} disagreement(s)")
+        self.model_summary.config(text="\n".join(lines))
+        
+        self.root.after(1000, self.refresh_model_tab)
     
     def update_progress(self):
         """Update progress bar."""
@@ -829,15 +2109,36 @@ class SortingDashboard:
     def on_sorting_complete(self):
         """Handle sorting completion."""
         self.is_sorting = False
+        self.scheduler.set_state(AWAITING_CAPTURE)
+        self.analytics.end_tray()
         self.log_message("Sorting complete! All pieces processed.", "SUCCESS")
         
         self.sort_btn.config(state=tk.NORMAL)
-        messagebox.showinfo("Complete", f"Successfully sorted {self.processed_pieces} of {self.total_pieces} pieces!")
+        counts = self.sort_job.counts() if self.sort_job else {"done": self.processed_pieces, "failed": 0}
+        message = f"Successfully sorted {counts['done']} of {self.total_pieces} pieces!"
+        if counts["failed"]:
+            failed = [p["piece_id"] for p in self.sort_job.pieces if p["state"] == FAILED]
+            message += f"\n\nFailed: {failed}. Press START SORTING to retry them."
+        messagebox.showinfo("Complete", message)
+    
+    def on_sorting_paused(self, reason):
+        """Handle a paused job (robot link lost); the job can be resumed."""
+        self.is_sorting = False
+        self.scheduler.set_state(AWAITING_CAPTURE)
+        self.analytics.end_tray()
+        self.log_message(f"Sorting paused: {reason}. Reconnect and press START SORTING to resume.", "WARNING")
+        if self.is_connected:
+            self.sort_btn.config(state=tk.NORMAL)
+        messagebox.showwarning("Sorting Paused", f"{reason}\n\nThe job was saved and can be resumed.")
     
     def on_sorting_error(self, error):
         """Handle sorting error."""
         self.is_sorting = False
-        self.sort_btn.config(state=tk.NORMAL)
+        self.scheduler.set_state(AWAITING_CAPTURE)
+        self.analytics.end_tray()
+        # Also undoes the STOP CONVEYOR state if the conveyor loop failed
+        self.sort_btn.config(text="▶️ START SORTING", command=self.start_sorting,
+                             bg=self.success_color, state=tk.NORMAL)
         self.log_message(f"Sorting error: {error}", "ERROR")
         messagebox.showerror("Error", f"Sorting error:\n{error}")
     
@@ -849,14 +2150,25 @@ class SortingDashboard:
         y = (self.root.winfo_screenheight() // 2) - (325)
         self.root.geometry(f"+{x}+{y}")
         
+        self.resources.pin("ui")
         self.log_message("Dashboard initialized")
+        self.log_message(f"Resource profile {self.resources.describe()}")
         self.log_message("Start camera to begin detection")
         
+        if self.control_port:
+            server = ControlServer(self.diagnostics, self.control_port)
+            if server.start():
+                self.control_server = server
+                self.log_message(f"Diagnostics control socket on 127.0.0.1:{self.control_port}")
+        
         self.root.mainloop()
         
         # Cleanup
+        if self.control_server:
+            self.control_server.stop()
         if self.cap:
             self.cap.release()
+        self.audit_store.close()
         cv2.destroyAllWindows()
 
 
@@ -0,0 +1,356 @@
+"""
+Robot Telemetry - Background pose/joint sampler with a fixed-size ring buffer
+
+A TelemetryPoller opens its own RobotClient connection (so motion commands on
+the main connection are never blocked), polls get_pose / get_joints at a
+configurable rate and stores every sample in a preallocated NumPy ring
+buffer. The sorting thread marks command spans (pick_piece, place_piece,
+move_home) so each cycle can be broken down into motion, idle,
+approach (descending) and retreat (ascending) time.
+"""
+
+import time
+import threading
+import numpy as np
+from robot_client import RobotClient
+
+
+# Ring buffer columns
+COL_TIME = 0
+COLS_POSE = slice(1, 7)     # x, y, z, rx, ry, rz
+COLS_JOINTS = slice(7, 13)  # j1..j6
+NUM_COLS = 13
+
+
+def extract_vector(response, keys, length=6):
+    """
+    Pull a numeric vector out of a server response.
+
+    Args:
+        response (dict): Response from the robot server.
+        keys (tuple): Candidate keys, tried in order.
+        length (int): Expected vector length.
+
+    Returns:
+        list: The vector, or None if not found.
+    """
+    if not response or response.get("status") not in (None, "success"):
+        return None
+    for key in keys:
+        value = response.get(key)
+        if isinstance(value, (list, tuple)) and len(value) >= length:
+            return value[:length]
+    return None
+
+
+class TelemetryPoller:
+    """
+    Polls robot pose and joints into a bounded time-series buffer.
+    """
+
+    def __init__(self, host, port=5000, rate_hz=10.0, capacity=6000, max_events=512,
+                 on_thread_start=None):
+        """
+        Initialize the poller.
+
+        Args:
+            host (str): Robot server IP address.
+            port (int): Robot server port.
+            rate_hz (float): Sampling rate.
+            capacity (int): Number of samples kept (older ones are overwritten).
+            max_events (int): Number of command span marks kept.
+            on_thread_start (callable): Called first on the sampling thread
+                (e.g. to pin it to the background cores).
+        """
+        self.host = host
+        self.port = port
+        self.rate_hz = rate_hz
+        self.capacity = capacity
+        self.on_thread_start = on_thread_start
+
+        # Preallocated sample storage: [t, pose(6), joints(6)]
+        self.samples = np.full((capacity, NUM_COLS), np.nan)
+        self.head = 0   # Next write index
+        self.count = 0  # Valid samples
+
+        # Command span marks: time, name code, phase (1=begin, 0=end)
+        self.max_events = max_events
+        self.event_times = np.zeros(max_events)
+        self.event_codes = np.zeros(max_events, dtype=np.int16)
+        self.event_phase = np.zeros(max_events, dtype=np.int8)
+        self.event_head = 0
+        self.event_count = 0
+        self.event_names = []  # code → name
+
+        self.client = None   # Owned by the sampling thread, which closes it on exit
+        self.running = False
+        self.thread = None
+        self._stop = threading.Event()
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Connect the telemetry connection and start sampling.
+
+        Returns:
+            bool: True if the connection succeeded.
+        """
+        if self.running:
+            return True
+        client = RobotClient(self.host, self.port)
+        if not client.connect():
+            return False
+        # A fresh stop event per thread: a previous thread still finishing a
+        # request after stop() cannot be revived by this start()
+        self._stop = threading.Event()
+        self.client = client
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, args=(client, self._stop),
+                                       name="telemetry", daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        """
+        Stop sampling. The sampling thread closes the telemetry connection when
+        it exits, so a request still in flight after the join timeout finishes
+        on an open socket instead of racing the close.
+        """
+        self.running = False
+        self._stop.set()
+        if self.thread:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+
+    def set_rate(self, rate_hz):
+        """Change the sampling rate (takes effect on the next sample)."""
+        self.rate_hz = max(0.1, float(rate_hz))
+
+    def _loop(self, client, stop):
+        """
+        Sampling loop (runs on its own thread).
+
+        Args:
+            client (RobotClient): Telemetry connection, closed here on exit.
+            stop (threading.Event): Set by stop().
+        """
+        try:
+            if self.on_thread_start:
+                self.on_thread_start()
+            next_tick = time.monotonic()
+            while not stop.is_set():
+                t = time.monotonic()
+                pose = extract_vector(client.get_pose(), ("pose", "tcp_pose", "data"))
+                joints = extract_vector(client.get_joints(), ("joints", "joint_angles", "data"))
+                if pose is None and joints is None:
+                    self.errors += 1
+                else:
+                    self.add_sample(t, pose, joints)
+
+                next_tick += 1.0 / self.rate_hz
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    stop.wait(delay)
+                else:
+                    next_tick = time.monotonic()  # Fell behind; don't burst to catch up
+        finally:
+            client.disconnect()
+            if self.client is client:
+                self.client = None
+
+    def add_sample(self, t, pose=None, joints=None):
+        """
+        Write one sample into the ring buffer (no allocation).
+
+        Args:
+            t (float): time.monotonic() timestamp.
+            pose (list): [x, y, z, rx, ry, rz] or None.
+            joints (list): Six joint angles or None.
+        """
+        with self._lock:
+            row = self.samples[self.head]
+            row[COL_TIME] = t
+            if pose is not None:
+                row[COLS_POSE] = pose
+            else:
+                row[COLS_POSE] = np.nan
+            if joints is not None:
+                row[COLS_JOINTS] = joints
+            else:
+                row[COLS_JOINTS] = np.nan
+            self.head = (self.head + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+
+    def _mark(self, name, phase):
+        """Record a command span boundary."""
+        with self._lock:
+            if name not in self.event_names:
+                self.event_names.append(name)
+            i = self.event_head
+            self.event_times[i] = time.monotonic()
+            self.event_codes[i] = self.event_names.index(name)
+            self.event_phase[i] = phase
+            self.event_head = (i + 1) % self.max_events
+            self.event_count = min(self.event_count + 1, self.max_events)
+
+    def begin(self, name):
+        """Mark the start of a robot command (e.g. "pick_piece")."""
+        self._mark(name, 1)
+
+    def end(self, name):
+        """Mark the end of a robot command."""
+        self._mark(name, 0)
+
+    def window(self, out, seconds=None):
+        """
+        Copy the most recent samples, oldest first, into a caller-owned array.
+
+        Args:
+            out (ndarray): (N, NUM_COLS) destination (reused between calls).
+            seconds (float): Optional time window; older rows are NaN-filled.
+
+        Returns:
+            int: Number of valid rows written to the end of `out`.
+        """
+        with self._lock:
+            n = min(len(out), self.count)
+            start = (self.head - n) % self.capacity
+            first = min(n, self.capacity - start)
+            out[len(out) - n:len(out) - n + first] = self.samples[start:start + first]
+            out[len(out) - n + first:] = self.samples[:n - first]
+        out[:len(out) - n] = np.nan
+        if seconds is not None and n:
+            cutoff = out[-1, COL_TIME] - seconds
+            stale = out[:, COL_TIME] < cutoff
+            out[stale] = np.nan
+            n = int(np.count_nonzero(~np.isnan(out[:, COL_TIME])))
+        return n
+
+    def ordered(self):
+        """Return all valid samples, oldest first (allocates; for analysis)."""
+        out = np.empty((self.count, NUM_COLS))
+        if self.count:
+            self.window(out)
+        return out
+
+    def spans(self):
+        """
+        Pair begin/end marks into command spans.
+
+        Returns:
+            list: [(name, t_start, t_end)] oldest first.
+        """
+        with self._lock:
+            n = self.event_count
+            start = (self.event_head - n) % self.max_events
+            order = (start + np.arange(n)) % self.max_events
+            times = self.event_times[order]
+            codes = self.event_codes[order]
+            phases = self.event_phase[order]
+            names = list(self.event_names)
+
+        open_spans = {}
+        result = []
+        for t, code, phase in zip(times, codes, phases):
+            name = names[code]
+            if phase == 1:
+                open_spans[name] = t
+            elif name in open_spans:
+                result.append((name, open_spans.pop(name), t))
+        return result
+
+
+def segment_motion(samples, speed_threshold=5.0, z_threshold=5.0):
+    """
+    Split a pose time series into motion and idle segments.
+
+    Motion segments are labelled "approach" when the tool mostly descends,
+    "retreat" when it mostly ascends and "transfer" otherwise.
+
+    Args:
+        samples (ndarray): (N, NUM_COLS) ordered samples.
+        speed_threshold (float): Tool speed (pose units/s) above which the
+            robot counts as moving.
+        z_threshold (float): Net Z change that makes a segment an
+            approach/retreat.
+
+    Returns:
+        list: [(kind, t_start, t_end)] with kind in
+        ("idle", "approach", "retreat", "transfer").
+    """
+    valid = ~np.isnan(samples[:, 1])
+    samples = samples[valid]
+    if len(samples) < 2:
+        return []
+
+    t = samples[:, COL_TIME]
+    xyz = samples[:, 1:4]
+    dt = np.diff(t)
+    dt[dt <= 0] = np.nan
+    speed = np.linalg.norm(np.diff(xyz, axis=0), axis=1) / dt
+    moving = np.nan_to_num(speed) > speed_threshold
+
+    # Run-length encode the moving flag over sample intervals
+    change = np.flatnonzero(np.diff(moving.astype(np.int8))) + 1
+    starts = np.concatenate(([0], change))
+    ends = np.concatenate((change, [len(moving)]))
+
+    segments = []
+    for s, e in zip(starts, ends):
+        t_start, t_end = t[s], t[e]
+        if not moving[s]:
+            segments.append(("idle", t_start, t_end))
+            continue
+        dz = xyz[e, 2] - xyz[s, 2]
+        if dz < -z_threshold:
+            kind = "approach"
+        elif dz > z_threshold:
+            kind = "retreat"
+        else:
+            kind = "transfer"
+        segments.append((kind, t_start, t_end))
+    return segments
+
+
+def summarize(poller, speed_threshold=5.0, z_threshold=5.0, samples=None):
+    """
+    Break each recorded command span down into motion categories.
+
+    Args:
+        poller (TelemetryPoller): Poller with samples and span marks.
+        speed_threshold (float): See segment_motion.
+        z_threshold (float): See segment_motion.
+        samples (ndarray): Ordered samples to segment, e.g. the rows already
+            copied for a plot (default: a copy of the whole buffer).
+
+    Returns:
+        dict: {"commands": [{"name", "duration", "idle", "approach",
+        "retreat", "transfer", "covered"}], "idle_gaps": [seconds between
+        commands], "averages": {name: mean duration}}; "covered" is False
+        for spans that started before the first sample (partial breakdown).
+    """
+    if samples is None:
+        samples = poller.ordered()
+    segments = segment_motion(samples, speed_threshold, z_threshold)
+    spans = poller.spans()
+    first = samples[0, COL_TIME] if len(samples) else np.inf
+
+    commands = []
+    for name, t_start, t_end in spans:
+        entry = {"name": name, "duration": t_end - t_start, "covered": bool(t_start >= first),
+                 "idle": 0.0, "approach": 0.0, "retreat": 0.0, "transfer": 0.0}
+        for kind, s_start, s_end in segments:
+            overlap = min(t_end, s_end) - max(t_start, s_start)
+            if overlap > 0:
+                entry[kind] += overlap
+        commands.append(entry)
+
+    idle_gaps = [b[1] - a[2] for a, b in zip(spans, spans[1:]) if b[1] > a[2]]
+
+    averages = {}
+    for entry in commands:
+        averages.setdefault(entry["name"], []).append(entry["duration"])
+    averages = {name: float(np.mean(values)) for name, values in averages.items()}
+
+    return {"commands": commands, "idle_gaps": idle_gaps, "averages": averages}
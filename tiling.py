@@ -0,0 +1,520 @@
+"""
+Tiled Inference - Full-resolution YOLO on overlapping tiles over the piece regions
+
+At the default capture size the whole tray is letterboxed into one
+640x640 model input, so a 3-pixel surface defect becomes a sub-pixel smudge
+and conf_thresh has to be lowered to catch it. In tiled mode the camera
+captures at high resolution (e.g. 1920x1080) and:
+1. the piece regions (defined at the reference capture size) are scaled to
+   the high-resolution frame and padded by a margin
+2. each padded region is covered by overlapping tile x tile crops; the tile
+   layout is computed once per frame size, and duplicate tiles are dropped
+3. every tile gets the brightness/contrast LUT written straight into a
+   preallocated batch buffer (only tile pixels are processed), and the
+   batch goes through the model in one call
+4. boxes are shifted back to frame coordinates and merged across tile seams
+   with class-aware NMS (IoU, plus intersection-over-smaller for halves of
+   a defect cut by a seam)
+5. boxes are scaled to the reference frame, so region logic, overlay,
+   display, audit and dataset code are unchanged
+
+Run this file directly for the recall/latency trade-off across tile sizes on
+a synthetic high-resolution tray with small defects (or on a recorded
+dataset with a real model):
+    python3 tiling.py
+    python3 tiling.py --model yolo.pt --dataset dataset
+"""
+
+import math
+import time
+import numpy as np
+import cv2
+from detection import boxes_to_arrays, BAD_CLASS_ID, PIECE_REGIONS
+from preprocess import build_lut
+
+
+SYNTHETIC_REFERENCE = (854, 480)  # Capture size the synthetic trays place PIECE_REGIONS at
+
+
+def tile_positions(start, end, tile, limit, overlap):
+    """
+    Tile origins covering [start, end) along one axis.
+    
+    Args:
+        start (int): Span start (pixels).
+        end (int): Span end.
+        tile (int): Tile length.
+        limit (int): Frame length (tiles stay inside the frame).
+        overlap (int): Minimum overlap between neighbouring tiles.
+    
+    Returns:
+        list: Tile origins.
+    """
+    tile = min(tile, limit)
+    length = end - start
+    if length <= tile:
+        center = (start + end) // 2
+        return [min(max(0, center - tile // 2), limit - tile)]
+    count = math.ceil((length - tile) / max(1, tile - overlap)) + 1
+    step = (length - tile) / (count - 1)
+    return sorted({min(max(0, int(round(start + i * step))), limit - tile) for i in range(count)})
+
+
+def merge_overlapping(rects):
+    """
+    Merge intersecting rectangles into their bounding boxes (repeatedly).
+    
+    Neighbouring padded regions overlap, so tiling each one separately would
+    infer the shared strip twice; they are tiled as one area instead.
+    
+    Args:
+        rects (list): [x1, y1, x2, y2] rectangles.
+    
+    Returns:
+        list: Disjoint [x1, y1, x2, y2] rectangles.
+    """
+    merged = [list(r) for r in rects]
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                a, b = merged[i], merged[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    merged[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del merged[j]
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged
+
+
+def nms_merge(xyxy, classes, confidences, iou_thresh=0.5, ios_thresh=0.7):
+    """
+    Class-aware greedy NMS that also merges boxes split by tile seams.
+    
+    A box is suppressed by a stronger box of the same class when their IoU
+    exceeds iou_thresh, or when one covers most of the other (intersection
+    over the smaller area above ios_thresh); in the second case the kept box
+    grows to the union, re-joining a defect cut in two by a seam.
+    
+    Args:
+        xyxy (ndarray): (N, 4) boxes.
+        classes (ndarray): (N,) class IDs.
+        confidences (ndarray): (N,) confidences.
+        iou_thresh (float): IoU suppression threshold.
+        ios_thresh (float): Intersection-over-smaller merge threshold.
+    
+    Returns:
+        tuple: (xyxy, classes, confidences) of the kept boxes.
+    """
+    if len(xyxy) == 0:
+        return xyxy, classes, confidences
+    boxes = xyxy.astype(np.float32, copy=True)
+    areas = np.maximum(boxes[:, 2] - boxes[:, 0], 0) * np.maximum(boxes[:, 3] - boxes[:, 1], 0)
+    order = np.argsort(-confidences)
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    keep = []
+    for i in order:
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        rest = order[~suppressed[order]]
+        rest = rest[(rest != i) & (classes[rest] == classes[i])]
+        if not len(rest):
+            continue
+        ix1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        iy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        ix2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        iy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.maximum(ix2 - ix1, 0) * np.maximum(iy2 - iy1, 0)
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-6)
+        ios = inter / np.maximum(np.minimum(areas[i], areas[rest]), 1e-6)
+        merge = rest[(ios > ios_thresh) & (iou <= iou_thresh)]
+        if len(merge):
+            boxes[i, :2] = np.minimum(boxes[i, :2], boxes[merge, :2].min(axis=0))
+            boxes[i, 2:] = np.maximum(boxes[i, 2:], boxes[merge, 2:].max(axis=0))
+            areas[i] = (boxes[i, 2] - boxes[i, 0]) * (boxes[i, 3] - boxes[i, 1])
+        suppressed[rest[(iou > iou_thresh) | (ios > ios_thresh)]] = True
+    keep = np.asarray(keep)
+    return boxes[keep], classes[keep], confidences[keep]
+
+
+class TiledDetector:
+    """
+    High-resolution tiled inference over the piece regions with reusable buffers.
+    """
+    
+    def __init__(self, regions, reference_size, tile=640, overlap=64, margin=0.1,
+                 contrast=1.5, brightness=-30, batch_size=16, record=None):
+        """
+        Initialize the detector.
+        
+        Args:
+            regions (dict): {piece_id: (x1, y1, x2, y2)} at reference_size.
+            reference_size (tuple): (width, height) the regions are defined at.
+            tile (int): Tile side in full-resolution pixels (also the model imgsz).
+            overlap (int): Minimum overlap between tiles (pixels; at least the
+                size of the largest defect so every defect is whole in one tile).
+            margin (float): Region padding as a fraction of its size.
+            contrast (float): Contrast gain (same as the preprocessor).
+            brightness (float): Brightness offset.
+            batch_size (int): Tiles per model call.
+            record (callable): record(step, seconds) for pipeline timings.
+        """
+        self.regions = dict(regions)
+        self.reference_size = tuple(reference_size)
+        self.tile = int(tile)
+        self.overlap = int(overlap)
+        self.margin = margin
+        self.batch_size = batch_size
+        self.record = record or (lambda step, seconds: None)
+        self.set_adjustment(contrast, brightness)
+        
+        self._frame_shape = None
+        self.tiles = []        # [(x, y, w, h)] in frame pixels
+        self._batch = None     # (n, tile_h, tile_w, 3) uint8, reused
+        self._views = []
+        self._scale = (1.0, 1.0)
+        self._reference_adjusted = np.empty((self.reference_size[1], self.reference_size[0], 3),
+                                            dtype=np.uint8)
+    
+    def set_adjustment(self, contrast, brightness):
+        """Rebuild the brightness/contrast lookup table."""
+        self.lut = build_lut(contrast, brightness)
+    
+    def layout(self, frame_shape):
+        """
+        Compute the tiles for a frame size (cached until the size changes).
+        
+        Returns:
+            list: [(x, y, w, h)] tiles.
+        """
+        if frame_shape == self._frame_shape:
+            return self.tiles
+        height, width = frame_shape[:2]
+        sx, sy = width / self.reference_size[0], height / self.reference_size[1]
+        tile_w, tile_h = min(self.tile, width), min(self.tile, height)
+        
+        areas = []
+        for x1, y1, x2, y2 in self.regions.values():
+            pad_x, pad_y = (x2 - x1) * self.margin, (y2 - y1) * self.margin
+            areas.append([max(0, int((x1 - pad_x) * sx)), max(0, int((y1 - pad_y) * sy)),
+                          min(width, int(math.ceil((x2 + pad_x) * sx))),
+                          min(height, int(math.ceil((y2 + pad_y) * sy)))])
+        
+        tiles = set()
+        for fx1, fy1, fx2, fy2 in merge_overlapping(areas):
+            for ty in tile_positions(fy1, fy2, tile_h, height, self.overlap):
+                for tx in tile_positions(fx1, fx2, tile_w, width, self.overlap):
+                    tiles.add((tx, ty, tile_w, tile_h))
+        
+        self.tiles = sorted(tiles, key=lambda t: (t[1], t[0]))
+        self._batch = np.empty((len(self.tiles), tile_h, tile_w, 3), dtype=np.uint8)
+        self._views = list(self._batch)  # One view per tile, handed to the model as a list
+        self._scale = (sx, sy)
+        self._frame_shape = frame_shape
+        return self.tiles
+    
+    def detect(self, model, frame, conf_thresh):
+        """
+        Run tiled inference on a high-resolution frame.
+        
+        Args:
+            model: Loaded ultralytics YOLO model.
+            frame (ndarray): Raw BGR frame at high resolution.
+            conf_thresh (float): YOLO confidence threshold.
+        
+        Returns:
+            tuple: (xyxy in reference coordinates, classes, confidences,
+            adjusted reference-size frame (reused buffer))
+        """
+        tiles = self.layout(frame.shape)
+        
+        start = time.perf_counter()
+        for view, (x, y, w, h) in zip(self._views, tiles):
+            cv2.LUT(frame[y:y + h, x:x + w], self.lut, dst=view)
+        self.record("tiles", time.perf_counter() - start)
+        
+        start = time.perf_counter()
+        found = []
+        for first in range(0, len(tiles), self.batch_size):
+            batch = self._views[first:first + self.batch_size]
+            results = model(batch, imgsz=self.tile, conf=conf_thresh, verbose=False)
+            for (x, y, _, _), result in zip(tiles[first:first + self.batch_size], results):
+                xyxy, classes, confidences = boxes_to_arrays([result])
+                if len(xyxy):
+                    xyxy[:, 0::2] += x
+                    xyxy[:, 1::2] += y
+                    found.append((xyxy, classes, confidences))
+        self.record("inference", time.perf_counter() - start)
+        
+        start = time.perf_counter()
+        if found:
+            xyxy = np.concatenate([f[0] for f in found])
+            classes = np.concatenate([f[1] for f in found])
+            confidences = np.concatenate([f[2] for f in found])
+            xyxy, classes, confidences = nms_merge(xyxy, classes, confidences)
+        else:
+            xyxy = np.zeros((0, 4), dtype=np.float32)
+            classes = np.zeros(0, dtype=int)
+            confidences = np.zeros(0, dtype=np.float32)
+        sx, sy = self._scale
+        xyxy = xyxy / np.array([sx, sy, sx, sy], dtype=np.float32)
+        self.record("merge", time.perf_counter() - start)
+        return xyxy, classes, confidences, self.reference_adjusted(frame)
+    
+    def reference_frame(self, frame):
+        """Raw frame resized to the reference size (new array; safe to queue)."""
+        return cv2.resize(frame, self.reference_size, interpolation=cv2.INTER_AREA)
+    
+    def reference_adjusted(self, frame):
+        """Adjusted reference-size frame for overlay and display (reused buffer)."""
+        cv2.resize(frame, self.reference_size, dst=self._reference_adjusted, interpolation=cv2.INTER_AREA)
+        return cv2.LUT(self._reference_adjusted, self.lut, dst=self._reference_adjusted)
+
+
+class _Array:
+    """Stand-in for a torch tensor (.cpu().numpy())."""
+    
+    def __init__(self, values):
+        self.values = values
+    
+    def cpu(self):
+        return self
+    
+    def numpy(self):
+        return self.values
+
+
+class _Boxes:
+    def __init__(self, xyxy, classes, confidences):
+        self.xyxy, self.cls, self.conf = _Array(xyxy), _Array(classes), _Array(confidences)
+    
+    def __len__(self):
+        return len(self.xyxy.values)
+
+
+class _Result:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class SyntheticDetector:
+    """
+    Model stand-in with a resolution limit, for benchmarking without YOLO.
+    
+    Each input is letterboxed to imgsz like ultralytics does; dark blobs
+    that still cover min_area pixels at that scale are detected as BAD.
+    Inference time is simulated as ms_at_640 * (imgsz / 640)^2 per image.
+    """
+    
+    def __init__(self, min_area=6, threshold=60, ms_at_640=120.0):
+        self.min_area = min_area
+        self.threshold = threshold
+        self.ms_at_640 = ms_at_640
+        self.simulated_ms = 0.0
+    
+    def __call__(self, source, imgsz=640, conf=0.25, verbose=False):
+        images = source if isinstance(source, list) else [source]
+        results = []
+        for image in images:
+            self.simulated_ms += self.ms_at_640 * (imgsz / 640) ** 2
+            scale = min(imgsz / image.shape[0], imgsz / image.shape[1])
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            small = cv2.resize(gray, (max(1, int(image.shape[1] * scale)), max(1, int(image.shape[0] * scale))),
+                               interpolation=cv2.INTER_AREA)
+            count, _, stats, _ = cv2.connectedComponentsWithStats((small < self.threshold).astype(np.uint8))
+            keep = stats[1:, cv2.CC_STAT_AREA] >= self.min_area
+            stats = stats[1:][keep]
+            xyxy = np.column_stack((stats[:, 0], stats[:, 1], stats[:, 0] + stats[:, 2],
+                                    stats[:, 1] + stats[:, 3])).astype(np.float32) / scale
+            confidences = np.full(len(xyxy), 0.8, dtype=np.float32)
+            classes = np.full(len(xyxy), BAD_CLASS_ID, dtype=int)
+            results.append(_Result(_Boxes(xyxy.reshape(-1, 4), classes, confidences)))
+        return results
+
+
+def synthetic_tray(regions, reference_size, size=(1920, 1080), defects_per_piece=3, seed=0):
+    """
+    High-resolution tray image with small dark defects on light pieces.
+    
+    Returns:
+        tuple: (BGR frame, (N, 4) defect boxes in reference coordinates)
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    sx, sy = width / reference_size[0], height / reference_size[1]
+    frame = np.full((height, width, 3), 90, dtype=np.uint8)
+    frame += rng.integers(0, 12, frame.shape, dtype=np.uint8)
+    truth = []
+    for x1, y1, x2, y2 in regions.values():
+        px1, py1, px2, py2 = int(x1 * sx) + 25, int(y1 * sy) + 25, int(x2 * sx) - 25, int(y2 * sy) - 25
+        frame[py1:py2, px1:px2] = 200
+        for _ in range(defects_per_piece):
+            radius = int(rng.integers(2, 6))
+            cx = int(rng.integers(px1 + 10, px2 - 10))
+            cy = int(rng.integers(py1 + 10, py2 - 10))
+            cv2.circle(frame, (cx, cy), radius, (20, 20, 20), -1)
+            truth.append(((cx - radius) / sx, (cy - radius) / sy, (cx + radius) / sx, (cy + radius) / sy))
+    return frame, np.asarray(truth, dtype=np.float32).reshape(-1, 4)
+
+
+def match_recall(predicted, truth, max_distance=4.0):
+    """
+    Fraction of ground-truth boxes with a predicted center nearby.
+    
+    Returns:
+        tuple: (recall, false positives)
+    """
+    if not len(truth):
+        return 1.0, len(predicted)
+    if not len(predicted):
+        return 0.0, 0
+    pc = (predicted[:, :2] + predicted[:, 2:]) / 2
+    tc = (truth[:, :2] + truth[:, 2:]) / 2
+    distance = np.linalg.norm(tc[:, None, :] - pc[None, :, :], axis=2)
+    hit = distance.min(axis=1) <= max_distance
+    used = distance.min(axis=0) <= max_distance
+    return float(hit.mean()), int((~used).sum())
+
+
+def benchmark(tile_sizes=(320, 480, 640, 960), frames=5):
+    """
+    Recall and latency of full-frame vs tiled inference on synthetic trays.
+    
+    Returns:
+        list: Rows {"mode", "tiles", "recall", "false_positives", "inference_ms", "wall_ms"}
+    """
+    from preprocess import FramePreprocessor
+    from detection import detect
+    
+    regions = PIECE_REGIONS
+    reference = SYNTHETIC_REFERENCE
+    scenes = [synthetic_tray(regions, reference, seed=i) for i in range(frames)]
+    rows = []
+    
+    # Baseline: the reference-size frame letterboxed to 640 (what camera_loop does today)
+    model = SyntheticDetector()
+    preprocessor = FramePreprocessor(contrast=1.0, brightness=0, imgsz=640)
+    recalls, fps, overhead = [], [], []
+    for frame, truth in scenes:
+        small = cv2.resize(frame, reference, interpolation=cv2.INTER_AREA)
+        start = time.perf_counter()
+        xyxy, _, _, _ = detect(model, preprocessor, small, 0.25)
+        overhead.append(time.perf_counter() - start)
+        recall, fp = match_recall(xyxy, truth)
+        recalls.append(recall)
+        fps.append(fp)
+    rows.append({"mode": "full frame 640", "tiles": 1, "recall": np.mean(recalls),
+                 "false_positives": np.mean(fps), "inference_ms": model.simulated_ms / frames,
+                 "wall_ms": np.mean(overhead) * 1000})
+    
+    for tile in tile_sizes:
+        model = SyntheticDetector()
+        tiled = TiledDetector(regions, reference, tile=tile, overlap=32, contrast=1.0, brightness=0)
+        recalls, fps, overhead = [], [], []
+        for frame, truth in scenes:
+            start = time.perf_counter()
+            xyxy, _, _, _ = tiled.detect(model, frame, 0.25)
+            overhead.append(time.perf_counter() - start)
+            recall, fp = match_recall(xyxy, truth)
+            recalls.append(recall)
+            fps.append(fp)
+        rows.append({"mode": f"tiles {tile}", "tiles": len(tiled.tiles), "recall": np.mean(recalls),
+                     "false_positives": np.mean(fps), "inference_ms": model.simulated_ms / frames,
+                     "wall_ms": np.mean(overhead) * 1000})
+    return rows
+
+
+def evaluate_dataset(model_path, dataset_dir, tile_sizes=(480, 640, 960), conf_thresh=0.3):
+    """
+    Recall of BAD boxes and latency on recorded high-resolution images with a real model.
+    
+    The piece regions and their reference size come from the dataset's
+    layout.json (written by the recorder), so scoring uses the layout the
+    images were captured with.
+    
+    Returns:
+        list: Rows {"mode", "tiles", "recall", "false_positives", "ms"}
+    """
+    import os
+    from model_manager import load_yolo
+    from preprocess import FramePreprocessor
+    from detection import detect
+    from dataset_capture import load_layout
+    
+    layout = load_layout(dataset_dir)
+    if layout is None:
+        raise ValueError(f"{dataset_dir} has no layout.json (record it with the dashboard)")
+    regions, reference_size = layout
+    model = load_yolo(model_path)
+    images = sorted(os.listdir(os.path.join(dataset_dir, "images")))
+    samples = []
+    for name in images:
+        frame = cv2.imread(os.path.join(dataset_dir, "images", name))
+        label = os.path.join(dataset_dir, "labels", os.path.splitext(name)[0] + ".txt")
+        if frame is None or not os.path.exists(label):
+            continue
+        height, width = frame.shape[:2]
+        truth = []
+        with open(label) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 5 and int(parts[0]) == BAD_CLASS_ID:
+                    cx, cy, w, h = (float(v) for v in parts[1:])
+                    truth.append(((cx - w / 2) * reference_size[0], (cy - h / 2) * reference_size[1],
+                                  (cx + w / 2) * reference_size[0], (cy + h / 2) * reference_size[1]))
+        samples.append((frame, np.asarray(truth, dtype=np.float32).reshape(-1, 4)))
+    if not samples:
+        raise ValueError(f"No labelled images in {dataset_dir}")
+    
+    rows = []
+    configs = [("full frame 640", None)] + [(f"tiles {t}", t) for t in tile_sizes]
+    for mode, tile in configs:
+        preprocessor = FramePreprocessor(imgsz=640)
+        tiled = TiledDetector(regions, reference_size, tile=tile) if tile else None
+        recalls, fps, elapsed = [], [], []
+        for frame, truth in samples:
+            start = time.perf_counter()
+            if tiled:
+                xyxy, classes, _, _ = tiled.detect(model, frame, conf_thresh)
+            else:
+                small = cv2.resize(frame, reference_size, interpolation=cv2.INTER_AREA)
+                xyxy, classes, _, _ = detect(model, preprocessor, small, conf_thresh)
+            elapsed.append(time.perf_counter() - start)
+            recall, fp = match_recall(xyxy[classes == BAD_CLASS_ID], truth, max_distance=10.0)
+            recalls.append(recall)
+            fps.append(fp)
+        rows.append({"mode": mode, "tiles": len(tiled.tiles) if tiled else 1, "recall": np.mean(recalls),
+                     "false_positives": np.mean(fps), "ms": np.mean(elapsed) * 1000})
+    return rows
+
+
+def main():
+    """Print the recall/latency trade-off across tile sizes."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Tiled inference recall/latency benchmark")
+    parser.add_argument("--model", help="YOLO model (with --dataset)")
+    parser.add_argument("--dataset", help="Recorded dataset with high-resolution images/labels")
+    args = parser.parse_args()
+    
+    if args.model and args.dataset:
+        print(f"{'mode':<16}{'tiles':>6}{'BAD recall':>12}{'false pos':>11}{'ms/frame':>10}")
+        for row in evaluate_dataset(args.model, args.dataset):
+            print(f"{row['mode']:<16}{row['tiles']:>6}{row['recall']:>12.1%}"
+                  f"{row['false_positives']:>11.1f}{row['ms']:>10.0f}")
+        return
+    
+    print("Synthetic 1920x1080 tray, 18 defects of 2-5 px radius (simulated 120 ms per 640 input)")
+    print("=" * 80)
+    print(f"{'mode':<16}{'tiles':>6}{'recall':>9}{'false pos':>11}{'inference ms':>14}{'wall ms':>9}")
+    for row in benchmark():
+        print(f"{row['mode']:<16}{row['tiles']:>6}{row['recall']:>9.1%}{row['false_positives']:>11.1f}"
+              f"{row['inference_ms']:>14.0f}{row['wall_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()